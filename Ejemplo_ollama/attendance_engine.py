@@ -0,0 +1,628 @@
+# attendance_engine.py
+"""
+Motor de análisis de asistencia en memoria con NumPy.
+
+Carga core_registro de un rango de fechas en arreglos tipados, ordenados por
+(usuario_id, tiempo, id):
+
+- tiempo: int64 en segundos desde 1970-01-01 (hora local tal como la guarda
+  MariaDB, sin zona horaria), de donde salen el día y el segundo del día
+- usuario_id: int32, estado_id: int8, id: int64
+- nombre, codigo_usuario, evento, lugar, dispositivo: códigos int32 sobre un
+  diccionario de valores distintos
+
+Los análisis de execute_attendance_analysis se resuelven con operaciones
+vectorizadas (np.unique, bincount, reduceat) sobre esos arreglos. Los rangos
+cargados se guardan en un LRU acotado por bytes; cada cierto tiempo se revisa
+MAX(id) y solo se agregan los registros nuevos, así que las preguntas repetidas
+dejan de ir a MariaDB.
+"""
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+import logging
+
+import numpy as np
+
+from attendance_rollup import ENTRY_STATE, EXIT_STATE
+
+logger = logging.getLogger(__name__)
+
+SECONDS_PER_DAY = 86400
+LATE_AFTER_SECONDS = 8 * 3600 + 10 * 60   # TIME(tiempo) > '08:10:00'
+
+LOAD_COLUMNS = ("id", "usuario_id", "estado_id", "tiempo", "nombre", "codigo_usuario", "evento", "lugar",
+                "dispositivo")
+TEXT_COLUMNS = ("nombre", "codigo_usuario", "evento", "lugar", "dispositivo")
+
+Result = Tuple[List[str], List[tuple]]
+
+
+class RowLimitExceeded(Exception):
+    """El rango pedido tiene más registros de los que el motor carga en memoria"""
+
+
+class Dictionary:
+    """Codificación con diccionario de una columna de texto"""
+
+    def __init__(self):
+        self.values: List[Any] = []
+        self._codes: Dict[Any, int] = {}
+
+    @classmethod
+    def from_values(cls, values: Sequence[Any]) -> "Dictionary":
+        """Diccionario con códigos ya asignados (posición en `values`)"""
+        dictionary = cls()
+        dictionary.values = list(values)
+        dictionary._codes = {value: code for code, value in enumerate(dictionary.values)}
+        return dictionary
+
+    def encode(self, items: Sequence[Any]) -> np.ndarray:
+        codes = self._codes
+        values = self.values
+        out = np.empty(len(items), dtype=np.int32)
+        for i, item in enumerate(items):
+            code = codes.get(item)
+            if code is None:
+                code = codes[item] = len(values)
+                values.append(item)
+            out[i] = code
+        return out
+
+    def matching(self, needle: str) -> np.ndarray:
+        """Arreglo booleano por código: el valor contiene `needle` (como LIKE '%x%' sin mayúsculas)"""
+        needle = needle.casefold()
+        return np.array([value is not None and needle in str(value).casefold() for value in self.values],
+                        dtype=bool)
+
+
+def day_bounds(date_from: Optional[str], date_to: Optional[str]) -> Tuple[Optional[int], Optional[int]]:
+    """[inicio, fin) en segundos para los filtros de fecha (fin incluye todo date_to)"""
+    low = high = None
+    if date_from:
+        low = (date.fromisoformat(date_from[:10]) - date(1970, 1, 1)).days * SECONDS_PER_DAY
+    if date_to:
+        high = ((date.fromisoformat(date_to[:10]) - date(1970, 1, 1)).days + 1) * SECONDS_PER_DAY
+    return low, high
+
+
+def range_sql(low: Optional[int], high: Optional[int], extra: str = "") -> Tuple[str, List[Any]]:
+    """SELECT de LOAD_COLUMNS para [low, high) en segundos, con una condición adicional opcional"""
+    conditions, params = ["tiempo IS NOT NULL"], []
+    if low is not None:
+        conditions.append("tiempo >= %s")
+        params.append(datetime(1970, 1, 1) + timedelta(seconds=low))
+    if high is not None:
+        conditions.append("tiempo < %s")
+        params.append(datetime(1970, 1, 1) + timedelta(seconds=high))
+    if extra:
+        conditions.append(extra)
+    return f"SELECT {', '.join(LOAD_COLUMNS)} FROM core_registro WHERE {' AND '.join(conditions)}", params
+
+
+def _to_datetimes(seconds: np.ndarray) -> List[datetime]:
+    return seconds.astype('datetime64[s]').astype(object).tolist()
+
+
+def _to_dates(seconds: np.ndarray) -> List[date]:
+    return (seconds // SECONDS_PER_DAY).astype('datetime64[D]').astype(object).tolist()
+
+
+def _format_time_of_day(seconds: np.ndarray) -> List[str]:
+    sod = seconds % SECONDS_PER_DAY
+    return [f"{s // 3600:02d}:{s % 3600 // 60:02d}:{s % 60:02d}" for s in sod.tolist()]
+
+
+class AttendanceFrame:
+    """Registros de core_registro de un rango de fechas en arreglos NumPy"""
+
+    def __init__(self, database: str, low: Optional[int], high: Optional[int]):
+        self.database = database
+        self.low = low
+        self.high = high
+        self.ids = np.empty(0, dtype=np.int64)
+        self.users = np.empty(0, dtype=np.int32)
+        self.states = np.empty(0, dtype=np.int8)
+        self.times = np.empty(0, dtype=np.int64)
+        self.text = {column: np.empty(0, dtype=np.int32) for column in TEXT_COLUMNS}
+        self.dictionaries = {column: Dictionary() for column in TEXT_COLUMNS}
+        # MAX(id) de la tabla al cargar: las cargas incrementales piden id > max_id
+        self.max_id = 0
+        self._pending: List[Dict[str, np.ndarray]] = []
+        self._pending_rows = 0
+        self.loaded_at = time.monotonic()
+        self.checked_at = self.loaded_at
+        self._groups = None
+
+    def __len__(self) -> int:
+        return len(self.ids) + self._pending_rows
+
+    @property
+    def nbytes(self) -> int:
+        arrays = self.ids.nbytes + self.users.nbytes + self.states.nbytes + self.times.nbytes
+        return arrays + sum(codes.nbytes for codes in self.text.values())
+
+    def covers(self, low: Optional[int], high: Optional[int]) -> bool:
+        return ((self.low is None or (low is not None and self.low <= low)) and
+                (self.high is None or (high is not None and high <= self.high)))
+
+    def append(self, rows: Sequence[tuple]):
+        """Convertir un lote de filas (en el orden de LOAD_COLUMNS) a arreglos; se integran en finish()"""
+        if not rows:
+            return
+        columns = list(zip(*rows))
+        batch = {
+            "ids": np.asarray(columns[0], dtype=np.int64),
+            "users": np.asarray(columns[1], dtype=np.int32),
+            "states": np.asarray(columns[2], dtype=np.int8),
+            # datetime64[s] trunca las fracciones de segundo, igual que TIME() al comparar con '08:10:00'
+            "times": np.array(columns[3], dtype='datetime64[s]').astype(np.int64),
+        }
+        for offset, column in enumerate(TEXT_COLUMNS, start=4):
+            batch[column] = self.dictionaries[column].encode(columns[offset])
+        self._pending.append(batch)
+        self._pending_rows += len(rows)
+
+    def finish(self):
+        """Concatenar los lotes pendientes una sola vez y reordenar por usuario, tiempo e id"""
+        if not self._pending:
+            return
+        batches = self._pending
+        self._pending, self._pending_rows = [], 0
+        join = lambda current, name: np.concatenate([current] + [b[name] for b in batches])
+        ids, users, states, times = (join(self.ids, "ids"), join(self.users, "users"),
+                                     join(self.states, "states"), join(self.times, "times"))
+        text = {column: join(self.text[column], column) for column in TEXT_COLUMNS}
+        order = np.lexsort((ids, times, users))
+        self.ids, self.users, self.states, self.times = ids[order], users[order], states[order], times[order]
+        self.text = {column: codes[order] for column, codes in text.items()}
+        self._groups = None
+
+    @classmethod
+    def from_arrays(cls, database: str, low: Optional[int], high: Optional[int], arrays: Dict[str, np.ndarray],
+                    dictionaries: Dict[str, Dictionary]) -> "AttendanceFrame":
+        """
+        Frame sobre arreglos existentes (p. ej. mapeados en memoria), sin copiarlos.
+        Deben estar agrupados por usuario-día y ordenados por tiempo e id dentro del grupo.
+        """
+        frame = cls(database, low, high)
+        frame.ids, frame.users = arrays["id"], arrays["usuario_id"]
+        frame.states, frame.times = arrays["estado_id"], arrays["tiempo"]
+        frame.text = {column: arrays[column] for column in TEXT_COLUMNS}
+        frame.dictionaries = dictionaries
+        frame.max_id = int(frame.ids.max()) if len(frame.ids) else 0
+        return frame
+
+    def extended(self) -> "AttendanceFrame":
+        """Copia para agregar registros nuevos (comparte arreglos y diccionarios, que solo crecen)"""
+        copy = AttendanceFrame(self.database, self.low, self.high)
+        copy.ids, copy.users, copy.states, copy.times = self.ids, self.users, self.states, self.times
+        copy.text = dict(self.text)
+        copy.dictionaries = self.dictionaries
+        copy.max_id = self.max_id
+        copy.loaded_at = self.loaded_at
+        return copy
+
+    # ===== Grupos usuario-día (contiguos por el orden del frame) =====
+
+    def groups(self) -> Tuple[np.ndarray, np.ndarray]:
+        """(inicio de cada grupo usuario-día, grupo de cada fila)"""
+        if self._groups is None:
+            days = self.times // SECONDS_PER_DAY
+            change = np.ones(len(self), dtype=bool)
+            change[1:] = (self.users[1:] != self.users[:-1]) | (days[1:] != days[:-1])
+            self._groups = (np.flatnonzero(change), np.cumsum(change) - 1)
+        return self._groups
+
+    def select(self, low: Optional[int], high: Optional[int], user_filter: Optional[str]) -> np.ndarray:
+        """Índices de las filas que cumplen los filtros (conservan el orden del frame)"""
+        mask = np.ones(len(self), dtype=bool)
+        if low is not None:
+            mask &= self.times >= low
+        if high is not None:
+            mask &= self.times < high
+        if user_filter:
+            names = self.dictionaries["nombre"].matching(user_filter)
+            codes = self.dictionaries["codigo_usuario"].matching(user_filter)
+            mask &= names[self.text["nombre"]] | codes[self.text["codigo_usuario"]]
+        return np.flatnonzero(mask)
+
+    def decode(self, column: str, rows: np.ndarray) -> List[Any]:
+        values = self.dictionaries[column].values
+        return [values[code] for code in self.text[column][rows].tolist()]
+
+
+def _distinct_per_group(group: np.ndarray, values: np.ndarray, groups: int) -> np.ndarray:
+    """COUNT(DISTINCT values) por grupo"""
+    if not len(group):
+        return np.zeros(groups, dtype=np.int64)
+    _, codes = np.unique(values, return_inverse=True)
+    width = int(codes.max()) + 1
+    pairs = np.unique(group.astype(np.int64) * width + codes)
+    return np.bincount(pairs // width, minlength=groups)
+
+
+def _sorted_groups(keys: Sequence[np.ndarray]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Orden que deja contiguas las filas con las mismas llaves (la última llave es la principal)"""
+    order = np.lexsort(keys)
+    change = np.zeros(len(order), dtype=bool)
+    change[:1] = True
+    for key in keys[1:]:
+        ordered = key[order]
+        change[1:] |= ordered[1:] != ordered[:-1]
+    starts = np.flatnonzero(change)
+    return order, starts, np.cumsum(change) - 1
+
+
+# ===== Análisis (mismas columnas que las consultas de generate_attendance_query) =====
+
+def daily_summary(frame: AttendanceFrame, rows: np.ndarray) -> Result:
+    days = frame.times[rows] // SECONDS_PER_DAY
+    states = frame.states[rows]
+    unique_days, group, totals = np.unique(days, return_inverse=True, return_counts=True)
+    n = len(unique_days)
+    users = _distinct_per_group(group, frame.users[rows], n)
+    entries = np.bincount(group, weights=states == ENTRY_STATE, minlength=n).astype(np.int64)
+    exits = np.bincount(group, weights=states == EXIT_STATE, minlength=n).astype(np.int64)
+    order = np.argsort(-unique_days, kind='stable')
+    fechas = _to_dates(unique_days[order] * SECONDS_PER_DAY)
+    columns = ["fecha", "total_registros", "usuarios_unicos", "entradas", "salidas"]
+    return columns, list(zip(fechas, totals[order].tolist(), users[order].tolist(),
+                             entries[order].tolist(), exits[order].tolist()))
+
+
+def _arrival_rows(frame: AttendanceFrame, selected: np.ndarray) -> Tuple[np.ndarray, List[datetime]]:
+    """Filas seleccionadas por tiempo DESC, id DESC"""
+    order = np.lexsort((-frame.ids[selected], -frame.times[selected]))
+    selected = selected[order]
+    return selected, _to_datetimes(frame.times[selected])
+
+
+def late_arrivals(frame: AttendanceFrame, rows: np.ndarray) -> Result:
+    times = frame.times[rows]
+    late = rows[(frame.states[rows] == ENTRY_STATE) & (times % SECONDS_PER_DAY > LATE_AFTER_SECONDS)]
+    late, moments = _arrival_rows(frame, late)
+    columns = ["registro_id", "nombre", "codigo_usuario", "tiempo", "fecha", "hora_llegada", "lugar", "dispositivo"]
+    return columns, list(zip(frame.ids[late].tolist(), frame.decode("nombre", late),
+                             frame.decode("codigo_usuario", late), moments, [m.date() for m in moments],
+                             _format_time_of_day(frame.times[late]), frame.decode("lugar", late),
+                             frame.decode("dispositivo", late)))
+
+
+def missing_exits(frame: AttendanceFrame, rows: np.ndarray) -> Result:
+    # Última salida de cada usuario-día sobre todo el frame: una entrada no tiene salida
+    # posterior el mismo día si esa última salida no es mayor que su hora
+    starts, group = frame.groups()
+    exit_times = np.where(frame.states == EXIT_STATE, frame.times, np.iinfo(np.int64).min)
+    last_exit = np.maximum.reduceat(exit_times, starts)
+    entries = rows[frame.states[rows] == ENTRY_STATE]
+    missing = entries[last_exit[group[entries]] <= frame.times[entries]]
+    missing, moments = _arrival_rows(frame, missing)
+    columns = ["registro_id", "nombre", "codigo_usuario", "tiempo", "fecha", "hora_entrada"]
+    return columns, list(zip(frame.ids[missing].tolist(), frame.decode("nombre", missing),
+                             frame.decode("codigo_usuario", missing), moments, [m.date() for m in moments],
+                             _format_time_of_day(frame.times[missing])))
+
+
+def user_pattern(frame: AttendanceFrame, rows: np.ndarray) -> Result:
+    times = frame.times[rows]
+    order, starts, group = _sorted_groups((times, frame.text["codigo_usuario"][rows],
+                                           frame.text["nombre"][rows], frame.users[rows]))
+    ordered = rows[order]
+    times = times[order]
+    ends = np.append(starts[1:], len(ordered))
+    totals = ends - starts
+    days = times // SECONDS_PER_DAY
+    new_day = np.ones(len(ordered), dtype=np.int64)
+    new_day[1:] = (days[1:] != days[:-1]) | (group[1:] != group[:-1])
+    active_days = np.add.reduceat(new_day, starts)
+
+    is_entry = frame.states[ordered] == ENTRY_STATE
+    seconds = times % SECONDS_PER_DAY
+    # HOUR(tiempo) + MINUTE(tiempo)/60.0: sin segundos
+    hours = seconds // 3600 + (seconds % 3600 // 60) / 60.0
+    entry_sum = np.add.reduceat(np.where(is_entry, hours, 0.0), starts)
+    entry_count = np.add.reduceat(is_entry.astype(np.int64), starts)
+    average = [s / c if c else None for s, c in zip(entry_sum.tolist(), entry_count.tolist())]
+
+    first = ordered[starts]
+    result_order = np.lexsort((frame.users[first], -totals))
+    first = first[result_order]
+    columns = ["usuario_id", "nombre", "codigo_usuario", "total_registros", "primer_registro",
+               "ultimo_registro", "dias_activos", "hora_promedio_entrada"]
+    return columns, list(zip(frame.users[first].tolist(), frame.decode("nombre", first),
+                             frame.decode("codigo_usuario", first), totals[result_order].tolist(),
+                             _to_datetimes(times[starts][result_order]), _to_datetimes(times[ends - 1][result_order]),
+                             active_days[result_order].tolist(), [average[i] for i in result_order.tolist()]))
+
+
+def device_usage(frame: AttendanceFrame, rows: np.ndarray) -> Result:
+    times = frame.times[rows]
+    order, starts, group = _sorted_groups((times, frame.text["lugar"][rows], frame.text["dispositivo"][rows]))
+    ordered = rows[order]
+    times = times[order]
+    ends = np.append(starts[1:], len(ordered))
+    totals = ends - starts
+    users = _distinct_per_group(group, frame.users[ordered], len(starts))
+    first = ordered[starts]
+    devices = frame.decode("dispositivo", first)
+    places = frame.decode("lugar", first)
+    result_order = sorted(range(len(starts)), key=lambda i: (-int(totals[i]), devices[i] is not None,
+                                                             devices[i] or '', places[i] is not None, places[i] or ''))
+    first_use = _to_dates(times[starts])
+    last_use = _to_dates(times[ends - 1])
+    columns = ["dispositivo", "lugar", "total_usos", "usuarios_distintos", "primer_uso", "ultimo_uso"]
+    return columns, [(devices[i], places[i], int(totals[i]), int(users[i]), first_use[i], last_use[i])
+                     for i in result_order]
+
+
+def hourly_distribution(frame: AttendanceFrame, rows: np.ndarray) -> Result:
+    hours = frame.times[rows] % SECONDS_PER_DAY // 3600
+    events = frame.text["evento"][rows]
+    width = len(frame.dictionaries["evento"].values) or 1
+    keys, group, counts = np.unique(hours * width + events, return_inverse=True, return_counts=True)
+    users = _distinct_per_group(group, frame.users[rows], len(keys))
+    event_values = frame.dictionaries["evento"].values
+    result = [(int(key // width), event_values[int(key % width)], int(count), int(distinct))
+              for key, count, distinct in zip(keys.tolist(), counts.tolist(), users.tolist())]
+    result.sort(key=lambda r: (r[0], r[1] is not None, r[1] or ''))
+    return ["hora", "evento", "cantidad", "usuarios_unicos"], result
+
+
+def work_hours(frame: AttendanceFrame, rows: np.ndarray) -> Result:
+    # Cada entrada se empareja con la checada siguiente del usuario si es una salida del mismo día
+    starts, group = frame.groups()
+    paired = np.zeros(len(frame), dtype=bool)
+    paired[:-1] = ((frame.states[:-1] == ENTRY_STATE) & (frame.states[1:] == EXIT_STATE) &
+                   (group[:-1] == group[1:]))
+    selected = np.zeros(len(frame), dtype=bool)
+    selected[rows] = True
+    paired &= selected
+    worked = np.zeros(len(frame), dtype=np.int64)
+    pair_rows = np.flatnonzero(paired)
+    worked[pair_rows] = frame.times[pair_rows + 1] - frame.times[pair_rows]
+
+    groups = len(starts)
+    seconds = np.bincount(group, weights=worked, minlength=groups)
+    pairs = np.bincount(group, weights=paired, minlength=groups).astype(np.int64)
+    in_selection = np.bincount(group, weights=selected, minlength=groups) > 0
+    entries = selected & (frame.states == ENTRY_STATE)
+    exits = selected & (frame.states == EXIT_STATE)
+    never = np.iinfo(np.int64).max
+    first_entry = np.minimum.reduceat(np.where(entries, frame.times, never), starts)
+    last_exit = np.maximum.reduceat(np.where(exits, frame.times, -1), starts)
+
+    chosen = np.flatnonzero(in_selection)
+    first_rows = starts[chosen]
+    days = frame.times[first_rows] // SECONDS_PER_DAY
+    order = np.lexsort((frame.users[first_rows], -days))
+    chosen, first_rows = chosen[order], first_rows[order]
+    entry_times = first_entry[chosen]
+    exit_times = last_exit[chosen]
+    entry_values = _to_datetimes(np.where(entry_times == never, 0, entry_times))
+    exit_values = _to_datetimes(np.maximum(exit_times, 0))
+    columns = ["usuario_id", "nombre", "fecha", "primera_entrada", "ultima_salida", "pares", "horas_trabajadas"]
+    return columns, list(zip(
+        frame.users[first_rows].tolist(), frame.decode("nombre", first_rows), _to_dates(frame.times[first_rows]),
+        [v if t != never else None for v, t in zip(entry_values, entry_times.tolist())],
+        [v if t >= 0 else None for v, t in zip(exit_values, exit_times.tolist())],
+        pairs[chosen].tolist(), np.round(seconds[chosen] / 3600, 2).tolist()))
+
+
+ANALYSES: Dict[str, Callable[[AttendanceFrame, np.ndarray], Result]] = {
+    "daily_summary": daily_summary,
+    "late_arrivals": late_arrivals,
+    "missing_exits": missing_exits,
+    "user_pattern": user_pattern,
+    "device_usage": device_usage,
+    "hourly_distribution": hourly_distribution,
+    "work_hours": work_hours,
+}
+
+
+ANALYSIS_COLUMNS = {
+    "daily_summary": ["fecha", "total_registros", "usuarios_unicos", "entradas", "salidas"],
+    "late_arrivals": ["registro_id", "nombre", "codigo_usuario", "tiempo", "fecha", "hora_llegada", "lugar",
+                      "dispositivo"],
+    "missing_exits": ["registro_id", "nombre", "codigo_usuario", "tiempo", "fecha", "hora_entrada"],
+    "user_pattern": ["usuario_id", "nombre", "codigo_usuario", "total_registros", "primer_registro",
+                     "ultimo_registro", "dias_activos", "hora_promedio_entrada"],
+    "device_usage": ["dispositivo", "lugar", "total_usos", "usuarios_distintos", "primer_uso", "ultimo_uso"],
+    "hourly_distribution": ["hora", "evento", "cantidad", "usuarios_unicos"],
+    "work_hours": ["usuario_id", "nombre", "fecha", "primera_entrada", "ultima_salida", "pares", "horas_trabajadas"],
+}
+
+
+def run_analysis(frame: AttendanceFrame, analysis_type: str, low: Optional[int], high: Optional[int],
+                 user_filter: Optional[str]) -> Dict[str, Any]:
+    """Ejecutar un análisis sobre las filas del frame que cumplen los filtros"""
+    started = time.perf_counter()
+    rows = frame.select(low, high, user_filter)
+    if len(rows):
+        columns, result = ANALYSES[analysis_type](frame, rows)
+    else:
+        columns, result = ANALYSIS_COLUMNS[analysis_type], []
+    return {
+        "columns": columns,
+        "rows": result,
+        "frame_rows": len(frame),
+        "rows_analyzed": len(rows),
+        "compute_ms": round((time.perf_counter() - started) * 1000, 3)
+    }
+
+
+class AttendanceEngine:
+    """LRU de rangos de core_registro cargados en memoria, acotado por bytes"""
+
+    def __init__(self, max_bytes: int = 512 * 1024 * 1024, max_rows: int = 5_000_000,
+                 refresh_interval: float = 5.0, ttl: float = 900.0, batch_rows: int = 50_000):
+        self.max_bytes = max_bytes
+        self.max_rows = max_rows
+        self.refresh_interval = refresh_interval
+        self.ttl = ttl
+        self.batch_rows = batch_rows
+        self._frames: "OrderedDict[Tuple[str, Optional[int], Optional[int]], AttendanceFrame]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Un lock por rango (base, low, high) con su número de usuarios: cargas de rangos
+        # o bases distintas no se esperan entre sí
+        self._load_locks: Dict[Tuple[str, Optional[int], Optional[int]], List[Any]] = {}
+        # Rangos que exceden max_rows: (registros, expiración) para no volver a contarlos
+        self._over_limit: Dict[Tuple[str, Optional[int], Optional[int]], Tuple[int, float]] = {}
+        self._counts = {"hits": 0, "loads": 0, "incremental_loads": 0, "evictions": 0, "rows_loaded": 0,
+                        "over_limit": 0}
+
+    @staticmethod
+    def _max_id(cursor) -> int:
+        cursor.execute("SELECT MAX(id) FROM core_registro")
+        return cursor.fetchone()[0] or 0
+
+    @staticmethod
+    def _count(cursor, low: Optional[int], high: Optional[int], max_id: int) -> int:
+        """Registros del rango antes de cargarlo (rango del índice de tiempo, sin traer filas)"""
+        sql, params = range_sql(low, high, "id <= %s")
+        cursor.execute(f"SELECT COUNT(*) FROM ({sql}) AS rango", params + [max_id])
+        return cursor.fetchone()[0] or 0
+
+    @contextmanager
+    def _range_lock(self, key: Tuple[str, Optional[int], Optional[int]]):
+        with self._lock:
+            entry = self._load_locks.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self._load_locks[key]
+
+    def _known_over_limit(self, database: str, low: Optional[int], high: Optional[int]) -> Optional[int]:
+        """Registros de un rango conocido como demasiado grande contenido en [low, high), o None"""
+        with self._lock:
+            now = time.monotonic()
+            for (known_database, known_low, known_high), (rows, expires_at) in list(self._over_limit.items()):
+                if now >= expires_at:
+                    del self._over_limit[(known_database, known_low, known_high)]
+                elif (known_database == database
+                      and (low is None or (known_low is not None and low <= known_low))
+                      and (high is None or (known_high is not None and known_high <= high))):
+                    return rows
+        return None
+
+    def _reject(self, database: str, low: Optional[int], high: Optional[int], rows: int, remember: bool = True):
+        with self._lock:
+            self._counts["over_limit"] += 1
+            if remember:
+                self._over_limit[(database, low, high)] = (rows, time.monotonic() + self.ttl)
+        raise RowLimitExceeded(f"El rango tiene {rows:,} registros, más de los {self.max_rows:,} que el motor "
+                               f"carga en memoria; acotar date_from/date_to")
+
+    def _fetch(self, cursor, frame: AttendanceFrame, sql: str, params: List[Any]) -> int:
+        cursor.execute(sql, params)
+        loaded = 0
+        while True:
+            batch = cursor.fetchmany(self.batch_rows)
+            if not batch:
+                break
+            loaded += len(batch)
+            if len(frame) + len(batch) > self.max_rows:
+                raise RowLimitExceeded(f"El rango tiene más de {self.max_rows:,} registros; acotar date_from/date_to")
+            frame.append(batch)
+        frame.finish()
+        return loaded
+
+    def _find(self, database: str, low: Optional[int], high: Optional[int]) -> Optional[AttendanceFrame]:
+        with self._lock:
+            now = time.monotonic()
+            for key, frame in list(self._frames.items()):
+                if now - frame.loaded_at > self.ttl:
+                    # Expira para recoger correcciones y borrados, que MAX(id) no detecta
+                    del self._frames[key]
+                elif frame.database == database and frame.covers(low, high):
+                    self._frames.move_to_end(key)
+                    return frame
+        return None
+
+    def _hit(self, frame: AttendanceFrame, source: str = "memory") -> Tuple[AttendanceFrame, str]:
+        with self._lock:
+            self._counts["hits"] += 1
+        return frame, source
+
+    def frame(self, cursor, database: str, low: Optional[int], high: Optional[int]) -> Tuple[AttendanceFrame, str]:
+        """
+        Frame que cubre [low, high) y cómo se obtuvo: 'memory' | 'incremental' | 'loaded'.
+        
+        Los frames no se modifican después de publicarse: los registros nuevos se agregan
+        a una copia que reemplaza a la anterior, así los análisis en curso no ven cambios.
+        """
+        frame = self._find(database, low, high)
+        if frame is not None and time.monotonic() - frame.checked_at < self.refresh_interval:
+            return self._hit(frame)
+
+        # Un lock por rango: dos pedidos del mismo rango no lo leen dos veces, pero las
+        # cargas de otros rangos u otras bases siguen en paralelo
+        key = (frame.database, frame.low, frame.high) if frame is not None else (database, low, high)
+        with self._range_lock(key):
+            frame = self._find(database, low, high)
+            if frame is None:
+                known = self._known_over_limit(database, low, high)
+                if known is not None:
+                    self._reject(database, low, high, known, remember=False)
+                frame = AttendanceFrame(database, low, high)
+                started = time.perf_counter()
+                frame.max_id = self._max_id(cursor)
+                # Se cuenta antes de leer: un rango demasiado grande no se transfiere para descartarse
+                rows = self._count(cursor, low, high, frame.max_id)
+                if rows > self.max_rows:
+                    self._reject(database, low, high, rows)
+                sql, params = range_sql(low, high, "id <= %s")
+                loaded = self._fetch(cursor, frame, sql, params + [frame.max_id])
+                logger.info(f"🧮 Rango de core_registro cargado en memoria ({database}): {loaded} registros, "
+                            f"{frame.nbytes / 1024 / 1024:.1f} MB en {time.perf_counter() - started:.2f}s")
+                with self._lock:
+                    self._frames[(database, low, high)] = frame
+                    self._counts["loads"] += 1
+                    self._counts["rows_loaded"] += loaded
+                    self._evict()
+                return frame, "loaded"
+
+            if time.monotonic() - frame.checked_at < self.refresh_interval:
+                return self._hit(frame)
+            max_id = self._max_id(cursor)
+            frame.checked_at = time.monotonic()
+            if max_id <= frame.max_id:
+                return self._hit(frame)
+
+            extended = frame.extended()
+            extended.max_id = max_id
+            sql, params = range_sql(frame.low, frame.high, "id > %s AND id <= %s")
+            loaded = self._fetch(cursor, extended, sql, params + [frame.max_id, max_id])
+            with self._lock:
+                self._frames[(frame.database, frame.low, frame.high)] = extended
+                self._counts["incremental_loads"] += 1
+                self._counts["rows_loaded"] += loaded
+                self._evict()
+            return extended, "incremental"
+
+    def _evict(self):
+        total = sum(frame.nbytes for frame in self._frames.values())
+        while total > self.max_bytes and len(self._frames) > 1:
+            _, frame = self._frames.popitem(last=False)
+            total -= frame.nbytes
+            self._counts["evictions"] += 1
+
+    def analyze(self, cursor, database: str, analysis_type: str, date_from: Optional[str] = None,
+                date_to: Optional[str] = None, user_filter: Optional[str] = None) -> Dict[str, Any]:
+        """Ejecutar un análisis sobre el rango en memoria (lo carga si no está)"""
+        low, high = day_bounds(date_from, date_to)
+        frame, source = self.frame(cursor, database, low, high)
+        return dict(run_analysis(frame, analysis_type, low, high, user_filter), frame_source=source)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self._counts, ranges=len(self._frames), over_limit_ranges=len(self._over_limit),
+                        bytes=sum(frame.nbytes for frame in self._frames.values()), max_bytes=self.max_bytes)
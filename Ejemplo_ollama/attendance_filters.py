@@ -0,0 +1,30 @@
+# attendance_filters.py
+"""
+Filtros de fecha y usuario de las consultas de asistencia sobre core_registro.
+
+Las condiciones llevan placeholders %s y los valores viajan aparte, así el texto
+de la sentencia solo depende de qué filtros se usan. Lo comparten este servidor
+y el servidor de ejemplo de la raíz del repositorio.
+"""
+from typing import List, Optional, Tuple
+
+
+def build_attendance_filters(date_from: Optional[str] = None, date_to: Optional[str] = None,
+                             user_filter: Optional[str] = None,
+                             alias: Optional[str] = None) -> Tuple[str, List[str]]:
+    """Construir las condiciones de filtro con placeholders %s y sus valores"""
+    prefix = f"{alias}." if alias else ""
+    conditions = []
+    params = []
+    if date_from:
+        conditions.append(f"{prefix}tiempo >= %s")
+        params.append(date_from)
+    if date_to:
+        # Rango semiabierto: incluye todo el día date_to (también fracciones de segundo)
+        conditions.append(f"{prefix}tiempo < DATE_ADD(%s, INTERVAL 1 DAY)")
+        params.append(date_to)
+    if user_filter:
+        conditions.append(f"({prefix}nombre LIKE %s OR {prefix}codigo_usuario LIKE %s)")
+        params.extend([f"%{user_filter}%", f"%{user_filter}%"])
+
+    return (" AND ".join(conditions) if conditions else "1=1"), params
@@ -0,0 +1,294 @@
+# attendance_rollup.py
+"""
+Resumen diario de asistencia (una fila por usuario por día) mantenido de forma
+incremental en un SQLite local.
+
+Cada actualización lee solo los registros de core_registro con id mayor que la
+marca de agua, los agrega en el servidor por usuario y día (GROUP BY, en lotes
+de rangos de id) y los combina con las filas ya guardadas: primera entrada,
+última salida, número de checadas, retardo y minutos trabajados. Los KPIs y el
+resumen semanal leen el SQLite, así que su costo depende de usuarios × días y
+no del número de checadas.
+
+Los registros corregidos o borrados en core_registro no mueven la marca de
+agua: rebuild() vuelve a agregar un rango de fechas desde los datos crudos.
+"""
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+ENTRY_STATE = 1
+EXIT_STATE = 2
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS daily_attendance (
+    db_name TEXT NOT NULL,
+    usuario_id TEXT NOT NULL,
+    fecha TEXT NOT NULL,
+    weekday INTEGER NOT NULL,
+    nombre TEXT,
+    first_entry TEXT,
+    last_exit TEXT,
+    punches INTEGER NOT NULL,
+    late INTEGER NOT NULL DEFAULT 0,
+    minutes_late REAL,
+    worked_minutes REAL,
+    PRIMARY KEY (db_name, usuario_id, fecha)
+);
+CREATE INDEX IF NOT EXISTS daily_attendance_fecha ON daily_attendance (db_name, fecha);
+CREATE TABLE IF NOT EXISTS rollup_state (
+    db_name TEXT PRIMARY KEY,
+    watermark INTEGER NOT NULL,
+    updated_at TEXT
+);
+"""
+
+# Agregado por usuario y día de un rango de ids (mismo SQL para la carga inicial y los incrementos)
+_AGGREGATE_SQL = """
+    SELECT usuario_id, DATE(tiempo) AS fecha, MAX(nombre),
+           MIN(CASE WHEN estado_id = %s THEN tiempo END),
+           MAX(CASE WHEN estado_id = %s THEN tiempo END),
+           COUNT(*)
+    FROM core_registro
+    WHERE {where}
+    GROUP BY usuario_id, DATE(tiempo)
+"""
+
+_DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def _as_text(value: Any) -> Optional[str]:
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.strftime(_DATETIME_FORMAT)
+    return str(value)[:19]
+
+
+def _earliest(a: Optional[str], b: Optional[str]) -> Optional[str]:
+    return min(v for v in (a, b) if v is not None) if (a or b) else None
+
+
+def _latest(a: Optional[str], b: Optional[str]) -> Optional[str]:
+    return max(v for v in (a, b) if v is not None) if (a or b) else None
+
+
+class AttendanceRollup:
+    """Resumen diario por usuario en SQLite con marca de agua por id"""
+
+    def __init__(self, path: str = "attendance_rollup.sqlite3", late_threshold: str = "08:10:00",
+                 batch_ids: int = 200_000, refresh_interval: float = 5.0):
+        self.path = path
+        self.late_threshold = late_threshold
+        self.batch_ids = batch_ids
+        self.refresh_interval = refresh_interval
+        self._lock = threading.Lock()
+        self._refresh_locks: Dict[str, threading.Lock] = {}
+        self._last_refresh: Dict[str, float] = {}
+        self._initialized = False
+
+        self._refreshes = 0
+        self._rows_merged = 0
+        self._raw_rows_aggregated = 0
+
+    @contextmanager
+    def _sqlite(self):
+        conn = sqlite3.connect(self.path)
+        try:
+            if not self._initialized:
+                conn.executescript(_SCHEMA)
+                self._initialized = True
+            yield conn
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _refresh_lock(self, database: str) -> threading.Lock:
+        with self._lock:
+            return self._refresh_locks.setdefault(database, threading.Lock())
+
+    def watermark(self, database: str) -> int:
+        with self._sqlite() as db:
+            row = db.execute("SELECT watermark FROM rollup_state WHERE db_name = ?", (database,)).fetchone()
+        return row[0] if row else 0
+
+    def _derive(self, first_entry: Optional[str], last_exit: Optional[str]):
+        """(retardo, minutos de retardo, minutos trabajados) de un día"""
+        late, minutes_late, worked = 0, None, None
+        if first_entry:
+            entry = datetime.strptime(first_entry, _DATETIME_FORMAT)
+            threshold = datetime.combine(entry.date(), datetime.strptime(self.late_threshold, "%H:%M:%S").time())
+            minutes_late = max(0.0, (entry - threshold).total_seconds() / 60)
+            late = int(minutes_late > 0)
+            if last_exit and last_exit > first_entry:
+                worked = (datetime.strptime(last_exit, _DATETIME_FORMAT) - entry).total_seconds() / 60
+        return late, minutes_late, worked
+
+    def _merge(self, db, database: str, rows: List[tuple], replace: bool = False) -> int:
+        """Combinar filas agregadas (usuario, fecha, nombre, entrada, salida, checadas) con las guardadas"""
+        if not rows:
+            return 0
+        dates = [str(r[1]) for r in rows]
+        existing = {}
+        if not replace:
+            for row in db.execute(
+                    "SELECT usuario_id, fecha, first_entry, last_exit, punches FROM daily_attendance "
+                    "WHERE db_name = ? AND fecha BETWEEN ? AND ?", (database, min(dates), max(dates))):
+                existing[(row[0], row[1])] = row[2:]
+
+        records = []
+        for usuario_id, fecha, nombre, first_entry, last_exit, punches in rows:
+            usuario_id, fecha = str(usuario_id), str(fecha)
+            first_entry, last_exit = _as_text(first_entry), _as_text(last_exit)
+            previous = existing.get((usuario_id, fecha))
+            if previous:
+                first_entry = _earliest(first_entry, previous[0])
+                last_exit = _latest(last_exit, previous[1])
+                punches += previous[2]
+            late, minutes_late, worked = self._derive(first_entry, last_exit)
+            records.append((database, usuario_id, fecha, date.fromisoformat(fecha).weekday(), nombre,
+                            first_entry, last_exit, punches, late, minutes_late, worked))
+        db.executemany("""
+            INSERT OR REPLACE INTO daily_attendance
+                (db_name, usuario_id, fecha, weekday, nombre, first_entry, last_exit, punches, late,
+                 minutes_late, worked_minutes)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, records)
+        return len(records)
+
+    def refresh(self, cursor, database: str, force: bool = False) -> Dict[str, Any]:
+        """Agregar los registros nuevos (id > marca de agua) en lotes de rangos de id"""
+        # Un candado por base: la agregación en MariaDB de una base no bloquea las demás
+        with self._refresh_lock(database):
+            last = self._last_refresh.get(database)
+            if not force and last is not None and time.monotonic() - last < self.refresh_interval:
+                return {"refreshed": False, "watermark": self.watermark(database)}
+
+            started = time.perf_counter()
+            watermark = self.watermark(database)
+            cursor.execute("SELECT MAX(id) FROM core_registro")
+            max_id = cursor.fetchone()[0] or 0
+            merged = 0
+            raw_rows = 0
+            while watermark < max_id:
+                upper = min(max_id, watermark + self.batch_ids)
+                cursor.execute(_AGGREGATE_SQL.format(where="id > %s AND id <= %s"),
+                               (ENTRY_STATE, EXIT_STATE, watermark, upper))
+                rows = cursor.fetchall()
+                with self._sqlite() as db:
+                    merged += self._merge(db, database, rows)
+                    # Cada lote queda confirmado: si la herramienta se interrumpe, la siguiente llamada continúa
+                    db.execute("INSERT OR REPLACE INTO rollup_state (db_name, watermark, updated_at) VALUES (?, ?, ?)",
+                               (database, upper, datetime.now().isoformat()))
+                raw_rows += sum(r[5] for r in rows)
+                watermark = upper
+
+            self._last_refresh[database] = time.monotonic()
+            with self._lock:
+                self._refreshes += 1
+                self._rows_merged += merged
+                self._raw_rows_aggregated += raw_rows
+            if merged:
+                logger.info(f"📅 Resumen diario de '{database}' actualizado: {raw_rows} registros → "
+                            f"{merged} filas usuario-día (marca de agua {watermark})")
+            return {"refreshed": True, "watermark": watermark, "raw_rows": raw_rows, "user_days_merged": merged,
+                    "elapsed_seconds": round(time.perf_counter() - started, 3)}
+
+    def rebuild(self, cursor, database: str, since: date) -> Dict[str, Any]:
+        """Volver a agregar desde `since` (recoge correcciones y borrados en core_registro)"""
+        with self._refresh_lock(database):
+            watermark = self.watermark(database)
+            cursor.execute(_AGGREGATE_SQL.format(where="tiempo >= %s AND id <= %s"),
+                           (ENTRY_STATE, EXIT_STATE, since.isoformat(), watermark))
+            rows = cursor.fetchall()
+            with self._sqlite() as db:
+                deleted = db.execute("DELETE FROM daily_attendance WHERE db_name = ? AND fecha >= ?",
+                                     (database, since.isoformat())).rowcount
+                merged = self._merge(db, database, rows, replace=True)
+            return {"rebuilt_since": since.isoformat(), "user_days_deleted": deleted, "user_days_rebuilt": merged}
+
+    # ===== Lecturas =====
+
+    def kpis(self, database: str, days: int = 30) -> Dict[str, Any]:
+        """KPIs de los últimos `days` días (misma forma que create_attendance_kpis)"""
+        since = (date.today() - timedelta(days=days)).isoformat()
+        with self._sqlite() as db:
+            punctual, arrivals, avg_worked, active_days = db.execute("""
+                SELECT SUM(first_entry IS NOT NULL AND late = 0), COUNT(first_entry),
+                       AVG(worked_minutes) / 60.0, COUNT(DISTINCT CASE WHEN first_entry IS NOT NULL THEN fecha END)
+                FROM daily_attendance WHERE db_name = ? AND fecha >= ?
+            """, (database, since)).fetchone()
+            active_users = db.execute(
+                "SELECT COUNT(DISTINCT usuario_id) FROM daily_attendance WHERE db_name = ? AND fecha >= ?",
+                (database, since)).fetchone()[0]
+
+        kpi_results: Dict[str, Any] = {}
+        if arrivals:
+            kpi_results["punctuality_rate"] = {
+                "percentage": round(punctual / arrivals * 100, 2),
+                "punctual_arrivals": punctual,
+                "total_arrivals": arrivals
+            }
+        if avg_worked:
+            kpi_results["average_work_hours"] = round(avg_worked, 2)
+        kpi_results["active_days_last_30"] = active_days
+        kpi_results["active_users_last_30"] = active_users
+        return kpi_results
+
+    def weekly_summary(self, database: str, week_start: date, morning_cutoff: str = "12:00:00",
+                       top: int = 5) -> Dict[str, Any]:
+        """Métricas de entradas de lunes a viernes de la semana, top retardos y top puntuales"""
+        week_end = week_start + timedelta(days=6)
+        # Entrada matutina en día laboral (mismo criterio que el resumen del cliente)
+        where = ("db_name = ? AND fecha BETWEEN ? AND ? AND weekday < 5 "
+                 "AND first_entry IS NOT NULL AND time(first_entry) < ?")
+        params = (database, week_start.isoformat(), week_end.isoformat(), morning_cutoff)
+        with self._sqlite() as db:
+            db.row_factory = sqlite3.Row
+            metrics = db.execute(f"""
+                SELECT COUNT(*) AS total_entradas,
+                       COUNT(DISTINCT usuario_id) AS empleados_distintos,
+                       COALESCE(SUM(late = 0), 0) AS llegadas_puntuales,
+                       COALESCE(SUM(late = 1), 0) AS retardos,
+                       MIN(fecha) AS primer_dia,
+                       MAX(fecha) AS ultimo_dia,
+                       AVG(strftime('%s', first_entry) % 86400) AS promedio_segundos,
+                       AVG(CASE WHEN late = 1 THEN minutes_late END) AS promedio_minutos_retardo
+                FROM daily_attendance WHERE {where}
+            """, params).fetchone()
+            late_arrivals = db.execute(f"""
+                SELECT nombre, fecha, time(first_entry) AS hora, ROUND(minutes_late) AS minutos_retardo
+                FROM daily_attendance WHERE {where} AND late = 1
+                ORDER BY time(first_entry) DESC LIMIT ?
+            """, (*params, top)).fetchall()
+            most_punctual = db.execute(f"""
+                SELECT nombre, COUNT(*) AS total_entradas, SUM(late = 0) AS dias_puntuales,
+                       ROUND(SUM(late = 0) * 100.0 / COUNT(*), 1) AS porcentaje_puntualidad
+                FROM daily_attendance WHERE {where}
+                GROUP BY usuario_id
+                HAVING COUNT(*) >= 2
+                ORDER BY porcentaje_puntualidad DESC, dias_puntuales DESC LIMIT ?
+            """, (*params, top)).fetchall()
+
+        return {
+            "week_start": week_start.isoformat(),
+            "week_end": week_end.isoformat(),
+            "metrics": {k: metrics[k] for k in metrics.keys()},
+            "late_arrivals": [dict(row) for row in late_arrivals],
+            "most_punctual": [dict(row) for row in most_punctual]
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "path": self.path,
+                "refreshes": self._refreshes,
+                "user_days_merged": self._rows_merged,
+                "raw_rows_aggregated": self._raw_rows_aggregated
+            }
@@ -0,0 +1,150 @@
+# attendance_scanner.py
+"""
+Revisión de calidad de core_registro en un solo recorrido.
+
+Las filas se leen una vez, ordenadas por (usuario_id, tiempo, id), con un
+cursor sin búfer, y se detectan juntos los cuatro problemas de
+validate_attendance_data. Solo se guarda el estado del usuario en curso
+(grupo de checadas con el mismo tiempo, grupo anterior y entradas del día),
+así que la memoria no depende del tamaño de la tabla:
+
+- duplicates: mismo usuario, tiempo y evento más de una vez
+- same_time_events: varias checadas del mismo usuario con el mismo tiempo
+- invalid_sequences: dos checadas consecutivas del usuario con el mismo evento
+- time_gaps: salida del mismo día más de 12 horas o menos de 30 minutos
+  después de una entrada (se compara contra la primera entrada del día para
+  los turnos largos y contra la última entrada anterior para los cortos)
+"""
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from attendance_rollup import ENTRY_STATE, EXIT_STATE
+
+ISSUE_TYPES = ("duplicates", "same_time_events", "invalid_sequences", "time_gaps")
+
+SCAN_COLUMNS = ("id", "usuario_id", "nombre", "codigo_usuario", "tiempo", "evento", "estado_id",
+                "lugar", "dispositivo")
+SCAN_SQL = f"SELECT {', '.join(SCAN_COLUMNS)} FROM core_registro ORDER BY usuario_id, tiempo, id"
+
+LONG_SHIFT_HOURS = 12
+SHORT_SHIFT_MINUTES = 30
+
+Finding = Tuple[str, Dict[str, Any]]
+
+
+class _UserState:
+    """Estado de un usuario mientras se recorren sus checadas"""
+
+    def __init__(self):
+        self.previous_group: List[Dict[str, Any]] = []
+        self.day = None
+        self.first_entry: Optional[Dict[str, Any]] = None
+        self.last_entry: Optional[Dict[str, Any]] = None
+
+
+def _hours(start: datetime, end: datetime) -> int:
+    # Mismo truncamiento que TIMESTAMPDIFF(HOUR, ...)
+    return int((end - start).total_seconds() // 3600)
+
+
+def _minutes(start: datetime, end: datetime) -> int:
+    return int((end - start).total_seconds() // 60)
+
+
+def _group_findings(group: List[Dict[str, Any]], state: _UserState) -> Iterator[Finding]:
+    """Problemas de un grupo de checadas del usuario con el mismo tiempo"""
+    first = group[0]
+    if len(group) > 1:
+        yield "same_time_events", {
+            "nombre": first["nombre"], "codigo_usuario": first["codigo_usuario"], "tiempo": first["tiempo"],
+            "eventos": [row["evento"] for row in group], "ids": [row["id"] for row in group],
+            "lugar": first["lugar"], "dispositivo": first["dispositivo"]
+        }
+        counts: Dict[Any, int] = {}
+        for row in group:
+            counts[row["evento"]] = counts.get(row["evento"], 0) + 1
+        for evento, count in counts.items():
+            if count > 1:
+                yield "duplicates", {
+                    "usuario_id": first["usuario_id"], "nombre": first["nombre"], "tiempo": first["tiempo"],
+                    "evento": evento, "duplicados": count
+                }
+
+    if state.previous_group:
+        previous_events = {row["evento"]: row for row in state.previous_group}
+        for row in group:
+            before = previous_events.pop(row["evento"], None)
+            if before is not None:
+                yield "invalid_sequences", {
+                    "nombre": row["nombre"], "codigo_usuario": row["codigo_usuario"],
+                    "evento1_tiempo": before["tiempo"], "evento1": before["evento"],
+                    "evento2_tiempo": row["tiempo"], "evento2": row["evento"]
+                }
+
+    moment = first["tiempo"]
+    if moment.date() != state.day:
+        state.day = moment.date()
+        state.first_entry = state.last_entry = None
+    for row in group:
+        if row["estado_id"] != EXIT_STATE or state.first_entry is None:
+            continue
+        # Solo entradas de grupos anteriores: la salida debe ser posterior a la entrada
+        for entry, too_far in ((state.first_entry, True), (state.last_entry, False)):
+            hours = _hours(entry["tiempo"], moment)
+            minutes = _minutes(entry["tiempo"], moment)
+            if (too_far and hours > LONG_SHIFT_HOURS) or (not too_far and minutes < SHORT_SHIFT_MINUTES):
+                yield "time_gaps", {
+                    "nombre": row["nombre"], "codigo_usuario": row["codigo_usuario"],
+                    "fecha": state.day, "entrada": entry["tiempo"], "salida": moment,
+                    "horas_diferencia": hours, "minutos_diferencia": minutes
+                }
+    for row in group:
+        if row["estado_id"] == ENTRY_STATE:
+            state.first_entry = state.first_entry or row
+            state.last_entry = row
+    state.previous_group = group
+
+
+def scan(rows: Iterable[tuple]) -> Iterator[Finding]:
+    """
+    Recorrer filas de SCAN_SQL (ordenadas por usuario, tiempo e id) y producir
+    (tipo, hallazgo) conforme aparecen.
+    """
+    state = _UserState()
+    user = object()
+    group: List[Dict[str, Any]] = []
+    for values in rows:
+        row = dict(zip(SCAN_COLUMNS, values))
+        if group and (row["usuario_id"] != user or row["tiempo"] != group[0]["tiempo"]):
+            yield from _group_findings(group, state)
+            group = []
+        if row["usuario_id"] != user:
+            user = row["usuario_id"]
+            state = _UserState()
+        group.append(row)
+    if group:
+        yield from _group_findings(group, state)
+
+
+def stream_rows(cursor, batch_size: int = 5000) -> Iterator[tuple]:
+    """Filas de un cursor sin búfer por lotes de fetchmany (la memoria no crece con la tabla)"""
+    while True:
+        batch = cursor.fetchmany(batch_size)
+        if not batch:
+            return
+        yield from batch
+
+
+def collect(findings: Iterable[Finding], max_per_type: int) -> Dict[str, Any]:
+    """Contar todos los hallazgos y conservar los primeros `max_per_type` de cada tipo"""
+    counts = {issue: 0 for issue in ISSUE_TYPES}
+    kept: Dict[str, List[Dict[str, Any]]] = {issue: [] for issue in ISSUE_TYPES}
+    for issue, finding in findings:
+        counts[issue] += 1
+        if len(kept[issue]) < max_per_type:
+            kept[issue].append(finding)
+    return {
+        "issue_counts": counts,
+        "issues_found": kept,
+        "truncated": {issue: counts[issue] > len(kept[issue]) for issue in ISSUE_TYPES}
+    }
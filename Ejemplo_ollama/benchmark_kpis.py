@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+# benchmark_kpis.py
+"""
+Benchmark de create_attendance_kpis(source="raw"): las cuatro consultas
+anteriores (con el self-join por DATE(tiempo)) contra el recorrido único
+agrupado por usuario y día de attendance_kpis.py, sobre una tabla sintética con la estructura de
+core_registro.
+
+La tabla se crea en la base de datos indicada (usar una base de pruebas, nunca
+la de producción) y se elimina al terminar salvo con --keep.
+
+Uso: python benchmark_kpis.py BASE_DE_PRUEBAS [--users 2000] [--days 45] [--punches 4] [--repeat 5]
+"""
+
+import argparse
+import random
+import statistics
+import time
+from datetime import date, datetime, timedelta
+
+import pymysql
+
+from attendance_kpis import attendance_kpis
+from db_config import DB_CONFIG
+
+TABLE = "bench_core_registro"
+
+
+def legacy_kpis(cursor, table: str) -> dict:
+    """Copia de las cuatro consultas anteriores de create_attendance_kpis, solo para comparar"""
+    kpi_results = {}
+    cursor.execute(f"""
+        SELECT
+            COUNT(CASE WHEN TIME(tiempo) <= '08:10:00' THEN 1 END) as puntuales,
+            COUNT(CASE WHEN estado_id = 1 THEN 1 END) as total_entradas
+        FROM {table}
+        WHERE tiempo >= DATE_SUB(CURDATE(), INTERVAL 30 DAY)
+            AND estado_id = 1;
+    """)
+    punctuality = cursor.fetchone()
+    if punctuality and punctuality[1] > 0:
+        kpi_results["punctuality_rate"] = {
+            "percentage": round((punctuality[0] / punctuality[1]) * 100, 2),
+            "punctual_arrivals": punctuality[0],
+            "total_arrivals": punctuality[1]
+        }
+    cursor.execute(f"""
+        SELECT AVG(horas_trabajadas) as promedio_horas
+        FROM (
+            SELECT
+                TIMESTAMPDIFF(MINUTE, r1.tiempo, r2.tiempo) / 60.0 as horas_trabajadas
+            FROM {table} r1
+            JOIN {table} r2 ON r1.usuario_id = r2.usuario_id
+                AND DATE(r1.tiempo) = DATE(r2.tiempo)
+                AND r1.estado_id = 1
+                AND r2.estado_id = 2
+                AND r2.tiempo > r1.tiempo
+            WHERE r1.tiempo >= DATE_SUB(CURDATE(), INTERVAL 30 DAY)
+        ) horas_diarias;
+    """)
+    avg_hours = cursor.fetchone()
+    if avg_hours and avg_hours[0]:
+        kpi_results["average_work_hours"] = round(float(avg_hours[0]), 2)
+    cursor.execute(f"""
+        SELECT COUNT(DISTINCT DATE(tiempo)) as dias_activos
+        FROM {table}
+        WHERE tiempo >= DATE_SUB(CURDATE(), INTERVAL 30 DAY)
+            AND estado_id = 1;
+    """)
+    kpi_results["active_days_last_30"] = cursor.fetchone()[0]
+    cursor.execute(f"""
+        SELECT COUNT(DISTINCT usuario_id) as usuarios_activos
+        FROM {table}
+        WHERE tiempo >= DATE_SUB(CURDATE(), INTERVAL 30 DAY);
+    """)
+    kpi_results["active_users_last_30"] = cursor.fetchone()[0]
+    return kpi_results
+
+
+def create_dataset(cursor, users: int, days: int, punches: int, rng: random.Random) -> int:
+    """Tabla sintética: por usuario y día laboral, `punches` checadas alternando entrada/salida"""
+    cursor.execute(f"DROP TABLE IF EXISTS {TABLE}")
+    cursor.execute(f"""
+        CREATE TABLE {TABLE} (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            usuario_id INT NOT NULL,
+            nombre VARCHAR(100),
+            tiempo DATETIME NOT NULL,
+            estado_id INT NOT NULL,
+            KEY idx_tiempo (tiempo),
+            KEY idx_usuario_tiempo (usuario_id, tiempo)
+        )
+    """)
+    insert = f"INSERT INTO {TABLE} (usuario_id, nombre, tiempo, estado_id) VALUES (%s, %s, %s, %s)"
+    batch, total = [], 0
+    today = date.today()
+    for offset in range(days, -1, -1):
+        day = today - timedelta(days=offset)
+        if day.weekday() >= 5:
+            continue
+        for user in range(1, users + 1):
+            moment = datetime.combine(day, datetime.min.time()) + timedelta(minutes=rng.randint(7 * 60 + 30, 8 * 60 + 40))
+            span = (9 * 60) // max(1, punches - 1)
+            for punch in range(punches):
+                batch.append((user, f"Empleado {user}", moment, 1 if punch % 2 == 0 else 2))
+                moment += timedelta(minutes=rng.randint(max(1, span - 30), span + 30))
+            if len(batch) >= 5000:
+                cursor.executemany(insert, batch)
+                total += len(batch)
+                batch = []
+    if batch:
+        cursor.executemany(insert, batch)
+        total += len(batch)
+    cursor.execute(f"ANALYZE TABLE {TABLE}")
+    cursor.fetchall()
+    return total
+
+
+def measure(label: str, run, repeat: int) -> float:
+    timings = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = run()
+        timings.append(time.perf_counter() - start)
+    median = statistics.median(timings)
+    print(f"{label:<32} mediana {median * 1000:9.1f} ms   (min {min(timings) * 1000:.1f} ms)   {result}")
+    return median
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("database", help="Base de datos de pruebas donde crear la tabla sintética")
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--days", type=int, default=45)
+    parser.add_argument("--punches", type=int, default=4, help="Checadas por usuario y día")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--keep", action="store_true", help="No eliminar la tabla sintética al terminar")
+    args = parser.parse_args()
+
+    conn = pymysql.connect(**DB_CONFIG, database=args.database)
+    try:
+        with conn.cursor() as cursor:
+            start = time.perf_counter()
+            rows = create_dataset(cursor, args.users, args.days, args.punches, random.Random(42))
+            print(f"📦 {rows} registros sintéticos en {args.database}.{TABLE} "
+                  f"({args.users} usuarios, {args.punches} checadas/día) en {time.perf_counter() - start:.1f} s\n")
+
+            before = measure("4 consultas + self-join", lambda: legacy_kpis(cursor, TABLE), args.repeat)
+            after = measure("1 recorrido por usuario-día", lambda: attendance_kpis(cursor, table=TABLE), args.repeat)
+            print(f"\n⚡ Aceleración: {before / after:.1f}x")
+            print("   (los KPIs difieren: el self-join promedia cada entrada contra todas las salidas "
+                  "posteriores del día; attendance_kpis cuenta una vez cada usuario-día, como el resumen diario)")
+
+            if not args.keep:
+                cursor.execute(f"DROP TABLE {TABLE}")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
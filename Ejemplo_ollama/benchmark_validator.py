@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# benchmark_validator.py
+"""
+Benchmark del validador SQL: validador anterior (≈20 búsquedas de subcadenas
+sobre la consulta en mayúsculas) contra el validador léxico de sql_validator.py,
+sin memoización y con veredictos memorizados.
+
+Uso: python benchmark_validator.py [repeticiones]
+"""
+
+import sys
+import time
+
+from sql_validator import SQLValidator, _scan
+
+
+def legacy_validate_sql_query(query: str) -> tuple[bool, str]:
+    """Copia del validador anterior de server.py, solo para comparar"""
+    query_upper = query.strip().upper()
+    forbidden_commands = [
+        'DROP', 'DELETE', 'UPDATE', 'INSERT', 'CREATE', 'ALTER',
+        'TRUNCATE', 'GRANT', 'REVOKE', 'EXEC', 'EXECUTE', 'CALL',
+        'LOAD_FILE', 'INTO OUTFILE', 'INTO DUMPFILE'
+    ]
+    dangerous_patterns = [
+        'UNION ALL SELECT', 'UNION SELECT', ') UNION', '/* UNION'
+    ]
+    for cmd in forbidden_commands:
+        if cmd in query_upper:
+            return False, f"Comando prohibido detectado: {cmd}"
+    for pattern in dangerous_patterns:
+        if pattern in query_upper:
+            return False, f"Patrón peligroso detectado: {pattern}"
+    if not query_upper.startswith('SELECT'):
+        return False, "Solo se permiten consultas SELECT"
+    for char in [';', '--', 'xp_', 'sp_']:
+        if char in query.lower():
+            return False, f"Caracter o patrón peligroso detectado: {char}"
+    if query.strip().endswith('--') or query.strip().startswith('--'):
+        return False, "Comentarios SQL en posiciones peligrosas no permitidos"
+    return True, "Consulta válida"
+
+
+# Consultas del estilo que genera el LLM para el módulo de asistencia
+LLM_QUERIES = [
+    """
+    SELECT r.usuario_id, r.nombre, DATE(r.tiempo) AS fecha,
+           MIN(TIME(r.tiempo)) AS primera_entrada, MAX(TIME(r.tiempo)) AS ultima_salida,
+           COUNT(*) AS total_registros,
+           SUM(CASE WHEN r.tipo = 'Entrada' AND TIME(r.tiempo) > '08:15:00' THEN 1 ELSE 0 END) AS retardos
+    FROM core_registro r
+    WHERE r.tiempo >= '2025-01-01' AND r.tiempo < '2025-02-01'
+      AND (r.nombre LIKE '%García%' OR r.usuario_id LIKE '%García%')
+      AND r.lugar IN ('Oficina Central', 'Sucursal Norte', 'Sucursal Sur', 'Almacén')
+    GROUP BY r.usuario_id, r.nombre, DATE(r.tiempo)
+    HAVING COUNT(*) >= 2
+    ORDER BY fecha DESC, retardos DESC, r.nombre ASC
+    LIMIT 500
+    """,
+    """
+    SELECT u.usuario_id, u.nombre, u.created_at, u.updated_at,
+           (SELECT COUNT(*) FROM core_registro x
+             WHERE x.usuario_id = u.usuario_id AND x.tipo = 'Entrada'
+               AND x.tiempo >= DATE_SUB(CURDATE(), INTERVAL 30 DAY)) AS entradas_30_dias,
+           (SELECT MAX(x.tiempo) FROM core_registro x WHERE x.usuario_id = u.usuario_id) AS ultimo_registro,
+           CONCAT(u.nombre, ' - ', COALESCE(u.dispositivo, 'sin dispositivo')) AS etiqueta
+    FROM core_registro u
+    WHERE u.tiempo BETWEEN '2025-03-01 00:00:00' AND '2025-03-31 23:59:59'
+    GROUP BY u.usuario_id, u.nombre, u.created_at, u.updated_at, u.dispositivo
+    ORDER BY entradas_30_dias DESC
+    """,
+]
+
+
+def _bench(label: str, func, queries, repetitions: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repetitions):
+        for query in queries:
+            func(query)
+    elapsed = time.perf_counter() - start
+    per_call_us = elapsed / (repetitions * len(queries)) * 1e6
+    print(f"  {label:<38} {per_call_us:8.2f} µs/consulta")
+    return per_call_us
+
+
+def main():
+    repetitions = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    # Consultas largas: el LLM suele concatenar varias columnas derivadas
+    queries = LLM_QUERIES + [q.replace("LIMIT 500", "") + " " * 4 for q in LLM_QUERIES]
+
+    print("📊 Veredictos (anterior → léxico):")
+    for query in queries:
+        legacy = legacy_validate_sql_query(query)
+        lexer = _scan(query.strip())
+        print(f"  {' '.join(query.split())[:60]}...  {legacy[0]} → {lexer[0]}"
+              + ("" if legacy[0] else f"  ({legacy[1]})"))
+
+    print(f"\n⏱️  {repetitions} repeticiones × {len(queries)} consultas "
+          f"(~{sum(len(q) for q in queries) // len(queries)} caracteres):")
+    legacy_us = _bench("validador anterior", legacy_validate_sql_query, queries, repetitions)
+    scan_us = _bench("léxico, sin memoización", lambda q: _scan(q.strip()), queries, repetitions)
+    validator = SQLValidator()
+    memo_us = _bench("léxico, veredicto memorizado", validator.validate, queries, repetitions)
+
+    print(f"\n  léxico sin memoización: {legacy_us / scan_us:5.2f}x respecto al anterior")
+    print(f"  léxico memorizado:      {legacy_us / memo_us:5.2f}x respecto al anterior")
+    print(f"  cache de veredictos: {validator.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -10,8 +10,12 @@ import time
 from mcp import ClientSession, StdioServerParameters
 from mcp.client.stdio import stdio_client
 import re
+from columnar import decode_columnar
 
 class OllamaMCPClient:
+    # Herramientas que aceptan format="columnar"
+    COLUMNAR_TOOLS = ("execute_query", "execute_attendance_analysis")
+    
     def __init__(self, ollama_host: str = "localhost", ollama_port: int = 11434, model: str = "gemma3:12b"):
         self.ollama_base_url = f"http://{ollama_host}:{ollama_port}"
         self.model = model
@@ -22,6 +26,8 @@ class OllamaMCPClient:
         self._client_session = None
         self.conversation_history = []
         self.debug_mode = True
+        # Pedir resultados en formato columnar (menos bytes por stdio); se decodifican al recibirlos
+        self.result_format = "columnar"
         
     async def __aenter__(self):
         """Context manager para gestionar la sesión MCP"""
@@ -186,6 +192,9 @@ class OllamaMCPClient:
                 if clean_query != kwargs['query']:
                     print(f"   Query with non-printable chars: '{clean_query}'")
             
+            if tool_name in self.COLUMNAR_TOOLS and 'format' not in kwargs:
+                kwargs['format'] = self.result_format
+            
             # Usar la sesión MCP para llamar a la herramienta
             result = await self.mcp_session.call_tool(tool_name, kwargs)
             
@@ -194,9 +203,13 @@ class OllamaMCPClient:
                 # Extraer contenido del resultado MCP
                 tool_result = result.content[0].text if result.content else {}
                 try:
-                    return json.loads(tool_result)
+                    parsed = json.loads(tool_result)
                 except json.JSONDecodeError:
                     return {"success": True, "data": tool_result}
+                # Decodificar resultados columnares de forma transparente
+                if isinstance(parsed, dict) and 'columnar' in parsed:
+                    parsed['results'] = decode_columnar(parsed.pop('columnar'))
+                return parsed
             
             return {"success": True, "result": result}
             
@@ -401,79 +414,20 @@ EJEMPLOS ADICIONALES:
         try:
             print("\n📊 Generando resumen semanal de asistencia...")
             
-            # Métricas generales de la semana (CORREGIDO con estado_id)
-            metrics_query = """
-            SELECT 
-                COUNT(*) as total_entradas,
-                COUNT(DISTINCT usuario_id) as empleados_distintos,
-                SUM(CASE WHEN TIME(tiempo) <= '08:10:00' THEN 1 ELSE 0 END) as llegadas_puntuales,
-                SUM(CASE WHEN TIME(tiempo) > '08:10:00' AND TIME(tiempo) < '12:00:00' THEN 1 ELSE 0 END) as retardos,
-                MIN(DATE(tiempo)) as primer_dia,
-                MAX(DATE(tiempo)) as ultimo_dia,
-                AVG(TIME_TO_SEC(TIME(tiempo))) as promedio_segundos,
-                AVG(TIMESTAMPDIFF(MINUTE, TIME('08:10:00'), TIME(tiempo))) as promedio_minutos_retardo
-            FROM core_registro 
-            WHERE estado_id = 1 
-                AND DATE(tiempo) >= DATE_SUB(CURDATE(), INTERVAL WEEKDAY(CURDATE()) DAY)
-                AND WEEKDAY(tiempo) < 5
-                AND TIME(tiempo) < '12:00:00'
-            """
-            
-            # Top llegadas más tardías (CORREGIDO con estado_id)
-            late_arrivals_query = """
-            SELECT 
-                nombre, 
-                DATE(tiempo) as fecha,
-                TIME(tiempo) as hora,
-                TIMESTAMPDIFF(MINUTE, TIME('08:10:00'), TIME(tiempo)) as minutos_retardo
-            FROM core_registro 
-            WHERE estado_id = 1
-                AND DATE(tiempo) >= DATE_SUB(CURDATE(), INTERVAL WEEKDAY(CURDATE()) DAY) 
-                AND TIME(tiempo) > '08:10:00'
-                AND TIME(tiempo) < '12:00:00'
-                AND WEEKDAY(tiempo) < 5
-            ORDER BY TIME(tiempo) DESC 
-            LIMIT 5
-            """
-            
-            # Personas más puntuales (CORREGIDO con estado_id)
-            punctual_people_query = """
-            SELECT 
-                nombre,
-                COUNT(*) as total_entradas,
-                SUM(CASE WHEN TIME(tiempo) <= '08:10:00' THEN 1 ELSE 0 END) as dias_puntuales,
-                ROUND(SUM(CASE WHEN TIME(tiempo) <= '08:10:00' THEN 1 ELSE 0 END) * 100.0 / COUNT(*), 1) as porcentaje_puntualidad
-            FROM core_registro 
-            WHERE estado_id = 1
-                AND DATE(tiempo) >= DATE_SUB(CURDATE(), INTERVAL WEEKDAY(CURDATE()) DAY)
-                AND WEEKDAY(tiempo) < 5
-                AND TIME(tiempo) < '12:00:00'
-            GROUP BY usuario_id, nombre
-            HAVING COUNT(*) >= 2
-            ORDER BY porcentaje_puntualidad DESC, dias_puntuales DESC
-            LIMIT 5
-            """
-            
-            # Ejecutar consultas
-            metrics_result = await self.execute_mcp_tool("execute_query", 
-                                                        database="zapopan", 
-                                                        query=metrics_query)
-            
-            late_result = await self.execute_mcp_tool("execute_query", 
-                                                     database="zapopan", 
-                                                     query=late_arrivals_query)
-            
-            punctual_result = await self.execute_mcp_tool("execute_query", 
-                                                         database="zapopan", 
-                                                         query=punctual_people_query)
+            # Métricas, retardos y puntuales salen del resumen diario que mantiene el servidor
+            summary_result = await self.execute_mcp_tool("get_weekly_attendance_summary",
+                                                         database="zapopan")
             
             # Formatear respuesta
             summary_parts = []
             summary_parts.append("📊 **RESUMEN SEMANAL DE ASISTENCIA**")
             summary_parts.append("=" * 50)
             
-            if metrics_result.get("success") and metrics_result.get("results"):
-                metrics = metrics_result["results"][0]
+            if not summary_result.get("success"):
+                return f"❌ Error generando resumen semanal: {summary_result.get('error', 'desconocido')}"
+            
+            if summary_result.get("metrics"):
+                metrics = summary_result["metrics"]
                 total_entradas = metrics.get("total_entradas", 0)
                 empleados_distintos = metrics.get("empleados_distintos", 0)
                 puntuales = metrics.get("llegadas_puntuales", 0)
@@ -512,9 +466,9 @@ EJEMPLOS ADICIONALES:
                     summary_parts.append(f"• **Evaluación: NECESITA MEJORA** 🚨")
             
             # Top retardos (ACTUALIZADO con minutos de retardo)
-            if late_result.get("success") and late_result.get("results"):
+            if summary_result.get("late_arrivals"):
                 summary_parts.append(f"\n⚠️ **TOP 5 LLEGADAS MÁS TARDÍAS:**")
-                for i, late in enumerate(late_result["results"], 1):
+                for i, late in enumerate(summary_result["late_arrivals"], 1):
                     nombre = late.get('nombre', '')
                     fecha = late.get('fecha', '')
                     hora = late.get('hora', '')
@@ -525,9 +479,9 @@ EJEMPLOS ADICIONALES:
                         summary_parts.append(f"{i}. {nombre} - {fecha} a las {hora}")
             
             # Top puntuales (ACTUALIZADO con nombres de campos corregidos)
-            if punctual_result.get("success") and punctual_result.get("results"):
+            if summary_result.get("most_punctual"):
                 summary_parts.append(f"\n✅ **TOP 5 EMPLEADOS MÁS PUNTUALES:**")
-                for i, person in enumerate(punctual_result["results"], 1):
+                for i, person in enumerate(summary_result["most_punctual"], 1):
                     nombre = person.get('nombre', '')
                     porcentaje = person.get('porcentaje_puntualidad', 0)
                     dias_puntuales = person.get('dias_puntuales', 0)
@@ -0,0 +1,77 @@
+# columnar.py
+"""
+Codificación columnar de resultados para reducir el tamaño de las respuestas MCP.
+
+En lugar de una lista de diccionarios (que repite el nombre de cada columna en
+cada fila) se envían las columnas una vez y los valores por columna. Las columnas
+de baja cardinalidad (nombre, lugar, dispositivo...) se codifican con diccionario.
+Este módulo lo usan tanto server.py (codificar) como client.py (decodificar).
+"""
+from typing import Any, Dict, List, Optional
+
+COLUMNAR_VERSION = 1
+RESULT_FORMATS = ("rows", "columnar")
+
+# Solo vale la pena el diccionario si hay suficientes filas y pocos valores distintos
+DICTIONARY_MIN_ROWS = 8
+DICTIONARY_MAX_RATIO = 0.5
+
+
+def _should_dictionary_encode(values: List[Any]) -> Optional[List[Any]]:
+    """Devolver los valores distintos si la columna conviene codificarla con diccionario"""
+    if len(values) < DICTIONARY_MIN_ROWS:
+        return None
+    distinct = {}
+    limit = int(len(values) * DICTIONARY_MAX_RATIO)
+    for value in values:
+        if value is not None and not isinstance(value, str):
+            return None
+        if value not in distinct:
+            distinct[value] = len(distinct)
+            if len(distinct) > limit:
+                return None
+    return list(distinct)
+
+
+def encode_columnar(columns: List[str], results: List[Dict[str, Any]],
+                    dictionary_encode: bool = True,
+                    dictionary_columns: Optional[List[str]] = None) -> Dict[str, Any]:
+    """
+    Convertir filas (lista de dicts) a formato columnar.
+
+    dictionary_columns: columnas a codificar con diccionario; si es None se
+    detectan automáticamente las columnas de texto de baja cardinalidad.
+    """
+    data = []
+    dictionaries = {}
+    for col in columns:
+        values = [row.get(col) for row in results]
+        if dictionary_encode and (dictionary_columns is None or col in dictionary_columns):
+            distinct = _should_dictionary_encode(values)
+            if distinct is not None:
+                codes = {value: i for i, value in enumerate(distinct)}
+                values = [codes[value] for value in values]
+                dictionaries[col] = distinct
+        data.append(values)
+
+    return {
+        "encoding": "columnar",
+        "version": COLUMNAR_VERSION,
+        "columns": columns,
+        "row_count": len(results),
+        "data": data,
+        "dictionaries": dictionaries
+    }
+
+
+def decode_columnar(payload: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Reconstruir la lista de dicts a partir del formato columnar"""
+    columns = payload["columns"]
+    dictionaries = payload.get("dictionaries", {})
+    data = []
+    for col, values in zip(columns, payload["data"]):
+        dictionary = dictionaries.get(col)
+        if dictionary is not None:
+            values = [dictionary[code] for code in values]
+        data.append(values)
+    return [dict(zip(columns, row)) for row in zip(*data)] if data else []
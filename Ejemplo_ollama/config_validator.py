@@ -66,7 +66,8 @@ class ConfigValidator:
             'fastmcp',
             'pymysql', 
             'mcp',
-            'requests'
+            'requests',
+            'numpy'
         ]
         
         missing_packages = []
@@ -0,0 +1,256 @@
+# cost_guard.py
+"""
+Guardia de costo para consultas ad-hoc escritas por el LLM.
+
+Antes de ejecutar, corre EXPLAIN FORMAT=JSON (no ejecuta la consulta), estima
+las filas examinadas y detecta recorridos completos de tablas grandes como
+core_registro. Según umbrales configurables la consulta se permite, se permite
+con advertencia, se rechaza o se reescribe a una forma que pueda usar índices
+(p. ej. DATE(tiempo) = CURDATE() -> rango sobre tiempo).
+"""
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+import logging
+
+import pymysql
+
+from db_pool import is_connection_lost, is_query_interrupted
+from pagination import _mask_nested
+from result_cache import normalize_sql
+from sql_rewriter import rewrite_sargable
+
+logger = logging.getLogger(__name__)
+
+GUARD_ACTIONS = ("reject", "warn", "rewrite")
+
+_TOP_LEVEL_LIMIT_RE = re.compile(r"\bLIMIT\s+(\d+)(?:\s*,\s*(\d+))?")
+_NEEDS_FULL_READ_RE = re.compile(r"\b(GROUP\s+BY|DISTINCT|HAVING)\b")
+_ORDER_BY_RE = re.compile(r"\bORDER\s+BY\b")
+# Accesos que recorren un índice en orden: con el ORDER BY resuelto por el índice
+# (sin filesort) la lectura se detiene al juntar LIMIT filas
+_ORDERED_ACCESS_TYPES = ("index", "range")
+
+
+def _top_level_limit(sql: str) -> Tuple[Optional[int], bool]:
+    """
+    LIMIT de nivel superior si la consulta puede terminar antes de leer todo, y si ordena.
+
+    Con ORDER BY el LIMIT solo acota la lectura si el plan recorre el índice de la llave
+    de orden; eso lo decide explain_plan.
+    """
+    masked = _mask_nested(sql)
+    ordered = bool(_ORDER_BY_RE.search(masked))
+    if _NEEDS_FULL_READ_RE.search(masked):
+        return None, ordered
+    matches = list(_TOP_LEVEL_LIMIT_RE.finditer(masked))
+    if not matches:
+        return None, ordered
+    offset, count = matches[-1].groups()
+    return (int(offset) + int(count) if count else int(offset)), ordered
+
+
+class CostRejected(Exception):
+    """La guardia rechazó la consulta; verdict trae las razones"""
+
+    def __init__(self, verdict: Dict[str, Any]):
+        super().__init__("; ".join(verdict["reasons"]))
+        self.verdict = verdict
+
+
+class _PlanWalker:
+    """Recorre el plan JSON de MariaDB/MySQL acumulando filas examinadas por tabla"""
+
+    def __init__(self):
+        self.tables: List[Dict[str, Any]] = []
+        self.estimated_rows = 0.0
+        self.uses_temporary_or_filesort = False
+
+    def walk(self, node: Any, fanout: float = 1.0) -> float:
+        """Devuelve el fanout de salida (filas producidas) del nodo"""
+        if isinstance(node, list):
+            for item in node:
+                self.walk(item, fanout)
+            return fanout
+        if not isinstance(node, dict):
+            return fanout
+
+        if 'access_type' in node and 'table_name' in node:
+            return self._table(node, fanout)
+        if 'nested_loop' in node:
+            current = fanout
+            for item in node['nested_loop']:
+                current = self.walk(item, current)
+            for key, value in node.items():
+                if key != 'nested_loop':
+                    self.walk(value, fanout)
+            return current
+
+        output = fanout
+        for key, value in node.items():
+            if key in ('filesort', 'temporary_table', 'read_sorted_file'):
+                self.uses_temporary_or_filesort = True
+            if key in ('subqueries', 'materialized'):
+                # Se cuentan una vez (aproximación: no se multiplican por la consulta externa)
+                self.walk(value, 1.0)
+            elif isinstance(value, (dict, list)):
+                output = self.walk(value, fanout)
+        return output
+
+    def _table(self, node: Dict[str, Any], fanout: float) -> float:
+        rows = float(node.get('rows') or node.get('rows_examined_per_scan') or 0)
+        filtered = float(node.get('filtered') or 100.0)
+        examined = fanout * rows
+        self.estimated_rows += examined
+        self.tables.append({
+            "table": node.get('table_name'),
+            "access_type": node.get('access_type'),
+            "key": node.get('key'),
+            "rows": int(rows),
+            "filtered": filtered,
+            "has_condition": 'attached_condition' in node
+        })
+        # Tablas derivadas o subconsultas materializadas dentro del nodo
+        for key in ('materialized', 'subqueries'):
+            if key in node:
+                self.walk(node[key], 1.0)
+        return examined * filtered / 100.0
+
+
+def explain_plan(cursor, sql: str, params: Optional[List[Any]] = None) -> Dict[str, Any]:
+    """Plan resumido: filas examinadas estimadas, tablas y recorridos completos"""
+    cursor.execute(f"EXPLAIN FORMAT=JSON {sql}", params)
+    plan = json.loads(cursor.fetchone()[0])
+    walker = _PlanWalker()
+    walker.walk(plan)
+
+    estimated = walker.estimated_rows
+    limit_bounded = False
+    limit, ordered = _top_level_limit(sql)
+    if limit is not None and len(walker.tables) == 1 and not walker.uses_temporary_or_filesort:
+        table = walker.tables[0]
+        if ordered:
+            # ORDER BY resuelto por el índice (index/range sin filesort): se lee en orden
+            # de la llave y se corta al juntar LIMIT filas. Cubre ORDER BY id DESC LIMIT n
+            # y las páginas de keyset (WHERE id > ? ORDER BY id LIMIT n, donde la condición
+            # es el propio rango); un recorrido de índice con filtro no queda acotado
+            bounded_read = table["access_type"] in _ORDERED_ACCESS_TYPES and \
+                (table["access_type"] == "range" or not table["has_condition"])
+        else:
+            # Una sola tabla sin filtro: el LIMIT corta la lectura. Con filtro no se sabe
+            # cuántas filas hay que leer hasta juntar LIMIT coincidencias
+            bounded_read = not table["has_condition"]
+        if bounded_read:
+            bounded = float(limit)
+            limit_bounded = bounded < estimated
+            estimated = min(estimated, bounded)
+
+    return {
+        "estimated_rows": int(estimated),
+        "tables": walker.tables,
+        "full_scans": sorted({t["table"] for t in walker.tables if t["access_type"] == "ALL"}),
+        "uses_temporary_or_filesort": walker.uses_temporary_or_filesort,
+        "limit_bounded": limit_bounded
+    }
+
+
+class CostGuard:
+    """EXPLAIN previo con umbrales de rechazo/advertencia y reescritura de predicados"""
+
+    def __init__(self, warn_rows: int = 100_000, reject_rows: int = 5_000_000,
+                 guarded_tables: Optional[List[str]] = None, full_scan_action: str = "rewrite",
+                 verdict_ttl: float = 300.0, max_entries: int = 512):
+        if full_scan_action not in GUARD_ACTIONS:
+            raise ValueError(f"full_scan_action debe ser uno de {GUARD_ACTIONS}")
+        self.warn_rows = warn_rows
+        self.reject_rows = reject_rows
+        self.guarded_tables = {t.lower() for t in (guarded_tables or [])}
+        self.full_scan_action = full_scan_action
+        self.verdict_ttl = verdict_ttl
+        self.max_entries = max_entries
+        self._verdicts: "OrderedDict[Tuple, Tuple[Dict[str, Any], float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._counts = {"allow": 0, "warn": 0, "reject": 0, "rewrite": 0, "explain_errors": 0, "memoized": 0}
+
+    def explain(self, cursor, sql: str, params: Optional[List[Any]] = None) -> Dict[str, Any]:
+        return explain_plan(cursor, sql, params)
+
+    def _guarded_full_scans(self, plan: Dict[str, Any]) -> List[str]:
+        if plan["limit_bounded"]:
+            # Un recorrido que el LIMIT corta pronto no lee la tabla completa
+            return []
+        return [t for t in plan["full_scans"] if t and t.lower() in self.guarded_tables]
+
+    def _decide(self, cursor, sql: str, params) -> Dict[str, Any]:
+        plan = self.explain(cursor, sql, params)
+        verdict = {"action": "allow", "query": sql, "estimated_rows": plan["estimated_rows"],
+                   "full_scans": plan["full_scans"], "reasons": [], "rewrites": []}
+
+        full_scans = self._guarded_full_scans(plan)
+        if full_scans:
+            reason = f"Recorrido completo de {', '.join(full_scans)} (~{plan['estimated_rows']:,} filas)"
+            if self.full_scan_action == "rewrite":
+                rewritten, rewrites = rewrite_sargable(sql)
+                if rewrites:
+                    new_plan = self.explain(cursor, rewritten, params)
+                    if len(self._guarded_full_scans(new_plan)) < len(full_scans) or \
+                            new_plan["estimated_rows"] < plan["estimated_rows"]:
+                        plan = new_plan
+                        verdict.update(action="rewrite", query=rewritten, rewrites=rewrites,
+                                       estimated_rows=new_plan["estimated_rows"],
+                                       full_scans=new_plan["full_scans"])
+                        verdict["reasons"].append(f"{reason}; reescrita para usar rango sobre la columna")
+                if verdict["action"] != "rewrite":
+                    verdict["action"] = "warn"
+                    verdict["reasons"].append(f"{reason}; no se encontró reescritura")
+            else:
+                verdict["action"] = self.full_scan_action
+                verdict["reasons"].append(reason)
+
+        rows = verdict["estimated_rows"]
+        if rows >= self.reject_rows:
+            verdict["action"] = "reject"
+            verdict["reasons"].append(f"Filas examinadas estimadas {rows:,} >= {self.reject_rows:,}")
+        elif rows >= self.warn_rows and verdict["action"] == "allow":
+            verdict["action"] = "warn"
+            verdict["reasons"].append(f"Filas examinadas estimadas {rows:,} >= {self.warn_rows:,}")
+        return verdict
+
+    def check(self, cursor, database: Optional[str], sql: str, params: Optional[List[Any]] = None) -> Dict[str, Any]:
+        """Veredicto para la consulta: action en allow | warn | reject | rewrite"""
+        key = (database, normalize_sql(sql), tuple(str(p) for p in (params or ())))
+        now = time.monotonic()
+        with self._lock:
+            cached = self._verdicts.get(key)
+            if cached and cached[1] > now:
+                self._verdicts.move_to_end(key)
+                self._counts["memoized"] += 1
+                return dict(cached[0], memoized=True)
+
+        try:
+            verdict = self._decide(cursor, sql, params)
+        except (pymysql.err.MySQLError, ValueError, TypeError, IndexError) as e:
+            if is_connection_lost(e) or is_query_interrupted(e):
+                raise
+            # Si EXPLAIN falla (sintaxis, servidor sin FORMAT=JSON) la ejecución reportará el error real
+            logger.debug(f"EXPLAIN no disponible para la consulta: {e}")
+            with self._lock:
+                self._counts["explain_errors"] += 1
+            return {"action": "allow", "query": sql, "estimated_rows": None, "full_scans": [],
+                    "reasons": [f"EXPLAIN no disponible: {e}"], "rewrites": []}
+
+        with self._lock:
+            self._counts[verdict["action"]] += 1
+            self._verdicts[key] = (verdict, now + self.verdict_ttl)
+            while len(self._verdicts) > self.max_entries:
+                self._verdicts.popitem(last=False)
+        return dict(verdict, memoized=False)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self._counts, entries=len(self._verdicts),
+                        warn_rows=self.warn_rows, reject_rows=self.reject_rows,
+                        full_scan_action=self.full_scan_action)
@@ -0,0 +1,22 @@
+# db_config.py
+"""
+Configuración compartida por el servidor MCP y las herramientas de línea de
+comandos (snapshots.py, benchmark_kpis.py). Importar server.py crea los pools,
+el ejecutor, el servidor FastMCP y abre mcp_server.log; las CLI solo necesitan
+estos valores.
+"""
+
+# Configuración de la base de datos
+DB_CONFIG = {
+    'host': '172.16.1.29',
+    'user': 'controla',
+    'password': 'controla',
+    'charset': 'utf8mb4',
+    'autocommit': True
+}
+
+# Instantáneas columnares por mes de core_registro (engine="snapshot", snapshots.py)
+SNAPSHOT_CONFIG = {
+    'directory': 'snapshots',       # Una instantánea por base de datos en directory/BASE
+    'batch_rows': 50_000            # Filas por fetchmany al exportar
+}
@@ -0,0 +1,203 @@
+# db_executor.py
+"""
+Ejecución asíncrona de trabajo bloqueante de base de datos.
+
+Las herramientas MCP usan pymysql (bloqueante); este módulo las ejecuta en un
+pool de hilos acotado para no bloquear el event loop de FastMCP, con un límite
+de concurrencia por base de datos.
+
+Cada herramienta corre con un tiempo límite: las sesiones que usa reciben un
+límite por sentencia (max_statement_time) y, si se vence el deadline o la
+solicitud MCP se cancela, se interrumpen sus consultas con KILL QUERY.
+"""
+import asyncio
+import contextvars
+import functools
+import inspect
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, Any, Hashable, Iterable, Optional, Callable, Set
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class ToolTimeoutError(Exception):
+    """La herramienta superó su tiempo límite"""
+
+
+class ToolCancelledError(Exception):
+    """La ejecución de la herramienta fue cancelada (timeout o desconexión del cliente)"""
+
+
+class ToolExecution:
+    """Estado de una ejecución de herramienta compartido entre el event loop y el hilo de trabajo"""
+
+    def __init__(self, tool: str, statement_timeout: Optional[float] = None):
+        self.tool = tool
+        self.statement_timeout = statement_timeout
+        self.cancelled = False
+        self._thread_ids: Set[Hashable] = set()
+        self._lock = threading.Lock()
+
+    def register(self, thread_id: Hashable):
+        """Registrar la sesión MariaDB que está usando la herramienta (thread_id o (nodo, thread_id))"""
+        with self._lock:
+            if self.cancelled:
+                raise ToolCancelledError(f"La herramienta {self.tool} fue cancelada")
+            self._thread_ids.add(thread_id)
+
+    def unregister(self, thread_id: Hashable):
+        with self._lock:
+            self._thread_ids.discard(thread_id)
+
+    def cancel(self) -> Set[Hashable]:
+        """Marcar como cancelada y devolver las sesiones con sentencias posiblemente en curso"""
+        with self._lock:
+            self.cancelled = True
+            thread_ids = set(self._thread_ids)
+            self._thread_ids.clear()
+            return thread_ids
+
+
+_current_execution: contextvars.ContextVar[Optional[ToolExecution]] = contextvars.ContextVar(
+    "mcp_tool_execution", default=None
+)
+
+
+def current_execution() -> Optional[ToolExecution]:
+    """Ejecución de herramienta en curso en este hilo/tarea (None fuera de una herramienta)"""
+    return _current_execution.get()
+
+
+class DatabaseExecutor:
+    """Pool de hilos compartido con semáforos por base de datos"""
+
+    def __init__(self, max_workers: int = 8, per_database_limit: int = 4, enabled: bool = True,
+                 tool_timeouts: Optional[Dict[str, float]] = None, default_timeout: Optional[float] = None,
+                 timeout_grace: float = 2.0, on_cancel: Optional[Callable[[Iterable[Hashable]], None]] = None):
+        self.max_workers = max_workers
+        self.per_database_limit = per_database_limit
+        self.enabled = enabled
+        self.tool_timeouts = tool_timeouts or {}
+        self.default_timeout = default_timeout
+        self.timeout_grace = timeout_grace
+        # Recibe las sesiones registradas (thread_id de MariaDB) cuyas sentencias hay que interrumpir
+        self.on_cancel = on_cancel
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="mcp-db")
+        self._semaphores: Dict[Optional[str], asyncio.Semaphore] = {}
+        self._lock = threading.Lock()
+
+        self._running: Dict[Optional[str], int] = {}
+        self._completed = 0
+        self._peak_running = 0
+        self._timeouts = 0
+        self._cancellations = 0
+
+    def _semaphore(self, database: Optional[str]) -> asyncio.Semaphore:
+        with self._lock:
+            semaphore = self._semaphores.get(database)
+            if semaphore is None:
+                semaphore = asyncio.Semaphore(self.per_database_limit)
+                self._semaphores[database] = semaphore
+            return semaphore
+
+    def timeout_for(self, tool: str) -> Optional[float]:
+        return self.tool_timeouts.get(tool, self.default_timeout)
+
+    def _cancel(self, execution: ToolExecution, reason: str):
+        """Interrumpir las sentencias en curso sin bloquear el event loop"""
+        thread_ids = execution.cancel()
+        with self._lock:
+            if reason == "timeout":
+                self._timeouts += 1
+            else:
+                self._cancellations += 1
+        logger.warning(f"⏱️  Herramienta {execution.tool} interrumpida ({reason}); sesiones activas: {sorted(thread_ids)}")
+        if thread_ids and self.on_cancel:
+            threading.Thread(target=self.on_cancel, args=(thread_ids,),
+                             name="mcp-kill-query", daemon=True).start()
+
+    async def run(self, database: Optional[str], func: Callable, *args, **kwargs) -> Any:
+        """Ejecutar func(*args, **kwargs) en el pool respetando el límite de la base de datos"""
+        tool = func.__name__
+        timeout = self.timeout_for(tool)
+        execution = ToolExecution(tool, timeout)
+        # Propagar contextvars al hilo de trabajo (igual que asyncio.to_thread)
+        context = contextvars.copy_context()
+        context.run(_current_execution.set, execution)
+        call = functools.partial(context.run, func, *args, **kwargs)
+
+        if not self.enabled:
+            # Modo síncrono: solo aplica el límite por sentencia
+            return call()
+
+        loop = asyncio.get_running_loop()
+        async with self._semaphore(database):
+            with self._lock:
+                self._running[database] = self._running.get(database, 0) + 1
+                self._peak_running = max(self._peak_running, sum(self._running.values()))
+            try:
+                future = loop.run_in_executor(self._executor, call)
+                if timeout:
+                    return await asyncio.wait_for(future, timeout + self.timeout_grace)
+                return await future
+            except asyncio.TimeoutError:
+                self._cancel(execution, "timeout")
+                raise ToolTimeoutError(f"La herramienta {tool} excedió el tiempo límite de {timeout}s")
+            except asyncio.CancelledError:
+                # Solicitud MCP cancelada o cliente desconectado
+                self._cancel(execution, "cancelada")
+                raise
+            finally:
+                with self._lock:
+                    self._running[database] -= 1
+                    self._completed += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "max_workers": self.max_workers,
+                "per_database_limit": self.per_database_limit,
+                "running": {db or "<servidor>": n for db, n in self._running.items() if n},
+                "peak_running": self._peak_running,
+                "completed": self._completed,
+                "default_timeout": self.default_timeout,
+                "timeouts": self._timeouts,
+                "cancellations": self._cancellations
+            }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+
+def database_tool(executor: DatabaseExecutor, database_arg: str = "database"):
+    """Decorator que convierte una herramienta síncrona en corrutina ejecutada en el pool de hilos
+
+    La función original queda disponible en `__wrapped__` para llamadas internas.
+    Si se vence el tiempo límite devuelve el error en el mismo formato que la
+    herramienta (dict, o JSON si la función devuelve str).
+    """
+    def decorator(func):
+        signature = inspect.signature(func)
+        returns_text = signature.return_annotation is str
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            bound = signature.bind_partial(*args, **kwargs)
+            database = bound.arguments.get(database_arg)
+            try:
+                return await executor.run(database, func, *args, **kwargs)
+            except ToolTimeoutError as e:
+                error = {
+                    "success": False,
+                    "error": str(e),
+                    "timeout_seconds": executor.timeout_for(func.__name__),
+                    "timestamp": datetime.now().isoformat()
+                }
+                return json.dumps(error, indent=2) if returns_text else error
+        return wrapper
+    return decorator
@@ -0,0 +1,371 @@
+# db_pool.py
+"""
+Pool de conexiones MariaDB para el servidor MCP.
+
+Mantiene un pool acotado por base de datos para evitar el costo de
+handshake TCP, autenticación y negociación de charset en cada herramienta.
+"""
+import threading
+import time
+import weakref
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Dict, Any, Iterable, Optional
+import logging
+
+import pymysql
+from pymysql.constants import CR, ER
+
+logger = logging.getLogger(__name__)
+
+# Clases de error que pueden venir de una conexión rota; is_connection_lost decide por el código
+CONNECTION_ERRORS = (pymysql.err.OperationalError, pymysql.err.InterfaceError)
+
+# Códigos del cliente de conexión perdida o desincronizada. Los demás OperationalError
+# (columna desconocida, GROUP BY inválido, bloqueos) dejan la sesión sana y se conserva
+# junto con sus sentencias preparadas
+LOST_CONNECTION_ERRORS = (CR.CR_SERVER_GONE_ERROR, CR.CR_SERVER_LOST, CR.CR_COMMANDS_OUT_OF_SYNC,
+                          CR.CR_SERVER_LOST_EXTENDED)
+
+# Sentencia interrumpida (KILL QUERY o max_statement_time): la conexión sigue sana
+QUERY_INTERRUPTED_ERRORS = (ER.QUERY_INTERRUPTED, ER.STATEMENT_TIMEOUT, ER.QUERY_TIMEOUT)
+
+# pymysql no define COM_RESET_CONNECTION (MariaDB 10.2.4+, MySQL 5.7.3+)
+COM_RESET_CONNECTION = 0x1F
+
+
+def is_query_interrupted(error: Exception) -> bool:
+    """True si el error indica una sentencia interrumpida y no una conexión rota"""
+    return bool(getattr(error, 'args', None)) and error.args[0] in QUERY_INTERRUPTED_ERRORS
+
+
+def is_connection_lost(error: Exception) -> bool:
+    """True si la conexión quedó inutilizable y debe descartarse en lugar de volver al pool"""
+    if isinstance(error, pymysql.err.InterfaceError):
+        return True
+    return isinstance(error, pymysql.err.OperationalError) and bool(error.args) \
+        and error.args[0] in LOST_CONNECTION_ERRORS
+
+
+def reset_connection(connection, database: Optional[str] = None):
+    """
+    Limpiar la sesión con COM_RESET_CONNECTION: transacción, variables de usuario y
+    de sesión (SET), tablas temporales y sentencias preparadas. El reinicio vuelve el
+    charset al del servidor y no deshace un USE, así que se restauran los de la conexión.
+    """
+    connection._execute_command(COM_RESET_CONNECTION, "")
+    connection._read_ok_packet()
+    connection.set_character_set(connection.charset, getattr(connection, 'collation', None))
+    if database:
+        connection.select_db(database)
+
+
+class PoolTimeoutError(Exception):
+    """No se obtuvo una conexión del pool dentro del tiempo de espera"""
+
+
+class ConnectionPool:
+    """Pool acotado de conexiones pymysql para una base de datos"""
+
+    def __init__(self, config: Dict[str, Any], database: Optional[str] = None,
+                 max_size: int = 5, idle_timeout: float = 300.0,
+                 checkout_timeout: float = 10.0,
+                 statement_timeout_variable: str = 'max_statement_time',
+                 on_session_reset: Optional[Callable[[Any], None]] = None):
+        self.config = config.copy()
+        if database:
+            self.config['database'] = database
+        self.database = database
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.checkout_timeout = checkout_timeout
+        # MariaDB: max_statement_time (segundos); MySQL: max_execution_time (milisegundos)
+        self.statement_timeout_variable = statement_timeout_variable
+        # Aviso a quien guarda estado por sesión (p. ej. sentencias preparadas) tras cada reinicio
+        self.on_session_reset = on_session_reset
+
+        self._idle = deque()  # (conexión, último uso)
+        self._in_use = set()
+        self._condition = threading.Condition()
+        # Límite de sentencia vigente en cada sesión, para no repetir el SET
+        self._statement_timeouts = weakref.WeakKeyDictionary()
+
+        # Estadísticas para dimensionar el pool
+        self._created = 0
+        self._closed = 0
+        self._checkouts = 0
+        self._waits = 0
+        self._wait_time_total = 0.0
+        self._wait_time_max = 0.0
+        self._timeouts = 0
+        self._failed_pings = 0
+
+    @property
+    def size(self) -> int:
+        return len(self._idle) + len(self._in_use)
+
+    def _connect(self):
+        connection = pymysql.connect(**self.config)
+        self._created += 1
+        logger.debug(f"✅ Nueva conexión en pool '{self.database or '<servidor>'}' hacia {self.config['host']}")
+        return connection
+
+    def _close(self, connection):
+        self._closed += 1
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def _is_alive(self, connection) -> bool:
+        """Ping de vida al sacar una conexión del pool"""
+        try:
+            connection.ping(reconnect=False)
+            return True
+        except Exception:
+            self._failed_pings += 1
+            return False
+
+    def _reset_session(self, connection):
+        """Restablecer el estado de sesión antes de devolver la conexión al pool"""
+        # Nada de lo que hizo quien la tuvo prestada (SET, @variables, USE, tablas temporales) pasa al siguiente
+        reset_connection(connection, self.config.get('database'))
+        self._statement_timeouts.pop(connection, None)
+        if self.on_session_reset:
+            self.on_session_reset(connection)
+        autocommit = bool(self.config.get('autocommit', False))
+        if connection.get_autocommit() != autocommit:
+            connection.autocommit(autocommit)
+
+    def set_statement_timeout(self, connection, seconds: Optional[float]):
+        """Fijar el límite de tiempo por sentencia de la sesión (0 o None = sin límite)"""
+        seconds = float(seconds or 0)
+        if self._statement_timeouts.get(connection) == seconds:
+            return
+        if self.statement_timeout_variable == 'max_execution_time':
+            value = int(seconds * 1000)
+        else:
+            value = seconds
+        with connection.cursor() as cursor:
+            cursor.execute(f"SET SESSION {self.statement_timeout_variable} = %s", (value,))
+        self._statement_timeouts[connection] = seconds
+
+    def acquire(self):
+        """Obtener una conexión viva del pool, esperando si está lleno"""
+        deadline = time.monotonic() + self.checkout_timeout
+        waited = False
+        wait_start = None
+
+        while True:
+            connection = None
+            with self._condition:
+                while True:
+                    if self._idle:
+                        # Se reserva bajo el lock; el ping se hace fuera para no frenar a los demás préstamos
+                        connection, last_used = self._idle.pop()
+                        self._in_use.add(connection)
+                        break
+
+                    if self.size < self.max_size:
+                        # Reservar el lugar antes de conectar fuera del lock
+                        placeholder = object()
+                        self._in_use.add(placeholder)
+                        break
+
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._timeouts += 1
+                        self._record_wait(waited, wait_start)
+                        raise PoolTimeoutError(
+                            f"Pool de '{self.database or '<servidor>'}' agotado "
+                            f"({self.max_size} conexiones en uso) tras {self.checkout_timeout}s"
+                        )
+                    if not waited:
+                        waited = True
+                        wait_start = time.monotonic()
+                    self._condition.wait(remaining)
+
+            if connection is None:
+                break
+            # Reutilizar conexiones inactivas, descartando las expiradas o muertas
+            if time.monotonic() - last_used <= self.idle_timeout and self._is_alive(connection):
+                with self._condition:
+                    self._checkouts += 1
+                    self._record_wait(waited, wait_start)
+                return connection
+            self._close(connection)
+            with self._condition:
+                self._in_use.discard(connection)
+                self._condition.notify()
+
+        try:
+            connection = self._connect()
+        except Exception:
+            with self._condition:
+                self._in_use.discard(placeholder)
+                self._condition.notify()
+            raise
+
+        with self._condition:
+            self._in_use.discard(placeholder)
+            self._in_use.add(connection)
+            self._checkouts += 1
+            self._record_wait(waited, wait_start)
+        return connection
+
+    def _record_wait(self, waited: bool, wait_start: Optional[float]):
+        if waited:
+            elapsed = time.monotonic() - wait_start
+            self._waits += 1
+            self._wait_time_total += elapsed
+            self._wait_time_max = max(self._wait_time_max, elapsed)
+
+    def release(self, connection, discard: bool = False):
+        """Devolver una conexión al pool (o cerrarla si quedó inutilizable)"""
+        if not discard:
+            try:
+                self._reset_session(connection)
+            except Exception as e:
+                logger.warning(f"⚠️  No se pudo restablecer la sesión, descartando conexión: {e}")
+                discard = True
+
+        with self._condition:
+            self._in_use.discard(connection)
+            if discard:
+                self._close(connection)
+            else:
+                self._idle.append((connection, time.monotonic()))
+            self._condition.notify()
+
+    @contextmanager
+    def connection(self):
+        """Context manager que presta una conexión y la devuelve al terminar"""
+        connection = self.acquire()
+        discard = False
+        try:
+            yield connection
+        except CONNECTION_ERRORS as e:
+            discard = is_connection_lost(e)
+            raise
+        finally:
+            self.release(connection, discard=discard)
+
+    def prune_idle(self) -> int:
+        """Cerrar conexiones inactivas que superaron idle_timeout"""
+        now = time.monotonic()
+        pruned = 0
+        with self._condition:
+            keep = deque()
+            while self._idle:
+                connection, last_used = self._idle.popleft()
+                if now - last_used > self.idle_timeout:
+                    self._close(connection)
+                    pruned += 1
+                else:
+                    keep.append((connection, last_used))
+            self._idle = keep
+        return pruned
+
+    def close_all(self):
+        with self._condition:
+            while self._idle:
+                connection, _ = self._idle.popleft()
+                self._close(connection)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._condition:
+            return {
+                "database": self.database,
+                "max_size": self.max_size,
+                "in_use": len(self._in_use),
+                "idle": len(self._idle),
+                "created": self._created,
+                "closed": self._closed,
+                "checkouts": self._checkouts,
+                "waits": self._waits,
+                "wait_time_total_ms": round(self._wait_time_total * 1000, 2),
+                "wait_time_avg_ms": round(self._wait_time_total / self._waits * 1000, 2) if self._waits else 0.0,
+                "wait_time_max_ms": round(self._wait_time_max * 1000, 2),
+                "timeouts": self._timeouts,
+                "failed_pings": self._failed_pings
+            }
+
+
+class PoolManager:
+    """Conjunto de pools indexados por base de datos"""
+
+    def __init__(self, config: Dict[str, Any], prune_interval: float = 60.0, **pool_options):
+        self.config = config
+        self.prune_interval = prune_interval
+        self.pool_options = pool_options
+        self._pools: Dict[Optional[str], ConnectionPool] = {}
+        self._lock = threading.Lock()
+        self._next_prune = time.monotonic() + prune_interval
+
+    def get_pool(self, database: Optional[str] = None) -> ConnectionPool:
+        with self._lock:
+            pool = self._pools.get(database)
+            if pool is None:
+                pool = ConnectionPool(self.config, database, **self.pool_options)
+                self._pools[database] = pool
+                logger.info(f"🏊 Pool de conexiones creado para '{database or '<servidor>'}' (máximo {pool.max_size})")
+            now = time.monotonic()
+            to_prune = []
+            if now >= self._next_prune:
+                # Como máximo una limpieza cada prune_interval, no en cada préstamo
+                self._next_prune = now + self.prune_interval
+                to_prune = [other for other in self._pools.values() if other is not pool]
+        # Fuera del lock del administrador: cerrar conexiones no bloquea a los demás préstamos
+        for other in to_prune:
+            other.prune_idle()
+        return pool
+
+    def connection(self, database: Optional[str] = None):
+        return self.get_pool(database).connection()
+
+    def in_use(self) -> int:
+        """Conexiones prestadas en todos los pools (carga del servidor para el enrutamiento)"""
+        with self._lock:
+            pools = list(self._pools.values())
+        return sum(len(pool._in_use) for pool in pools)
+
+    def close_all(self):
+        with self._lock:
+            for pool in self._pools.values():
+                pool.close_all()
+
+    def kill_queries(self, thread_ids: Iterable[int]):
+        """Interrumpir las sentencias en curso de esas sesiones desde una conexión aparte"""
+        thread_ids = list(thread_ids)
+        if not thread_ids:
+            return
+        # Conexión propia fuera del pool: el pool puede estar agotado justo por esas consultas
+        config = self.config.copy()
+        config.setdefault('connect_timeout', 5)
+        try:
+            connection = pymysql.connect(**config)
+        except Exception as e:
+            logger.error(f"❌ No se pudo abrir conexión para KILL QUERY: {e}")
+            return
+        try:
+            with connection.cursor() as cursor:
+                for thread_id in thread_ids:
+                    try:
+                        cursor.execute(f"KILL QUERY {int(thread_id)}")
+                        logger.info(f"🛑 KILL QUERY enviado a la sesión {thread_id}")
+                    except pymysql.err.MySQLError as e:
+                        # ER_NO_SUCH_THREAD: la sentencia ya terminó
+                        if e.args[0] != ER.NO_SUCH_THREAD:
+                            logger.warning(f"⚠️  KILL QUERY {thread_id} falló: {e}")
+        finally:
+            connection.close()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            pools = [pool.stats() for pool in self._pools.values()]
+        return {
+            "pools": pools,
+            "total_in_use": sum(p["in_use"] for p in pools),
+            "total_idle": sum(p["idle"] for p in pools),
+            "total_waits": sum(p["waits"] for p in pools)
+        }
@@ -0,0 +1,198 @@
+# db_topology.py
+"""
+Enrutamiento de lecturas entre el primario y sus réplicas MariaDB.
+
+Cada nodo tiene su propio PoolManager. Las herramientas con presupuesto de retraso
+(staleness) se envían a la réplica sana con menos conexiones en uso cuyo
+Seconds_Behind_Master no supere ese presupuesto; las demás, y cualquier lectura
+sin réplica elegible, van al primario.
+
+- El retraso se consulta con SHOW SLAVE STATUS como máximo cada lag_check_interval
+  segundos por réplica, fuera del lock de la réplica y por un solo hilo a la vez: los
+  demás enrutan con el último retraso conocido mientras dura la medición; replicación detenida (Seconds_Behind_Master NULL) o un error
+  de conexión la marcan como no sana durante retry_interval segundos
+- Si la conexión a la réplica elegida falla, se prueba la siguiente y al final el primario
+- Las sesiones se identifican como (nodo, thread_id) para enviar KILL QUERY al servidor correcto
+"""
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import logging
+
+from db_pool import PoolManager, PoolTimeoutError
+
+logger = logging.getLogger(__name__)
+
+PRIMARY = "primary"
+
+
+class _Replica:
+    """Estado de salud de una réplica"""
+
+    def __init__(self, name: str, pools: PoolManager):
+        self.name = name
+        self.pools = pools
+        self.lock = threading.Lock()
+        self.lag: Optional[float] = None
+        self.healthy = False
+        self.checked_at = 0.0
+        self.refreshing = False
+        self.down_until = 0.0
+        self.error: Optional[str] = None
+        self.routed = 0
+        self.failures = 0
+
+
+def replication_lag(cursor) -> Optional[float]:
+    """Seconds_Behind_Master de SHOW SLAVE STATUS (el mayor si hay varias fuentes), None si está detenida"""
+    cursor.execute("SHOW SLAVE STATUS")
+    rows = cursor.fetchall()
+    if not rows:
+        raise RuntimeError("El servidor no está configurado como réplica")
+    columns = [desc[0] for desc in cursor.description]
+    lags = []
+    for row in rows:
+        status = dict(zip(columns, row))
+        if status.get("Slave_IO_Running") != "Yes" or status.get("Slave_SQL_Running") != "Yes":
+            return None
+        if status.get("Seconds_Behind_Master") is None:
+            return None
+        lags.append(float(status["Seconds_Behind_Master"]))
+    return max(lags)
+
+
+class ReplicaRouter:
+    """Elige el nodo (primario o réplica) de cada conexión según la herramienta en curso"""
+
+    def __init__(self, primary: PoolManager, replicas: Dict[str, PoolManager],
+                 staleness: Optional[Dict[str, float]] = None,
+                 lag_check_interval: float = 5.0, retry_interval: float = 30.0):
+        self.primary = primary
+        self.replicas = {name: _Replica(name, pools) for name, pools in replicas.items()}
+        self.staleness = staleness or {}
+        self.lag_check_interval = lag_check_interval
+        self.retry_interval = retry_interval
+        self._lock = threading.Lock()
+        self._primary_routed = 0
+        self._fallbacks = 0
+        self._failovers = 0
+
+    def pools(self, node: str) -> PoolManager:
+        return self.primary if node == PRIMARY else self.replicas[node].pools
+
+    def _mark_down(self, replica: _Replica, error: str):
+        replica.healthy = False
+        replica.down_until = time.monotonic() + self.retry_interval
+        replica.error = error
+        replica.failures += 1
+
+    def _refresh(self, replica: _Replica):
+        """
+        Actualizar el retraso de la réplica si la medición venció. SHOW SLAVE STATUS corre
+        sin replica.lock tomado y solo en el hilo que marca refreshing; los demás siguen
+        con el último retraso conocido en vez de esperar a una réplica lenta.
+        """
+        now = time.monotonic()
+        with replica.lock:
+            if (replica.refreshing or now < replica.down_until
+                    or now - replica.checked_at < self.lag_check_interval):
+                return
+            replica.refreshing = True
+        try:
+            with replica.pools.connection() as connection:
+                with connection.cursor() as cursor:
+                    lag = replication_lag(cursor)
+        except Exception as e:
+            logger.warning(f"⚠️  Réplica '{replica.name}' no disponible: {e}")
+            with replica.lock:
+                replica.refreshing = False
+                self._mark_down(replica, str(e))
+            return
+        with replica.lock:
+            replica.refreshing = False
+            replica.checked_at = time.monotonic()
+            replica.lag = lag
+            replica.healthy = lag is not None
+            replica.error = None if lag is not None else "Replicación detenida"
+        if lag is None:
+            logger.warning(f"⚠️  Réplica '{replica.name}' con la replicación detenida")
+
+    def candidates(self, tool: Optional[str]) -> List[str]:
+        """Nodos en orden de preferencia para la herramienta; el primario siempre va al final"""
+        budget = self.staleness.get(tool) if tool else None
+        if budget is None or not self.replicas:
+            return [PRIMARY]
+        eligible = []
+        for replica in self.replicas.values():
+            self._refresh(replica)
+            with replica.lock:
+                if replica.healthy and replica.lag <= budget:
+                    eligible.append((replica.pools.in_use(), replica.lag, replica.name))
+        if not eligible:
+            with self._lock:
+                self._fallbacks += 1
+            logger.debug(f"Sin réplica dentro de {budget}s de retraso para {tool}; se usa el primario")
+        return [name for _, _, name in sorted(eligible)] + [PRIMARY]
+
+    def acquire(self, database: Optional[str], tool: Optional[str]) -> Tuple[str, Any, Any]:
+        """Conexión del nodo preferido para la herramienta. Devuelve (nodo, pool, conexión)"""
+        for node in self.candidates(tool):
+            pool = self.pools(node).get_pool(database)
+            try:
+                connection = pool.acquire()
+            except PoolTimeoutError as e:
+                # Pool lleno: la réplica sigue sana, solo se prueba el siguiente nodo
+                if node == PRIMARY:
+                    raise
+                logger.warning(f"⚠️  {e}; se prueba el siguiente nodo")
+                continue
+            except Exception as e:
+                if node == PRIMARY:
+                    raise
+                logger.warning(f"⚠️  Falló la conexión a la réplica '{node}', se prueba el siguiente nodo: {e}")
+                replica = self.replicas[node]
+                with replica.lock:
+                    self._mark_down(replica, str(e))
+                with self._lock:
+                    self._failovers += 1
+                continue
+            if node == PRIMARY:
+                with self._lock:
+                    self._primary_routed += 1
+            else:
+                with self.replicas[node].lock:
+                    self.replicas[node].routed += 1
+            return node, pool, connection
+
+    def kill_queries(self, sessions: Iterable[Tuple[str, int]]):
+        """KILL QUERY de cada sesión (nodo, thread_id) en el servidor al que pertenece"""
+        by_node = defaultdict(list)
+        for node, thread_id in sessions:
+            by_node[node].append(thread_id)
+        for node, thread_ids in by_node.items():
+            self.pools(node).kill_queries(thread_ids)
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        replicas = {}
+        for name, replica in self.replicas.items():
+            with replica.lock:
+                replicas[name] = {
+                    "healthy": replica.healthy,
+                    "lag_seconds": replica.lag,
+                    "checked_seconds_ago": round(now - replica.checked_at, 1) if replica.checked_at else None,
+                    "retry_in_seconds": round(replica.down_until - now, 1) if replica.down_until > now else None,
+                    "error": replica.error,
+                    "routed": replica.routed,
+                    "failures": replica.failures,
+                    "in_use": replica.pools.in_use()
+                }
+        with self._lock:
+            return {
+                "replicas": replicas,
+                "staleness_budgets": self.staleness,
+                "primary_routed": self._primary_routed,
+                "fallbacks_to_primary": self._fallbacks,
+                "failovers": self._failovers
+            }
@@ -0,0 +1,262 @@
+# distribution.py
+"""
+Distribución de una columna para analyze_data_distribution.
+
+Una sentencia agrupada recorre la tabla una vez; las columnas numéricas y de
+fecha necesitan antes una sentencia MIN/MAX para fijar el ancho de las cubetas
+(una búsqueda en el índice si la columna encabeza uno). La tabla se agrupa por "cubetas finas" calculadas en el servidor con
+aritmética de cubetas, y por cada una se devuelven COUNT, suma y suma de
+cuadrados desplazadas, MIN/MAX y COUNT(DISTINCT). Con eso se obtienen en
+Python conteo, nulos, distintos, min/max, media, desviación estándar, el
+histograma de `bins` cubetas de igual ancho y percentiles interpolados dentro
+de cada cubeta fina (error acotado por su ancho).
+
+- Numéricas: cubetas de ancho (max - min) / (bins * finas_por_cubeta); los
+  enteros con rango pequeño usan una cubeta por valor (percentiles exactos) y
+  el histograma tiene como máximo una cubeta por valor posible.
+- Fechas: igual que numéricas sobre TO_DAYS().
+- DATETIME/TIMESTAMP/TIME: hora del día en cubetas de un minuto o una hora
+  (TIME_TO_SEC), sin necesidad de conocer antes el rango; `bins` no aplica.
+
+Cuando el histograma no tiene las `bins` cubetas pedidas lo indica con
+requested_bins y una nota.
+"""
+import math
+from datetime import date
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from schema_cache import quote_identifier
+from table_profile import NUMERIC_DATA_TYPES, INTEGER_DATA_TYPES
+
+TIME_BUCKETS = {"minute": 60, "hour": 3600}
+_TIME_BUCKET_LABELS = {"minute": "un minuto", "hour": "una hora"}
+DEFAULT_PERCENTILES = (50, 90, 99)
+DATETIME_DATA_TYPES = frozenset(('datetime', 'timestamp'))
+
+# TO_DAYS('0001-01-01') = 366 y date(1, 1, 1).toordinal() = 1
+_TO_DAYS_OFFSET = 365
+
+
+def column_kind(data_type: str, bucket: Optional[str]) -> str:
+    """numeric | date | time_of_day | text según DATA_TYPE y la cubeta pedida"""
+    if data_type in NUMERIC_DATA_TYPES:
+        return "numeric"
+    if data_type == 'date' or (data_type in DATETIME_DATA_TYPES and bucket == 'day'):
+        return "date"
+    if data_type in DATETIME_DATA_TYPES or data_type == 'time':
+        return "time_of_day"
+    return "text"
+
+
+def format_seconds(seconds: Optional[float]) -> Optional[str]:
+    """Segundos desde medianoche como HH:MM:SS"""
+    if seconds is None:
+        return None
+    total = int(round(seconds))
+    sign = "-" if total < 0 else ""
+    total = abs(total)
+    return f"{sign}{total // 3600:02d}:{total % 3600 // 60:02d}:{total % 60:02d}"
+
+
+def format_days(days: Optional[float]) -> Optional[str]:
+    """Valor de TO_DAYS() como fecha ISO"""
+    if days is None:
+        return None
+    return date.fromordinal(int(math.floor(days)) - _TO_DAYS_OFFSET).isoformat()
+
+
+class BucketSpec:
+    """Cómo se calcula la cubeta fina y cómo se agrupan las cubetas en el histograma"""
+
+    def __init__(self, kind: str, value_sql: str, origin: float, width: float,
+                 fine_per_bin: int = 1, bins: Optional[int] = None, per_value: bool = False,
+                 formatter: Optional[Callable[[Optional[float]], Any]] = None, unit: Optional[str] = None,
+                 value_span: Optional[int] = None, requested_bins: Optional[int] = None):
+        self.kind = kind
+        self.value_sql = value_sql
+        self.origin = origin
+        self.width = width
+        self.fine_per_bin = fine_per_bin
+        self.bins = bins
+        self.per_value = per_value
+        self.formatter = formatter or (lambda v: v)
+        self.unit = unit
+        # Cantidad de valores enteros posibles cuando hay una cubeta por valor
+        self.value_span = value_span
+        # bins pedido por el usuario, para avisar si el histograma no lo respeta
+        self.requested_bins = requested_bins if requested_bins is not None else bins
+
+    @property
+    def fine_count(self) -> Optional[int]:
+        return self.bins * self.fine_per_bin if self.bins else None
+
+    def bucket_sql(self) -> str:
+        offset = f"({self.value_sql} - {self.origin!r})" if self.origin else self.value_sql
+        bucket = f"FLOOR({offset} / {self.width!r})" if self.width != 1 else f"FLOOR({offset})"
+        if self.fine_count and not self.per_value:
+            # MAX cae justo en el borde superior: va a la última cubeta
+            bucket = f"LEAST({bucket}, {self.fine_count - 1})"
+        return bucket
+
+
+def time_of_day_spec(column_sql: str, data_type: str, bucket: str, bins: Optional[int] = None) -> BucketSpec:
+    unit = TIME_BUCKETS[bucket]
+    seconds = f"TIME_TO_SEC({column_sql})" if data_type == 'time' else f"TIME_TO_SEC(TIME({column_sql}))"
+    return BucketSpec("time_of_day", seconds, 0, unit, formatter=format_seconds, unit=bucket,
+                      requested_bins=bins)
+
+
+def value_sql_for(kind: str, column_sql: str) -> str:
+    return f"TO_DAYS({column_sql})" if kind == "date" else column_sql
+
+
+def range_spec(kind: str, column_sql: str, low: float, high: float, bins: int, fine_per_bin: int,
+               integer: bool) -> BucketSpec:
+    """Cubetas finas de igual ancho sobre [low, high] conocidos"""
+    value_sql = value_sql_for(kind, column_sql)
+    formatter = format_days if kind == "date" else None
+    span = high - low
+    if integer and span + 1 <= bins * fine_per_bin:
+        # Rango pequeño: una cubeta por valor entero, percentiles y top de valores exactos
+        return BucketSpec(kind, value_sql, low, 1, bins=min(bins, int(span) + 1), per_value=True,
+                          formatter=formatter, value_span=int(span) + 1, requested_bins=bins)
+    width = span / (bins * fine_per_bin) if span > 0 else 1.0
+    return BucketSpec(kind, value_sql, low, width, fine_per_bin, bins, formatter=formatter)
+
+
+def distribution_sql(table: str, spec: BucketSpec, where: Optional[str]) -> str:
+    """Una sentencia: una fila por cubeta fina (la cubeta NULL cuenta los nulos)"""
+    value = spec.value_sql
+    shifted = f"({value} - {spec.origin!r})" if spec.origin else value
+    return f"""
+        SELECT {spec.bucket_sql()} AS bucket,
+               COUNT(*), COUNT({value}), SUM(1e0 * {shifted}), SUM(1e0 * {shifted} * {shifted}),
+               MIN({value}), MAX({value}), COUNT(DISTINCT {value})
+        FROM {quote_identifier(table)}
+        {f'WHERE ({where})' if where else ''}
+        GROUP BY bucket
+        ORDER BY bucket
+    """
+
+
+def _percentile(buckets: List[Tuple], total: int, p: float) -> Optional[float]:
+    """
+    Percentil con interpolación lineal entre posiciones (como numpy por defecto): dentro
+    de la cubeta fina entre su MIN y MAX, o entre el MAX de una cubeta y el MIN de la
+    siguiente si la posición cae entre las dos.
+    """
+    if not total:
+        return None
+    rank = p / 100.0 * (total - 1)
+    seen = 0
+    for i, (_, count, low, high) in enumerate(buckets):
+        if rank < seen + count:
+            position = rank - seen
+            if position <= count - 1:
+                if count == 1 or high == low:
+                    return low
+                return low + (high - low) * position / (count - 1)
+            next_low = buckets[i + 1][2]
+            return high + (next_low - high) * (position - (count - 1))
+        seen += count
+    return buckets[-1][3]
+
+
+def summarize(rows: Sequence[Sequence[Any]], spec: BucketSpec,
+              percentiles: Sequence[float] = DEFAULT_PERCENTILES, top: int = 10) -> Dict[str, Any]:
+    """Estadísticas, percentiles e histograma a partir de las filas por cubeta fina"""
+    total_rows = 0
+    non_null = 0
+    distinct = 0
+    sum_shifted = 0.0
+    sum_squares = 0.0
+    buckets = []  # (índice, conteo, min, max) de cubetas con valores
+    for bucket, count, count_values, s1, s2, low, high, distinct_values in rows:
+        total_rows += count
+        if bucket is None:
+            continue
+        non_null += count_values
+        distinct += distinct_values
+        sum_shifted += float(s1 or 0)
+        sum_squares += float(s2 or 0)
+        buckets.append((int(bucket), count_values, float(low), float(high)))
+    buckets.sort()
+
+    fmt = spec.formatter
+    stats: Dict[str, Any] = {
+        "total_rows": total_rows,
+        "non_null_count": non_null,
+        "null_count": total_rows - non_null,
+        "distinct_count": distinct,
+        "null_percentage": round((total_rows - non_null) / total_rows * 100, 2) if total_rows else 0,
+        "uniqueness_ratio": round(distinct / non_null * 100, 2) if non_null else 0
+    }
+    result: Dict[str, Any] = {"basic_statistics": stats}
+    if not non_null:
+        return result
+
+    mean_shifted = sum_shifted / non_null
+    variance = max(0.0, sum_squares / non_null - mean_shifted ** 2)
+    mean = spec.origin + mean_shifted
+    stats.update({
+        "min_value": fmt(buckets[0][2]),
+        "max_value": fmt(buckets[-1][3]),
+        "average": fmt(mean),
+        "std_deviation": math.sqrt(variance) if spec.kind == "numeric" else round(math.sqrt(variance), 2),
+    })
+    if spec.kind != "numeric":
+        stats["std_deviation_unit"] = "days" if spec.kind == "date" else "seconds"
+
+    result["percentiles"] = {f"p{p:g}": fmt(_percentile(buckets, non_null, p)) for p in percentiles}
+    result["percentile_resolution"] = (
+        "exacto" if spec.per_value
+        else f"interpolado en cubetas de {_TIME_BUCKET_LABELS[spec.unit]}" if spec.unit
+        else f"interpolado en cubetas de ancho {spec.width:g}"
+    )
+    result["histogram"] = _histogram(buckets, spec, non_null)
+
+    if spec.per_value:
+        ranked = sorted(buckets, key=lambda b: (-b[1], b[0]))[:top]
+        result["top_values"] = [{"value": fmt(b[2]), "frequency": b[1], "percentage": round(b[1] / non_null * 100, 2)}
+                                for b in ranked]
+    return result
+
+
+def _histogram(buckets: List[Tuple], spec: BucketSpec, non_null: int) -> Dict[str, Any]:
+    fmt = spec.formatter
+    if spec.kind == "time_of_day":
+        # Cubetas naturales (minuto u hora del día); solo las que tienen registros
+        histogram = {
+            "bucket": spec.unit,
+            "buckets": [{"from": fmt(index * spec.width), "to": fmt((index + 1) * spec.width),
+                         "count": count, "percentage": round(count / non_null * 100, 2)}
+                        for index, count, _, _ in buckets]
+        }
+        if spec.requested_bins is not None:
+            histogram["requested_bins"] = spec.requested_bins
+            histogram["note"] = (f"bins no aplica a la hora del día: una cubeta por "
+                                 f"{'minuto' if spec.unit == 'minute' else 'hora'} con registros")
+        return histogram
+
+    bins = spec.bins
+    counts = [0] * bins
+    if spec.per_value:
+        span = spec.value_span
+        bin_width = span / bins
+        for index, count, _, _ in buckets:
+            counts[min(index * bins // span, bins - 1)] += count
+    else:
+        bin_width = spec.width * spec.fine_per_bin
+        for index, count, _, _ in buckets:
+            counts[min(index // spec.fine_per_bin, bins - 1)] += count
+    histogram = {
+        "bins": bins,
+        "bin_width": bin_width,
+        "buckets": [{"from": fmt(spec.origin + i * bin_width), "to": fmt(spec.origin + (i + 1) * bin_width),
+                     "count": count, "percentage": round(count / non_null * 100, 2)}
+                    for i, count in enumerate(counts)]
+    }
+    if spec.requested_bins != bins:
+        histogram["requested_bins"] = spec.requested_bins
+        histogram["note"] = f"El rango tiene solo {spec.value_span} valores enteros: una cubeta por valor"
+    return histogram
@@ -0,0 +1,379 @@
+# index_advisor.py
+"""
+Asesor de índices para la carga real del servidor sobre core_registro.
+
+Toma las consultas que el servidor ejecuta (log de carga de execute_query y de
+los análisis de asistencia, más los análisis generados), extrae sus predicados
+de igualdad y rango y sus columnas de GROUP BY / ORDER BY, y propone índices
+compuestos o de cobertura. Cada sugerencia se mide con EXPLAIN antes y después
+creando el índice en una instancia de prueba (MariaDB no tiene índices
+hipotéticos); sin instancia de prueba solo se reporta el plan actual.
+"""
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import logging
+
+from cost_guard import explain_plan
+from result_cache import normalize_sql
+
+logger = logging.getLogger(__name__)
+
+# Tipos que no conviene (o no se puede) indexar completos
+_NON_INDEXABLE_TYPES = {'text', 'mediumtext', 'longtext', 'blob', 'mediumblob', 'longblob', 'json', 'geometry'}
+
+_LITERAL_RE = re.compile(r"'(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.)*\"")
+_COLUMN = r"(?:([A-Za-z_]\w*)\.)?([A-Za-z_]\w*)"
+_TABLE_REF_RE = re.compile(
+    r"\b(?:FROM|JOIN)\s+([A-Za-z_]\w*)(?:\s+(?:AS\s+)?(?!(?:WHERE|JOIN|ON|LEFT|RIGHT|INNER|OUTER|CROSS|NATURAL|"
+    r"STRAIGHT_JOIN|GROUP|ORDER|HAVING|LIMIT|USING|UNION|WINDOW)\b)([A-Za-z_]\w*))?",
+    re.IGNORECASE
+)
+_WHERE_OR_ON_RE = re.compile(r"\b(WHERE|ON)\b", re.IGNORECASE)
+_GROUP_BY_RE = re.compile(r"\bGROUP\s+BY\b", re.IGNORECASE)
+_ORDER_BY_RE = re.compile(r"\bORDER\s+BY\b", re.IGNORECASE)
+_CLAUSE_STOP_RE = re.compile(
+    r"(GROUP\s+BY|ORDER\s+BY|HAVING|LIMIT|UNION|WINDOW|WHERE|JOIN|LEFT|RIGHT|INNER|CROSS|ON|FOR)\b", re.IGNORECASE
+)
+
+# Funciones de fecha que el reescritor sargable convierte en rango sobre la columna
+_RANGE_FUNCTIONS = {'DATE', 'YEAR'}
+_FUNCTION_PREDICATE_RE = re.compile(
+    rf"\b([A-Za-z_]+)\s*\(\s*{_COLUMN}\s*\)\s*(?:=|<=>|>=|<=|<|>|BETWEEN\b|IN\b)", re.IGNORECASE
+)
+_EQUALITY_RE = re.compile(rf"(?<![\w.]){_COLUMN}\s*(?:<=>|=(?!=))", re.IGNORECASE)
+_IN_RE = re.compile(rf"(?<![\w.]){_COLUMN}\s+IN\s*\(", re.IGNORECASE)
+_NOT_IN_RE = re.compile(rf"(?<![\w.]){_COLUMN}\s+NOT\s+IN\s*\(", re.IGNORECASE)
+_RANGE_RE = re.compile(rf"(?<![\w.]){_COLUMN}\s*(?:>=|<=|>|<(?!>))|(?<![\w.]){_COLUMN}\s+BETWEEN\b", re.IGNORECASE)
+_PREFIX_LIKE_RE = re.compile(rf"(?<![\w.]){_COLUMN}\s+LIKE\s+'x'", re.IGNORECASE)
+_REFERENCE_RE = re.compile(rf"(?<![\w.]){_COLUMN}(?!\s*\()", re.IGNORECASE)
+_SELECT_STAR_RE = re.compile(r"\bSELECT\s+(?:DISTINCT\s+)?(?:([A-Za-z_]\w*)\.)?\*", re.IGNORECASE)
+
+
+def _mask_literals(sql: str) -> str:
+    """Reducir literales a 'x' (o '%' si empiezan con comodín) y quitar backticks"""
+    def mask(match):
+        content = match.group(0)[1:-1]
+        return "'%'" if content[:1] in ('%', '_') else ("'x'" if content else "''")
+    return _LITERAL_RE.sub(mask, sql).replace('`', '')
+
+
+def _clause_bodies(masked: str, keyword_re) -> List[str]:
+    """Texto de cada cláusula (WHERE, ON, GROUP BY...) hasta la siguiente cláusula del mismo nivel"""
+    bodies = []
+    for match in keyword_re.finditer(masked):
+        depth = 0
+        i = match.end()
+        stop = len(masked)
+        while i < len(masked):
+            ch = masked[i]
+            if ch == '(':
+                depth += 1
+            elif ch == ')':
+                if depth == 0:
+                    stop = i
+                    break
+                depth -= 1
+            elif depth == 0 and (i == 0 or not (masked[i - 1].isalnum() or masked[i - 1] == '_')) \
+                    and _CLAUSE_STOP_RE.match(masked, i):
+                stop = i
+                break
+            i += 1
+        bodies.append(masked[match.end():stop])
+    return bodies
+
+
+def _split_top_level(body: str) -> List[str]:
+    items, depth, start = [], 0, 0
+    for i, ch in enumerate(body):
+        if ch == '(':
+            depth += 1
+        elif ch == ')':
+            depth -= 1
+        elif ch == ',' and depth == 0:
+            items.append(body[start:i])
+            start = i + 1
+    items.append(body[start:])
+    return [item.strip() for item in items if item.strip()]
+
+
+def _append_unique(target: List[str], value: Optional[str]):
+    if value and value not in target:
+        target.append(value)
+
+
+def analyze_query(sql: str, table: str, table_columns: List[str]) -> Optional[Dict[str, Any]]:
+    """
+    Forma de la consulta respecto a table: columnas con igualdad, con rango,
+    de GROUP BY y ORDER BY, predicados no sargables y columnas referenciadas.
+    Devuelve None si la consulta no usa la tabla.
+    """
+    masked = _mask_literals(sql)
+    columns = {c.lower(): c for c in table_columns}
+    aliases = set()
+    for match in _TABLE_REF_RE.finditer(masked):
+        if match.group(1).lower() == table.lower():
+            aliases.add(match.group(1).lower())
+            if match.group(2):
+                aliases.add(match.group(2).lower())
+    if not aliases:
+        return None
+
+    def resolve(qualifier: Optional[str], name: str) -> Optional[str]:
+        if qualifier and qualifier.lower() not in aliases:
+            return None
+        return columns.get(name.lower())
+
+    shape = {"equality": [], "range": [], "group_by": [], "order_by": [],
+             "non_sargable": [], "referenced": [], "select_star": False}
+
+    for body in _clause_bodies(masked, _WHERE_OR_ON_RE):
+        for match in _FUNCTION_PREDICATE_RE.finditer(body):
+            function, qualifier, name = match.group(1).upper(), match.group(2), match.group(3)
+            column = resolve(qualifier, name)
+            if not column:
+                continue
+            _append_unique(shape["non_sargable"], f"{function}({column})")
+            if function in _RANGE_FUNCTIONS:
+                # Se vuelve rango tras la reescritura sargable (DATE(col) = x -> col en [x, x+1))
+                _append_unique(shape["range"], column)
+        for match in _EQUALITY_RE.finditer(body):
+            _append_unique(shape["equality"], resolve(match.group(1), match.group(2)))
+        for match in _IN_RE.finditer(body):
+            _append_unique(shape["equality"], resolve(match.group(1), match.group(2)))
+        for regex in (_RANGE_RE, _PREFIX_LIKE_RE):
+            for match in regex.finditer(body):
+                qualifier, name = (match.group(1), match.group(2)) if match.group(2) else (match.group(3), match.group(4))
+                column = resolve(qualifier, name)
+                if column and column not in shape["equality"]:
+                    _append_unique(shape["range"], column)
+        for match in _NOT_IN_RE.finditer(body):
+            column = resolve(match.group(1), match.group(2))
+            if column:
+                _append_unique(shape["non_sargable"], f"{column} NOT IN (...)")
+
+    for key, keyword_re in (("group_by", _GROUP_BY_RE), ("order_by", _ORDER_BY_RE)):
+        for body in _clause_bodies(masked, keyword_re):
+            for item in _split_top_level(body):
+                item = re.sub(r"\s+(ASC|DESC)$", "", item, flags=re.IGNORECASE).strip()
+                match = re.fullmatch(_COLUMN, item)
+                if match:
+                    _append_unique(shape[key], resolve(match.group(1), match.group(2)))
+
+    for match in _SELECT_STAR_RE.finditer(masked):
+        if not match.group(1) or match.group(1).lower() in aliases:
+            shape["select_star"] = True
+    for match in _REFERENCE_RE.finditer(masked):
+        _append_unique(shape["referenced"], resolve(match.group(1), match.group(2)))
+    return shape
+
+
+def candidate_indexes(shape: Dict[str, Any], column_types: Dict[str, str],
+                      max_index_columns: int = 5, max_covering_columns: int = 6,
+                      implicit_columns: Tuple[str, ...] = ()) -> List[Dict[str, Any]]:
+    """
+    Índices candidatos para una forma de consulta: igualdades primero, luego agrupación/orden o un rango.
+    
+    implicit_columns: columnas que todo índice secundario ya incluye (llave primaria en InnoDB)
+    """
+    equality = [c for c in shape["equality"] if column_types.get(c) not in _NON_INDEXABLE_TYPES]
+    keys = []
+    ranges = [c for c in shape["range"] if c not in equality]
+    if equality or ranges:
+        label = " + ".join(part for part, used in (("igualdades", equality), ("rango", ranges)) if used)
+        keys.append((equality + ranges[:1], label))
+    grouping = shape["group_by"] or shape["order_by"]
+    if grouping:
+        extra = [c for c in grouping if c not in equality]
+        if extra:
+            label = "GROUP BY" if shape["group_by"] else "ORDER BY"
+            keys.append((equality + extra, f"igualdades + {label}" if equality else label))
+
+    candidates = []
+    seen = set()
+    for key, reason in keys:
+        key = [c for c in key if column_types.get(c) not in _NON_INDEXABLE_TYPES][:max_index_columns]
+        if not key or tuple(key) in seen:
+            continue
+        seen.add(tuple(key))
+        covering = None
+        referenced = [c for c in shape["referenced"] if c not in key and c not in implicit_columns]
+        if not shape["select_star"] and len(key) + len(referenced) <= max_covering_columns \
+                and all(column_types.get(c) not in _NON_INDEXABLE_TYPES for c in referenced):
+            covering = key + referenced
+        candidates.append({"columns": key, "covering_columns": covering, "reason": reason})
+    return candidates
+
+
+class WorkloadLog:
+    """Registro acotado (LRU) de las consultas que el servidor ejecuta, agregado por SQL normalizado"""
+
+    def __init__(self, max_entries: int = 500):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[Optional[str], str], Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def record(self, database: Optional[str], source: str, sql: str,
+               params: Optional[List[Any]] = None, elapsed_ms: Optional[float] = None):
+        key = (database, normalize_sql(sql))
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = {"database": database, "source": source, "sql": sql, "params": list(params or []),
+                         "count": 0, "total_ms": 0.0, "first_seen": now}
+                self._entries[key] = entry
+            else:
+                self._entries.move_to_end(key)
+                entry["params"] = list(params or [])
+            entry["count"] += 1
+            entry["total_ms"] += elapsed_ms or 0.0
+            entry["last_seen"] = now
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def entries(self, database: Optional[str] = None) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [dict(e) for e in self._entries.values() if database is None or e["database"] == database]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"entries": len(self._entries), "max_entries": self.max_entries,
+                    "executions": sum(e["count"] for e in self._entries.values())}
+
+
+def _index_name(columns: List[str]) -> str:
+    return "mcp_adv_" + hashlib.sha1(",".join(columns).encode('utf-8')).hexdigest()[:10]
+
+
+def _table_plan(plan: Dict[str, Any], table: str) -> List[Dict[str, Any]]:
+    return [t for t in plan["tables"] if (t["table"] or '').lower() == table.lower()]
+
+
+class IndexAdvisor:
+    """Sugerencias de índices a partir de la carga, con medición opcional en una instancia de prueba"""
+
+    def __init__(self, max_index_columns: int = 5, max_covering_columns: int = 6,
+                 queries_per_suggestion: int = 3):
+        self.max_index_columns = max_index_columns
+        self.max_covering_columns = max_covering_columns
+        self.queries_per_suggestion = queries_per_suggestion
+
+    @staticmethod
+    def load_schema(cursor, database: str, table: str) -> Tuple[Dict[str, str], Dict[str, List[str]]]:
+        """(tipos de columna, índices existentes nombre -> columnas)"""
+        cursor.execute("""
+            SELECT COLUMN_NAME, DATA_TYPE FROM information_schema.COLUMNS
+            WHERE TABLE_SCHEMA = %s AND TABLE_NAME = %s ORDER BY ORDINAL_POSITION
+        """, (database, table))
+        column_types = {row[0]: (row[1] or '').lower() for row in cursor.fetchall()}
+        cursor.execute("""
+            SELECT INDEX_NAME, COLUMN_NAME FROM information_schema.STATISTICS
+            WHERE TABLE_SCHEMA = %s AND TABLE_NAME = %s ORDER BY INDEX_NAME, SEQ_IN_INDEX
+        """, (database, table))
+        indexes: Dict[str, List[str]] = {}
+        for name, column in cursor.fetchall():
+            indexes.setdefault(name, []).append(column)
+        return column_types, indexes
+
+    def suggest(self, workload: List[Dict[str, Any]], table: str, column_types: Dict[str, str],
+                existing_indexes: Dict[str, List[str]], max_suggestions: int = 5) -> List[Dict[str, Any]]:
+        """Agregar candidatos de toda la carga, ponderados por número de ejecuciones"""
+        aggregated: Dict[Tuple[str, ...], Dict[str, Any]] = {}
+        primary_key = tuple(existing_indexes.get('PRIMARY', ()))
+        for entry in workload:
+            shape = analyze_query(entry["sql"], table, list(column_types))
+            if not shape:
+                continue
+            for candidate in candidate_indexes(shape, column_types, self.max_index_columns,
+                                               self.max_covering_columns, primary_key):
+                key = tuple(candidate["columns"])
+                slot = aggregated.setdefault(key, {
+                    "columns": candidate["columns"], "covering_columns": candidate["covering_columns"],
+                    "reason": candidate["reason"], "weight": 0, "queries": [], "non_sargable": []
+                })
+                slot["weight"] += max(1, entry.get("count", 1))
+                slot["queries"].append(entry)
+                for predicate in shape["non_sargable"]:
+                    _append_unique(slot["non_sargable"], predicate)
+                # Solo se conserva la cobertura si sirve a todas las consultas del candidato
+                if slot["covering_columns"] != candidate["covering_columns"]:
+                    slot["covering_columns"] = None
+
+        # Un candidato que es prefijo de otro queda cubierto por el más largo
+        ordered = sorted(aggregated.values(), key=lambda s: len(s["columns"]), reverse=True)
+        kept: List[Dict[str, Any]] = []
+        for slot in ordered:
+            longer = next((k for k in kept if k["columns"][:len(slot["columns"])] == slot["columns"]), None)
+            if longer:
+                longer["weight"] += slot["weight"]
+                longer["queries"].extend(slot["queries"])
+                longer["covering_columns"] = None
+                continue
+            kept.append(slot)
+
+        suggestions = []
+        for slot in sorted(kept, key=lambda s: s["weight"], reverse=True):
+            columns = slot["covering_columns"] or slot["columns"]
+            redundant = next((name for name, cols in existing_indexes.items()
+                              if cols[:len(columns)] == columns), None)
+            if redundant:
+                continue
+            extends = next((name for name, cols in existing_indexes.items()
+                            if columns[:len(cols)] == cols), None)
+            slot["queries"].sort(key=lambda e: e.get("count", 1), reverse=True)
+            suggestions.append({
+                "columns": slot["columns"],
+                "covering_columns": slot["covering_columns"],
+                "index_columns": columns,
+                "ddl": f"CREATE INDEX `{_index_name(columns)}` ON `{table}` ("
+                       + ", ".join(f"`{c}`" for c in columns) + ")",
+                "reason": slot["reason"] + (" (de cobertura)" if slot["covering_columns"] else ""),
+                "extends_index": extends,
+                "weight": slot["weight"],
+                "non_sargable_predicates": slot["non_sargable"],
+                "queries": slot["queries"][:self.queries_per_suggestion]
+            })
+            if len(suggestions) >= max_suggestions:
+                break
+        return suggestions
+
+    def measure(self, suggestion: Dict[str, Any], table: str, before_cursor,
+                test_connection_factory: Optional[Callable[[], Any]] = None) -> Dict[str, Any]:
+        """EXPLAIN antes y, con instancia de prueba, después de crear el índice"""
+        results = []
+        if test_connection_factory is None:
+            for entry in suggestion["queries"]:
+                plan = explain_plan(before_cursor, entry["sql"], entry["params"] or None)
+                results.append({"source": entry["source"], "before_rows": plan["estimated_rows"],
+                                "before_access": _table_plan(plan, table), "after_rows": None})
+            return {"mode": "solo_plan_actual", "queries": results}
+
+        name = _index_name(suggestion["index_columns"])
+        connection = test_connection_factory()
+        try:
+            with connection.cursor() as cursor:
+                befores = [explain_plan(cursor, e["sql"], e["params"] or None) for e in suggestion["queries"]]
+                cursor.execute(suggestion["ddl"])
+                try:
+                    for entry, before in zip(suggestion["queries"], befores):
+                        after = explain_plan(cursor, entry["sql"], entry["params"] or None)
+                        after_access = _table_plan(after, table)
+                        results.append({
+                            "source": entry["source"],
+                            "before_rows": before["estimated_rows"],
+                            "after_rows": after["estimated_rows"],
+                            "reduction_pct": round(100.0 * (1 - after["estimated_rows"] / before["estimated_rows"]), 1)
+                            if before["estimated_rows"] else 0.0,
+                            "index_used": any(t["key"] == name for t in after_access),
+                            "before_access": _table_plan(before, table),
+                            "after_access": after_access
+                        })
+                finally:
+                    cursor.execute(f"DROP INDEX `{name}` ON `{table}`")
+        finally:
+            connection.close()
+        return {"mode": "instancia_de_prueba", "queries": results}
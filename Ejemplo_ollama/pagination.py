@@ -0,0 +1,317 @@
+# pagination.py
+"""
+Paginación por keyset con tokens de continuación opacos.
+
+En lugar de OFFSET, cada página continúa desde los valores de las columnas
+de orden de la última fila entregada, así el costo por página es constante.
+
+El keyset termina siempre en una columna única (id, o las demás columnas del
+resultado si no hay id) para que los empates no pierdan filas en el borde de una
+página, y el predicado trata NULL como el menor valor, igual que el ORDER BY de
+MariaDB y SQLite.
+"""
+import base64
+import hashlib
+import json
+import re
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+TOKEN_VERSION = 2
+MAX_PAGE_SIZE = 1000
+
+_ORDER_BY_RE = re.compile(r'\bORDER\s+BY\b')
+_CLAUSE_END_RE = re.compile(r'\b(LIMIT|FOR\s+UPDATE|LOCK\s+IN|INTO)\b')
+_SIMPLE_COLUMN_RE = re.compile(r'^`?([A-Za-z_][A-Za-z0-9_$]*)`?$')
+
+
+class PaginationError(ValueError):
+    """La consulta o el token no permiten paginar por keyset"""
+
+
+def _mask_nested(query: str) -> str:
+    """Reemplazar literales y subconsultas por espacios para analizar solo el nivel superior"""
+    masked = []
+    depth = 0
+    quote = None
+    i = 0
+    while i < len(query):
+        ch = query[i]
+        if quote:
+            if ch == '\\' and quote != '`':
+                masked.append('  ')
+                i += 2
+                continue
+            if ch == quote:
+                quote = None
+            masked.append(' ')
+        elif ch in ("'", '"', '`'):
+            quote = ch
+            masked.append(' ')
+        elif ch == '(':
+            depth += 1
+            masked.append(' ')
+        elif ch == ')':
+            depth -= 1
+            masked.append(' ')
+        else:
+            masked.append(ch.upper() if depth == 0 else ' ')
+        i += 1
+    return ''.join(masked)[:len(query)]
+
+
+def strip_statement_end(query: str) -> str:
+    """Quitar espacios y el ';' final de una sentencia"""
+    query = query.strip()
+    while query.endswith(';'):
+        query = query[:-1].rstrip()
+    return query
+
+
+def parse_order_by(query: str) -> List[Tuple[str, str]]:
+    """Obtener las columnas del ORDER BY de nivel superior como [(columna, 'ASC'|'DESC')]"""
+    masked = _mask_nested(query)
+    matches = list(_ORDER_BY_RE.finditer(masked))
+    if not matches:
+        return []
+
+    start = matches[-1].end()
+    end_match = _CLAUSE_END_RE.search(masked, start)
+    end = end_match.start() if end_match else len(query)
+
+    items = []
+    item_start = start
+    for pos in range(start, end + 1):
+        if pos == end or masked[pos] == ',':
+            raw = query[item_start:pos].strip()
+            item_start = pos + 1
+            if not raw:
+                continue
+            direction = 'ASC'
+            parts = raw.rsplit(None, 1)
+            if len(parts) == 2 and parts[1].upper() in ('ASC', 'DESC'):
+                raw, direction = parts[0].strip(), parts[1].upper()
+            # Las columnas calificadas (r1.tiempo) se exponen sin alias de tabla
+            column = raw.split('.')[-1]
+            match = _SIMPLE_COLUMN_RE.match(column)
+            if not match:
+                raise PaginationError(
+                    f"No se puede paginar por la expresión '{raw}': use un alias de columna en el ORDER BY"
+                )
+            items.append((match.group(1), direction))
+    return items
+
+
+def _token_value(value: Any) -> Any:
+    """Convertir un valor de clave a un escalar JSON comparable en SQL"""
+    if isinstance(value, datetime):
+        return value.isoformat(sep=' ')
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, timedelta):
+        total = int(value.total_seconds())
+        sign = '-' if total < 0 else ''
+        total = abs(total)
+        return f"{sign}{total // 3600}:{total % 3600 // 60:02d}:{total % 60:02d}"
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, bytes):
+        return value.decode('utf-8', errors='replace')
+    return value
+
+
+def query_fingerprint(database: str, query: str, keyset: List[Tuple[str, str]],
+                      params: Optional[List[Any]] = None) -> str:
+    """Huella de la consulta (y sus parámetros) para impedir reutilizar un token en otra consulta"""
+    normalized = ' '.join(strip_statement_end(query).split())
+    material = json.dumps([database, normalized, keyset, params or []], ensure_ascii=False, default=str)
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()[:16]
+
+
+def quote_column(column: str) -> str:
+    return "`" + column.replace("`", "``") + "`"
+
+
+def with_tiebreaker(keyset: List[Tuple[str, str]], columns: List[str],
+                    tiebreaker: str = "id") -> List[Tuple[str, str]]:
+    """
+    Completar el keyset para que identifique una sola fila.
+
+    Se agrega la columna tiebreaker si está en el resultado; si no, las columnas
+    restantes del resultado (dos filas idénticas en todo siguen siendo indistinguibles).
+    """
+    present = {column.lower() for column, _ in keyset}
+    if tiebreaker.lower() in present:
+        return list(keyset)
+    lowered = {column.lower(): column for column in columns}
+    if tiebreaker.lower() in lowered:
+        return list(keyset) + [(lowered[tiebreaker.lower()], "ASC")]
+    return list(keyset) + [(column, "ASC") for column in columns if column.lower() not in present]
+
+
+def encode_token(fingerprint: str, last_values: List[Any], page_size: int,
+                 keyset: Optional[List[Tuple[str, str]]] = None) -> str:
+    payload = {
+        "v": TOKEN_VERSION,
+        "f": fingerprint,
+        "k": [_token_value(v) for v in last_values],
+        "n": page_size
+    }
+    if keyset is not None:
+        payload["c"] = [list(item) for item in keyset]
+    raw = json.dumps(payload, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_token(token: str, fingerprint: str) -> Dict[str, Any]:
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except Exception:
+        raise PaginationError("Token de continuación inválido")
+    if payload.get("v") != TOKEN_VERSION or payload.get("f") != fingerprint:
+        raise PaginationError("El token de continuación no corresponde a esta consulta")
+    return payload
+
+
+def token_keyset(payload: Dict[str, Any], keyset: List[Tuple[str, str]]) -> List[Tuple[str, str]]:
+    """Keyset completo guardado en el token; debe empezar con las columnas de orden de la consulta"""
+    try:
+        stored = [(str(column), direction) for column, direction in payload.get("c") or keyset]
+    except (TypeError, ValueError):
+        raise PaginationError("Token de continuación inválido")
+    if (stored[:len(keyset)] != [tuple(item) for item in keyset]
+            or any(direction not in ("ASC", "DESC") for _, direction in stored)):
+        raise PaginationError("El token de continuación no coincide con las columnas de orden")
+    return stored
+
+
+def keyset_predicate(keyset: List[Tuple[str, str]], values: List[Any]) -> Tuple[str, List[Any]]:
+    """
+    Construir (a < %s) OR (a = %s AND b > %s) ... para continuar después de 'values'
+
+    NULL es el menor valor: en ASC va antes que todo y en DESC después de todo,
+    así que 'después de NULL' es IS NOT NULL en ASC y nada en DESC.
+    """
+    if len(values) != len(keyset):
+        raise PaginationError("El token de continuación no coincide con las columnas de orden")
+    disjuncts = []
+    params = []
+    for i, (column, direction) in enumerate(keyset):
+        terms = []
+        term_params = []
+        for (prev_column, _), prev_value in zip(keyset[:i], values[:i]):
+            if prev_value is None:
+                terms.append(f"{quote_column(prev_column)} IS NULL")
+            else:
+                terms.append(f"{quote_column(prev_column)} = %s")
+                term_params.append(prev_value)
+        value = values[i]
+        if value is None:
+            if direction == 'DESC':
+                continue
+            terms.append(f"{quote_column(column)} IS NOT NULL")
+        elif direction == 'DESC':
+            terms.append(f"({quote_column(column)} < %s OR {quote_column(column)} IS NULL)")
+            term_params.append(value)
+        else:
+            terms.append(f"{quote_column(column)} > %s")
+            term_params.append(value)
+        disjuncts.append("(" + " AND ".join(terms) + ")")
+        params.extend(term_params)
+    if not disjuncts:
+        return "(1 = 0)", []
+    return "(" + " OR ".join(disjuncts) + ")", params
+
+
+def probe_columns_query(base_query: str, base_params: Optional[List[Any]] = None) -> str:
+    """Consulta sin filas para conocer las columnas del resultado antes de elegir el desempate"""
+    base = strip_statement_end(base_query)
+    if base_params is None:
+        base = base.replace('%', '%%')
+    return f"SELECT * FROM (\n{base}\n) AS _pagina LIMIT 0"
+
+
+def build_page_query(base_query: str, keyset: List[Tuple[str, str]], page_size: int,
+                     after_values: Optional[List[Any]] = None,
+                     base_params: Optional[List[Any]] = None) -> Tuple[str, List[Any]]:
+    """Envolver la consulta en una tabla derivada y pedir page_size + 1 filas tras el keyset"""
+    base = strip_statement_end(base_query)
+    params = list(base_params or [])
+    if base_params is None:
+        # Sin parámetros propios, los '%' literales deben escaparse para pymysql
+        base = base.replace('%', '%%')
+
+    where = ""
+    if after_values is not None:
+        predicate, predicate_params = keyset_predicate(keyset, after_values)
+        where = f" WHERE {predicate}"
+        params.extend(predicate_params)
+
+    order = ", ".join(f"{quote_column(column)} {direction}" for column, direction in keyset)
+    sql = f"SELECT * FROM (\n{base}\n) AS _pagina{where} ORDER BY {order} LIMIT {page_size + 1}"
+    return sql, params
+
+
+def clamp_page_size(page_size: int) -> int:
+    return max(1, min(int(page_size), MAX_PAGE_SIZE))
+
+
+def fetch_page(select: Callable[[str, List[Any]], Tuple[List[str], list, bool]], database: str,
+               base_query: str, keyset: List[Tuple[str, str]], page_size: Optional[int] = None,
+               continuation_token: Optional[str] = None, base_params: Optional[List[Any]] = None,
+               tiebreaker: Optional[str] = None, default_page_size: int = 100,
+               guard: Optional[Callable[[str, List[Any]], str]] = None):
+    """
+    Obtener una página de base_query y el token de la siguiente. Devuelve (columnas, filas, paginación, sql)
+
+    select: Función (sql, params) -> (columnas, filas, desde_cache)
+    tiebreaker: Columna única (id) que se agrega al keyset si la consulta no ordena ya por ella.
+                Sin esa columna en el resultado se desempata por las demás columnas; si además
+                el keyset está vacío (consulta sin ORDER BY) se lanza PaginationError. El keyset
+                completo viaja en el token, así que las páginas siguientes no repiten la consulta
+                de columnas.
+    guard: Función (sql, params) -> sql que recibe la consulta de la página tal como se va a
+           ejecutar (guardia de costo); puede reescribirla o lanzar una excepción para rechazarla.
+    """
+    fingerprint = query_fingerprint(database, base_query, keyset, base_params)
+    after_values = None
+    if continuation_token:
+        payload = decode_token(continuation_token, fingerprint)
+        keyset = token_keyset(payload, keyset)
+        after_values = payload["k"]
+        page_size = page_size or payload["n"]
+    elif tiebreaker and tiebreaker.lower() not in {column.lower() for column, _ in keyset}:
+        probed, _, _ = select(probe_columns_query(base_query, base_params), list(base_params or []))
+        if not keyset and tiebreaker.lower() not in {column.lower() for column in probed}:
+            # Sin ORDER BY solo se pagina por el desempate; ordenar por todas las columnas no es lo pedido
+            raise PaginationError(f"La consulta no tiene ORDER BY ni columna {tiebreaker} en el resultado: "
+                                  f"agregue un ORDER BY para paginar")
+        keyset = with_tiebreaker(keyset, probed, tiebreaker)
+    page_size = clamp_page_size(page_size or default_page_size)
+
+    sql, params = build_page_query(base_query, keyset, page_size, after_values, base_params)
+    if guard is not None:
+        sql = guard(sql, params)
+    columns, rows, from_cache = select(sql, params)
+
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    next_token = None
+    if has_more:
+        lowered = [col.lower() for col in columns]
+        missing = [col for col, _ in keyset if col.lower() not in lowered]
+        if missing:
+            raise PaginationError(f"Las columnas de orden {missing} deben estar en el SELECT para paginar")
+        key_indexes = [lowered.index(col.lower()) for col, _ in keyset]
+        next_token = encode_token(fingerprint, [rows[-1][i] for i in key_indexes], page_size, keyset)
+
+    pagination = {
+        "page_size": page_size,
+        "has_more": has_more,
+        "continuation_token": next_token,
+        "keyset": [f"{col} {direction}" for col, direction in keyset],
+        "from_cache": from_cache
+    }
+    return columns, rows, pagination, sql
@@ -0,0 +1,121 @@
+# prepared_statements.py
+"""
+Sentencias preparadas del lado del servidor MariaDB cacheadas por conexión.
+
+pymysql solo habla el protocolo de texto, así que se usan PREPARE / EXECUTE
+USING (MariaDB 10.2.3+ acepta literales en USING, un solo round trip por
+ejecución). Las sentencias se reutilizan mientras la conexión está prestada
+(p. ej. las páginas de un mismo análisis); al devolverla, el pool reinicia la
+sesión con COM_RESET_CONNECTION, que las elimina, y llama a forget().
+"""
+import itertools
+import re
+import threading
+import weakref
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+import logging
+
+from pymysql.constants import ER
+
+from sql_validator import mask_literals
+
+logger = logging.getLogger(__name__)
+
+# Error de MariaDB cuando la sentencia ya no existe en la sesión
+UNKNOWN_STMT_HANDLER = ER.UNKNOWN_STMT_HANDLER
+
+# De izquierda a derecha: en '%%s' el '%%' se consume antes de ver un '%s'
+_PLACEHOLDER_RE = re.compile(r"%%|%s")
+
+
+def to_qmark(sql: str) -> str:
+    """
+    Convertir placeholders de pymysql (%s) a placeholders de PREPARE (?) sin el ';' final.
+    Solo se convierten los %s fuera de literales y comentarios; '%%' se vuelve '%' en
+    todas partes, igual que al formatear pymysql la consulta con parámetros.
+    """
+    sql = sql.strip().rstrip(';')
+    masked = mask_literals(sql)
+
+    def replace(match):
+        if match.group() == '%%':
+            return '%'
+        return '?' if masked[match.start()] == '%' else match.group()
+    return _PLACEHOLDER_RE.sub(replace, sql)
+
+
+class PreparedStatementCache:
+    """Cache LRU de sentencias preparadas por conexión"""
+
+    def __init__(self, max_per_connection: int = 32):
+        self.max_per_connection = max_per_connection
+        self._by_connection = weakref.WeakKeyDictionary()
+        self._names = itertools.count(1)
+        self._lock = threading.Lock()
+
+        self._prepares = 0
+        self._reuses = 0
+        self._deallocations = 0
+
+    def _statements(self, connection) -> "OrderedDict[str, str]":
+        with self._lock:
+            statements = self._by_connection.get(connection)
+            if statements is None:
+                statements = OrderedDict()
+                self._by_connection[connection] = statements
+            return statements
+
+    def forget(self, connection):
+        """Olvidar las sentencias de una conexión cuya sesión se reinició"""
+        with self._lock:
+            self._by_connection.pop(connection, None)
+
+    def _prepare(self, cursor, statements, sql: str) -> str:
+        with self._lock:
+            name = f"mcp_stmt_{next(self._names)}"
+        cursor.execute(f"PREPARE {name} FROM %s", (to_qmark(sql),))
+        statements[sql] = name
+        with self._lock:
+            self._prepares += 1
+
+        while len(statements) > self.max_per_connection:
+            _, oldest = statements.popitem(last=False)
+            cursor.execute(f"DEALLOCATE PREPARE {oldest}")
+            with self._lock:
+                self._deallocations += 1
+        return name
+
+    def execute(self, cursor, sql: str, params: Optional[List[Any]] = None):
+        """Ejecutar sql (con placeholders %s) como sentencia preparada en la conexión del cursor"""
+        statements = self._statements(cursor.connection)
+        name = statements.get(sql)
+        if name is None:
+            name = self._prepare(cursor, statements, sql)
+        else:
+            statements.move_to_end(sql)
+            with self._lock:
+                self._reuses += 1
+
+        params = list(params or [])
+        using = f" USING {', '.join(['%s'] * len(params))}" if params else ""
+        try:
+            return cursor.execute(f"EXECUTE {name}{using}", params or None)
+        except Exception as e:
+            if getattr(e, 'args', [None])[0] != UNKNOWN_STMT_HANDLER:
+                raise
+            # La sesión perdió la sentencia (p. ej. reinicio de sesión): preparar de nuevo
+            logger.debug(f"♻️  Sentencia {name} desconocida en la sesión, preparando de nuevo")
+            statements.pop(sql, None)
+            name = self._prepare(cursor, statements, sql)
+            return cursor.execute(f"EXECUTE {name}{using}", params or None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "connections": len(self._by_connection),
+                "statements": sum(len(s) for s in self._by_connection.values()),
+                "prepares": self._prepares,
+                "reuses": self._reuses,
+                "deallocations": self._deallocations
+            }
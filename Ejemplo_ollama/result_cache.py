@@ -0,0 +1,197 @@
+# result_cache.py
+"""
+Cache en proceso de resultados de consultas de lectura.
+
+- Llave: SQL normalizado + base de datos + parámetros
+- Acotado por bytes con desalojo LRU
+- TTL por entrada; las consultas relativas a CURDATE() expiran a medianoche
+- Invalidación por marca de agua barata (p. ej. MAX(id) de core_registro)
+"""
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Funciones cuyo valor cambia en cada ejecución: la consulta no se cachea
+_VOLATILE_RE = re.compile(
+    r'\b(NOW|SYSDATE|CURTIME|CURRENT_TIME|CURRENT_TIMESTAMP|LOCALTIME|LOCALTIMESTAMP|'
+    r'UNIX_TIMESTAMP|RAND|UUID|UUID_SHORT|LAST_INSERT_ID|CONNECTION_ID|FOUND_ROWS|SLEEP)\s*\(',
+    re.IGNORECASE
+)
+# Funciones relativas al día actual: la entrada vive hasta medianoche
+_DAY_RELATIVE_RE = re.compile(r'\b(CURDATE\s*\(|CURRENT_DATE\b|UTC_DATE\b)', re.IGNORECASE)
+_PUNCT_SPACE_RE = re.compile(r'\s*([(),])\s*')
+_LITERAL_RE = re.compile(r"('(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.)*\"|`[^`]*`)")
+
+
+def normalize_sql(sql: str) -> str:
+    """Colapsar espacios fuera de literales y quitar el ';' final"""
+    def squeeze(chunk: str) -> str:
+        return _PUNCT_SPACE_RE.sub(r'\1', ' '.join(chunk.split()))
+
+    parts = []
+    last = 0
+    for match in _LITERAL_RE.finditer(sql):
+        parts.append(squeeze(sql[last:match.start()]))
+        parts.append(match.group(0))
+        last = match.end()
+    parts.append(squeeze(sql[last:]))
+    normalized = ' '.join(p for p in parts if p)
+    return normalized.rstrip('; ')
+
+
+def seconds_until_midnight(now: Optional[datetime] = None) -> float:
+    now = now or datetime.now()
+    midnight = datetime.combine(now.date() + timedelta(days=1), datetime.min.time())
+    return (midnight - now).total_seconds()
+
+
+def ttl_for_query(sql: str, default_ttl: float, now: Optional[datetime] = None) -> Optional[float]:
+    """TTL de la entrada, o None si la consulta no es cacheable"""
+    if _VOLATILE_RE.search(sql):
+        return None
+    if _DAY_RELATIVE_RE.search(sql):
+        return min(default_ttl, seconds_until_midnight(now))
+    return default_ttl
+
+
+def estimate_size(value: Any) -> int:
+    """Tamaño aproximado en bytes de un resultado (columnas + filas)"""
+    if value is None:
+        return 8
+    if isinstance(value, (str, bytes)):
+        return len(value) + 16
+    if isinstance(value, (list, tuple)):
+        return 16 + sum(estimate_size(v) for v in value)
+    if isinstance(value, dict):
+        return 16 + sum(estimate_size(k) + estimate_size(v) for k, v in value.items())
+    return 16
+
+
+class ResultCache:
+    """Cache LRU acotado por bytes con TTL y marca de agua por entrada"""
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, default_ttl: float = 300.0):
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self._entries: "OrderedDict[Tuple, Tuple[Any, float, Any, int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self._hits = 0
+        self._misses = 0
+        self._expired = 0
+        self._invalidated = 0
+        self._evicted = 0
+        self._uncacheable = 0
+        self._too_large = 0
+
+    @staticmethod
+    def make_key(database: Optional[str], sql: str, params: Optional[Iterable[Any]] = None) -> Tuple:
+        # repr distingue el tipo: 1, '1', 1.0 y Decimal('1') no comparten entrada
+        return (database, normalize_sql(sql), tuple(repr(p) for p in (params or ())))
+
+    def _drop(self, key):
+        _, _, _, size = self._entries.pop(key)
+        self._bytes -= size
+
+    def get(self, key: Tuple, watermark: Any = None) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._misses += 1
+                return None
+            value, expires_at, entry_watermark, _ = entry
+            if time.monotonic() >= expires_at:
+                self._drop(key)
+                self._expired += 1
+                self._misses += 1
+                return None
+            if entry_watermark != watermark:
+                self._drop(key)
+                self._invalidated += 1
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return value
+
+    def put(self, key: Tuple, value: Any, ttl: float, watermark: Any = None) -> bool:
+        size = estimate_size(value)
+        if size > self.max_bytes // 4:
+            # Un resultado enorme desalojaría casi todo el cache
+            with self._lock:
+                self._too_large += 1
+            return False
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (value, time.monotonic() + ttl, watermark, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes and self._entries:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self._evicted += 1
+        return True
+
+    def record_uncacheable(self):
+        with self._lock:
+            self._uncacheable += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_ratio": round(self._hits / lookups, 4) if lookups else 0.0,
+                "expired": self._expired,
+                "invalidated_by_watermark": self._invalidated,
+                "evicted": self._evicted,
+                "uncacheable": self._uncacheable,
+                "too_large": self._too_large
+            }
+
+
+class WatermarkTracker:
+    """Marcas de agua por tabla (p. ej. MAX(id)) refrescadas como máximo cada refresh_seconds"""
+
+    def __init__(self, tables: Dict[str, str], refresh_seconds: float = 5.0):
+        self.tables = tables
+        self.refresh_seconds = refresh_seconds
+        self._values: Dict[Tuple[Optional[str], str], Tuple[Any, float]] = {}
+        self._patterns = {table: re.compile(rf'\b{re.escape(table)}\b', re.IGNORECASE) for table in tables}
+        self._lock = threading.Lock()
+
+    def tables_in(self, sql: str):
+        return sorted(table for table, pattern in self._patterns.items() if pattern.search(sql))
+
+    def current(self, cursor, database: Optional[str], sql: str) -> Tuple:
+        """Marca de agua de las tablas vigiladas que aparecen en la consulta"""
+        watermark = []
+        for table in self.tables_in(sql):
+            key = (database, table)
+            with self._lock:
+                cached = self._values.get(key)
+            if cached and time.monotonic() - cached[1] < self.refresh_seconds:
+                watermark.append((table, cached[0]))
+                continue
+            cursor.execute(f"SELECT MAX(`{self.tables[table]}`) FROM `{table}`")
+            value = cursor.fetchone()[0]
+            with self._lock:
+                self._values[key] = (value, time.monotonic())
+            watermark.append((table, value))
+        return tuple(watermark)
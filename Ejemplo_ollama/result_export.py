@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+# result_export.py
+"""
+Exportación de resultados de consultas a archivos comprimidos en disco.
+
+Las filas se leen de un cursor sin búfer (SSCursor) con fetchmany y se escriben
+directamente a CSV o NDJSON comprimido con gzip, así que la memoria usada no depende
+del número de filas: solo se conserva un lote de `batch_rows` filas a la vez.
+
+Cada exportación ocupa dos archivos en el directorio de exportaciones:
+
+    ID.csv.gz / ID.ndjson.gz    los datos (mientras se escriben, con sufijo .part)
+    ID.json                     metadatos: base, consulta, columnas, filas y bytes
+
+El archivo de metadatos se escribe al final, así que una exportación interrumpida
+nunca se reporta como completa. Las exportaciones se eliminan a las `retention_hours`.
+"""
+import csv
+import gzip
+import io
+import json
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+from datetime import date, datetime, time as time_of_day, timedelta
+from decimal import Decimal
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMATS = ("csv", "ndjson")
+_EXTENSIONS = {"csv": "csv.gz", "ndjson": "ndjson.gz"}
+_EXPORT_ID = re.compile(r"^[0-9a-f]{32}$")
+
+
+class ExportError(Exception):
+    """Formato no válido o exportación inexistente"""
+
+
+def _timedelta_text(value: timedelta) -> str:
+    """TIME de MariaDB (llega como timedelta) en formato [-]HH:MM:SS"""
+    seconds = int(value.total_seconds())
+    sign = "-" if seconds < 0 else ""
+    hours, rest = divmod(abs(seconds), 3600)
+    return f"{sign}{hours:02d}:{rest // 60:02d}:{rest % 60:02d}"
+
+
+def export_value(value):
+    """Valor de una columna en un tipo que CSV y JSON representan sin pérdida"""
+    if isinstance(value, (datetime, date, time_of_day)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, timedelta):
+        return _timedelta_text(value)
+    if isinstance(value, (bytes, bytearray)):
+        return value.hex()
+    return value
+
+
+def _csv_writer(handle, columns: List[str]):
+    writer = csv.writer(handle)
+    writer.writerow(columns)
+
+    def write(rows):
+        # None queda como campo vacío, igual que en un volcado de MariaDB a CSV
+        writer.writerows([["" if value is None else export_value(value) for value in row] for row in rows])
+    return write
+
+
+def _ndjson_writer(handle, columns: List[str]):
+    def write(rows):
+        handle.writelines(
+            json.dumps(dict(zip(columns, map(export_value, row))), ensure_ascii=False) + "\n"
+            for row in rows
+        )
+    return write
+
+
+_WRITERS = {"csv": _csv_writer, "ndjson": _ndjson_writer}
+
+
+def stream_to_file(cursor, path: str, format: str, batch_rows: int = 10_000,
+                   compresslevel: int = 6) -> Dict[str, Any]:
+    """
+    Escribir el resultado de la consulta ya ejecutada en `cursor` a `path` (gzip).
+
+    Devuelve columnas, filas, bytes comprimidos y sin comprimir. El cursor debe ser sin
+    búfer para que la memoria quede acotada por `batch_rows`.
+    """
+    columns = [desc[0] for desc in cursor.description] if cursor.description else []
+    rows = 0
+    with gzip.open(path, "wb", compresslevel=compresslevel) as compressed:
+        with io.TextIOWrapper(compressed, encoding="utf-8", newline="") as handle:
+            write = _WRITERS[format](handle, columns)
+            while True:
+                batch = cursor.fetchmany(batch_rows)
+                if not batch:
+                    break
+                write(batch)
+                rows += len(batch)
+            handle.flush()
+            # En modo escritura, tell() de GzipFile cuenta los bytes sin comprimir
+            uncompressed = compressed.tell()
+    return {
+        "columns": columns,
+        "rows": rows,
+        "bytes": os.path.getsize(path),
+        "uncompressed_bytes": uncompressed
+    }
+
+
+class ExportStore:
+    """Directorio de exportaciones: rutas, metadatos y limpieza por antigüedad"""
+
+    def __init__(self, directory: str, retention_hours: float = 24):
+        self.directory = directory
+        self.retention_seconds = retention_hours * 3600
+        self._lock = threading.Lock()
+        self._exports = 0
+        self._failures = 0
+        self._removed = 0
+        self._rows = 0
+        self._bytes = 0
+
+    def _data_path(self, export_id: str, format: str) -> str:
+        return os.path.join(self.directory, f"{export_id}.{_EXTENSIONS[format]}")
+
+    def _metadata_path(self, export_id: str) -> str:
+        return os.path.join(self.directory, f"{export_id}.json")
+
+    def export(self, cursor, format: str, batch_rows: int, compresslevel: int = 6,
+               **metadata) -> Dict[str, Any]:
+        """Volcar el cursor a una exportación nueva. Devuelve sus metadatos (con export_id y path)"""
+        if format not in EXPORT_FORMATS:
+            raise ExportError(f"Formato de exportación no válido: '{format}'. Opciones: {', '.join(EXPORT_FORMATS)}")
+        self.cleanup()
+        os.makedirs(self.directory, exist_ok=True)
+        export_id = uuid.uuid4().hex
+        path = self._data_path(export_id, format)
+        partial = f"{path}.part"
+        started = time.perf_counter()
+        try:
+            result = stream_to_file(cursor, partial, format, batch_rows, compresslevel)
+            os.replace(partial, path)
+        except BaseException:
+            with self._lock:
+                self._failures += 1
+            if os.path.exists(partial):
+                os.remove(partial)
+            raise
+        info = {
+            "export_id": export_id,
+            **metadata,
+            "format": format,
+            **result,
+            "path": os.path.abspath(path),
+            "elapsed_seconds": round(time.perf_counter() - started, 3),
+            "created_at": datetime.now().isoformat()
+        }
+        temporary = f"{self._metadata_path(export_id)}.tmp"
+        with open(temporary, "w", encoding="utf-8") as handle:
+            json.dump(info, handle, ensure_ascii=False, default=str)
+        os.replace(temporary, self._metadata_path(export_id))
+        with self._lock:
+            self._exports += 1
+            self._rows += result["rows"]
+            self._bytes += result["bytes"]
+        return info
+
+    def get(self, export_id: str) -> Dict[str, Any]:
+        """Metadatos de una exportación terminada"""
+        if not _EXPORT_ID.match(export_id or ""):
+            raise ExportError(f"Identificador de exportación no válido: {export_id!r}")
+        try:
+            with open(self._metadata_path(export_id), encoding="utf-8") as handle:
+                return json.load(handle)
+        except FileNotFoundError:
+            raise ExportError(f"La exportación '{export_id}' no existe o ya expiró") from None
+
+    def cleanup(self, now: Optional[float] = None) -> int:
+        """Eliminar las exportaciones (y restos .part) con más de retention_hours"""
+        if not os.path.isdir(self.directory):
+            return 0
+        cutoff = (now or time.time()) - self.retention_seconds
+        removed = 0
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+                    removed += name.endswith(".json")
+            except FileNotFoundError:
+                continue
+        if removed:
+            logger.info(f"🧹 {removed} exportaciones expiradas eliminadas de {self.directory}")
+            with self._lock:
+                self._removed += removed
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "directory": self.directory,
+                "retention_hours": self.retention_seconds / 3600,
+                "exports": self._exports,
+                "failures": self._failures,
+                "removed": self._removed,
+                "rows_written": self._rows,
+                "bytes_written": self._bytes
+            }
@@ -0,0 +1,218 @@
+# result_handles.py
+"""
+Resultados materializados en el servidor y leídos por partes como recursos MCP.
+
+execute_attendance_analysis(materialize=True) guarda las filas del análisis aquí y
+devuelve un identificador; el cliente lee rebanadas con read_resource:
+
+    result://ID                         columnas, filas, bytes y expiración
+    result://ID/OFFSET/SIZE             filas [OFFSET, OFFSET + SIZE)
+    result://ID/OFFSET/SIZE/ORDEN       igual, reordenado: 'col' ascendente, '-col'
+                                        descendente, varias separadas por coma
+
+- LRU acotado por bytes (estimate_size de result_cache) y expiración fija por entrada
+- Reordenar no vuelve a la base de datos: la permutación de cada orden se calcula una
+  vez y se guarda con el resultado (cuenta para el presupuesto de bytes)
+"""
+import logging
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from result_cache import estimate_size
+
+logger = logging.getLogger(__name__)
+
+# Bytes aproximados por posición de una permutación guardada
+_PERMUTATION_ENTRY_BYTES = 8
+# Órdenes distintos guardados por resultado (los más antiguos se descartan)
+_MAX_ORDERS = 4
+
+
+class HandleError(ValueError):
+    """Identificador inexistente o expirado, rebanada u orden no válidos"""
+
+
+class _Handle:
+    __slots__ = ("columns", "rows", "metadata", "created_at", "expires_at", "size", "orders")
+
+    def __init__(self, columns: List[str], rows: List[Dict[str, Any]], metadata: Dict[str, Any],
+                 ttl: float, size: int):
+        self.columns = columns
+        self.rows = rows
+        self.metadata = metadata
+        self.created_at = datetime.now()
+        self.expires_at = time.monotonic() + ttl
+        self.size = size
+        self.orders: "OrderedDict[str, List[int]]" = OrderedDict()
+
+
+def parse_order(order_by: str, columns: List[str]) -> List[tuple]:
+    """'-retardo_minutos,nombre' -> [('retardo_minutos', True), ('nombre', False)]"""
+    keys = []
+    for part in order_by.split(","):
+        part = part.strip()
+        descending = part.startswith("-")
+        column = part.lstrip("+-").strip()
+        if column not in columns:
+            raise HandleError(f"Columna de orden desconocida: '{column}'. Columnas: {', '.join(columns)}")
+        keys.append((column, descending))
+    return keys
+
+
+def _sort_permutation(rows: List[Dict[str, Any]], keys: List[tuple]) -> List[int]:
+    """Posiciones de las filas en el orden pedido (NULL al final en ambos sentidos)"""
+    order = list(range(len(rows)))
+    # Ordenamientos estables de la última llave a la primera
+    for column, descending in reversed(keys):
+        present = [i for i in order if rows[i][column] is not None]
+        missing = [i for i in order if rows[i][column] is None]
+        present.sort(key=lambda i: rows[i][column], reverse=descending)
+        order = present + missing
+    return order
+
+
+class ResultHandleStore:
+    """LRU de resultados materializados, acotado por bytes y con expiración"""
+
+    def __init__(self, max_bytes: int = 256 * 1024 * 1024, ttl: float = 1800.0, max_slice_rows: int = 1000):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.max_slice_rows = max_slice_rows
+        self._handles: "OrderedDict[str, _Handle]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self._created = 0
+        self._slices = 0
+        self._sorts = 0
+        self._sort_hits = 0
+        self._misses = 0
+        self._expired = 0
+        self._evicted = 0
+        self._too_large = 0
+
+    def _drop(self, handle_id: str):
+        handle = self._handles.pop(handle_id)
+        self._bytes -= handle.size
+
+    def _evict(self):
+        while self._bytes > self.max_bytes and self._handles:
+            self._drop(next(iter(self._handles)))
+            self._evicted += 1
+
+    def _get(self, handle_id: str) -> _Handle:
+        """Buscar el resultado (con el lock tomado) y marcarlo como usado"""
+        handle = self._handles.get(handle_id)
+        if handle is not None and time.monotonic() >= handle.expires_at:
+            self._drop(handle_id)
+            self._expired += 1
+            handle = None
+        if handle is None:
+            self._misses += 1
+            raise HandleError(f"El resultado '{handle_id}' no existe o ya expiró; vuelva a ejecutar el análisis")
+        self._handles.move_to_end(handle_id)
+        return handle
+
+    def _describe(self, handle_id: str, handle: _Handle) -> Dict[str, Any]:
+        remaining = max(0.0, handle.expires_at - time.monotonic())
+        return {
+            "handle": handle_id,
+            "uri": f"result://{handle_id}",
+            "slice_uri": f"result://{handle_id}/{{offset}}/{{size}}",
+            "sorted_slice_uri": f"result://{handle_id}/{{offset}}/{{size}}/{{order_by}}",
+            "columns": handle.columns,
+            "row_count": len(handle.rows),
+            "bytes": handle.size,
+            "max_slice_rows": self.max_slice_rows,
+            "created_at": handle.created_at.isoformat(),
+            "expires_at": (datetime.now() + timedelta(seconds=remaining)).isoformat(),
+            **handle.metadata
+        }
+
+    def put(self, columns: List[str], rows: List[Dict[str, Any]], **metadata) -> Dict[str, Any]:
+        """Guardar un resultado serializado. Devuelve su descripción (handle, uri, filas, bytes)"""
+        size = estimate_size(columns) + estimate_size(rows)
+        if size > self.max_bytes:
+            with self._lock:
+                self._too_large += 1
+            raise HandleError(f"El resultado ({size} bytes) excede el presupuesto de resultados "
+                              f"materializados ({self.max_bytes} bytes)")
+        handle_id = secrets.token_hex(16)
+        handle = _Handle(columns, rows, metadata, self.ttl, size)
+        with self._lock:
+            self._handles[handle_id] = handle
+            self._bytes += size
+            self._created += 1
+            self._evict()
+            return self._describe(handle_id, handle)
+
+    def info(self, handle_id: str) -> Dict[str, Any]:
+        with self._lock:
+            return self._describe(handle_id, self._get(handle_id))
+
+    def slice(self, handle_id: str, offset: int, size: int, order_by: Optional[str] = None) -> Dict[str, Any]:
+        """Filas [offset, offset + size) del resultado, opcionalmente reordenado"""
+        if offset < 0 or size < 1:
+            raise HandleError("offset debe ser >= 0 y size >= 1")
+        size = min(size, self.max_slice_rows)
+        with self._lock:
+            handle = self._get(handle_id)
+            self._slices += 1
+            order = None
+            if order_by:
+                keys = parse_order(order_by, handle.columns)
+                canonical = ",".join(("-" if descending else "") + column for column, descending in keys)
+                order = handle.orders.get(canonical)
+                if order is None:
+                    # Se ordena con el lock tomado: el resultado ya está acotado por max_bytes
+                    order = _sort_permutation(handle.rows, keys)
+                    handle.orders[canonical] = order
+                    extra = len(order) * _PERMUTATION_ENTRY_BYTES
+                    handle.size += extra
+                    self._bytes += extra
+                    self._sorts += 1
+                    if len(handle.orders) > _MAX_ORDERS:
+                        _, dropped = handle.orders.popitem(last=False)
+                        handle.size -= len(dropped) * _PERMUTATION_ENTRY_BYTES
+                        self._bytes -= len(dropped) * _PERMUTATION_ENTRY_BYTES
+                    self._evict()
+                else:
+                    handle.orders.move_to_end(canonical)
+                    self._sort_hits += 1
+                order_by = canonical
+            positions = range(offset, min(offset + size, len(handle.rows)))
+            rows = [handle.rows[order[i] if order else i] for i in positions]
+            total = len(handle.rows)
+        next_offset = offset + len(rows)
+        return {
+            "handle": handle_id,
+            "columns": handle.columns,
+            "results": rows,
+            "row_count": len(rows),
+            "offset": offset,
+            "total_rows": total,
+            "order_by": order_by,
+            "next_uri": (f"result://{handle_id}/{next_offset}/{size}" + (f"/{order_by}" if order_by else "")
+                         if next_offset < total else None)
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "handles": len(self._handles),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "ttl": self.ttl,
+                "created": self._created,
+                "slices_served": self._slices,
+                "sorts_computed": self._sorts,
+                "sorts_reused": self._sort_hits,
+                "misses": self._misses,
+                "expired": self._expired,
+                "evicted": self._evicted,
+                "too_large": self._too_large
+            }
@@ -0,0 +1,217 @@
+# schema_cache.py
+"""
+Cache en memoria del esquema de cada base de datos.
+
+Tablas, columnas e índices se leen en bloque de information_schema (TABLES,
+COLUMNS y STATISTICS: tres consultas por base de datos, sin importar cuántas
+tablas haya) y se sirven desde memoria hasta que vence el TTL. Los conteos de
+filas son la estimación de information_schema.TABLE_ROWS; el COUNT(*) exacto
+queda a cargo de quien lo pida explícitamente.
+"""
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+_TABLES_SQL = """
+    SELECT TABLE_NAME, TABLE_TYPE, ENGINE, TABLE_ROWS, DATA_LENGTH, INDEX_LENGTH,
+           AUTO_INCREMENT, TABLE_COLLATION, CREATE_TIME, UPDATE_TIME, TABLE_COMMENT
+    FROM information_schema.TABLES
+    WHERE TABLE_SCHEMA = %s
+    ORDER BY TABLE_NAME
+"""
+_COLUMNS_SQL = """
+    SELECT TABLE_NAME, COLUMN_NAME, COLUMN_TYPE, DATA_TYPE, IS_NULLABLE, COLUMN_KEY,
+           COLUMN_DEFAULT, EXTRA
+    FROM information_schema.COLUMNS
+    WHERE TABLE_SCHEMA = %s
+    ORDER BY TABLE_NAME, ORDINAL_POSITION
+"""
+_STATISTICS_SQL = """
+    SELECT TABLE_NAME, INDEX_NAME, SEQ_IN_INDEX, COLUMN_NAME, NON_UNIQUE, CARDINALITY
+    FROM information_schema.STATISTICS
+    WHERE TABLE_SCHEMA = %s
+    ORDER BY TABLE_NAME, INDEX_NAME, SEQ_IN_INDEX
+"""
+
+
+def quote_identifier(name: str) -> str:
+    """Identificador entre backticks (duplicando los backticks internos)"""
+    return f"`{name.replace('`', '``')}`"
+
+
+def column_leads_index(indexes: List[Dict[str, Any]], column: str) -> bool:
+    """Si la columna es la primera de algún índice (MIN/MAX se resuelven con una búsqueda)"""
+    return any(idx["seq_in_index"] == 1 and idx["column_name"].lower() == column.lower() for idx in indexes)
+
+
+def _describe_default(value: Any) -> Any:
+    """
+    COLUMN_DEFAULT como lo muestra DESCRIBE. MariaDB 10.2.7+ entrecomilla los
+    literales y reporta un DEFAULT NULL explícito como el texto 'NULL'.
+    """
+    if not isinstance(value, str):
+        return value
+    if value == 'NULL':
+        return None
+    if len(value) >= 2 and value[0] == value[-1] == "'":
+        return value[1:-1].replace("''", "'")
+    return value
+
+
+class SchemaSnapshot:
+    """Esquema de una base de datos leído en un instante dado"""
+
+    def __init__(self, database: str, tables: "OrderedDict[str, Dict[str, Any]]",
+                 columns: Dict[str, List[Dict[str, Any]]], indexes: Dict[str, List[Dict[str, Any]]]):
+        self.database = database
+        self.tables = tables
+        self.columns = columns
+        self.indexes = indexes
+        self.loaded_at = datetime.now()
+        self.loaded_monotonic = time.monotonic()
+        # Búsqueda sin distinguir mayúsculas (lower_case_table_names varía por servidor)
+        self._by_lower = {name.lower(): name for name in tables}
+
+    def resolve(self, table: str) -> Optional[str]:
+        """Nombre real de la tabla, o None si no existe"""
+        if table in self.tables:
+            return table
+        return self._by_lower.get(table.lower())
+
+    def table_names(self) -> List[str]:
+        return list(self.tables)
+
+    def age_seconds(self) -> float:
+        return time.monotonic() - self.loaded_monotonic
+
+
+class SchemaCache:
+    """Esquemas por base de datos con TTL; una sola carga concurrente por base de datos"""
+
+    def __init__(self, ttl: float = 300.0, max_databases: int = 32, miss_refresh_after: float = 5.0):
+        self.ttl = ttl
+        self.max_databases = max_databases
+        # Una tabla desconocida fuerza recarga si el snapshot tiene al menos esta antigüedad
+        self.miss_refresh_after = miss_refresh_after
+        self._snapshots: "OrderedDict[str, SchemaSnapshot]" = OrderedDict()
+        self._load_locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+        self._hits = 0
+        self._loads = 0
+        self._load_seconds = 0.0
+
+    def _load_lock(self, database: str) -> threading.Lock:
+        with self._lock:
+            return self._load_locks.setdefault(database, threading.Lock())
+
+    def cached(self, database: str) -> Optional[SchemaSnapshot]:
+        """Snapshot vigente sin tocar la base de datos, o None"""
+        with self._lock:
+            snapshot = self._snapshots.get(database)
+            if snapshot is None or snapshot.age_seconds() >= self.ttl:
+                return None
+            self._snapshots.move_to_end(database)
+            self._hits += 1
+            return snapshot
+
+    def _load(self, cursor, database: str) -> SchemaSnapshot:
+        started = time.perf_counter()
+
+        cursor.execute(_TABLES_SQL, (database,))
+        tables: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        for (name, table_type, engine, rows, data_length, index_length, auto_increment,
+             collation, create_time, update_time, comment) in cursor.fetchall():
+            tables[name] = {
+                "name": name,
+                "type": table_type,
+                "engine": engine,
+                "rows_estimate": rows,
+                "data_length_bytes": data_length,
+                "index_length_bytes": index_length,
+                "auto_increment": auto_increment,
+                "collation": collation,
+                "create_time": create_time.isoformat() if create_time else None,
+                "update_time": update_time.isoformat() if update_time else None,
+                "comment": comment
+            }
+
+        cursor.execute(_COLUMNS_SQL, (database,))
+        columns: Dict[str, List[Dict[str, Any]]] = {}
+        for table, field, column_type, data_type, nullable, key, default, extra in cursor.fetchall():
+            columns.setdefault(table, []).append({
+                "field": field,
+                "type": column_type,
+                "data_type": (data_type or '').lower(),
+                "null": nullable,
+                "key": key,
+                "default": _describe_default(default),
+                "extra": extra
+            })
+
+        cursor.execute(_STATISTICS_SQL, (database,))
+        indexes: Dict[str, List[Dict[str, Any]]] = {}
+        for table, index_name, seq, column, non_unique, cardinality in cursor.fetchall():
+            indexes.setdefault(table, []).append({
+                "key_name": index_name,
+                "seq_in_index": seq,
+                "column_name": column,
+                "non_unique": non_unique,
+                "cardinality": cardinality
+            })
+
+        snapshot = SchemaSnapshot(database, tables, columns, indexes)
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self._snapshots[database] = snapshot
+            self._snapshots.move_to_end(database)
+            while len(self._snapshots) > self.max_databases:
+                self._snapshots.popitem(last=False)
+            self._loads += 1
+            self._load_seconds += elapsed
+        logger.debug(f"🗂️  Esquema de '{database}' cargado: {len(tables)} tablas en {elapsed * 1000:.1f} ms")
+        return snapshot
+
+    def get(self, cursor, database: str, refresh: bool = False) -> SchemaSnapshot:
+        """Snapshot del esquema; se carga con el cursor dado si no hay uno vigente"""
+        if not refresh:
+            snapshot = self.cached(database)
+            if snapshot is not None:
+                return snapshot
+        with self._load_lock(database):
+            # Otra llamada pudo cargarlo mientras se esperaba el candado
+            if not refresh:
+                snapshot = self.cached(database)
+                if snapshot is not None:
+                    return snapshot
+            return self._load(cursor, database)
+
+    def reload_on_miss(self, snapshot: SchemaSnapshot) -> bool:
+        """Si una tabla desconocida justifica recargar (pudo crearse después de la carga)"""
+        return snapshot.age_seconds() >= self.miss_refresh_after
+
+    def invalidate(self, database: Optional[str] = None):
+        with self._lock:
+            if database is None:
+                self._snapshots.clear()
+            else:
+                self._snapshots.pop(database, None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "databases": len(self._snapshots),
+                "ttl": self.ttl,
+                "hits": self._hits,
+                "loads": self._loads,
+                "avg_load_ms": round(self._load_seconds / self._loads * 1000, 2) if self._loads else 0.0,
+                "snapshots": {
+                    name: {"tables": len(s.tables), "age_seconds": round(s.age_seconds(), 1)}
+                    for name, s in self._snapshots.items()
+                }
+            }
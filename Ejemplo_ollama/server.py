@@ -1,10 +1,44 @@
 # server.py
 from mcp.server.fastmcp import FastMCP
 import pymysql
+import asyncio
+import fnmatch
 import json
 from datetime import datetime, timedelta
 from typing import Dict, List, Any, Optional
 import logging
+import functools
+import os
+import threading
+import time
+from contextlib import contextmanager
+from db_config import DB_CONFIG, SNAPSHOT_CONFIG
+from db_pool import PoolManager, CONNECTION_ERRORS, is_connection_lost, is_query_interrupted
+from db_topology import ReplicaRouter
+from db_executor import DatabaseExecutor, database_tool, current_execution
+from pagination import PaginationError, parse_order_by, fetch_page, strip_statement_end
+from result_cache import ResultCache, WatermarkTracker, ttl_for_query, normalize_sql
+from columnar import encode_columnar, RESULT_FORMATS
+from prepared_statements import PreparedStatementCache
+from sql_validator import validate_sql_query, parentheses_balanced, default_validator as sql_validator
+from cost_guard import CostGuard, CostRejected
+from sql_rewriter import rewrite_sargable
+from index_advisor import IndexAdvisor, WorkloadLog
+from attendance_rollup import AttendanceRollup
+from attendance_kpis import attendance_kpis
+from attendance_filters import build_attendance_filters
+from attendance_engine import AttendanceEngine, ANALYSES, RowLimitExceeded
+import attendance_scanner
+from snapshots import export_snapshot, open_snapshot, snapshot_directory, SnapshotError
+from sqlite_mirror import SqliteMirror
+from result_export import ExportStore, ExportError, EXPORT_FORMATS
+from result_handles import ResultHandleStore, HandleError
+from schema_cache import SchemaCache, quote_identifier, column_leads_index
+from table_profile import (numeric_columns, integer_primary_key, profile_exact, profile_sample,
+                           INTEGER_DATA_TYPES)
+from table_diff import ChunkedTableDiff, TableSide, query_both
+from distribution import (column_kind, time_of_day_spec, range_spec, value_sql_for, distribution_sql,
+                          summarize, TIME_BUCKETS)
 
 # Configurar logging mejorado
 logging.basicConfig(
@@ -44,76 +78,473 @@ def handle_mcp_errors(func):
 # Create an MCP server
 mcp = FastMCP("MariaDB_Analytics_Server")
 
-# Configuración de la base de datos
-DB_CONFIG = {
-    'host': '172.16.1.29',
-    'user': 'controla',
-    'password': 'controla',
-    'charset': 'utf8mb4',
-    'autocommit': True
+# Configuración del pool de conexiones (un pool por base de datos)
+POOL_CONFIG = {
+    'max_size': 5,              # Conexiones máximas por base de datos
+    'idle_timeout': 300,        # Segundos antes de cerrar una conexión inactiva
+    'checkout_timeout': 10,     # Segundos máximos esperando una conexión libre
+    'prune_interval': 60        # Segundos entre limpiezas de conexiones inactivas de los demás pools
 }
 
-def validate_sql_query(query: str) -> tuple[bool, str]:
-    """Validar consulta SQL para prevenir inyección y comandos peligrosos"""
-    query_upper = query.strip().upper()
-    
-    # Lista de comandos prohibidos (más específica)
-    forbidden_commands = [
-        'DROP', 'DELETE', 'UPDATE', 'INSERT', 'CREATE', 'ALTER', 
-        'TRUNCATE', 'GRANT', 'REVOKE', 'EXEC', 'EXECUTE', 'CALL',
-        'LOAD_FILE', 'INTO OUTFILE', 'INTO DUMPFILE'
-    ]
-    
-    # Patrones de UNION peligrosos (permite UNION en subconsultas legítimas)
-    dangerous_patterns = [
-        'UNION ALL SELECT', 'UNION SELECT', ') UNION', '/* UNION'
-    ]
-    
-    # Verificar comandos prohibidos
-    for cmd in forbidden_commands:
-        if cmd in query_upper:
-            return False, f"Comando prohibido detectado: {cmd}"
-    
-    # Verificar patrones peligrosos de UNION
-    for pattern in dangerous_patterns:
-        if pattern in query_upper:
-            return False, f"Patrón peligroso detectado: {pattern}"
-    
-    # Debe empezar con SELECT
-    if not query_upper.startswith('SELECT'):
-        return False, "Solo se permiten consultas SELECT"
-    
-    # Validar caracteres peligrosos específicos
-    dangerous_chars = [';', '--', 'xp_', 'sp_']
-    for char in dangerous_chars:
-        if char in query.lower():
-            return False, f"Caracter o patrón peligroso detectado: {char}"
-    
-    # Permitir comentarios SQL básicos pero no en posiciones peligrosas
-    if query.strip().endswith('--') or query.strip().startswith('--'):
-        return False, "Comentarios SQL en posiciones peligrosas no permitidos"
-    
-    return True, "Consulta válida"
+# Sentencias preparadas del servidor, cacheadas por conexión del pool mientras dura cada préstamo
+# (el pool reinicia la sesión al devolver la conexión y las olvida)
+prepared_statements = PreparedStatementCache(max_per_connection=32)
+
+db_pools = PoolManager(DB_CONFIG, on_session_reset=prepared_statements.forget, **POOL_CONFIG)
+
+# Réplicas de lectura: las herramientas de 'staleness' se envían a la réplica sana con
+# menos conexiones en uso y retraso (Seconds_Behind_Master) dentro del presupuesto;
+# si ninguna califica o falla la conexión se usa el primario (DB_CONFIG)
+REPLICA_CONFIG = {
+    'replicas': [
+        # {'name': 'replica1', 'host': '172.16.1.30'},   # Usuario, contraseña y charset de DB_CONFIG
+    ],
+    'staleness': {              # Retraso máximo aceptado por herramienta (segundos)
+        'execute_query': 30,
+        'execute_attendance_analysis': 60,
+        'create_attendance_kpis': 300,
+        'get_database_overview': 600,
+        'analyze_data_distribution': 600
+    },
+    'lag_check_interval': 5,    # Segundos entre mediciones de retraso de cada réplica
+    'retry_interval': 30        # Segundos fuera de servicio tras un error de conexión
+}
+
+replica_router = ReplicaRouter(
+    db_pools,
+    {replica['name']: PoolManager({**DB_CONFIG, 'connect_timeout': 5,
+                                   **{k: v for k, v in replica.items() if k != 'name'}},
+                                  on_session_reset=prepared_statements.forget, **POOL_CONFIG)
+     for replica in REPLICA_CONFIG['replicas']},
+    REPLICA_CONFIG['staleness'], REPLICA_CONFIG['lag_check_interval'], REPLICA_CONFIG['retry_interval']
+)
+
+# Ejecución asíncrona: las herramientas corren en un pool de hilos para no
+# bloquear el event loop. per_database_limit no debe superar POOL_CONFIG['max_size']
+ASYNC_CONFIG = {
+    'enabled': True,            # False ejecuta las herramientas en línea (modo síncrono)
+    'max_workers': 8,           # Hilos totales para consultas
+    'per_database_limit': 4     # Consultas simultáneas por base de datos
+}
+
+# Tiempo límite por herramienta: se aplica como max_statement_time a cada sesión
+# que use la herramienta y como deadline asíncrono (más 'grace'); al vencer, o si
+# el cliente cancela la solicitud, se envía KILL QUERY desde una conexión aparte
+TIMEOUT_CONFIG = {
+    'default': 30,              # Segundos para herramientas sin límite propio
+    'grace': 2,                 # Margen del deadline asíncrono sobre el límite por sentencia
+    'tools': {
+        'list_databases': 10,
+        'test_connection': 10,
+        'get_server_status': 10,
+        'execute_query': 30,
+        'get_table_metrics': 60,
+        'get_database_overview': 60,
+        'compare_tables': 300,
+        'analyze_data_distribution': 60,
+        'execute_attendance_analysis': 60,
+        'validate_attendance_data': 300,
+        'create_attendance_kpis': 120,
+        'get_weekly_attendance_summary': 120,
+        'refresh_attendance_rollup': 300,
+        'export_attendance_snapshot': 600,
+        'sync_mirror': 600,
+        'export_query': 600,
+        'suggest_indexes': 180
+    }
+}
+
+db_executor = DatabaseExecutor(
+    **ASYNC_CONFIG,
+    tool_timeouts=TIMEOUT_CONFIG['tools'],
+    default_timeout=TIMEOUT_CONFIG['default'],
+    timeout_grace=TIMEOUT_CONFIG['grace'],
+    on_cancel=replica_router.kill_queries
+)
+
+# Cache de resultados de lectura para execute_query y execute_attendance_analysis
+CACHE_CONFIG = {
+    'enabled': True,
+    'max_bytes': 64 * 1024 * 1024,  # Presupuesto total en bytes (LRU)
+    'default_ttl': 300,             # Segundos; las consultas con CURDATE() expiran a medianoche
+    'watermark_refresh': 5,         # Segundos entre lecturas de la marca de agua
+    'watermark_tables': {           # Tabla -> columna cuyo MAX() invalida el cache
+        'core_registro': 'id'
+    }
+}
+
+result_cache = ResultCache(CACHE_CONFIG['max_bytes'], CACHE_CONFIG['default_ttl'])
+watermarks = WatermarkTracker(CACHE_CONFIG['watermark_tables'], CACHE_CONFIG['watermark_refresh'])
+
+# Guardia de costo para execute_query: EXPLAIN antes de ejecutar SQL del LLM
+COST_GUARD_CONFIG = {
+    'enabled': True,
+    'warn_rows': 100_000,               # Filas examinadas estimadas a partir de las cuales se advierte
+    'reject_rows': 5_000_000,           # ... y a partir de las cuales se rechaza
+    'guarded_tables': ['core_registro'],
+    'full_scan_action': 'rewrite',      # Recorrido completo de una tabla vigilada: 'reject' | 'warn' | 'rewrite'
+    'verdict_ttl': 300                  # Segundos que se reutiliza el veredicto de una misma consulta
+}
+
+cost_guard = CostGuard(**{k: v for k, v in COST_GUARD_CONFIG.items() if k != 'enabled'})
+
+# Reescritura previa de predicados de fecha no sargables en execute_query
+# (DATE(tiempo) = CURDATE() -> rango semiabierto sobre tiempo), se aplique o no la guardia
+SQL_REWRITE_CONFIG = {
+    'enabled': True
+}
+
+# Asesor de índices: registra la carga real y mide sugerencias en una instancia de prueba
+INDEX_ADVISOR_CONFIG = {
+    'workload_log_size': 500,       # Consultas distintas que se recuerdan (LRU)
+    'max_index_columns': 5,
+    'max_covering_columns': 6,
+    # Instancia donde se crean los índices para medir EXPLAIN antes/después; nunca la de
+    # producción. Ejemplo: {'host': 'localhost', 'user': 'root', 'password': '', 'database': 'zapopan_prueba'}
+    'test_instance': None
+}
+
+workload_log = WorkloadLog(INDEX_ADVISOR_CONFIG['workload_log_size'])
+index_advisor = IndexAdvisor(INDEX_ADVISOR_CONFIG['max_index_columns'], INDEX_ADVISOR_CONFIG['max_covering_columns'])
+
+# Cache del esquema (information_schema en bloque) para list_tables, describe_table y el resumen
+SCHEMA_CACHE_CONFIG = {
+    'ttl': 300,                 # Segundos que se sirve el esquema desde memoria
+    'max_databases': 32,
+    'miss_refresh_after': 5     # Una tabla desconocida recarga el esquema si tiene al menos esta antigüedad
+}
+
+schema_cache = SchemaCache(**SCHEMA_CACHE_CONFIG)
+
+# Perfil de get_table_metrics: exacto (una sentencia agregada) o muestreado por rango de la clave primaria
+TABLE_METRICS_CONFIG = {
+    'sample_rows': 20_000,          # Filas leídas por defecto en modo muestreado
+    'max_sample_rows': 200_000,
+    'sample_chunks': 20             # Trozos contiguos de la clave, uno por estrato del rango
+}
+
+# Distribución de analyze_data_distribution (una pasada agrupando por cubetas finas)
+DISTRIBUTION_CONFIG = {
+    'max_bins': 200,
+    'fine_buckets_per_bin': 100     # Resolución de los percentiles: ancho de cubeta / este valor
+}
+
+# Resumen diario por usuario (SQLite local) del que leen los KPIs y el resumen semanal
+ROLLUP_CONFIG = {
+    'path': 'attendance_rollup.sqlite3',
+    'late_threshold': '08:10:00',   # Primera entrada después de esta hora = retardo
+    'morning_cutoff': '12:00:00',   # El resumen semanal solo cuenta primeras entradas antes de esta hora
+    'batch_ids': 200_000,           # Rango de ids agregado por sentencia al actualizar
+    'refresh_interval': 5           # Segundos mínimos entre revisiones de la marca de agua
+}
 
+attendance_rollup = AttendanceRollup(ROLLUP_CONFIG['path'], ROLLUP_CONFIG['late_threshold'],
+                                     ROLLUP_CONFIG['batch_ids'], ROLLUP_CONFIG['refresh_interval'])
+
+# Motor en memoria (NumPy) de execute_attendance_analysis
+ANALYTICS_ENGINE_CONFIG = {
+    'default_engine': 'sql',            # 'sql' | 'numpy' (pedir engine='numpy' con date_from/date_to acotados)
+    'max_bytes': 512 * 1024 * 1024,     # Memoria máxima de los rangos cargados (LRU)
+    'max_rows': 5_000_000,              # Registros máximos de un rango (se cuentan antes de cargar); si no, SQL
+    'refresh_interval': 5,              # Segundos mínimos entre revisiones de MAX(id)
+    'ttl': 900,                         # Segundos que vive un rango antes de recargarse completo
+    'batch_rows': 50_000                # Filas por fetchmany al cargar
+}
+
+attendance_engine = AttendanceEngine(ANALYTICS_ENGINE_CONFIG['max_bytes'], ANALYTICS_ENGINE_CONFIG['max_rows'],
+                                     ANALYTICS_ENGINE_CONFIG['refresh_interval'], ANALYTICS_ENGINE_CONFIG['ttl'],
+                                     ANALYTICS_ENGINE_CONFIG['batch_rows'])
+ANALYSIS_ENGINES = ("numpy", "sql", "snapshot")
+
+# Una exportación a la vez: comparten el directorio y los diccionarios
+snapshot_export_lock = threading.Lock()
+
+# Espejo SQLite local de solo lectura (backend="mirror" en las herramientas de análisis)
+MIRROR_CONFIG = {
+    'directory': 'mirror',                          # Un archivo BASE.sqlite3 por base de datos
+    'tables': ['core_registro', 'core_usuario'],    # Tablas copiadas (requieren columna id)
+    'indexes': {'core_registro': [('tiempo',), ('usuario_id', 'tiempo')]},
+    'batch_rows': 50_000,                           # Filas por lote leído de MariaDB
+    'commit_rows': 500_000,                         # Filas por transacción en SQLite
+    'sync_interval': 60                             # Las lecturas con backend="mirror" sincronizan antes si
+                                                    # pasaron estos segundos (0 = solo con sync_mirror)
+}
+
+sqlite_mirror = SqliteMirror(MIRROR_CONFIG['directory'], MIRROR_CONFIG['tables'], MIRROR_CONFIG['indexes'],
+                             MIRROR_CONFIG['batch_rows'], MIRROR_CONFIG['commit_rows'], MIRROR_CONFIG['sync_interval'])
+BACKENDS = ("mariadb", "mirror")
+
+# Resultados materializados de execute_attendance_analysis(materialize=True), leídos por
+# rebanadas con el recurso result://ID/OFFSET/SIZE (result_handles.py)
+RESULT_HANDLE_CONFIG = {
+    'max_bytes': 256 * 1024 * 1024,     # Presupuesto total; se desalojan los menos usados
+    'ttl': 1800,                        # Segundos de vida de cada resultado
+    'max_slice_rows': 1000              # Filas máximas por rebanada
+}
+
+result_handles = ResultHandleStore(RESULT_HANDLE_CONFIG['max_bytes'], RESULT_HANDLE_CONFIG['ttl'],
+                                   RESULT_HANDLE_CONFIG['max_slice_rows'])
+
+# Exportación de resultados a disco (export_query, result_export.py)
+EXPORT_CONFIG = {
+    'directory': 'exports',     # ID.csv.gz / ID.ndjson.gz más ID.json con los metadatos
+    'batch_rows': 10_000,       # Filas por fetchmany: acota la memoria de la exportación
+    'compresslevel': 6,         # Nivel de gzip (1 = más rápido, 9 = más compacto)
+    'retention_hours': 24       # Las exportaciones más antiguas se eliminan
+}
+
+export_store = ExportStore(EXPORT_CONFIG['directory'], EXPORT_CONFIG['retention_hours'])
+
+# Análisis en varias bases de datos (execute_attendance_analysis_multi)
+FANOUT_CONFIG = {
+    'max_concurrency': 4,       # Bases consultadas a la vez, en total entre todas las llamadas
+    'max_databases': 100,       # Bases máximas por llamada
+    'deadline': 120,            # Segundos para toda la llamada; las bases sin terminar van a 'failed'
+    'engine': 'sql'             # Motor por defecto: con 'numpy' cada sitio desplazaría a los demás del LRU
+}
+
+fanout_semaphore = asyncio.Semaphore(FANOUT_CONFIG['max_concurrency'])
+SYSTEM_DATABASES = ("information_schema", "mysql", "performance_schema", "sys")
+
+# Modo 'data' de compare_tables: sumas de verificación por trozos de la clave primaria
+COMPARE_CONFIG = {
+    'chunk_size': 100_000,      # Claves por trozo en el nivel superior
+    'fanout': 16,               # Subtrozos al bajar en un trozo con diferencias
+    'leaf_rows': 512,           # Por debajo de esta cantidad de claves se compara fila por fila
+    'max_differences': 100
+}
+
+@contextmanager
 def get_db_connection(database: str = None):
-    """Crear conexión a la base de datos"""
-    config = DB_CONFIG.copy()
+    """Obtener una conexión del pool de la base de datos (se devuelve al salir del with)
+
+    Dentro de una herramienta con presupuesto en REPLICA_CONFIG['staleness'] la conexión
+    puede venir de una réplica; en otro caso siempre del primario.
+    """
     if database:
-        config['database'] = database
-        logger.debug(f"Conectando a base de datos específica: {database}")
+        logger.debug(f"Solicitando conexión del pool para base de datos: {database}")
     else:
-        logger.debug("Conectando a servidor MariaDB sin seleccionar base de datos")
+        logger.debug("Solicitando conexión del pool del servidor MariaDB sin seleccionar base de datos")
     
+    execution = current_execution()
     try:
-        connection = pymysql.connect(**config)
-        logger.debug(f"✅ Conexión exitosa a {config['host']}")
-        return connection
+        node, pool, connection = replica_router.acquire(database, execution.tool if execution else None)
     except Exception as e:
-        logger.error(f"❌ Error conectando a base de datos {config['host']}: {e}")
+        logger.error(f"❌ Error conectando a base de datos {DB_CONFIG['host']}: {e}")
         raise
+    
+    # Límite por sentencia de la herramienta en curso y registro para KILL QUERY
+    session = None
+    discard = False
+    try:
+        if execution:
+            session = (node, connection.thread_id())
+            execution.register(session)
+        pool.set_statement_timeout(connection, execution.statement_timeout if execution else None)
+        yield connection
+    except CONNECTION_ERRORS as e:
+        # Solo se descarta la conexión si se perdió; un error de la sentencia la deja sana
+        discard = is_connection_lost(e)
+        if is_query_interrupted(e):
+            logger.warning(f"⏱️  Sentencia interrumpida en base de datos '{database}' ({node}): {e}")
+        raise
+    finally:
+        if session is not None:
+            execution.unregister(session)
+        pool.release(connection, discard=discard)
+
+
+def refresh_mirror(database: str):
+    """
+    Sincronización oportunista antes de leer el espejo: como máximo una cada sync_interval
+    segundos, sin esperar a otra en curso. Si MariaDB no responde se leen los datos de la
+    última sincronización.
+    """
+    if not sqlite_mirror.is_stale(database) or not sqlite_mirror.exists(database):
+        return
+    try:
+        with get_db_connection(database) as conn:
+            with conn.cursor() as cursor:
+                sqlite_mirror.sync(cursor, database, wait=False)
+    except Exception as e:
+        logger.warning(f"⚠️  No se pudo sincronizar el espejo de '{database}'; se leen los datos anteriores: {e}")
+
+
+@contextmanager
+def get_backend_connection(database: str, backend: str = "mariadb"):
+    """Conexión a MariaDB (pool) o al espejo SQLite local de solo lectura, con la misma interfaz"""
+    if backend == "mirror":
+        refresh_mirror(database)
+        with sqlite_mirror.connect(database) as connection:
+            yield connection
+    else:
+        with get_db_connection(database) as connection:
+            yield connection
+
+
+def backend_scope(database: str, backend: str) -> str:
+    """Llave de la base en los caches: los resultados del espejo no se mezclan con los de MariaDB"""
+    return f"mirror:{database}" if backend == "mirror" else database
+
+
+def invalid_backend_error(backend: str) -> Optional[Dict[str, Any]]:
+    if backend not in BACKENDS:
+        return {
+            "success": False,
+            "error": f"Backend no válido: '{backend}'. Opciones: {', '.join(BACKENDS)}",
+            "timestamp": datetime.now().isoformat()
+        }
+    return None
+
+
+def get_schema(database: str, refresh: bool = False):
+    """Esquema de la base de datos desde el cache; solo toma una conexión si hay que cargarlo"""
+    snapshot = None if refresh else schema_cache.cached(database)
+    if snapshot is None:
+        with get_db_connection(database) as conn:
+            with conn.cursor() as cursor:
+                snapshot = schema_cache.get(cursor, database, refresh)
+    return snapshot
+
+
+def resolve_table(database: str, table: str, refresh: bool = False):
+    """(esquema, nombre real de la tabla o None); una tabla desconocida recarga el esquema una vez"""
+    snapshot = get_schema(database, refresh)
+    name = snapshot.resolve(table)
+    if name is None and not refresh and schema_cache.reload_on_miss(snapshot):
+        snapshot = get_schema(database, refresh=True)
+        name = snapshot.resolve(table)
+    return snapshot, name
+
+
+def serialize_rows(columns: List[str], rows) -> List[Dict[str, Any]]:
+    """Convertir filas de pymysql a diccionarios JSON serializables"""
+    results = []
+    for row in rows:
+        row_dict = {}
+        for i, col in enumerate(columns):
+            value = row[i]
+            if isinstance(value, datetime):
+                value = value.isoformat()
+            elif hasattr(value, 'isoformat'):  # Para dates, times, etc.
+                value = value.isoformat()
+            row_dict[col] = value
+        results.append(row_dict)
+    return results
+
+
+def run_cached_select(cursor, database: str, sql: str, params: list = None, execute=None):
+    """
+    Ejecutar un SELECT usando el cache de resultados. Devuelve (columnas, filas, desde_cache)
+    
+    execute: Función (sql, params) que ejecuta en el cursor; por defecto cursor.execute
+    """
+    execute = execute or cursor.execute
+    ttl = ttl_for_query(sql, CACHE_CONFIG['default_ttl']) if CACHE_CONFIG['enabled'] else None
+    if ttl is None:
+        if CACHE_CONFIG['enabled']:
+            result_cache.record_uncacheable()
+        execute(sql, params)
+        return [desc[0] for desc in cursor.description], cursor.fetchall(), False
+    
+    key = result_cache.make_key(database, sql, params)
+    watermark = watermarks.current(cursor, database, sql)
+    cached = result_cache.get(key, watermark)
+    if cached is not None:
+        logger.debug(f"⚡ Resultado servido desde cache para '{database}'")
+        return cached[0], cached[1], True
+    
+    execute(sql, params)
+    columns = [desc[0] for desc in cursor.description]
+    rows = cursor.fetchall()
+    result_cache.put(key, (columns, rows), ttl, watermark)
+    return columns, rows, False
+
+
+def rewrite_query(query: str):
+    """Reescribir predicados de fecha envueltos en funciones. Devuelve (consulta, reescrituras)"""
+    if not SQL_REWRITE_CONFIG['enabled']:
+        return query, []
+    rewritten, rewrites = rewrite_sargable(query)
+    if rewrites:
+        logger.info(f"🔧 Predicados reescritos a rangos: {'; '.join(rewrites)}")
+    return rewritten, rewrites
+
+
+def guard_query_cost(cursor, database: str, query: str, backend: str = "mariadb", params: list = None):
+    """
+    Pasar la consulta por la guardia de costo. Devuelve (consulta a ejecutar, veredicto)
+    
+    El veredicto es None si la guardia está desactivada o la consulta va al espejo local
+    (la guardia usa EXPLAIN de MariaDB); si action es 'rewrite' la consulta devuelta es la reescrita.
+    """
+    if not COST_GUARD_CONFIG['enabled'] or backend == "mirror":
+        return query, None
+    verdict = cost_guard.check(cursor, database, query, params)
+    if verdict["action"] in ("warn", "rewrite", "reject"):
+        logger.warning(f"💸 Guardia de costo ({verdict['action']}) en '{database}': {'; '.join(verdict['reasons'])}")
+    summary = {k: verdict[k] for k in ("action", "estimated_rows", "full_scans", "reasons", "rewrites")}
+    return verdict["query"], summary
+
+
+def execute_filtered(cursor, sql: str):
+    """
+    Ejecutar una sentencia armada con un filtro del usuario validándola completa:
+    el mismo filtro se inserta en formas de sentencia distintas.
+    """
+    is_valid, message = validate_sql_query(sql)
+    if not is_valid:
+        raise ValueError(f"Filtro no válido: {message}")
+    cursor.execute(sql)
+
+
+def cost_rejection_error(database: str, query: str, verdict: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "success": False,
+        "error": f"Consulta rechazada por costo estimado: {'; '.join(verdict['reasons'])}",
+        "database": database,
+        "query": query,
+        "cost_guard": verdict,
+        "timestamp": datetime.now().isoformat()
+    }
+
+
+def apply_result_format(response: Dict[str, Any], format: str, dictionary_encode: bool = True) -> Dict[str, Any]:
+    """Reemplazar 'results' por su versión columnar cuando se pide format='columnar'"""
+    if format == "columnar":
+        results = response.pop("results")
+        response["columnar"] = encode_columnar(response["columns"], results, dictionary_encode)
+    response["format"] = format
+    return response
+
+
+def invalid_format_error(format: str) -> Optional[Dict[str, Any]]:
+    if format not in RESULT_FORMATS:
+        return {
+            "success": False,
+            "error": f"Formato no válido: '{format}'. Opciones: {', '.join(RESULT_FORMATS)}",
+            "timestamp": datetime.now().isoformat()
+        }
+    return None
+
+
+# Tamaño de página por defecto cuando se pide paginación sin page_size
+DEFAULT_PAGE_SIZE = 100
+
+
+def fetch_keyset_page(cursor, database: str, base_query: str, keyset, page_size: int = None,
+                      continuation_token: str = None, base_params: list = None, execute=None,
+                      tiebreaker: str = None, guard=None):
+    """Ejecutar una página de base_query ordenada por keyset (con cache) y generar el token de la siguiente"""
+    return fetch_page(
+        lambda sql, params: run_cached_select(cursor, database, sql, params, execute),
+        database, base_query, keyset, page_size, continuation_token, base_params, tiebreaker, DEFAULT_PAGE_SIZE,
+        guard
+    )
 
 
 @mcp.tool()
+@database_tool(db_executor)
 def list_databases() -> Dict[str, Any]:
     """Listar todas las bases de datos disponibles en el servidor MariaDB"""
     try:
@@ -136,20 +567,24 @@ def list_databases() -> Dict[str, Any]:
 
 
 @mcp.tool()
-def list_tables(database: str) -> Dict[str, Any]:
-    """Listar todas las tablas en una base de datos específica"""
+@database_tool(db_executor)
+def list_tables(database: str, refresh: bool = False) -> Dict[str, Any]:
+    """
+    Listar todas las tablas en una base de datos específica.
+    
+    refresh: Volver a leer el esquema en lugar de usar el cache
+    """
     try:
-        with get_db_connection(database) as conn:
-            with conn.cursor() as cursor:
-                cursor.execute("SHOW TABLES")
-                tables = [row[0] for row in cursor.fetchall()]
-                return {
-                    "success": True,
-                    "database": database,
-                    "tables": tables,
-                    "count": len(tables),
-                    "timestamp": datetime.now().isoformat()
-                }
+        snapshot = get_schema(database, refresh)
+        tables = snapshot.table_names()
+        return {
+            "success": True,
+            "database": database,
+            "tables": tables,
+            "count": len(tables),
+            "schema_loaded_at": snapshot.loaded_at.isoformat(),
+            "timestamp": datetime.now().isoformat()
+        }
     except Exception as e:
         return {
             "success": False,
@@ -160,30 +595,36 @@ def list_tables(database: str) -> Dict[str, Any]:
 
 
 @mcp.tool()
-def describe_table(database: str, table: str) -> Dict[str, Any]:
-    """Obtener la estructura de una tabla específica"""
+@database_tool(db_executor)
+def describe_table(database: str, table: str, refresh: bool = False) -> Dict[str, Any]:
+    """
+    Obtener la estructura de una tabla específica.
+    
+    refresh: Volver a leer el esquema en lugar de usar el cache
+    """
     try:
-        with get_db_connection(database) as conn:
-            with conn.cursor() as cursor:
-                cursor.execute(f"DESCRIBE {table}")
-                columns = []
-                for row in cursor.fetchall():
-                    columns.append({
-                        "field": row[0],
-                        "type": row[1],
-                        "null": row[2],
-                        "key": row[3],
-                        "default": row[4],
-                        "extra": row[5]
-                    })
-                return {
-                    "success": True,
-                    "database": database,
-                    "table": table,
-                    "columns": columns,
-                    "column_count": len(columns),
-                    "timestamp": datetime.now().isoformat()
-                }
+        snapshot, name = resolve_table(database, table, refresh)
+        if name is None:
+            return {
+                "success": False,
+                "error": f"La tabla '{table}' no existe en la base de datos '{database}'",
+                "database": database,
+                "table": table,
+                "timestamp": datetime.now().isoformat()
+            }
+        columns = [
+            {key: column[key] for key in ("field", "type", "null", "key", "default", "extra")}
+            for column in snapshot.columns.get(name, [])
+        ]
+        return {
+            "success": True,
+            "database": database,
+            "table": name,
+            "columns": columns,
+            "column_count": len(columns),
+            "schema_loaded_at": snapshot.loaded_at.isoformat(),
+            "timestamp": datetime.now().isoformat()
+        }
     except Exception as e:
         return {
             "success": False,
@@ -195,10 +636,35 @@ def describe_table(database: str, table: str) -> Dict[str, Any]:
 
 
 @mcp.tool()
-def execute_query(database: str, query: str, limit: int = 100) -> Dict[str, Any]:
-    """Ejecutar una consulta SELECT en la base de datos con límite de resultados"""
+@database_tool(db_executor)
+def execute_query(database: str, query: str, limit: int = 100, page_size: int = None, continuation_token: str = None,
+                  format: str = "rows", dictionary_encode: bool = True, backend: str = "mariadb",
+                  params: List[Any] = None) -> Dict[str, Any]:
+    """
+    Ejecutar una consulta SELECT en la base de datos con límite de resultados.
+    
+    params: Valores de los placeholders %s de la consulta, p. ej. la consulta y los
+            'params' que devuelve generate_attendance_query (un '%' literal va como '%%')
+    page_size: Activa la paginación por keyset (columnas del ORDER BY, o id si no hay ORDER BY;
+               sin ORDER BY ni columna id en el resultado se devuelve un error)
+    continuation_token: Token devuelto por la página anterior para obtener la siguiente
+    format: 'rows' (lista de objetos) o 'columnar' (columnas + arreglos de valores por columna)
+    dictionary_encode: En formato columnar, codificar con diccionario las columnas de baja cardinalidad
+    backend: 'mariadb' o 'mirror' (espejo SQLite local de core_registro y core_usuario, ver sync_mirror)
+    
+    Los predicados de fecha envueltos en funciones (DATE(tiempo) = CURDATE(), YEAR(...))
+    se reescriben a rangos sobre la columna; se listan en 'rewrites'. Después la
+    consulta pasa por la guardia de costo (EXPLAIN): puede rechazarse o reescribirse;
+    el veredicto se devuelve en 'cost_guard'.
+    """
     logger.info(f"🔍 Ejecutando consulta en base de datos '{database}': {query[:100]}...")
+    started = time.perf_counter()
     try:
+        format_error = invalid_format_error(format) or invalid_backend_error(backend)
+        if format_error:
+            return format_error
+        scope = backend_scope(database, backend)
+        
         # Validación de seguridad SQL
         is_valid, validation_msg = validate_sql_query(query)
         if not is_valid:
@@ -208,6 +674,57 @@ def execute_query(database: str, query: str, limit: int = 100) -> Dict[str, Any]
                 "error": f"Consulta rechazada por seguridad: {validation_msg}",
                 "timestamp": datetime.now().isoformat()
             }
+        # El validador admite un ';' final; se quita para poder envolver o agregar LIMIT
+        query = strip_statement_end(query)
+        original_query = query
+        query, rewrites = rewrite_query(query)
+        # Sin placeholders se envía None: pymysql no interpreta los '%' de la consulta
+        params = list(params) if params else None
+        
+        if page_size or continuation_token:
+            # Paginación por keyset: la consulta se envuelve y se continúa desde la última clave
+            # Sin ORDER BY se pagina por id; si el resultado no tiene id, fetch_page pide un ORDER BY
+            keyset = parse_order_by(query)
+            with get_backend_connection(database, backend) as conn:
+                with conn.cursor() as cursor:
+                    # La guardia evalúa la consulta de la página (con su keyset y LIMIT), que es
+                    # la que se ejecuta; la consulta base sin acotar casi siempre se rechazaría
+                    verdicts = []
+
+                    def guard_page(sql, params):
+                        guarded, verdict = guard_query_cost(cursor, database, sql, backend, params)
+                        if verdict and verdict["action"] == "reject":
+                            raise CostRejected(dict(verdict, query=guarded))
+                        verdicts.append(verdict)
+                        return guarded
+
+                    try:
+                        columns, rows, pagination, executed = fetch_keyset_page(
+                            cursor, scope, query, keyset, page_size, continuation_token, base_params=params,
+                            tiebreaker="id", guard=guard_page
+                        )
+                    except CostRejected as e:
+                        return cost_rejection_error(database, e.verdict.pop("query"), e.verdict)
+                    verdict = verdicts[-1] if verdicts else None
+                    if backend == "mariadb":
+                        workload_log.record(database, "execute_query", query, params,
+                                            elapsed_ms=(time.perf_counter() - started) * 1000)
+                    results = serialize_rows(columns, rows)
+                    return apply_result_format({
+                        "success": True,
+                        "database": database,
+                        "query": executed,
+                        "params": params,
+                        "columns": columns,
+                        "results": results,
+                        "row_count": len(results),
+                        "pagination": pagination,
+                        "backend": backend,
+                        "rewrites": rewrites,
+                        "original_query": original_query if rewrites else None,
+                        "cost_guard": verdict,
+                        "timestamp": datetime.now().isoformat()
+                    }, format, dictionary_encode)
         
         # Agregar LIMIT si no existe (detección mejorada)
         query_clean = query.strip()
@@ -230,34 +747,34 @@ def execute_query(database: str, query: str, limit: int = 100) -> Dict[str, Any]
         if not has_limit:
             query += f" LIMIT {limit}"
         
-        with get_db_connection(database) as conn:
+        with get_backend_connection(database, backend) as conn:
             with conn.cursor() as cursor:
-                cursor.execute(query)
-                columns = [desc[0] for desc in cursor.description]
-                rows = cursor.fetchall()
+                query, verdict = guard_query_cost(cursor, database, query, backend, params)
+                if verdict and verdict["action"] == "reject":
+                    return cost_rejection_error(database, query, verdict)
+                columns, rows, from_cache = run_cached_select(cursor, scope, query, params)
+                if backend == "mariadb":
+                    workload_log.record(database, "execute_query", query, params,
+                                        elapsed_ms=(time.perf_counter() - started) * 1000)
                 
                 # Convertir resultados a formato JSON serializable
-                results = []
-                for row in rows:
-                    row_dict = {}
-                    for i, col in enumerate(columns):
-                        value = row[i]
-                        if isinstance(value, datetime):
-                            value = value.isoformat()
-                        elif hasattr(value, 'isoformat'):  # Para dates, times, etc.
-                            value = value.isoformat()
-                        row_dict[col] = value
-                    results.append(row_dict)
+                results = serialize_rows(columns, rows)
                 
-                return {
+                return apply_result_format({
                     "success": True,
                     "database": database,
                     "query": query,
+                    "params": params,
                     "columns": columns,
                     "results": results,
                     "row_count": len(results),
+                    "from_cache": from_cache,
+                    "backend": backend,
+                    "rewrites": rewrites,
+                    "original_query": original_query if rewrites else None,
+                    "cost_guard": verdict,
                     "timestamp": datetime.now().isoformat()
-                }
+                }, format, dictionary_encode)
     except Exception as e:
         return {
             "success": False,
@@ -269,6 +786,7 @@ def execute_query(database: str, query: str, limit: int = 100) -> Dict[str, Any]
 
 
 @mcp.tool()
+@database_tool(db_executor)
 def test_connection() -> Dict[str, Any]:
     """Probar la conexión a la base de datos MariaDB"""
     logger.info("🔍 Probando conexión a la base de datos MariaDB")
@@ -301,69 +819,90 @@ def test_connection() -> Dict[str, Any]:
 
 
 @mcp.tool()
-def get_table_metrics(database: str, table: str) -> Dict[str, Any]:
-    """Obtener métricas completas de una tabla"""
+@database_tool(db_executor)
+def get_table_metrics(database: str, table: str, sample: bool = False, sample_rows: int = None,
+                      confidence: float = 0.95) -> Dict[str, Any]:
+    """
+    Obtener métricas completas de una tabla.
+    
+    Las columnas numéricas se perfilan en una sola sentencia agregada junto con el conteo.
+    sample: Estimar a partir de trozos aleatorios del rango de la clave primaria (requiere
+            clave primaria entera) en lugar de recorrer toda la tabla
+    sample_rows: Filas a leer en modo muestreado (por defecto TABLE_METRICS_CONFIG['sample_rows'])
+    confidence: Nivel de confianza de los márgenes de error del modo muestreado
+    """
     try:
+        if sample_rows is not None and sample_rows < 1:
+            return {
+                "success": False,
+                "error": f"sample_rows debe ser al menos 1, no {sample_rows}",
+                "database": database,
+                "table": table,
+                "timestamp": datetime.now().isoformat()
+            }
+        if not 0 < confidence < 1:
+            return {
+                "success": False,
+                "error": f"confidence debe estar entre 0 y 1 (exclusivo), no {confidence}",
+                "database": database,
+                "table": table,
+                "timestamp": datetime.now().isoformat()
+            }
+        snapshot, name = resolve_table(database, table)
+        if name is None:
+            return {
+                "success": False,
+                "error": f"La tabla '{table}' no existe en la base de datos '{database}'",
+                "database": database,
+                "table": table,
+                "timestamp": datetime.now().isoformat()
+            }
+        info = snapshot.tables[name]
+        columns = snapshot.columns.get(name, [])
+        indexes = snapshot.indexes.get(name, [])
+        numeric = numeric_columns(columns)
+
+        sample_rows = min(sample_rows or TABLE_METRICS_CONFIG['sample_rows'], TABLE_METRICS_CONFIG['max_sample_rows'])
+        primary_key = integer_primary_key(columns, indexes)
+        if sample and primary_key is None:
+            return {
+                "success": False,
+                "error": f"El modo muestreado requiere una clave primaria entera de una sola columna en '{name}'",
+                "database": database,
+                "table": name,
+                "timestamp": datetime.now().isoformat()
+            }
+        # Una tabla que cabe en la muestra se perfila completa
+        sampled = sample and (info["rows_estimate"] or 0) > sample_rows
+
         with get_db_connection(database) as conn:
             with conn.cursor() as cursor:
-                # Información básica de la tabla
-                cursor.execute(f"SHOW TABLE STATUS LIKE '{table}'")
-                table_status = cursor.fetchone()
-                
-                # Índices
-                cursor.execute(f"SHOW INDEX FROM {table}")
-                indexes = cursor.fetchall()
-                
-                # Conteo de registros
-                cursor.execute(f"SELECT COUNT(*) FROM {table}")
-                row_count = cursor.fetchone()[0]
-                
-                # Obtener información de columnas numéricas para estadísticas
-                cursor.execute(f"DESCRIBE {table}")
-                columns_info = cursor.fetchall()
-                
-                numeric_stats = {}
-                for col_info in columns_info:
-                    col_name = col_info[0]
-                    col_type = col_info[1].upper()
-                    
-                    # Verificar si es columna numérica
-                    if any(num_type in col_type for num_type in ['INT', 'DECIMAL', 'FLOAT', 'DOUBLE', 'NUMERIC']):
-                        try:
-                            cursor.execute(f"""
-                                SELECT 
-                                    MIN({col_name}) as min_val,
-                                    MAX({col_name}) as max_val,
-                                    AVG({col_name}) as avg_val,
-                                    COUNT(DISTINCT {col_name}) as distinct_count
-                                FROM {table}
-                                WHERE {col_name} IS NOT NULL
-                            """)
-                            stats = cursor.fetchone()
-                            if stats:
-                                numeric_stats[col_name] = {
-                                    "min": float(stats[0]) if stats[0] is not None else None,
-                                    "max": float(stats[1]) if stats[1] is not None else None,
-                                    "avg": float(stats[2]) if stats[2] is not None else None,
-                                    "distinct_count": stats[3]
-                                }
-                        except:
-                            continue
-                
-                return {
-                    "success": True,
-                    "database": database,
-                    "table": table,
-                    "row_count": row_count,
-                    "engine": table_status[1] if table_status else None,
-                    "collation": table_status[14] if table_status else None,
-                    "data_length_bytes": table_status[6] if table_status else None,
-                    "index_length_bytes": table_status[8] if table_status else None,
-                    "auto_increment": table_status[10] if table_status else None,
-                    "indexes": [{"key_name": idx[2], "column_name": idx[4], "non_unique": idx[1]} for idx in indexes],
-                    "numeric_statistics": numeric_stats,
-                    "timestamp": datetime.now().isoformat()
-                }
+                if sampled:
+                    profile = profile_sample(cursor, name, primary_key, numeric, sample_rows,
+                                             TABLE_METRICS_CONFIG['sample_chunks'], confidence)
+                else:
+                    profile = profile_exact(cursor, name, numeric)
+
+        result = {
+            "success": True,
+            "database": database,
+            "table": name,
+            "mode": "sampled" if sampled else "exact",
+            "row_count": profile["row_count"],
+            "engine": info["engine"],
+            "collation": info["collation"],
+            "data_length_bytes": info["data_length_bytes"],
+            "index_length_bytes": info["index_length_bytes"],
+            "auto_increment": info["auto_increment"],
+            "indexes": [{"key_name": idx["key_name"], "column_name": idx["column_name"], "non_unique": idx["non_unique"]}
+                        for idx in indexes],
+            "numeric_statistics": profile["numeric_statistics"],
+            "timestamp": datetime.now().isoformat()
+        }
+        if sampled:
+            result["row_count_margin_of_error"] = profile["row_count_margin_of_error"]
+            result["sampling"] = profile["sampling"]
+        return result
     except Exception as e:
         return {
             "success": False,
@@ -375,49 +914,57 @@ def get_table_metrics(database: str, table: str) -> Dict[str, Any]:
 
 
 @mcp.tool()
-def get_database_overview(database: str) -> Dict[str, Any]:
-    """Obtener un resumen completo de una base de datos"""
+@database_tool(db_executor)
+def get_database_overview(database: str, exact_counts: bool = False, refresh: bool = False) -> Dict[str, Any]:
+    """
+    Obtener un resumen completo de una base de datos.
+    
+    Tamaños y filas salen de information_schema (estimación de TABLE_ROWS, exacta
+    solo en MyISAM), servidos desde el cache del esquema.
+    exact_counts: Ejecutar COUNT(*) por tabla (un recorrido completo de cada tabla InnoDB)
+    refresh: Volver a leer el esquema en lugar de usar el cache
+    """
     try:
-        with get_db_connection(database) as conn:
-            with conn.cursor() as cursor:
-                # Listar todas las tablas
-                cursor.execute("SHOW TABLES")
-                tables = [row[0] for row in cursor.fetchall()]
-                
-                tables_info = []
-                total_rows = 0
-                total_size = 0
-                
-                for table in tables:
-                    # Información básica de cada tabla
-                    cursor.execute(f"SHOW TABLE STATUS LIKE '{table}'")
-                    table_status = cursor.fetchone()
-                    
-                    cursor.execute(f"SELECT COUNT(*) FROM {table}")
-                    row_count = cursor.fetchone()[0]
-                    
-                    table_size = (table_status[6] or 0) + (table_status[8] or 0)  # data + index length
-                    
-                    tables_info.append({
-                        "name": table,
-                        "rows": row_count,
-                        "size_bytes": table_size,
-                        "engine": table_status[1] if table_status else None
-                    })
-                    
-                    total_rows += row_count
-                    total_size += table_size
-                
-                return {
-                    "success": True,
-                    "database": database,
-                    "total_tables": len(tables),
-                    "total_rows": total_rows,
-                    "total_size_bytes": total_size,
-                    "total_size_mb": round(total_size / (1024 * 1024), 2),
-                    "tables": tables_info,
-                    "timestamp": datetime.now().isoformat()
-                }
+        snapshot = get_schema(database, refresh)
+        exact_rows = {}
+        if exact_counts:
+            with get_db_connection(database) as conn:
+                with conn.cursor() as cursor:
+                    for name, info in snapshot.tables.items():
+                        if info["type"] == "VIEW":
+                            continue
+                        cursor.execute(f"SELECT COUNT(*) FROM {quote_identifier(name)}")
+                        exact_rows[name] = cursor.fetchone()[0]
+
+        tables_info = []
+        total_rows = 0
+        total_size = 0
+        for name, info in snapshot.tables.items():
+            table_size = (info["data_length_bytes"] or 0) + (info["index_length_bytes"] or 0)  # data + index length
+            rows = exact_rows.get(name, info["rows_estimate"])
+            tables_info.append({
+                "name": name,
+                "rows": rows,
+                "rows_exact": name in exact_rows,
+                "size_bytes": table_size,
+                "engine": info["engine"],
+                "type": info["type"]
+            })
+            total_rows += rows or 0
+            total_size += table_size
+
+        return {
+            "success": True,
+            "database": database,
+            "total_tables": len(tables_info),
+            "total_rows": total_rows,
+            "row_counts": "exact" if exact_counts else "estimated",
+            "total_size_bytes": total_size,
+            "total_size_mb": round(total_size / (1024 * 1024), 2),
+            "tables": tables_info,
+            "schema_loaded_at": snapshot.loaded_at.isoformat(),
+            "timestamp": datetime.now().isoformat()
+        }
     except Exception as e:
         return {
             "success": False,
@@ -428,66 +975,106 @@ def get_database_overview(database: str) -> Dict[str, Any]:
 
 
 @mcp.tool()
-def compare_tables(database: str, table1: str, table2: str) -> Dict[str, Any]:
-    """Comparar dos tablas en términos de estructura y métricas básicas"""
+@database_tool(db_executor)
+def compare_tables(database: str, table1: str, table2: str, mode: str = "structure", database2: str = None,
+                   chunk_size: int = None, max_differences: int = None) -> Dict[str, Any]:
+    """
+    Comparar dos tablas en términos de estructura y métricas básicas, o fila por fila.
+    
+    mode: 'structure' (columnas, conteos y tamaños) o 'data' (diferencia de datos por sumas de
+          verificación por trozos de la clave primaria, p. ej. para verificar una copia de archivo)
+    database2: Base de datos de table2 si es distinta de database
+    chunk_size: Claves por trozo en modo 'data' (por defecto COMPARE_CONFIG['chunk_size'])
+    max_differences: Máximo de filas distintas a reportar en modo 'data'
+    """
+    database2 = database2 or database
     try:
-        with get_db_connection(database) as conn:
-            with conn.cursor() as cursor:
-                # Información de tabla 1
-                cursor.execute(f"DESCRIBE {table1}")
-                cols1 = cursor.fetchall()
-                cursor.execute(f"SELECT COUNT(*) FROM {table1}")
-                count1 = cursor.fetchone()[0]
-                cursor.execute(f"SHOW TABLE STATUS LIKE '{table1}'")
-                status1 = cursor.fetchone()
-                
-                # Información de tabla 2
-                cursor.execute(f"DESCRIBE {table2}")
-                cols2 = cursor.fetchall()
-                cursor.execute(f"SELECT COUNT(*) FROM {table2}")
-                count2 = cursor.fetchone()[0]
-                cursor.execute(f"SHOW TABLE STATUS LIKE '{table2}'")
-                status2 = cursor.fetchone()
-                
-                # Comparar estructura
-                cols1_names = set(col[0] for col in cols1)
-                cols2_names = set(col[0] for col in cols2)
-                
-                common_columns = cols1_names & cols2_names
-                only_in_table1 = cols1_names - cols2_names
-                only_in_table2 = cols2_names - cols1_names
-                
-                size1 = (status1[6] or 0) + (status1[8] or 0) if status1 else 0
-                size2 = (status2[6] or 0) + (status2[8] or 0) if status2 else 0
-                
+        if mode not in ("structure", "data"):
+            return {
+                "success": False,
+                "error": f"mode debe ser 'structure' o 'data', no '{mode}'",
+                "timestamp": datetime.now().isoformat()
+            }
+        snapshot1, name1 = resolve_table(database, table1)
+        snapshot2, name2 = resolve_table(database2, table2)
+        missing = [f"{db}.{t}" for db, t, name in ((database, table1, name1), (database2, table2, name2)) if name is None]
+        if missing:
+            return {
+                "success": False,
+                "error": f"Tabla(s) inexistente(s): {', '.join(missing)}",
+                "timestamp": datetime.now().isoformat()
+            }
+
+        cols1 = snapshot1.columns.get(name1, [])
+        cols2 = snapshot2.columns.get(name2, [])
+        cols1_names = [c["field"] for c in cols1]
+        cols2_names = set(c["field"] for c in cols2)
+        # Orden de table1 para que la suma de verificación sea la misma en ambas tablas
+        common_columns = [c for c in cols1_names if c in cols2_names]
+        only_in_table1 = [c for c in cols1_names if c not in cols2_names]
+        only_in_table2 = sorted(cols2_names - set(cols1_names))
+
+        left = TableSide("table1", name1, lambda: get_db_connection(database))
+        right = TableSide("table2", name2, lambda: get_db_connection(database2))
+        comparison = {
+            "common_columns": common_columns,
+            "common_columns_count": len(common_columns),
+            "only_in_table1": only_in_table1,
+            "only_in_table2": only_in_table2,
+            "structure_similarity": len(common_columns) / max(len(cols1_names), len(cols2_names), 1) * 100
+        }
+
+        if mode == "data":
+            primary_key = integer_primary_key(cols1, snapshot1.indexes.get(name1, []))
+            if primary_key is None or primary_key != integer_primary_key(cols2, snapshot2.indexes.get(name2, [])):
                 return {
-                    "success": True,
-                    "database": database,
-                    "table1": {
-                        "name": table1,
-                        "columns": len(cols1),
-                        "rows": count1,
-                        "size_bytes": size1,
-                        "engine": status1[1] if status1 else None
-                    },
-                    "table2": {
-                        "name": table2,
-                        "columns": len(cols2),
-                        "rows": count2,
-                        "size_bytes": size2,
-                        "engine": status2[1] if status2 else None
-                    },
-                    "comparison": {
-                        "common_columns": list(common_columns),
-                        "common_columns_count": len(common_columns),
-                        "only_in_table1": list(only_in_table1),
-                        "only_in_table2": list(only_in_table2),
-                        "row_difference": count2 - count1,
-                        "size_difference_bytes": size2 - size1,
-                        "structure_similarity": len(common_columns) / max(len(cols1_names), len(cols2_names)) * 100
-                    },
+                    "success": False,
+                    "error": "El modo 'data' requiere la misma clave primaria entera de una columna en ambas tablas",
                     "timestamp": datetime.now().isoformat()
                 }
+            diff = ChunkedTableDiff(
+                left, right, primary_key, common_columns,
+                chunk_size=chunk_size or COMPARE_CONFIG['chunk_size'],
+                fanout=COMPARE_CONFIG['fanout'],
+                leaf_rows=COMPARE_CONFIG['leaf_rows'],
+                max_differences=max_differences or COMPARE_CONFIG['max_differences']
+            ).run()
+            count1, count2 = diff.pop("rows_table1"), diff.pop("rows_table2")
+            comparison["data"] = diff
+        else:
+            # Conteos exactos de ambas tablas en paralelo, cada una en su conexión
+            (row1,), (row2,) = query_both(left, right, lambda side: (f"SELECT COUNT(*) FROM {quote_identifier(side.table)}", ()))
+            count1, count2 = row1[0], row2[0]
+
+        info1 = snapshot1.tables[name1]
+        info2 = snapshot2.tables[name2]
+        size1 = (info1["data_length_bytes"] or 0) + (info1["index_length_bytes"] or 0)
+        size2 = (info2["data_length_bytes"] or 0) + (info2["index_length_bytes"] or 0)
+        comparison["row_difference"] = count2 - count1
+        comparison["size_difference_bytes"] = size2 - size1
+
+        return {
+            "success": True,
+            "database": database,
+            "mode": mode,
+            "table1": {
+                "name": name1,
+                "columns": len(cols1),
+                "rows": count1,
+                "size_bytes": size1,
+                "engine": info1["engine"]
+            },
+            "table2": {
+                "name": name2,
+                "database": database2,
+                "columns": len(cols2),
+                "rows": count2,
+                "size_bytes": size2,
+                "engine": info2["engine"]
+            },
+            "comparison": comparison,
+            "timestamp": datetime.now().isoformat()
+        }
     except Exception as e:
         return {
             "success": False,
@@ -500,83 +1087,138 @@ def compare_tables(database: str, table1: str, table2: str) -> Dict[str, Any]:
 
 
 @mcp.tool()
-def analyze_data_distribution(database: str, table: str, column: str, bins: int = 10) -> Dict[str, Any]:
-    """Analizar la distribución de datos en una columna específica"""
+@database_tool(db_executor)
+def analyze_data_distribution(database: str, table: str, column: str, bins: int = 10, bucket: str = None,
+                              where: str = None, top_values: bool = False) -> Dict[str, Any]:
+    """
+    Analizar la distribución de datos en una columna específica.
+    
+    Columnas numéricas y de fecha: histograma de `bins` cubetas de igual ancho (como máximo una
+    por valor en enteros de rango pequeño), conteo, nulos, distintos, min/max, media, desviación
+    estándar y p50/p90/p99 con una sentencia MIN/MAX y una agrupada.
+    DATETIME/TIMESTAMP/TIME (p. ej. tiempo): distribución por hora del día; `bins` no aplica.
+    Si el histograma no tiene `bins` cubetas, lo indica con requested_bins y una nota.
+    bucket: 'minute' u 'hour' para columnas de tiempo (por defecto 'minute'); 'day' agrupa
+            DATETIME por fecha
+    where: Filtro opcional sin la palabra WHERE (p. ej. "estado_id = 1" para solo entradas)
+    top_values: En numéricas de rango amplio, calcular también los valores más frecuentes
+                (una pasada adicional); en rangos pequeños y en texto siempre se incluyen
+    """
     try:
+        snapshot, name = resolve_table(database, table)
+        if name is None:
+            return {
+                "success": False,
+                "error": f"La tabla '{table}' no existe en la base de datos '{database}'",
+                "timestamp": datetime.now().isoformat()
+            }
+        columns = {c["field"].lower(): c for c in snapshot.columns.get(name, [])}
+        info = columns.get(column.lower())
+        if info is None:
+            return {
+                "success": False,
+                "error": f"La columna '{column}' no existe en la tabla '{name}'",
+                "available_columns": [c["field"] for c in snapshot.columns.get(name, [])],
+                "timestamp": datetime.now().isoformat()
+            }
+        if bucket is not None and bucket not in (*TIME_BUCKETS, 'day'):
+            return {
+                "success": False,
+                "error": f"bucket debe ser 'minute', 'hour' o 'day', no '{bucket}'",
+                "timestamp": datetime.now().isoformat()
+            }
+        if where:
+            where = strip_statement_end(where)
+            if not parentheses_balanced(where):
+                return {
+                    "success": False,
+                    "error": "Filtro no válido: paréntesis sin cerrar o de más",
+                    "timestamp": datetime.now().isoformat()
+                }
+        column = info["field"]
+        col = quote_identifier(column)
+        bins = max(1, min(int(bins), DISTRIBUTION_CONFIG['max_bins']))
+        kind = column_kind(info["data_type"], bucket)
+        where_sql = f"WHERE ({where})" if where else ""
+        scans = 0
+
         with get_db_connection(database) as conn:
             with conn.cursor() as cursor:
-                # Verificar que la columna existe
-                cursor.execute(f"DESCRIBE {table}")
-                columns = [row[0] for row in cursor.fetchall()]
-                
-                if column not in columns:
-                    return {
-                        "success": False,
-                        "error": f"La columna '{column}' no existe en la tabla '{table}'",
-                        "available_columns": columns,
-                        "timestamp": datetime.now().isoformat()
+                if kind == "text":
+                    execute_filtered(cursor, f"""
+                        SELECT COUNT(*), COUNT({col}), COUNT(DISTINCT {col}), MIN({col}), MAX({col})
+                        FROM {quote_identifier(name)} {where_sql}
+                    """)
+                    total, non_null, distinct, min_val, max_val = cursor.fetchone()
+                    execute_filtered(cursor, f"""
+                        SELECT {col}, COUNT(*) as frequency
+                        FROM {quote_identifier(name)}
+                        WHERE {col} IS NOT NULL {f'AND ({where})' if where else ''}
+                        GROUP BY {col}
+                        ORDER BY frequency DESC
+                        LIMIT 10
+                    """)
+                    top = cursor.fetchall()
+                    scans = 2
+                    profile = {
+                        "basic_statistics": {
+                            "total_rows": total,
+                            "non_null_count": non_null,
+                            "null_count": total - non_null,
+                            "distinct_count": distinct,
+                            "null_percentage": round((total - non_null) / total * 100, 2) if total else 0,
+                            "uniqueness_ratio": round(distinct / non_null * 100, 2) if non_null else 0,
+                            "min_value": min_val,
+                            "max_value": max_val
+                        },
+                        "top_values": [{"value": val, "frequency": freq,
+                                        "percentage": round(freq / non_null * 100, 2)} for val, freq in top]
                     }
-                
-                # Estadísticas básicas
-                cursor.execute(f"""
-                    SELECT 
-                        COUNT(*) as total_count,
-                        COUNT({column}) as non_null_count,
-                        COUNT(DISTINCT {column}) as distinct_count,
-                        MIN({column}) as min_val,
-                        MAX({column}) as max_val
-                    FROM {table}
-                """)
-                basic_stats = cursor.fetchone()
-                
-                # Top valores más frecuentes
-                cursor.execute(f"""
-                    SELECT {column}, COUNT(*) as frequency
-                    FROM {table}
-                    WHERE {column} IS NOT NULL
-                    GROUP BY {column}
-                    ORDER BY frequency DESC
-                    LIMIT 10
-                """)
-                top_values = cursor.fetchall()
-                
-                result = {
-                    "success": True,
-                    "database": database,
-                    "table": table,
-                    "column": column,
-                    "basic_statistics": {
-                        "total_rows": basic_stats[0],
-                        "non_null_count": basic_stats[1],
-                        "null_count": basic_stats[0] - basic_stats[1],
-                        "distinct_count": basic_stats[2],
-                        "null_percentage": round((basic_stats[0] - basic_stats[1]) / basic_stats[0] * 100, 2),
-                        "uniqueness_ratio": round(basic_stats[2] / basic_stats[1] * 100, 2) if basic_stats[1] > 0 else 0
-                    },
-                    "top_values": [{"value": val[0], "frequency": val[1], "percentage": round(val[1] / basic_stats[1] * 100, 2)} for val in top_values],
-                    "timestamp": datetime.now().isoformat()
-                }
-                
-                # Si es numérico, agregar estadísticas adicionales
-                if basic_stats[3] is not None and basic_stats[4] is not None:
-                    try:
-                        cursor.execute(f"""
-                            SELECT AVG({column}), STDDEV({column})
-                            FROM {table}
-                            WHERE {column} IS NOT NULL
+                else:
+                    if kind == "time_of_day":
+                        spec = time_of_day_spec(col, info["data_type"], bucket or 'minute', bins)
+                    else:
+                        # Rango para el ancho de las cubetas; con índice sobre la columna es una búsqueda
+                        value_sql = value_sql_for(kind, col)
+                        execute_filtered(cursor, f"SELECT MIN({value_sql}), MAX({value_sql}) "
+                                                 f"FROM {quote_identifier(name)} {where_sql}")
+                        low, high = cursor.fetchone()
+                        if where or not column_leads_index(snapshot.indexes.get(name, []), column):
+                            scans += 1
+                        integer = kind == "date" or info["data_type"] in INTEGER_DATA_TYPES
+                        spec = range_spec(kind, col, float(low or 0), float(high or 0), bins,
+                                          DISTRIBUTION_CONFIG['fine_buckets_per_bin'], integer)
+
+                    execute_filtered(cursor, distribution_sql(name, spec, where))
+                    profile = summarize(cursor.fetchall(), spec)
+                    scans += 1
+
+                    if top_values and kind == "numeric" and "top_values" not in profile:
+                        execute_filtered(cursor, f"""
+                            SELECT {col}, COUNT(*) as frequency
+                            FROM {quote_identifier(name)}
+                            WHERE {col} IS NOT NULL {f'AND ({where})' if where else ''}
+                            GROUP BY {col}
+                            ORDER BY frequency DESC
+                            LIMIT 10
                         """)
-                        avg_std = cursor.fetchone()
-                        
-                        result["basic_statistics"].update({
-                            "min_value": float(basic_stats[3]),
-                            "max_value": float(basic_stats[4]),
-                            "average": float(avg_std[0]) if avg_std[0] else None,
-                            "std_deviation": float(avg_std[1]) if avg_std[1] else None
-                        })
-                    except:
-                        pass
-                
-                return result
+                        non_null = profile["basic_statistics"]["non_null_count"]
+                        profile["top_values"] = [{"value": float(val), "frequency": freq,
+                                                  "percentage": round(freq / non_null * 100, 2)}
+                                                 for val, freq in cursor.fetchall()]
+                        scans += 1
+
+        return {
+            "success": True,
+            "database": database,
+            "table": name,
+            "column": column,
+            "kind": kind,
+            "filter": where,
+            **profile,
+            "passes": scans,
+            "timestamp": datetime.now().isoformat()
+        }
                 
     except Exception as e:
         return {
@@ -591,27 +1233,50 @@ def analyze_data_distribution(database: str, table: str, column: str, bins: int
 
 # ===== HERRAMIENTAS ESPECIALIZADAS PARA ANÁLISIS DE ASISTENCIA =====
 
+# Columnas de orden (únicas por fila) usadas para paginar cada análisis por keyset
+ANALYSIS_KEYSETS = {
+    "daily_summary": [("fecha", "DESC")],
+    "late_arrivals": [("tiempo", "DESC"), ("registro_id", "DESC")],
+    "missing_exits": [("tiempo", "DESC"), ("registro_id", "DESC")],
+    "user_pattern": [("total_registros", "DESC"), ("usuario_id", "ASC")],
+    "device_usage": [("total_usos", "DESC"), ("dispositivo", "ASC"), ("lugar", "ASC")],
+    "hourly_distribution": [("hora", "ASC"), ("evento", "ASC")],
+    "work_hours": [("fecha", "DESC"), ("usuario_id", "ASC")]
+}
+
+
+def finish_analysis_response(response: Dict[str, Any], format: str, dictionary_encode: bool,
+                             materialize: bool) -> Dict[str, Any]:
+    """Aplicar el formato pedido, o guardar las filas en el servidor y devolver su identificador"""
+    if not materialize:
+        return apply_result_format(response, format, dictionary_encode)
+    results = response.pop("results")
+    response["result_handle"] = result_handles.put(
+        response["columns"], results, database=response["database"],
+        analysis_type=response["analysis_type"], filters_applied=response["filters_applied"]
+    )
+    logger.info(f"📌 Resultado materializado {response['result_handle']['handle']}: "
+                f"{response['row_count']} filas, {response['result_handle']['bytes']} bytes")
+    response["format"] = "handle"
+    return response
+
 @mcp.tool()
 def generate_attendance_query(database: str, analysis_type: str, date_from: str = None, date_to: str = None, user_filter: str = None) -> Dict[str, Any]:
     """
     Genera consultas SQL optimizadas para análisis de asistencia específicos.
     
     database: Base de datos que contiene la tabla core_registro
-    analysis_type: 'daily_summary', 'late_arrivals', 'missing_exits', 'user_pattern', 'device_usage', 'hourly_distribution'
+    analysis_type: 'daily_summary', 'late_arrivals', 'missing_exits', 'user_pattern', 'device_usage', 'hourly_distribution',
+                   'work_hours'
     date_from: Fecha inicio en formato YYYY-MM-DD
     date_to: Fecha fin en formato YYYY-MM-DD  
     user_filter: Filtro por nombre o código de usuario
     """
     try:
-        base_conditions = []
-        if date_from:
-            base_conditions.append(f"tiempo >= '{date_from} 00:00:00'")
-        if date_to:
-            base_conditions.append(f"tiempo <= '{date_to} 23:59:59'")
-        if user_filter:
-            base_conditions.append(f"(nombre LIKE '%{user_filter}%' OR codigo_usuario LIKE '%{user_filter}%')")
-        
-        where_clause = " AND ".join(base_conditions) if base_conditions else "1=1"
+        # Los valores de los filtros viajan como parámetros: el texto de la sentencia
+        # solo depende de qué filtros se usan, así el servidor puede reutilizar el plan
+        where_clause, params = build_attendance_filters(date_from, date_to, user_filter)
+        r1_where_clause, _ = build_attendance_filters(date_from, date_to, user_filter, alias="r1")
         
         queries = {
             "daily_summary": f"""
@@ -629,7 +1294,9 @@ def generate_attendance_query(database: str, analysis_type: str, date_from: str
             
             "late_arrivals": f"""
                 SELECT 
+                    id as registro_id,
                     nombre, codigo_usuario, 
+                    tiempo,
                     DATE(tiempo) as fecha,
                     TIME(tiempo) as hora_llegada,
                     lugar, dispositivo
@@ -642,12 +1309,14 @@ def generate_attendance_query(database: str, analysis_type: str, date_from: str
             
             "missing_exits": f"""
                 SELECT DISTINCT
+                    r1.id as registro_id,
                     r1.nombre, r1.codigo_usuario,
+                    r1.tiempo,
                     DATE(r1.tiempo) as fecha,
                     TIME(r1.tiempo) as hora_entrada
                 FROM core_registro r1
                 WHERE r1.estado_id = 1 
-                    AND {where_clause.replace('tiempo', 'r1.tiempo')}
+                    AND {r1_where_clause}
                     AND NOT EXISTS (
                         SELECT 1 FROM core_registro r2 
                         WHERE r2.usuario_id = r1.usuario_id 
@@ -660,7 +1329,7 @@ def generate_attendance_query(database: str, analysis_type: str, date_from: str
             
             "user_pattern": f"""
                 SELECT 
-                    nombre, codigo_usuario,
+                    usuario_id, nombre, codigo_usuario,
                     COUNT(*) as total_registros,
                     MIN(tiempo) as primer_registro,
                     MAX(tiempo) as ultimo_registro,
@@ -696,6 +1365,32 @@ def generate_attendance_query(database: str, analysis_type: str, date_from: str
                 WHERE {where_clause}
                 GROUP BY HOUR(tiempo), evento
                 ORDER BY hora, evento;
+            """,
+            
+            # Cada entrada se empareja con la checada siguiente del usuario si es una salida del mismo día
+            "work_hours": f"""
+                SELECT 
+                    usuario_id,
+                    MIN(nombre) as nombre,
+                    DATE(tiempo) as fecha,
+                    MIN(CASE WHEN estado_id = 1 THEN tiempo END) as primera_entrada,
+                    MAX(CASE WHEN estado_id = 2 THEN tiempo END) as ultima_salida,
+                    COUNT(CASE WHEN estado_id = 1 AND siguiente_estado = 2
+                                    AND DATE(siguiente_tiempo) = DATE(tiempo) THEN 1 END) as pares,
+                    ROUND(COALESCE(SUM(CASE WHEN estado_id = 1 AND siguiente_estado = 2
+                                            AND DATE(siguiente_tiempo) = DATE(tiempo)
+                                       THEN TIMESTAMPDIFF(SECOND, tiempo, siguiente_tiempo) END), 0) / 3600.0, 2)
+                        as horas_trabajadas
+                FROM (
+                    SELECT usuario_id, nombre, estado_id, tiempo,
+                           LEAD(tiempo) OVER w as siguiente_tiempo,
+                           LEAD(estado_id) OVER w as siguiente_estado
+                    FROM core_registro
+                    WHERE {where_clause}
+                    WINDOW w AS (PARTITION BY usuario_id ORDER BY tiempo, id)
+                ) checadas
+                GROUP BY usuario_id, DATE(tiempo)
+                ORDER BY fecha DESC, usuario_id ASC;
             """
         }
         
@@ -710,7 +1405,8 @@ def generate_attendance_query(database: str, analysis_type: str, date_from: str
             "success": True,
             "database": database,
             "query": queries[analysis_type].strip(),
-            "description": f"Consulta para {analysis_type}",
+            "params": params,
+            "description": f"Consulta parametrizada para {analysis_type} (placeholders %s)",
             "filters_applied": {
                 "date_from": date_from,
                 "date_to": date_to, 
@@ -728,15 +1424,48 @@ def generate_attendance_query(database: str, analysis_type: str, date_from: str
 
 
 @mcp.tool()
-def execute_attendance_analysis(database: str, analysis_type: str, date_from: str = None, date_to: str = None, user_filter: str = None) -> Dict[str, Any]:
+@database_tool(db_executor)
+def execute_attendance_analysis(database: str, analysis_type: str, date_from: str = None, date_to: str = None, user_filter: str = None,
+                                page_size: int = None, continuation_token: str = None,
+                                format: str = "rows", dictionary_encode: bool = True,
+                                engine: str = None, backend: str = "mariadb", materialize: bool = False) -> Dict[str, Any]:
     """
     Ejecuta directamente un análisis de asistencia y devuelve los resultados.
     
     database: Base de datos que contiene la tabla core_registro
     analysis_type: Tipo de análisis a ejecutar
     date_from, date_to, user_filter: Filtros opcionales
+    page_size: Filas por página (activa la paginación por keyset)
+    continuation_token: Token de la página anterior para continuar
+    format: 'rows' o 'columnar' (con diccionario para columnas como nombre, lugar, dispositivo)
+    engine: 'sql', 'numpy' (rango de fechas en memoria, sin paginación; conviene acotar las fechas) o 'snapshot' (instantánea
+            de export_attendance_snapshot, sin consultar MariaDB); por defecto
+            ANALYTICS_ENGINE_CONFIG['default_engine']
+    backend: 'mariadb' o 'mirror' (espejo SQLite local, ver sync_mirror) para los motores 'numpy' y 'sql'
+    materialize: Guardar el resultado completo en el servidor y devolver 'result_handle' en lugar de
+                 las filas; se leen por rebanadas con el recurso result://ID/OFFSET/SIZE[/ORDEN]
+                 sin volver a la base de datos (no se combina con la paginación)
     """
     try:
+        format_error = invalid_format_error(format) or invalid_backend_error(backend)
+        if format_error:
+            return format_error
+        if materialize and (page_size or continuation_token):
+            return {
+                "success": False,
+                "error": "materialize no se combina con page_size/continuation_token: "
+                         "las rebanadas se leen del recurso result://ID/OFFSET/SIZE",
+                "timestamp": datetime.now().isoformat()
+            }
+        scope = backend_scope(database, backend)
+        engine = engine or ANALYTICS_ENGINE_CONFIG['default_engine']
+        if engine not in ANALYSIS_ENGINES:
+            return {
+                "success": False,
+                "error": f"Motor no válido: {engine}. Opciones: {', '.join(ANALYSIS_ENGINES)}",
+                "timestamp": datetime.now().isoformat()
+            }
+        
         # Primero obtenemos la consulta
         query_result = generate_attendance_query(database, analysis_type, date_from, date_to, user_filter)
         
@@ -744,28 +1473,96 @@ def execute_attendance_analysis(database: str, analysis_type: str, date_from: st
             return query_result
         
         query = query_result["query"]
+        params = query_result["params"]
+        started = time.perf_counter()
+        
+        if engine == "snapshot":
+            snapshot = open_snapshot(snapshot_directory(database))
+            analysis = snapshot.analyze(analysis_type, date_from, date_to, user_filter)
+            results = serialize_rows(analysis["columns"], analysis["rows"])
+            response = {
+                "success": True,
+                "database": database,
+                "analysis_type": analysis_type,
+                "filters_applied": query_result["filters_applied"],
+                "columns": analysis["columns"],
+                "results": results,
+                "row_count": len(results),
+                "engine": "snapshot",
+                "engine_stats": {
+                    "partitions_read": analysis["partitions_read"],
+                    "frame_rows": analysis["frame_rows"],
+                    "rows_analyzed": analysis["rows_analyzed"],
+                    "compute_ms": analysis["compute_ms"]
+                },
+                "snapshot": {
+                    "created_at": snapshot.manifest.get("created_at"),
+                    "max_id": snapshot.manifest.get("max_id")
+                },
+                "from_cache": False,
+                "timestamp": datetime.now().isoformat()
+            }
+            return finish_analysis_response(response, format, dictionary_encode, materialize)
+        
+        engine_note = None
+        if engine == "numpy" and not (page_size or continuation_token) and analysis_type in ANALYSES:
+            try:
+                with get_backend_connection(database, backend) as conn:
+                    # Cursor sin búfer: la carga del rango se lee por lotes con fetchmany
+                    with conn.cursor(pymysql.cursors.SSCursor) as cursor:
+                        analysis = attendance_engine.analyze(cursor, scope, analysis_type, date_from, date_to,
+                                                             user_filter)
+                if backend == "mariadb":
+                    workload_log.record(database, f"analysis:{analysis_type}", query_result["query"], params,
+                                        elapsed_ms=(time.perf_counter() - started) * 1000)
+                results = serialize_rows(analysis["columns"], analysis["rows"])
+                response = {
+                    "success": True,
+                    "database": database,
+                    "analysis_type": analysis_type,
+                    "filters_applied": query_result["filters_applied"],
+                    "columns": analysis["columns"],
+                    "results": results,
+                    "row_count": len(results),
+                    "engine": "numpy",
+                    "backend": backend,
+                    "engine_stats": {
+                        "frame_source": analysis["frame_source"],
+                        "frame_rows": analysis["frame_rows"],
+                        "rows_analyzed": analysis["rows_analyzed"],
+                        "compute_ms": analysis["compute_ms"]
+                    },
+                    "from_cache": analysis["frame_source"] == "memory",
+                    "timestamp": datetime.now().isoformat()
+                }
+                return finish_analysis_response(response, format, dictionary_encode, materialize)
+            except RowLimitExceeded as e:
+                logger.warning(f"⚠️  {e}: {analysis_type} se ejecuta en SQL")
+                engine_note = f"{e}; se usó SQL"
         
-        # Ejecutamos la consulta
-        with get_db_connection(database) as conn:
+        # Ejecutamos la consulta como sentencia preparada del servidor (cacheada por conexión);
+        # el espejo SQLite la ejecuta directamente
+        with get_backend_connection(database, backend) as conn:
             with conn.cursor() as cursor:
-                cursor.execute(query)
-                columns = [desc[0] for desc in cursor.description]
-                rows = cursor.fetchall()
+                execute_prepared = (functools.partial(prepared_statements.execute, cursor) if backend == "mariadb"
+                                    else None)
+                pagination = None
+                if page_size or continuation_token:
+                    columns, rows, pagination, query = fetch_keyset_page(
+                        cursor, scope, query, ANALYSIS_KEYSETS[analysis_type], page_size, continuation_token,
+                        base_params=params, execute=execute_prepared
+                    )
+                    from_cache = pagination["from_cache"]
+                else:
+                    columns, rows, from_cache = run_cached_select(cursor, scope, query, params, execute_prepared)
+                if backend == "mariadb":
+                    workload_log.record(database, f"analysis:{analysis_type}", query_result["query"], params,
+                                        elapsed_ms=(time.perf_counter() - started) * 1000)
                 
                 # Convertir resultados a formato JSON serializable
-                results = []
-                for row in rows:
-                    row_dict = {}
-                    for i, col in enumerate(columns):
-                        value = row[i]
-                        if isinstance(value, datetime):
-                            value = value.isoformat()
-                        elif hasattr(value, 'isoformat'):
-                            value = value.isoformat()
-                        row_dict[col] = value
-                    results.append(row_dict)
+                results = serialize_rows(columns, rows)
                 
-                return {
+                response = {
                     "success": True,
                     "database": database,
                     "analysis_type": analysis_type,
@@ -774,8 +1571,17 @@ def execute_attendance_analysis(database: str, analysis_type: str, date_from: st
                     "results": results,
                     "row_count": len(results),
                     "executed_query": query,
+                    "query_params": params,
+                    "from_cache": from_cache,
+                    "engine": "sql",
+                    "backend": backend,
                     "timestamp": datetime.now().isoformat()
                 }
+                if engine_note:
+                    response["engine_note"] = engine_note
+                if pagination:
+                    response["pagination"] = pagination
+                return finish_analysis_response(response, format, dictionary_encode, materialize)
                 
     except Exception as e:
         return {
@@ -787,15 +1593,175 @@ def execute_attendance_analysis(database: str, analysis_type: str, date_from: st
         }
 
 
+def resolve_databases(databases: str, available: List[str]) -> List[str]:
+    """Nombres separados por coma; los que llevan *, ? o [ se expanden contra las bases disponibles"""
+    resolved = []
+    for pattern in (part.strip() for part in databases.split(",")):
+        if not pattern:
+            continue
+        if any(char in pattern for char in "*?["):
+            matches = [name for name in available
+                       if fnmatch.fnmatchcase(name, pattern) and name not in SYSTEM_DATABASES]
+        else:
+            matches = [pattern]
+        resolved.extend(name for name in matches if name not in resolved)
+    return resolved
+
+
+@mcp.tool()
+async def execute_attendance_analysis_multi(databases: str, analysis_type: str, date_from: str = None,
+                                            date_to: str = None, user_filter: str = None,
+                                            format: str = "rows", engine: str = None, backend: str = "mariadb",
+                                            materialize: bool = False) -> Dict[str, Any]:
+    """
+    Ejecuta el mismo análisis de asistencia en varias bases de datos (una por sitio) a la vez.
+    
+    databases: Lista separada por comas y/o patrones glob sobre list_databases, p. ej.
+               "zapopan,tonala" o "sitio_*" (los patrones omiten las bases del sistema)
+    analysis_type, date_from, date_to, user_filter, backend: Igual que execute_attendance_analysis
+    engine: Igual que execute_attendance_analysis; por defecto FANOUT_CONFIG['engine'] ('sql')
+    format: 'rows' o 'columnar'
+    materialize: Guardar el resultado combinado en el servidor y devolver 'result_handle'
+    
+    Como máximo FANOUT_CONFIG['max_concurrency'] bases se consultan al mismo tiempo (en total,
+    entre todas las llamadas). Las filas se combinan con la columna 'database' al inicio; las
+    bases que fallan, o que no terminan dentro de FANOUT_CONFIG['deadline'] segundos, se
+    reportan en 'failed' sin invalidar las demás.
+    """
+    started = time.perf_counter()
+    try:
+        format_error = invalid_format_error(format) or invalid_backend_error(backend)
+        if format_error:
+            return format_error
+        if analysis_type not in ANALYSIS_KEYSETS:
+            return {
+                "success": False,
+                "error": f"Tipo de análisis no válido. Opciones: {', '.join(ANALYSIS_KEYSETS)}",
+                "timestamp": datetime.now().isoformat()
+            }
+        available = []
+        if any(char in databases for char in "*?["):
+            listing = await list_databases()
+            if not listing.get("success"):
+                return listing
+            available = listing["databases"]
+        targets = resolve_databases(databases, available)
+        if not targets:
+            return {
+                "success": False,
+                "error": f"Ninguna base de datos coincide con '{databases}'",
+                "timestamp": datetime.now().isoformat()
+            }
+        if len(targets) > FANOUT_CONFIG['max_databases']:
+            return {
+                "success": False,
+                "error": f"{len(targets)} bases de datos exceden el máximo de {FANOUT_CONFIG['max_databases']} por llamada",
+                "databases": targets,
+                "timestamp": datetime.now().isoformat()
+            }
+        engine = engine or FANOUT_CONFIG['engine']
+        deadline = FANOUT_CONFIG['deadline']
+        logger.info(f"🌐 {analysis_type} en {len(targets)} bases de datos: {', '.join(targets)}")
+        
+        async def run_site(database: str) -> Dict[str, Any]:
+            async with fanout_semaphore:
+                site_started = time.perf_counter()
+                try:
+                    result = await execute_attendance_analysis(database, analysis_type, date_from, date_to,
+                                                               user_filter, engine=engine, backend=backend)
+                except Exception as e:
+                    result = {"success": False, "error": str(e)}
+                result["elapsed_seconds"] = round(time.perf_counter() - site_started, 3)
+                return result
+        
+        # Plazo total: las bases que siguen en curso (o esperando turno) se cancelan, lo que
+        # envía KILL QUERY a sus sentencias, y se reportan como fallidas
+        tasks = [asyncio.ensure_future(run_site(database)) for database in targets]
+        _, pending = await asyncio.wait(tasks, timeout=deadline)
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+        elapsed = round(time.perf_counter() - started, 3)
+        outcomes = [
+            task.result() if task not in pending else
+            {"success": False, "error": f"Sin terminar al vencer el plazo de {deadline}s", "elapsed_seconds": elapsed}
+            for task in tasks
+        ]
+        
+        columns = None
+        results = []
+        sites = []
+        failed = []
+        for database, outcome in zip(targets, outcomes):
+            if not outcome.get("success"):
+                logger.warning(f"⚠️  {analysis_type} falló en '{database}': {outcome.get('error')}")
+                failed.append({"database": database, "error": outcome.get("error"),
+                               "elapsed_seconds": outcome["elapsed_seconds"]})
+                continue
+            columns = columns or ["database"] + outcome["columns"]
+            results.extend({"database": database, **row} for row in outcome["results"])
+            sites.append({
+                "database": database,
+                "row_count": outcome["row_count"],
+                "engine": outcome.get("engine"),
+                "from_cache": outcome.get("from_cache"),
+                "elapsed_seconds": outcome["elapsed_seconds"]
+            })
+        
+        response = {
+            "success": bool(sites),
+            "partial": bool(sites) and bool(failed),
+            "database": ",".join(targets),
+            "analysis_type": analysis_type,
+            "filters_applied": {"date_from": date_from, "date_to": date_to, "user_filter": user_filter},
+            "databases": targets,
+            "sites": sites,
+            "failed": failed,
+            "columns": columns or [],
+            "results": results,
+            "row_count": len(results),
+            "max_concurrency": FANOUT_CONFIG['max_concurrency'],
+            "engine": engine,
+            "deadline_seconds": deadline,
+            "timed_out": len(pending),
+            "elapsed_seconds": round(time.perf_counter() - started, 3),
+            "timestamp": datetime.now().isoformat()
+        }
+        if not sites:
+            response["error"] = f"El análisis falló en todas las bases de datos ({len(targets)})"
+            return response
+        return finish_analysis_response(response, format, True, materialize)
+    except Exception as e:
+        return {
+            "success": False,
+            "error": str(e),
+            "databases": databases,
+            "analysis_type": analysis_type,
+            "timestamp": datetime.now().isoformat()
+        }
+
+
 @mcp.tool()
-def validate_attendance_data(database: str, data_issues: str) -> Dict[str, Any]:
+@database_tool(db_executor)
+def validate_attendance_data(database: str, data_issues: str, max_findings: int = 50,
+                             backend: str = "mariadb") -> Dict[str, Any]:
     """
     Ejecuta validaciones para identificar problemas en los datos de asistencia.
     
     database: Base de datos que contiene la tabla core_registro
-    data_issues: 'duplicates', 'same_time_events', 'invalid_sequences', 'time_gaps'
+    data_issues: 'duplicates', 'same_time_events', 'invalid_sequences', 'time_gaps' o
+                 'scan_all' (los cuatro en un solo recorrido de la tabla)
+    max_findings: Con 'scan_all', hallazgos que se reportan por tipo (se cuentan todos)
+    backend: 'mariadb' o 'mirror' (espejo SQLite local, ver sync_mirror)
     """
     try:
+        backend_error = invalid_backend_error(backend)
+        if backend_error:
+            return backend_error
+        if data_issues == "scan_all":
+            return _scan_attendance_data(database, max(0, max_findings), backend)
+
         validation_queries = {
             "duplicates": """
                 SELECT usuario_id, nombre, tiempo, evento, COUNT(*) as duplicados
@@ -856,30 +1822,20 @@ def validate_attendance_data(database: str, data_issues: str) -> Dict[str, Any]:
         if data_issues not in validation_queries:
             return {
                 "success": False,
-                "error": f"Tipo de validación no válido. Opciones: {', '.join(validation_queries.keys())}",
+                "error": f"Tipo de validación no válido. Opciones: {', '.join([*validation_queries, 'scan_all'])}",
                 "timestamp": datetime.now().isoformat()
             }
         
         query = validation_queries[data_issues]
         
-        with get_db_connection(database) as conn:
+        with get_backend_connection(database, backend) as conn:
             with conn.cursor() as cursor:
                 cursor.execute(query)
                 columns = [desc[0] for desc in cursor.description]
                 rows = cursor.fetchall()
                 
                 # Convertir resultados
-                results = []
-                for row in rows:
-                    row_dict = {}
-                    for i, col in enumerate(columns):
-                        value = row[i]
-                        if isinstance(value, datetime):
-                            value = value.isoformat()
-                        elif hasattr(value, 'isoformat'):
-                            value = value.isoformat()
-                        row_dict[col] = value
-                    results.append(row_dict)
+                results = serialize_rows(columns, rows)
                 
                 return {
                     "success": True,
@@ -888,6 +1844,7 @@ def validate_attendance_data(database: str, data_issues: str) -> Dict[str, Any]:
                     "columns": columns,
                     "issues_found": results,
                     "issue_count": len(results),
+                    "backend": backend,
                     "executed_query": query.strip(),
                     "timestamp": datetime.now().isoformat()
                 }
@@ -902,94 +1859,406 @@ def validate_attendance_data(database: str, data_issues: str) -> Dict[str, Any]:
         }
 
 
+def _scan_attendance_data(database: str, max_findings: int, backend: str = "mariadb") -> Dict[str, Any]:
+    """Los cuatro tipos de validación en un solo recorrido ordenado, con cursor sin búfer"""
+    started = time.perf_counter()
+    scanned = 0
+    with get_backend_connection(database, backend) as conn:
+        with conn.cursor(pymysql.cursors.SSCursor) as cursor:
+            cursor.execute(attendance_scanner.SCAN_SQL)
+
+            def rows():
+                nonlocal scanned
+                for row in attendance_scanner.stream_rows(cursor):
+                    scanned += 1
+                    yield row
+
+            report = attendance_scanner.collect(attendance_scanner.scan(rows()), max_findings)
+
+    elapsed = round(time.perf_counter() - started, 3)
+    logger.info(f"🔎 Revisión de core_registro en '{database}': {scanned} registros en {elapsed}s, "
+                f"hallazgos {report['issue_counts']}")
+    report["issues_found"] = {
+        issue: [serialize_rows(list(finding), [list(finding.values())])[0] for finding in found]
+        for issue, found in report["issues_found"].items()
+    }
+    return {
+        "success": True,
+        "database": database,
+        "validation_type": "scan_all",
+        **report,
+        "issue_count": sum(report["issue_counts"].values()),
+        "rows_scanned": scanned,
+        "max_findings": max_findings,
+        "executed_query": attendance_scanner.SCAN_SQL,
+        "backend": backend,
+        "elapsed_seconds": elapsed,
+        "timestamp": datetime.now().isoformat()
+    }
+
+
 @mcp.tool()
-def create_attendance_kpis(database: str) -> Dict[str, Any]:
+@database_tool(db_executor)
+def create_attendance_kpis(database: str, source: str = "rollup", backend: str = "mariadb") -> Dict[str, Any]:
     """
     Calcula KPIs (indicadores clave) de asistencia para los últimos 30 días.
     
     database: Base de datos que contiene la tabla core_registro
+    source: 'rollup' (resumen diario por usuario, actualizado por marca de agua) o 'raw'
+            (recalcular desde las checadas de core_registro)
+    backend: 'mariadb' o 'mirror': de dónde se leen las checadas (espejo SQLite local, ver sync_mirror)
     """
+    if source not in ("rollup", "raw"):
+        return {
+            "success": False,
+            "error": f"source debe ser 'rollup' o 'raw', no '{source}'",
+            "database": database,
+            "timestamp": datetime.now().isoformat()
+        }
+    backend_error = invalid_backend_error(backend)
+    if backend_error:
+        return backend_error
     try:
-        kpi_results = {}
+        if source == "rollup":
+            with get_backend_connection(database, backend) as conn:
+                with conn.cursor() as cursor:
+                    refresh = attendance_rollup.refresh(cursor, database)
+            return {
+                "success": True,
+                "database": database,
+                "period": "Últimos 30 días",
+                "source": source,
+                "backend": backend,
+                "kpis": attendance_rollup.kpis(database, days=30),
+                "rollup": refresh,
+                "timestamp": datetime.now().isoformat()
+            }
+
+        with get_backend_connection(database, backend) as conn:
+            with conn.cursor() as cursor:
+                # Un solo recorrido de la ventana de 30 días para los cuatro KPIs
+                kpi_results = attendance_kpis(cursor, days=30, late_threshold=ROLLUP_CONFIG['late_threshold'])
+        return {
+            "success": True,
+            "database": database,
+            "period": "Últimos 30 días",
+            "source": source,
+            "backend": backend,
+            "kpis": kpi_results,
+            "timestamp": datetime.now().isoformat()
+        }
         
+    except Exception as e:
+        return {
+            "success": False,
+            "error": str(e),
+            "database": database,
+            "timestamp": datetime.now().isoformat()
+        }
+
+
+@mcp.tool()
+@database_tool(db_executor)
+def get_weekly_attendance_summary(database: str, weeks_ago: int = 0, top: int = 5) -> Dict[str, Any]:
+    """
+    Resumen semanal de asistencia (lunes a viernes) desde el resumen diario por usuario.
+    
+    database: Base de datos que contiene la tabla core_registro
+    weeks_ago: 0 = semana actual, 1 = semana pasada, ...
+    top: Número de personas en los listados de retardos y puntualidad
+    """
+    try:
         with get_db_connection(database) as conn:
             with conn.cursor() as cursor:
-                
-                # 1. Tasa de puntualidad
-                cursor.execute("""
-                    SELECT 
-                        COUNT(CASE WHEN TIME(tiempo) <= '08:10:00' THEN 1 END) as puntuales,
-                        COUNT(CASE WHEN estado_id = 1 THEN 1 END) as total_entradas
-                    FROM core_registro 
-                    WHERE tiempo >= DATE_SUB(CURDATE(), INTERVAL 30 DAY)
-                        AND estado_id = 1;
-                """)
-                punctuality = cursor.fetchone()
-                
-                if punctuality and punctuality[1] > 0:
-                    punctuality_rate = round((punctuality[0] / punctuality[1]) * 100, 2)
-                    kpi_results["punctuality_rate"] = {
-                        "percentage": punctuality_rate,
-                        "punctual_arrivals": punctuality[0],
-                        "total_arrivals": punctuality[1]
+                refresh = attendance_rollup.refresh(cursor, database)
+        today = datetime.now().date()
+        week_start = today - timedelta(days=today.weekday() + 7 * max(0, weeks_ago))
+        summary = attendance_rollup.weekly_summary(database, week_start, ROLLUP_CONFIG['morning_cutoff'], top)
+        return {
+            "success": True,
+            "database": database,
+            **summary,
+            "late_threshold": ROLLUP_CONFIG['late_threshold'],
+            "rollup": refresh,
+            "timestamp": datetime.now().isoformat()
+        }
+    except Exception as e:
+        return {
+            "success": False,
+            "error": str(e),
+            "database": database,
+            "timestamp": datetime.now().isoformat()
+        }
+
+
+@mcp.tool()
+@database_tool(db_executor)
+def refresh_attendance_rollup(database: str, rebuild_days: int = 0) -> Dict[str, Any]:
+    """
+    Actualizar el resumen diario por usuario con los registros nuevos de core_registro.
+    
+    rebuild_days: Volver a agregar desde los datos crudos los últimos N días (recoge
+                  checadas corregidas o borradas, que la marca de agua por id no detecta)
+    """
+    try:
+        with get_db_connection(database) as conn:
+            with conn.cursor() as cursor:
+                result = attendance_rollup.refresh(cursor, database, force=True)
+                if rebuild_days > 0:
+                    since = datetime.now().date() - timedelta(days=rebuild_days)
+                    result["rebuild"] = attendance_rollup.rebuild(cursor, database, since)
+        return {
+            "success": True,
+            "database": database,
+            **result,
+            "timestamp": datetime.now().isoformat()
+        }
+    except Exception as e:
+        return {
+            "success": False,
+            "error": str(e),
+            "database": database,
+            "timestamp": datetime.now().isoformat()
+        }
+
+
+@mcp.tool()
+@database_tool(db_executor)
+def export_attendance_snapshot(database: str, date_from: str = None, date_to: str = None) -> Dict[str, Any]:
+    """
+    Exportar core_registro a una instantánea columnar particionada por mes (ver snapshots.py).
+    
+    date_from, date_to: Meses a exportar (se reescriben completos); sin fechas se exporta toda la
+                        tabla. Los meses fuera del rango que ya estaban en la instantánea se conservan
+    """
+    try:
+        directory = snapshot_directory(database)
+        with snapshot_export_lock:
+            with get_db_connection(database) as conn:
+                # Cursor sin búfer: cada mes se lee por lotes con fetchmany
+                with conn.cursor(pymysql.cursors.SSCursor) as cursor:
+                    result = export_snapshot(cursor, directory, database, date_from, date_to,
+                                             SNAPSHOT_CONFIG['batch_rows'])
+        logger.info(f"🗂️  Instantánea de {database}: {result['rows_written']} registros en "
+                    f"{len(result['partitions_written'])} meses ({result['elapsed_seconds']}s)")
+        return {
+            "success": True,
+            "database": database,
+            **result,
+            "timestamp": datetime.now().isoformat()
+        }
+    except Exception as e:
+        return {
+            "success": False,
+            "error": str(e),
+            "database": database,
+            "timestamp": datetime.now().isoformat()
+        }
+
+
+@mcp.tool()
+@database_tool(db_executor)
+def sync_mirror(database: str, rebuild: bool = False) -> Dict[str, Any]:
+    """
+    Sincronizar el espejo SQLite local (MIRROR_CONFIG['tables']) con las filas nuevas de MariaDB.
+    
+    rebuild: Recargar las tablas completas (recoge filas corregidas o borradas, que la marca
+             de agua por id no detecta)
+    
+    Las herramientas de análisis leen el espejo con backend="mirror", sin cargar MariaDB.
+    """
+    try:
+        with get_db_connection(database) as conn:
+            with conn.cursor() as cursor:
+                result = sqlite_mirror.sync(cursor, database, force=True, rebuild=rebuild)
+        return {
+            "success": True,
+            "database": database,
+            **result,
+            "mirror": sqlite_mirror.status(database),
+            "timestamp": datetime.now().isoformat()
+        }
+    except Exception as e:
+        return {
+            "success": False,
+            "error": str(e),
+            "database": database,
+            "timestamp": datetime.now().isoformat()
+        }
+
+
+@mcp.tool()
+@database_tool(db_executor)
+def export_query(database: str, query: str, format: str = "csv", backend: str = "mariadb",
+                 params: Optional[List[Any]] = None) -> Dict[str, Any]:
+    """
+    Exportar el resultado completo de una consulta SELECT a un archivo comprimido en disco.
+    
+    format: 'csv' (con encabezado) o 'ndjson' (un objeto JSON por línea), ambos con gzip
+    backend: 'mariadb' o 'mirror' (espejo SQLite local, ver sync_mirror)
+    params: Valores de los placeholders %s de la consulta, como en execute_query
+            (un '%' literal va como '%%')
+    
+    Para volcados grandes (un mes de checadas para nómina) en lugar de execute_query: las
+    filas se leen con un cursor sin búfer por lotes de EXPORT_CONFIG['batch_rows'] y se
+    escriben directo al archivo, sin LIMIT y con memoria constante. La respuesta trae la
+    URI del recurso (export://ID), la ruta, el número de filas y los bytes, no los datos.
+    """
+    logger.info(f"📤 Exportando consulta de '{database}' a {format}: {query[:100]}...")
+    started = time.perf_counter()
+    try:
+        if format not in EXPORT_FORMATS:
+            return {
+                "success": False,
+                "error": f"Formato de exportación no válido: '{format}'. Opciones: {', '.join(EXPORT_FORMATS)}",
+                "timestamp": datetime.now().isoformat()
+            }
+        backend_error = invalid_backend_error(backend)
+        if backend_error:
+            return backend_error
+        
+        is_valid, validation_msg = validate_sql_query(query)
+        if not is_valid:
+            logger.warning(f"⚠️  Consulta SQL rechazada por seguridad: {validation_msg}")
+            return {
+                "success": False,
+                "error": f"Consulta rechazada por seguridad: {validation_msg}",
+                "timestamp": datetime.now().isoformat()
+            }
+        query = strip_statement_end(query)
+        original_query = query
+        query, rewrites = rewrite_query(query)
+        # Sin placeholders se envía None: pymysql no interpreta los '%' de la consulta
+        params = list(params) if params else None
+        
+        with get_backend_connection(database, backend) as conn:
+            with conn.cursor() as cursor:
+                query, verdict = guard_query_cost(cursor, database, query, backend, params)
+            if verdict and verdict["action"] == "reject":
+                return cost_rejection_error(database, query, verdict)
+            with conn.cursor(pymysql.cursors.SSCursor) as cursor:
+                cursor.execute(query, params)
+                info = export_store.export(cursor, format, EXPORT_CONFIG['batch_rows'],
+                                           EXPORT_CONFIG['compresslevel'],
+                                           database=database, query=query, params=params, backend=backend)
+        if backend == "mariadb":
+            workload_log.record(database, "export_query", query, params,
+                                elapsed_ms=(time.perf_counter() - started) * 1000)
+        logger.info(f"📤 Exportación {info['export_id']}: {info['rows']} filas, {info['bytes']} bytes "
+                    f"({info['elapsed_seconds']}s)")
+        return {
+            "success": True,
+            "uri": f"export://{info['export_id']}",
+            **info,
+            "rewrites": rewrites,
+            "original_query": original_query if rewrites else None,
+            "cost_guard": verdict,
+            "timestamp": datetime.now().isoformat()
+        }
+    except Exception as e:
+        return {
+            "success": False,
+            "error": str(e),
+            "database": database,
+            "query": query,
+            "timestamp": datetime.now().isoformat()
+        }
+
+
+def advisor_test_connection_factory(database: str):
+    """Fábrica de conexiones a la instancia de prueba del asesor de índices, o (None, motivo)"""
+    test_instance = INDEX_ADVISOR_CONFIG['test_instance']
+    if not test_instance:
+        return None, "Sin instancia de prueba configurada: solo se reporta el plan actual (EXPLAIN antes)"
+    same_server = (test_instance.get('host', DB_CONFIG['host']) == DB_CONFIG['host']
+                   and test_instance.get('port', 3306) == DB_CONFIG.get('port', 3306))
+    if same_server and test_instance.get('database', database) == database:
+        return None, "La instancia de prueba apunta a la base de producción: no se crean índices"
+    config = {**DB_CONFIG, **test_instance}
+    return (lambda: pymysql.connect(**config)), None
+
+
+@mcp.tool()
+@database_tool(db_executor)
+def suggest_indexes(database: str, table: str = "core_registro", include_generated: bool = True,
+                    max_suggestions: int = 5, measure: bool = True) -> Dict[str, Any]:
+    """
+    Sugerir índices compuestos o de cobertura para las consultas que el servidor realmente ejecuta.
+    
+    database: Base de datos a analizar
+    table: Tabla objetivo (por defecto core_registro)
+    include_generated: Incluir los análisis de generate_attendance_query (últimos 30 días)
+    max_suggestions: Número máximo de sugerencias
+    measure: Medir cada sugerencia con EXPLAIN antes/después (el "después" requiere
+             INDEX_ADVISOR_CONFIG['test_instance'], donde el índice se crea y se elimina)
+    """
+    logger.info(f"🧭 Analizando carga para sugerir índices en '{database}.{table}'")
+    try:
+        workload = workload_log.entries(database)
+        logged = len(workload)
+        generated = 0
+        if include_generated and table == "core_registro":
+            known = {normalize_sql(entry["sql"]) for entry in workload}
+            date_to = datetime.now().date()
+            date_from = date_to - timedelta(days=30)
+            for analysis_type in ANALYSIS_KEYSETS:
+                result = generate_attendance_query(database, analysis_type, date_from.isoformat(), date_to.isoformat())
+                if result.get("success") and normalize_sql(result["query"]) not in known:
+                    workload.append({"database": database, "source": f"generated:{analysis_type}",
+                                     "sql": result["query"], "params": result["params"], "count": 1})
+                    generated += 1
+        
+        notes = []
+        with get_db_connection(database) as conn:
+            with conn.cursor() as cursor:
+                column_types, existing_indexes = index_advisor.load_schema(cursor, database, table)
+                if not column_types:
+                    return {
+                        "success": False,
+                        "error": f"La tabla '{table}' no existe en '{database}'",
+                        "timestamp": datetime.now().isoformat()
                     }
+                suggestions = index_advisor.suggest(workload, table, column_types, existing_indexes, max_suggestions)
                 
-                # 2. Promedio de horas trabajadas
-                cursor.execute("""
-                    SELECT AVG(horas_trabajadas) as promedio_horas
-                    FROM (
-                        SELECT 
-                            TIMESTAMPDIFF(MINUTE, r1.tiempo, r2.tiempo) / 60.0 as horas_trabajadas
-                        FROM core_registro r1
-                        JOIN core_registro r2 ON r1.usuario_id = r2.usuario_id
-                            AND DATE(r1.tiempo) = DATE(r2.tiempo)
-                            AND r1.estado_id = 1 
-                            AND r2.estado_id = 2
-                            AND r2.tiempo > r1.tiempo
-                        WHERE r1.tiempo >= DATE_SUB(CURDATE(), INTERVAL 30 DAY)
-                    ) horas_diarias;
-                """)
-                avg_hours = cursor.fetchone()
-                
-                if avg_hours and avg_hours[0]:
-                    kpi_results["average_work_hours"] = round(float(avg_hours[0]), 2)
-                
-                # 3. Días con registros de asistencia
-                cursor.execute("""
-                    SELECT COUNT(DISTINCT DATE(tiempo)) as dias_activos
-                    FROM core_registro 
-                    WHERE tiempo >= DATE_SUB(CURDATE(), INTERVAL 30 DAY)
-                        AND estado_id = 1;
-                """)
-                active_days = cursor.fetchone()
-                
-                if active_days:
-                    kpi_results["active_days_last_30"] = active_days[0]
-                
-                # 4. Usuarios únicos activos
-                cursor.execute("""
-                    SELECT COUNT(DISTINCT usuario_id) as usuarios_activos
-                    FROM core_registro 
-                    WHERE tiempo >= DATE_SUB(CURDATE(), INTERVAL 30 DAY);
-                """)
-                active_users = cursor.fetchone()
-                
-                if active_users:
-                    kpi_results["active_users_last_30"] = active_users[0]
-                
-                return {
-                    "success": True,
-                    "database": database,
-                    "period": "Últimos 30 días",
-                    "kpis": kpi_results,
-                    "timestamp": datetime.now().isoformat()
-                }
-                
+                test_factory, reason = advisor_test_connection_factory(database)
+                if reason:
+                    notes.append(reason)
+                if measure:
+                    for suggestion in suggestions:
+                        try:
+                            suggestion["measurement"] = index_advisor.measure(suggestion, table, cursor, test_factory)
+                        except Exception as e:
+                            logger.warning(f"⚠️  No se pudo medir {suggestion['index_columns']}: {e}")
+                            suggestion["measurement"] = {"error": str(e)}
+        
+        for suggestion in suggestions:
+            suggestion["queries"] = [
+                {"source": entry["source"], "count": entry.get("count", 1), "sql": " ".join(entry["sql"].split())[:300]}
+                for entry in suggestion["queries"]
+            ]
+            if suggestion["non_sargable_predicates"]:
+                notes.append(
+                    f"Predicados no sargables en consultas de {suggestion['index_columns']}: "
+                    f"{', '.join(suggestion['non_sargable_predicates'])} (DATE/YEAR se pueden reescribir "
+                    f"como rango sobre la columna; MONTH/TIME/HOUR/WEEKDAY no aprovechan el índice)"
+                )
+        
+        return {
+            "success": True,
+            "database": database,
+            "table": table,
+            "workload": {"queries_analyzed": len(workload), "from_log": logged, "generated": generated},
+            "existing_indexes": existing_indexes,
+            "suggestions": suggestions,
+            "notes": notes,
+            "timestamp": datetime.now().isoformat()
+        }
     except Exception as e:
         return {
             "success": False,
             "error": str(e),
             "database": database,
+            "table": table,
             "timestamp": datetime.now().isoformat()
         }
 
@@ -1042,10 +2311,14 @@ def get_attendance_help() -> str:
        - user_pattern: Patrones de comportamiento por usuario
        - device_usage: Análisis de uso de dispositivos/lugares
        - hourly_distribution: Distribución por horas del día
+       - work_hours: Horas trabajadas por usuario y día (pares entrada-salida)
+       - Devuelve 'query' con placeholders %s y sus 'params'; para ejecutarla:
+         execute_query(database, query=r["query"], params=r["params"])
        
     2. execute_attendance_analysis: Ejecuta análisis y devuelve resultados
        - Combina generate_attendance_query + execute_query
        - Devuelve datos formateados listos para usar
+       - engine='numpy': resuelve el análisis sobre el rango de fechas en memoria (por defecto 'sql')
        
     3. validate_attendance_data: Validación de calidad de datos
        - duplicates: Registros duplicados
@@ -1071,6 +2344,7 @@ def get_attendance_help() -> str:
 
 
 @mcp.resource("mariadb://status")
+@database_tool(db_executor)
 def get_server_status() -> str:
     """Obtener estado actual del servidor MariaDB"""
     try:
@@ -1094,6 +2368,72 @@ def get_server_status() -> str:
         return json.dumps({"error": str(e), "timestamp": datetime.now().isoformat()}, indent=2)
 
 
+@mcp.resource("mariadb://pool_stats")
+def get_pool_stats() -> str:
+    """Estadísticas del pool de conexiones (en uso, inactivas, esperas y tiempo de espera)"""
+    stats = db_pools.stats()
+    stats["config"] = POOL_CONFIG
+    stats["replication"] = replica_router.stats()
+    stats["replica_pools"] = {name: replica_router.pools(name).stats() for name in replica_router.replicas}
+    stats["executor"] = db_executor.stats()
+    stats["prepared_statements"] = prepared_statements.stats()
+    stats["timestamp"] = datetime.now().isoformat()
+    return json.dumps(stats, indent=2)
+
+
+@mcp.resource("mariadb://cache_stats")
+def get_cache_stats() -> str:
+    """Estadísticas del cache de resultados (aciertos, fallos, desalojos e invalidaciones)"""
+    stats = result_cache.stats()
+    stats["config"] = CACHE_CONFIG
+    stats["sql_validator"] = sql_validator.stats()
+    stats["cost_guard"] = cost_guard.stats()
+    stats["schema_cache"] = schema_cache.stats()
+    stats["attendance_rollup"] = attendance_rollup.stats()
+    stats["attendance_engine"] = attendance_engine.stats()
+    stats["sqlite_mirror"] = sqlite_mirror.stats()
+    stats["exports"] = export_store.stats()
+    stats["result_handles"] = result_handles.stats()
+    stats["timestamp"] = datetime.now().isoformat()
+    return json.dumps(stats, indent=2)
+
+
+@mcp.resource("export://{export_id}")
+def get_export(export_id: str) -> str:
+    """Metadatos de una exportación de export_query (ruta del archivo, columnas, filas y bytes)"""
+    try:
+        return json.dumps(export_store.get(export_id), indent=2, ensure_ascii=False)
+    except ExportError as e:
+        return json.dumps({"success": False, "error": str(e), "timestamp": datetime.now().isoformat()},
+                          indent=2, ensure_ascii=False)
+
+
+def _result_resource(read, *args) -> str:
+    try:
+        return json.dumps(read(*args), indent=2, ensure_ascii=False, default=str)
+    except HandleError as e:
+        return json.dumps({"success": False, "error": str(e), "timestamp": datetime.now().isoformat()},
+                          indent=2, ensure_ascii=False)
+
+
+@mcp.resource("result://{handle}")
+def get_result_handle(handle: str) -> str:
+    """Descripción de un resultado materializado (columnas, filas, bytes y expiración)"""
+    return _result_resource(result_handles.info, handle)
+
+
+@mcp.resource("result://{handle}/{offset}/{size}")
+def get_result_slice(handle: str, offset: int, size: int) -> str:
+    """Rebanada [offset, offset + size) de un resultado materializado"""
+    return _result_resource(result_handles.slice, handle, offset, size)
+
+
+@mcp.resource("result://{handle}/{offset}/{size}/{order_by}")
+def get_sorted_result_slice(handle: str, offset: int, size: int, order_by: str) -> str:
+    """Rebanada de un resultado materializado reordenado ('col' ascendente, '-col' descendente, con comas)"""
+    return _result_resource(result_handles.slice, handle, offset, size, order_by)
+
+
 # Entry point to run the server
 if __name__ == "__main__":
     mcp.run()
@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+# snapshots.py
+"""
+Instantáneas columnares de core_registro particionadas por mes.
+
+Cada instantánea es un directorio:
+
+    manifest.json     base de datos, fecha de creación y, por mes, filas y min/max de id y tiempo
+    dictionary.json   valores de cada columna de texto (el código es la posición en la lista)
+    2025-03/          un .npy de ancho fijo por columna: id (int64), usuario_id (int32),
+                      estado_id (int8), tiempo (int64, segundos desde 1970) y los códigos
+                      int32 de nombre, codigo_usuario, evento, lugar y dispositivo
+
+Las filas de cada mes están en el orden de attendance_engine (usuario, tiempo, id),
+así que los análisis mapean en memoria solo los meses que se cruzan con el rango
+pedido y trabajan sobre los archivos sin copiarlos (un solo mes) o con una sola
+concatenación. Sirve también como conjunto de datos portátil para probar las
+herramientas de asistencia sin acceso a MariaDB.
+
+Uso:
+    python snapshots.py export BASE [--dir DIRECTORIO] [--from AAAA-MM-DD] [--to AAAA-MM-DD]
+    python snapshots.py info DIRECTORIO
+    python snapshots.py analyze DIRECTORIO TIPO [--from ...] [--to ...] [--user ...] [--limit 20]
+"""
+import argparse
+import functools
+import json
+import logging
+import os
+import shutil
+import time
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from attendance_engine import (AttendanceFrame, Dictionary, ANALYSES, TEXT_COLUMNS,
+                               SECONDS_PER_DAY, day_bounds, range_sql, run_analysis)
+from db_config import SNAPSHOT_CONFIG
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_VERSION = 1
+MANIFEST_FILE = "manifest.json"
+DICTIONARY_FILE = "dictionary.json"
+ARRAY_DTYPES = dict({"id": "int64", "usuario_id": "int32", "estado_id": "int8", "tiempo": "int64"},
+                    **{column: "int32" for column in TEXT_COLUMNS})
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+class SnapshotError(Exception):
+    """Instantánea inexistente, incompatible o de otra base de datos"""
+
+
+def _seconds(moment: datetime) -> int:
+    return int((moment - _EPOCH).total_seconds())
+
+
+def _iso(seconds: int) -> str:
+    return np.datetime64(int(seconds), 's').astype(object).isoformat()
+
+
+def _months(first: date, last: date) -> List[Tuple[str, int, int]]:
+    """(AAAA-MM, inicio, fin) en segundos de cada mes entre first y last"""
+    months = []
+    year, month = first.year, first.month
+    while (year, month) <= (last.year, last.month):
+        next_year, next_month = (year + 1, 1) if month == 12 else (year, month + 1)
+        low = (date(year, month, 1) - _EPOCH.date()).days * SECONDS_PER_DAY
+        high = (date(next_year, next_month, 1) - _EPOCH.date()).days * SECONDS_PER_DAY
+        months.append((f"{year:04d}-{month:02d}", low, high))
+        year, month = next_year, next_month
+    return months
+
+
+def _write_json(path: str, data: Dict[str, Any]):
+    temporary = f"{path}.tmp"
+    with open(temporary, "w", encoding="utf-8") as handle:
+        json.dump(data, handle, ensure_ascii=False, default=str)
+    os.replace(temporary, path)
+
+
+def _read_json(path: str) -> Dict[str, Any]:
+    with open(path, encoding="utf-8") as handle:
+        return json.load(handle)
+
+
+def _write_partition(directory: str, key: str, frame: AttendanceFrame):
+    """Escribir los arreglos del mes en un directorio temporal y reemplazar el anterior"""
+    final = os.path.join(directory, key)
+    temporary = f"{final}.tmp"
+    shutil.rmtree(temporary, ignore_errors=True)
+    os.makedirs(temporary)
+    arrays = dict({"id": frame.ids, "usuario_id": frame.users, "estado_id": frame.states, "tiempo": frame.times},
+                  **frame.text)
+    for column, dtype in ARRAY_DTYPES.items():
+        np.save(os.path.join(temporary, f"{column}.npy"), arrays[column].astype(dtype, copy=False))
+    _remove_partition(directory, key)
+    os.rename(temporary, final)
+
+
+def _remove_partition(directory: str, key: str):
+    # Los lectores con el mes mapeado conservan sus archivos hasta cerrarlos
+    final = os.path.join(directory, key)
+    if os.path.isdir(final):
+        stale = f"{final}.old"
+        shutil.rmtree(stale, ignore_errors=True)
+        os.rename(final, stale)
+        shutil.rmtree(stale, ignore_errors=True)
+
+
+def export_snapshot(cursor, directory: str, database: str, date_from: str = None, date_to: str = None,
+                    batch_rows: int = 50_000) -> Dict[str, Any]:
+    """
+    Exportar core_registro a `directory`, un mes a la vez (cada mes es una consulta por rango
+    de tiempo). Si ya hay una instantánea de la misma base, solo se reescriben los meses del
+    rango y los diccionarios se extienden, así los códigos existentes no cambian.
+    """
+    started = time.perf_counter()
+    manifest_path = os.path.join(directory, MANIFEST_FILE)
+    manifest = {"version": SNAPSHOT_VERSION, "database": database, "partitions": {}}
+    dictionaries = {column: Dictionary() for column in TEXT_COLUMNS}
+    if os.path.exists(manifest_path):
+        manifest = _read_json(manifest_path)
+        if manifest.get("version") != SNAPSHOT_VERSION or manifest.get("database") != database:
+            raise SnapshotError(f"{directory} contiene una instantánea de otra base o versión")
+        stored = _read_json(os.path.join(directory, DICTIONARY_FILE))
+        dictionaries = {column: Dictionary.from_values(stored[column]) for column in TEXT_COLUMNS}
+    os.makedirs(directory, exist_ok=True)
+
+    cursor.execute("SELECT MIN(tiempo), MAX(tiempo), MAX(id) FROM core_registro")
+    first, last, max_id = cursor.fetchone()
+    written: List[str] = []
+    total_rows = 0
+    if first is not None:
+        first = max(first.date(), date.fromisoformat(date_from[:10])) if date_from else first.date()
+        last = min(last.date(), date.fromisoformat(date_to[:10])) if date_to else last.date()
+        for key, low, high in _months(first, last):
+            # Meses completos aunque el rango empiece o termine a la mitad
+            frame = AttendanceFrame(database, low, high)
+            frame.dictionaries = dictionaries
+            sql, params = range_sql(low, high, "id <= %s")
+            cursor.execute(sql, params + [max_id])
+            while True:
+                batch = cursor.fetchmany(batch_rows)
+                if not batch:
+                    break
+                frame.append(batch)
+            frame.finish()
+            if not len(frame):
+                _remove_partition(directory, key)
+                manifest["partitions"].pop(key, None)
+                continue
+            _write_partition(directory, key, frame)
+            manifest["partitions"][key] = {
+                "rows": len(frame),
+                "min_id": int(frame.ids.min()),
+                "max_id": int(frame.ids.max()),
+                "min_tiempo": _iso(frame.times.min()),
+                "max_tiempo": _iso(frame.times.max())
+            }
+            written.append(key)
+            total_rows += len(frame)
+            logger.info(f"🗂️  Instantánea {database}/{key}: {len(frame)} registros")
+
+    # El diccionario antes que el manifiesto: un lector nunca ve códigos sin su valor
+    _write_json(os.path.join(directory, DICTIONARY_FILE),
+                {column: dictionaries[column].values for column in TEXT_COLUMNS})
+    manifest["partitions"] = dict(sorted(manifest["partitions"].items()))
+    manifest.update({
+        "columns": ARRAY_DTYPES,
+        "created_at": datetime.now().isoformat(),
+        "max_id": max(max_id or 0, manifest.get("max_id") or 0)
+    })
+    _write_json(manifest_path, manifest)
+    return {
+        "directory": directory,
+        "partitions_written": written,
+        "rows_written": total_rows,
+        "partitions": len(manifest["partitions"]),
+        "bytes": snapshot_bytes(directory),
+        "elapsed_seconds": round(time.perf_counter() - started, 2)
+    }
+
+
+def snapshot_bytes(directory: str) -> int:
+    total = 0
+    for root, _, files in os.walk(directory):
+        total += sum(os.path.getsize(os.path.join(root, name)) for name in files)
+    return total
+
+
+class Snapshot:
+    """Instantánea abierta para lectura: manifiesto y diccionarios en memoria, meses mapeados bajo demanda"""
+
+    def __init__(self, directory: str):
+        manifest_path = os.path.join(directory, MANIFEST_FILE)
+        if not os.path.exists(manifest_path):
+            raise SnapshotError(f"No hay instantánea en {directory}")
+        self.directory = directory
+        self.manifest = _read_json(manifest_path)
+        if self.manifest.get("version") != SNAPSHOT_VERSION:
+            raise SnapshotError(f"Versión de instantánea no soportada: {self.manifest.get('version')}")
+        stored = _read_json(os.path.join(directory, DICTIONARY_FILE))
+        self.dictionaries = {column: Dictionary.from_values(stored[column]) for column in TEXT_COLUMNS}
+
+    @property
+    def database(self) -> str:
+        return self.manifest["database"]
+
+    def partitions_for(self, low: Optional[int], high: Optional[int]) -> List[str]:
+        """Meses cuyo [min_tiempo, max_tiempo] se cruza con [low, high)"""
+        keys = []
+        for key, partition in self.manifest["partitions"].items():
+            first = _seconds(datetime.fromisoformat(partition["min_tiempo"]))
+            last = _seconds(datetime.fromisoformat(partition["max_tiempo"]))
+            if (low is None or last >= low) and (high is None or first < high):
+                keys.append(key)
+        return keys
+
+    def _load(self, key: str) -> Dict[str, np.ndarray]:
+        return {column: np.load(os.path.join(self.directory, key, f"{column}.npy"), mmap_mode="r")
+                for column in ARRAY_DTYPES}
+
+    def frame(self, low: Optional[int], high: Optional[int]) -> Tuple[AttendanceFrame, List[str]]:
+        """Frame de los meses que cubren el rango (los días no cruzan meses, los grupos usuario-día siguen contiguos)"""
+        keys = self.partitions_for(low, high)
+        parts = [self._load(key) for key in keys]
+        if len(parts) == 1:
+            arrays = parts[0]
+        else:
+            arrays = {column: np.concatenate([part[column] for part in parts]) if parts
+                      else np.empty(0, dtype=dtype) for column, dtype in ARRAY_DTYPES.items()}
+        return AttendanceFrame.from_arrays(self.database, low, high, arrays, self.dictionaries), keys
+
+    def analyze(self, analysis_type: str, date_from: str = None, date_to: str = None,
+                user_filter: str = None) -> Dict[str, Any]:
+        low, high = day_bounds(date_from, date_to)
+        frame, keys = self.frame(low, high)
+        return dict(run_analysis(frame, analysis_type, low, high, user_filter), partitions_read=keys)
+
+    def info(self) -> Dict[str, Any]:
+        partitions = self.manifest["partitions"]
+        return {
+            "directory": self.directory,
+            "database": self.database,
+            "created_at": self.manifest.get("created_at"),
+            "max_id": self.manifest.get("max_id"),
+            "rows": sum(partition["rows"] for partition in partitions.values()),
+            "partitions": partitions
+        }
+
+
+@functools.lru_cache(maxsize=16)
+def _open(directory: str, modified: int) -> Snapshot:
+    return Snapshot(directory)
+
+
+def snapshot_directory(database: str) -> str:
+    """Directorio de la instantánea de una base (el nombre no puede salir de SNAPSHOT_CONFIG['directory'])"""
+    if not database or database in (".", "..") or os.path.basename(database) != database:
+        raise SnapshotError(f"Nombre de base de datos no válido para una instantánea: {database!r}")
+    return os.path.join(SNAPSHOT_CONFIG['directory'], database)
+
+
+def open_snapshot(directory: str) -> Snapshot:
+    """Snapshot de `directory`; se reabre cuando cambia su manifiesto"""
+    try:
+        modified = os.stat(os.path.join(directory, MANIFEST_FILE)).st_mtime_ns
+    except FileNotFoundError:
+        raise SnapshotError(f"No hay instantánea en {directory}; crearla con export_attendance_snapshot "
+                            f"o python snapshots.py export") from None
+    return _open(os.path.abspath(directory), modified)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    export = commands.add_parser("export", help="Exportar core_registro de una base a una instantánea")
+    export.add_argument("database")
+    export.add_argument("--dir", help="Directorio de la instantánea (por defecto SNAPSHOT_CONFIG['directory']/BASE)")
+    export.add_argument("--from", dest="date_from")
+    export.add_argument("--to", dest="date_to")
+    info = commands.add_parser("info", help="Mostrar el manifiesto de una instantánea")
+    info.add_argument("directory")
+    analyze = commands.add_parser("analyze", help="Ejecutar un análisis de asistencia sin base de datos")
+    analyze.add_argument("directory")
+    analyze.add_argument("analysis_type", choices=sorted(ANALYSES))
+    analyze.add_argument("--from", dest="date_from")
+    analyze.add_argument("--to", dest="date_to")
+    analyze.add_argument("--user", dest="user_filter")
+    analyze.add_argument("--limit", type=int, default=20, help="Filas a mostrar")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        # Solo la exportación necesita MariaDB
+        import pymysql
+        from db_config import DB_CONFIG
+        directory = args.dir or snapshot_directory(args.database)
+        conn = pymysql.connect(**DB_CONFIG, database=args.database)
+        try:
+            with conn.cursor(pymysql.cursors.SSCursor) as cursor:
+                result = export_snapshot(cursor, directory, args.database, args.date_from, args.date_to)
+        finally:
+            conn.close()
+        print(json.dumps(result, indent=2, ensure_ascii=False))
+    elif args.command == "info":
+        print(json.dumps(Snapshot(args.directory).info(), indent=2, ensure_ascii=False))
+    else:
+        result = Snapshot(args.directory).analyze(args.analysis_type, args.date_from, args.date_to, args.user_filter)
+        print(f"📊 {args.analysis_type}: {len(result['rows'])} filas de {result['rows_analyzed']} registros "
+              f"({', '.join(result['partitions_read']) or 'sin meses'}) en {result['compute_ms']} ms")
+        print(" | ".join(result["columns"]))
+        for row in result["rows"][:args.limit]:
+            print(" | ".join("" if value is None else str(value) for value in row))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+# sql_rewriter.py
+"""
+Reescritura de predicados de fecha envueltos en funciones a rangos sobre la
+columna, para que las consultas del LLM puedan usar el índice de `tiempo`.
+
+- DATE(col) = fecha            -> col >= fecha AND col < fecha + 1 día
+- DATE(col) >=, >, <=, < fecha -> el lado correspondiente del rango semiabierto
+- DATE(col) BETWEEN a AND b    -> col >= a AND col < b + 1 día
+- fecha <op> DATE(col)         -> igual, con el operador invertido
+- YEAR(col) <op> 2025          -> rango entre '2025-01-01' y '2026-01-01'
+- col <op> CONCAT(DATE(col), ' 08:10:00') -> TIME(col) <op> '08:10:00'
+  (una hora del día en todas las fechas no es un rango sobre col; la forma
+  TIME() es equivalente y evita armar y convertir una cadena por fila)
+
+Las fechas admitidas son CURDATE(), CURRENT_DATE, DATE(NOW()), literales
+'AAAA-MM-DD' y esas mismas con DATE_SUB/DATE_ADD o +/- INTERVAL n DAY|WEEK|
+MONTH|YEAR. Los patrones se buscan sobre una copia con los literales y
+comentarios enmascarados (sql_validator.mask_literals), así que el texto dentro
+de cadenas nunca se reescribe. Si un operando va seguido o precedido de otra
+operación aritmética, el predicado se deja como está.
+"""
+import re
+from datetime import date, timedelta
+from typing import Callable, List, Optional, Tuple
+
+from sql_validator import mask_literals
+
+_COLUMN = r"((?:`[^`]+`|[A-Za-z_][\w$]*)(?:\.(?:`[^`]+`|[A-Za-z_][\w$]*))?)"
+_DATE_COLUMN = rf"\bDATE\s*\(\s*{_COLUMN}\s*\)"
+_LITERAL = r"'\x00*'"
+_BASE_DATE = rf"(?:CURDATE\s*\(\s*\)|CURRENT_DATE\b(?:\s*\(\s*\))?|DATE\s*\(\s*NOW\s*\(\s*\)\s*\)|{_LITERAL})"
+_INTERVAL = r"INTERVAL\s+\d+\s+(?:DAY|WEEK|MONTH|YEAR)\b"
+_DATE_OPERAND = (
+    rf"(?:(?:DATE_SUB|DATE_ADD|SUBDATE|ADDDATE)\s*\(\s*{_BASE_DATE}\s*,\s*{_INTERVAL}\s*\)"
+    rf"|{_BASE_DATE}(?:\s*[-+]\s*{_INTERVAL})?)"
+)
+_OPERATOR = r"(>=|<=|=|>|<)(?![=>])"
+# Lo que sigue al predicado no puede continuar la expresión (aritmética, INTERVAL, llamada)
+_END = r"(?!\s*(?:[-+*/%|^&]|\bDIV\b|\bMOD\b|\bINTERVAL\b|\())"
+_YEAR = r"(\d{4})\b(?!\s*[-+*/%.])"
+
+_DATE_BETWEEN_RE = re.compile(
+    rf"{_DATE_COLUMN}\s+BETWEEN\s+({_DATE_OPERAND})\s+AND\s+({_DATE_OPERAND}){_END}", re.IGNORECASE)
+_DATE_COMPARE_RE = re.compile(rf"{_DATE_COLUMN}\s*{_OPERATOR}\s*({_DATE_OPERAND}){_END}", re.IGNORECASE)
+_DATE_COMPARE_REVERSED_RE = re.compile(
+    rf"({_DATE_OPERAND})\s*{_OPERATOR}\s*{_DATE_COLUMN}{_END}", re.IGNORECASE)
+_YEAR_BETWEEN_RE = re.compile(rf"\bYEAR\s*\(\s*{_COLUMN}\s*\)\s+BETWEEN\s+{_YEAR}\s+AND\s+{_YEAR}{_END}",
+                              re.IGNORECASE)
+_YEAR_COMPARE_RE = re.compile(rf"\bYEAR\s*\(\s*{_COLUMN}\s*\)\s*{_OPERATOR}\s*{_YEAR}{_END}", re.IGNORECASE)
+_CONCAT_TIME_RE = re.compile(
+    rf"(?<![\w.`]){_COLUMN}\s*{_OPERATOR}\s*CONCAT\s*\(\s*DATE\s*\(\s*{_COLUMN}\s*\)\s*,\s*({_LITERAL})\s*\){_END}",
+    re.IGNORECASE)
+
+_ISO_DATE_LITERAL_RE = re.compile(r"'(\d{4}-\d{2}-\d{2})'")
+_ANY_LITERAL_RE = re.compile(r"'[^']*'")
+_TIME_SUFFIX_RE = re.compile(r"' (\d{2}:\d{2}:\d{2}(?:\.\d+)?)'")
+_FLIPPED = {'=': '=', '>=': '<=', '<=': '>=', '>': '<', '<': '>'}
+
+Rewrite = Tuple[str, str]
+
+
+def _date_operand(operand: str) -> Optional[Tuple[str, str]]:
+    """(fecha, día siguiente) del operando, o None si algún literal no es 'AAAA-MM-DD'"""
+    literals = _ANY_LITERAL_RE.findall(operand)
+    if any(not _ISO_DATE_LITERAL_RE.fullmatch(lit) for lit in literals):
+        return None
+    literal = _ISO_DATE_LITERAL_RE.fullmatch(operand.strip())
+    if literal:
+        try:
+            next_day = date.fromisoformat(literal.group(1)) + timedelta(days=1)
+        except ValueError:
+            return None
+        return operand, f"'{next_day.isoformat()}'"
+    return operand, f"{operand} + INTERVAL 1 DAY"
+
+
+def _date_range(column: str, op: str, start: str, next_day: str) -> str:
+    """DATE(column) <op> start como rango semiabierto sobre column"""
+    if op == '=':
+        return f"({column} >= {start} AND {column} < {next_day})"
+    if op == '>=':
+        return f"{column} >= {start}"
+    if op == '>':
+        return f"{column} >= {next_day}"
+    if op == '<=':
+        return f"{column} < {next_day}"
+    return f"{column} < {start}"
+
+
+def _same_column(a: str, b: str) -> bool:
+    return a.replace('`', '').lower() == b.replace('`', '').lower()
+
+
+def _continues_expression(masked: str, start: int) -> bool:
+    """El predicado es operando de otra operación (p. ej. 1 + DATE(col) = ...)"""
+    before = masked[:start].rstrip()
+    return bool(before) and (before[-1] in "+-*/%=<>!|&^~" or before.upper().endswith("INTERVAL"))
+
+
+def _apply(sql: str, pattern: "re.Pattern", replace: Callable[[Callable[[int], str]], Optional[str]],
+           rewrites: List[Rewrite]) -> str:
+    """Reemplazar las coincidencias del patrón en la copia enmascarada usando el texto original"""
+    masked = mask_literals(sql)
+    out = []
+    pos = 0
+    for match in pattern.finditer(masked):
+        if _continues_expression(masked, match.start()):
+            continue
+        replacement = replace(lambda i: sql[match.start(i):match.end(i)])
+        if replacement is None:
+            continue
+        original = sql[match.start():match.end()]
+        out.append(sql[pos:match.start()])
+        out.append(replacement)
+        rewrites.append((original, replacement))
+        pos = match.end()
+    out.append(sql[pos:])
+    return ''.join(out)
+
+
+def _date_between(group):
+    start, end = _date_operand(group(2)), _date_operand(group(3))
+    if not start or not end:
+        return None
+    column = group(1)
+    return f"({column} >= {start[0]} AND {column} < {end[1]})"
+
+
+def _date_compare(group):
+    operand = _date_operand(group(3))
+    return _date_range(group(1), group(2), *operand) if operand else None
+
+
+def _date_compare_reversed(group):
+    operand = _date_operand(group(1))
+    return _date_range(group(3), _FLIPPED[group(2)], *operand) if operand else None
+
+
+def _year_bounds(year: str) -> Tuple[str, str]:
+    return f"'{int(year):04d}-01-01'", f"'{int(year) + 1:04d}-01-01'"
+
+
+def _year_between(group):
+    column = group(1)
+    return f"({column} >= {_year_bounds(group(2))[0]} AND {column} < {_year_bounds(group(3))[1]})"
+
+
+def _year_compare(group):
+    return _date_range(group(1), group(2), *_year_bounds(group(3)))
+
+
+def _concat_time(group):
+    time_literal = _TIME_SUFFIX_RE.fullmatch(group(4))
+    if not time_literal or not _same_column(group(1), group(3)):
+        return None
+    return f"TIME({group(1)}) {group(2)} '{time_literal.group(1)}'"
+
+
+_RULES = (
+    (_DATE_BETWEEN_RE, _date_between),
+    (_DATE_COMPARE_RE, _date_compare),
+    (_DATE_COMPARE_REVERSED_RE, _date_compare_reversed),
+    (_YEAR_BETWEEN_RE, _year_between),
+    (_YEAR_COMPARE_RE, _year_compare),
+    (_CONCAT_TIME_RE, _concat_time),
+)
+
+
+def rewrite_sargable(sql: str) -> Tuple[str, List[str]]:
+    """Reescribir predicados de fecha no sargables. Devuelve (sql, reescrituras aplicadas)"""
+    rewrites: List[Rewrite] = []
+    for pattern, replace in _RULES:
+        sql = _apply(sql, pattern, replace, rewrites)
+    return sql, [f"{' '.join(original.split())} -> {replacement}" for original, replacement in rewrites]
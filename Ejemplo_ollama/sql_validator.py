@@ -0,0 +1,244 @@
+# sql_validator.py
+"""
+Validador de consultas SQL de solo lectura basado en un analizador léxico.
+
+Una sola pasada consume literales, identificadores entre comillas y comentarios
+como tokens completos; lo que queda es el código SQL "desnudo", que se parte en
+palabras para buscar las palabras clave como tokens. Así una columna `created_at`
+o un texto 'DROP' ya no se rechazan. Las consultas que solo tienen literales
+'...' simples (el caso habitual del LLM) se parten por la comilla en C sin
+recorrerlas caracter por caracter. Los veredictos se memorizan en un LRU
+indexado por el hash de la consulta.
+"""
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+
+FORBIDDEN_COMMANDS = (
+    'DROP', 'DELETE', 'UPDATE', 'INSERT', 'CREATE', 'ALTER',
+    'TRUNCATE', 'GRANT', 'REVOKE', 'EXEC', 'EXECUTE', 'CALL',
+    'LOAD_FILE'
+)
+
+# Caracteres que abren un token que hay que consumir completo
+_SPECIAL_RE = re.compile(r"['\"`#;]|/\*|--")
+# Si la consulta no contiene ninguno, los literales son solo '...' sin escapes
+_FAST_PATH_BLOCKERS = ('"', '`', '\\', '/*', '--', '#')
+_OUTFILE_RE = re.compile(r"\bINTO\s+(OUTFILE|DUMPFILE)\b")
+_PROCEDURE_RE = re.compile(r"(?<![\w.$])((?:XP|SP)_[\w$]*)\s*\(")
+
+# Tabla para partir el código en palabras: todo lo que no forma parte de un
+# identificador (letras, dígitos, _, $, '.', bytes no ASCII) se vuelve espacio
+_WORD_BYTES = set(b'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789_$.') | set(range(128, 256))
+_SPLIT_TABLE = bytes(b if b in _WORD_BYTES else 0x20 for b in range(256))
+_FORBIDDEN_WORDS = frozenset(cmd.encode('ascii') for cmd in FORBIDDEN_COMMANDS)
+
+
+def _closing_quote(text: str, start: int, quote: str) -> int:
+    """Posición de la comilla que cierra el literal abierto en start, o -1"""
+    i = start + 1
+    while True:
+        j = text.find(quote, i)
+        if j < 0:
+            return -1
+        if quote != '`':
+            backslashes = 0
+            k = j - 1
+            while k > start and text[k] == '\\':
+                backslashes += 1
+                k -= 1
+            if backslashes % 2:
+                i = j + 1
+                continue
+        if text.startswith(quote, j + 1):
+            # Comilla duplicada ('' o ``) dentro del literal
+            i = j + 2
+            continue
+        return j
+
+
+def _lex(upper: str) -> Tuple[str, Optional[str]]:
+    """
+    Recorrer la consulta (en mayúsculas) una vez y devolver (código sin literales
+    ni comentarios, primera violación léxica o None).
+    """
+    if not any(blocker in upper for blocker in _FAST_PATH_BLOCKERS):
+        # Camino rápido: partir por la comilla simple; las partes pares son código
+        parts = upper.split("'")
+        if len(parts) % 2 == 0:
+            return ' '.join(parts[::2]), "Literal o identificador sin cerrar"
+        code = ' '.join(parts[::2])
+        semicolon = code.find(';')
+        if semicolon >= 0 and code[semicolon + 1:].strip():
+            return code, "Caracter o patrón peligroso detectado: ;"
+        return code.replace(';', ' '), None
+
+    chunks = []
+    violation = None
+    pos = 0
+    while True:
+        match = _SPECIAL_RE.search(upper, pos)
+        if not match:
+            chunks.append(upper[pos:])
+            break
+        start = match.start()
+        token = match.group()
+        chunks.append(upper[pos:start])
+        chunks.append(' ')
+
+        if token in ("'", '"', '`'):
+            end = _closing_quote(upper, start, token)
+            if end < 0:
+                return ''.join(chunks), "Literal o identificador sin cerrar"
+            pos = end + 1
+        elif token == '/*':
+            if upper.startswith('!', start + 2) or upper.startswith('M!', start + 2):
+                violation = violation or "Comentarios ejecutables (/*! ... */) no permitidos"
+            end = upper.find('*/', start + 2)
+            if end < 0:
+                return ''.join(chunks), "Comentario sin cerrar"
+            pos = end + 2
+        elif token == ';':
+            # Solo se admite un ';' final; cualquier otro separa sentencias
+            if upper[start + 1:].strip():
+                violation = violation or "Caracter o patrón peligroso detectado: ;"
+            pos = start + 1
+        else:
+            return ''.join(chunks), f"Comentarios de línea no permitidos: {token}"
+    return ''.join(chunks), violation
+
+
+def mask_literals(query: str, fill: str = '\x00') -> str:
+    """
+    Copia de la consulta del mismo largo con el contenido de los literales '...' y
+    "..." reemplazado por `fill` (las comillas se conservan) y los comentarios de
+    bloque por espacios. Las posiciones coinciden con la original, así que lo que
+    se encuentre en la copia se puede recortar de la consulta original.
+    """
+    chars = list(query)
+    pos = 0
+    while True:
+        match = _SPECIAL_RE.search(query, pos)
+        if not match:
+            return ''.join(chars)
+        start = match.start()
+        token = match.group()
+        if token in ("'", '"', '`'):
+            end = _closing_quote(query, start, token)
+            if end < 0:
+                end = len(query)
+            if token != '`':
+                # Los identificadores entre backticks se conservan: son nombres de columna
+                chars[start + 1:end] = fill * (end - start - 1)
+            pos = end + 1
+        elif token == '/*':
+            end = query.find('*/', start + 2)
+            end = len(query) if end < 0 else end + 2
+            chars[start:end] = ' ' * (end - start)
+            pos = end
+        elif token in ('--', '#'):
+            end = query.find('\n', start)
+            end = len(query) if end < 0 else end
+            chars[start:end] = ' ' * (end - start)
+            pos = end
+        else:
+            pos = start + 1
+
+
+def parentheses_balanced(fragment: str) -> bool:
+    """
+    Los paréntesis del fragmento (fuera de literales y comentarios) cierran sin
+    quedar por debajo de cero: un filtro entre paréntesis no puede salirse de ellos.
+    """
+    depth = 0
+    for char in mask_literals(fragment):
+        if char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+            if depth < 0:
+                return False
+    return depth == 0
+
+
+def _scan(query: str) -> Tuple[bool, str]:
+    """Analizar la consulta y devolver (es_válida, mensaje)"""
+    code, violation = _lex(query.upper())
+    words = code.encode('utf-8').translate(_SPLIT_TABLE).split()
+    word_set = set(words)
+
+    forbidden = word_set & _FORBIDDEN_WORDS
+    if forbidden:
+        # Reportar en el orden de la lista para que el mensaje sea estable
+        cmd = next(c for c in FORBIDDEN_COMMANDS if c.encode('ascii') in forbidden)
+        return False, f"Comando prohibido detectado: {cmd}"
+    if b'OUTFILE' in word_set or b'DUMPFILE' in word_set:
+        match = _OUTFILE_RE.search(code)
+        if match:
+            return False, f"Comando prohibido detectado: INTO {match.group(1)}"
+    if b'UNION' in word_set:
+        return False, "Patrón peligroso detectado: UNION"
+
+    # Debe empezar con SELECT (se permiten paréntesis y comentarios de bloque previos)
+    if not words or words[0] != b'SELECT' or not code.lstrip(' \t\r\n(').startswith('SELECT'):
+        return False, "Solo se permiten consultas SELECT"
+
+    if violation:
+        return False, violation
+    if 'XP_' in code or 'SP_' in code:
+        match = _PROCEDURE_RE.search(code)
+        if match:
+            return False, f"Caracter o patrón peligroso detectado: {match.group(1).lower()}"
+    return True, "Consulta válida"
+
+
+class SQLValidator:
+    """Validador con memoización LRU de veredictos por hash de consulta"""
+
+    def __init__(self, max_entries: int = 2048):
+        self.max_entries = max_entries
+        self._verdicts: "OrderedDict[bytes, Tuple[bool, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    @staticmethod
+    def _key(query: str) -> bytes:
+        return hashlib.blake2b(query.encode('utf-8'), digest_size=16).digest()
+
+    def validate(self, query: str) -> Tuple[bool, str]:
+        query = query.strip()
+        key = self._key(query)
+        with self._lock:
+            verdict = self._verdicts.get(key)
+            if verdict is not None:
+                self._verdicts.move_to_end(key)
+                self._hits += 1
+                return verdict
+            self._misses += 1
+
+        verdict = _scan(query)
+        with self._lock:
+            self._verdicts[key] = verdict
+            if len(self._verdicts) > self.max_entries:
+                self._verdicts.popitem(last=False)
+        return verdict
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._verdicts),
+                "max_entries": self.max_entries,
+                "hits": self._hits,
+                "misses": self._misses
+            }
+
+
+default_validator = SQLValidator()
+
+
+def validate_sql_query(query: str) -> Tuple[bool, str]:
+    """Validar consulta SQL para prevenir inyección y comandos peligrosos"""
+    return default_validator.validate(query)
@@ -0,0 +1,582 @@
+# sqlite_mirror.py
+"""
+Espejo local de solo lectura de tablas de MariaDB (core_registro, core_usuario)
+en un SQLite por base de datos, sincronizado de forma incremental por `id`.
+
+- sync() lee de MariaDB solo las filas con id mayor que la marca de agua de
+  cada tabla, por lotes ordenados por id (keyset), y las inserta con
+  executemany en transacciones grandes (una cada `commit_rows` filas). Las
+  columnas se toman de INFORMATION_SCHEMA; si cambian, la tabla se recarga.
+- connect() abre el SQLite en modo de solo lectura y devuelve una conexión con
+  la interfaz de pymysql que usan las herramientas (cursor(), execute con
+  placeholders %s o %(nombre)s, fetchone/fetchmany/fetchall, description).
+  El SQL se traduce del dialecto de MariaDB: DATE_ADD/DATE_SUB e INTERVAL,
+  TIMESTAMPDIFF, HOUR/MINUTE/..., CURDATE/NOW, IF y DATE_FORMAT se resuelven
+  con funciones registradas en SQLite. Las columnas DATETIME y DATE se
+  devuelven como datetime/date, igual que pymysql, y también los valores de
+  expresiones (MIN(tiempo), DATE(tiempo)) que SQLite entrega como texto ISO.
+- Las lecturas pueden sincronizar antes de forma oportunista (ver is_stale y
+  sync(wait=False)): como máximo una vez cada `sync_interval` segundos.
+
+Las filas corregidas o borradas en MariaDB no mueven la marca de agua:
+sync(rebuild=True) recarga las tablas completas.
+"""
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+import logging
+
+from sql_validator import mask_literals
+
+logger = logging.getLogger(__name__)
+
+
+class MirrorError(Exception):
+    """El espejo no existe, no tiene la tabla o la consulta no se puede traducir"""
+
+
+_STATE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS mirror_state (
+    table_name TEXT PRIMARY KEY,
+    watermark INTEGER NOT NULL,
+    row_count INTEGER NOT NULL,
+    columns TEXT NOT NULL,
+    synced_at TEXT
+);
+"""
+
+_INTEGER_TYPES = {"tinyint", "smallint", "mediumint", "int", "integer", "bigint", "bit", "bool", "boolean", "year"}
+_REAL_TYPES = {"decimal", "numeric", "float", "double", "real"}
+_BLOB_TYPES = {"binary", "varbinary", "tinyblob", "blob", "mediumblob", "longblob"}
+
+
+def _sqlite_type(data_type: str) -> str:
+    data_type = data_type.lower()
+    if data_type in _INTEGER_TYPES:
+        return "INTEGER"
+    if data_type in _REAL_TYPES:
+        return "REAL"
+    if data_type in ("datetime", "timestamp"):
+        return "DATETIME"
+    if data_type == "date":
+        return "DATE"
+    if data_type in _BLOB_TYPES:
+        return "BLOB"
+    return "TEXT"
+
+
+def _to_sqlite(value: Any) -> Any:
+    """Valor de pymysql a uno que SQLite guarda y compara igual que MariaDB"""
+    if isinstance(value, datetime):
+        return value.isoformat(" ")
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, timedelta):
+        seconds = int(value.total_seconds())
+        sign = "-" if seconds < 0 else ""
+        seconds = abs(seconds)
+        return f"{sign}{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+    return value
+
+
+def _parse_datetime(value: bytes) -> datetime:
+    return datetime.fromisoformat(value.decode())
+
+
+def _parse_date(value: bytes) -> date:
+    return date.fromisoformat(value.decode()[:10])
+
+
+# Columnas declaradas DATETIME/DATE (ver _sqlite_type) regresan como datetime/date
+sqlite3.register_converter("DATETIME", _parse_datetime)
+sqlite3.register_converter("DATE", _parse_date)
+
+# Texto ISO que producen las expresiones (MIN(tiempo), DATE(tiempo), DATE_ADD):
+# SQLite no conserva el tipo declarado fuera de las columnas
+_ISO_DATETIME_RE = re.compile(r"\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}:\d{2}(?:\.\d{1,6})?")
+_ISO_DATE_RE = re.compile(r"\d{4}-\d{2}-\d{2}")
+
+
+def _from_sqlite(value: Any) -> Any:
+    """Texto con forma de fecha u hora ISO -> datetime/date, como lo entrega pymysql"""
+    if type(value) is not str or len(value) < 10 or value[4] != "-":
+        return value
+    try:
+        if len(value) == 10 and _ISO_DATE_RE.fullmatch(value):
+            return date.fromisoformat(value)
+        if _ISO_DATETIME_RE.fullmatch(value):
+            return datetime.fromisoformat(value)
+    except ValueError:
+        pass
+    return value
+
+
+def _convert_row(row: Optional[tuple]) -> Optional[tuple]:
+    return row if row is None else tuple(_from_sqlite(value) for value in row)
+
+
+# ===== Funciones de MariaDB registradas en SQLite =====
+
+_UNITS = ("MICROSECOND", "SECOND", "MINUTE", "HOUR", "DAY", "WEEK", "MONTH", "QUARTER", "YEAR")
+_TIMEDELTA_UNITS = {"MICROSECOND": "microseconds", "SECOND": "seconds", "MINUTE": "minutes", "HOUR": "hours",
+                    "DAY": "days", "WEEK": "weeks"}
+
+
+def _as_datetime(value: Any) -> Optional[datetime]:
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return None
+    text = str(value).strip()
+    try:
+        return datetime.fromisoformat(text)
+    except ValueError:
+        return None
+
+
+def _has_time(value: Any) -> bool:
+    return len(str(value).strip()) > 10
+
+
+def _add_months(moment: datetime, months: int) -> datetime:
+    month = moment.month - 1 + months
+    year = moment.year + month // 12
+    month = month % 12 + 1
+    # Como MariaDB: el día se recorta al último del mes
+    next_month = date(year + month // 12, month % 12 + 1, 1)
+    last_day = (next_month - timedelta(days=1)).day
+    return moment.replace(year=year, month=month, day=min(moment.day, last_day))
+
+
+def _date_add(value: Any, amount: Any, unit: str) -> Optional[str]:
+    moment = _as_datetime(value)
+    if moment is None or amount is None:
+        return None
+    amount = int(float(amount))
+    unit = unit.upper()
+    if unit in ("MONTH", "QUARTER", "YEAR"):
+        moment = _add_months(moment, amount * {"MONTH": 1, "QUARTER": 3, "YEAR": 12}[unit])
+    else:
+        moment += timedelta(**{_TIMEDELTA_UNITS[unit]: amount})
+    if not _has_time(value) and unit in ("DAY", "WEEK", "MONTH", "QUARTER", "YEAR"):
+        return moment.date().isoformat()
+    return moment.isoformat(" ")
+
+
+def _timestampdiff(unit: str, start: Any, end: Any) -> Optional[int]:
+    first, last = _as_datetime(start), _as_datetime(end)
+    if first is None or last is None:
+        return None
+    unit = unit.upper()
+    if unit in ("MONTH", "QUARTER", "YEAR"):
+        months = (last.year - first.year) * 12 + last.month - first.month
+        # Mes incompleto: no cuenta (TIMESTAMPDIFF trunca hacia cero)
+        if months > 0 and _add_months(first, months) > last:
+            months -= 1
+        elif months < 0 and _add_months(first, months) < last:
+            months += 1
+        return int(months / {"MONTH": 1, "QUARTER": 3, "YEAR": 12}[unit])
+    seconds = (last - first).total_seconds()
+    if unit == "MICROSECOND":
+        return int(seconds * 1_000_000)
+    return int(seconds / {"SECOND": 1, "MINUTE": 60, "HOUR": 3600, "DAY": 86400, "WEEK": 604800}[unit])
+
+
+def _part(extract: Callable[[datetime], Any]) -> Callable[[Any], Any]:
+    def function(value):
+        moment = _as_datetime(value)
+        if moment is None:
+            # Horas sueltas ('08:10:00') para HOUR/MINUTE/SECOND
+            match = re.fullmatch(r"(-?\d+):(\d{2}):(\d{2})(?:\.\d+)?", str(value or "").strip())
+            if not match:
+                return None
+            moment = datetime(2000, 1, 1, int(match.group(1)) % 24, int(match.group(2)), int(match.group(3)))
+        return extract(moment)
+    return function
+
+
+_DATE_FORMATS = {"%Y": "%Y", "%y": "%y", "%m": "%m", "%c": "{month}", "%d": "%d", "%e": "{day}", "%H": "%H",
+                 "%k": "{hour}", "%i": "%M", "%s": "%S", "%S": "%S", "%p": "%p", "%W": "%A", "%a": "%a",
+                 "%M": "%B", "%b": "%b", "%j": "%j", "%T": "%H:%M:%S", "%f": "%f", "%%": "%%"}
+
+
+def _date_format(value: Any, pattern: str) -> Optional[str]:
+    moment = _as_datetime(value)
+    if moment is None or pattern is None:
+        return None
+    pattern = pattern.replace("{", "{{").replace("}", "}}")
+    converted = re.sub(r"%.", lambda m: _DATE_FORMATS.get(m.group(0), m.group(0)[1:]), pattern)
+    return moment.strftime(converted).format(month=moment.month, day=moment.day, hour=moment.hour)
+
+
+def _concat(*values):
+    return None if any(value is None for value in values) else "".join(str(value) for value in values)
+
+
+_FUNCTIONS: Sequence[Tuple[str, int, Callable, bool]] = (
+    ("DATE_ADD", 3, _date_add, True),
+    ("DATE_SUB", 3, lambda value, amount, unit: _date_add(value, -float(amount), unit) if amount is not None
+     else None, True),
+    ("TIMESTAMPDIFF", 3, _timestampdiff, True),
+    ("HOUR", 1, _part(lambda m: m.hour), True),
+    ("MINUTE", 1, _part(lambda m: m.minute), True),
+    ("SECOND", 1, _part(lambda m: m.second), True),
+    ("YEAR", 1, _part(lambda m: m.year), True),
+    ("MONTH", 1, _part(lambda m: m.month), True),
+    ("DAY", 1, _part(lambda m: m.day), True),
+    ("DAYOFMONTH", 1, _part(lambda m: m.day), True),
+    ("WEEKDAY", 1, _part(lambda m: m.weekday()), True),
+    ("DAYOFWEEK", 1, _part(lambda m: (m.weekday() + 1) % 7 + 1), True),
+    ("DAYNAME", 1, _part(lambda m: m.strftime("%A")), True),
+    ("DATE_FORMAT", 2, _date_format, True),
+    ("CONCAT", -1, _concat, True),
+    ("CURDATE", 0, lambda: date.today().isoformat(), False),
+    ("NOW", 0, lambda: datetime.now().replace(microsecond=0).isoformat(" "), False),
+)
+
+
+def register_functions(sqlite: sqlite3.Connection):
+    """Registrar en la conexión las funciones de MariaDB que usa el SQL traducido"""
+    for name, arity, function, deterministic in _FUNCTIONS:
+        sqlite.create_function(name, arity, function, deterministic=deterministic)
+
+
+# ===== Traducción del dialecto de MariaDB =====
+
+_UNIT = rf"({'|'.join(_UNITS)})"
+# Operando simple o llamada con hasta dos niveles de paréntesis
+_CALL = r"[A-Za-z_]\w*\s*\((?:[^()]|\((?:[^()]|\([^()]*\))*\))*\)"
+_OPERAND = rf"(?:{_CALL}|'[^']*'|\?|:\w+|%s|%\(\w+\)s|`[^`]+`(?:\.`[^`]+`)?|[A-Za-z_][\w.]*)"
+_AMOUNT = r"(-?\d+(?:\.\d+)?|%s|%\(\w+\)s)"
+_ARGUMENT = r"((?:[^(),]|\((?:[^()]|\([^()]*\))*\))+?)"
+
+_INTERVAL_CALL_RE = re.compile(
+    rf"\b(DATE_ADD|DATE_SUB|ADDDATE|SUBDATE)\s*\(\s*{_ARGUMENT}\s*,\s*INTERVAL\s+{_AMOUNT}\s+{_UNIT}\s*\)",
+    re.IGNORECASE)
+_INTERVAL_ARITHMETIC_RE = re.compile(rf"({_OPERAND})\s*([-+])\s*INTERVAL\s+{_AMOUNT}\s+{_UNIT}\b", re.IGNORECASE)
+_TIMESTAMPDIFF_RE = re.compile(rf"\bTIMESTAMPDIFF\s*\(\s*{_UNIT}\s*,", re.IGNORECASE)
+_CURRENT_DATE_RE = re.compile(r"\b(?:CURRENT_DATE|UTC_DATE)\b(?:\s*\(\s*\))?", re.IGNORECASE)
+_CURRENT_TIMESTAMP_RE = re.compile(r"\b(?:CURRENT_TIMESTAMP|LOCALTIMESTAMP|LOCALTIME|SYSDATE)\b(?:\s*\(\s*\))?",
+                                   re.IGNORECASE)
+_IF_RE = re.compile(r"\bIF\s*\(", re.IGNORECASE)
+_PLACEHOLDER_RE = re.compile(r"%\((\w+)\)s|%s|%%")
+
+
+def _substitute(sql: str, pattern: "re.Pattern", replace: Callable[[Callable[[int], str]], str]) -> str:
+    """Reemplazar coincidencias buscadas en la copia enmascarada (nunca dentro de literales)"""
+    masked = mask_literals(sql)
+    out, pos = [], 0
+    for match in pattern.finditer(masked):
+        out.append(sql[pos:match.start()])
+        out.append(replace(lambda i, m=match: sql[m.start(i):m.end(i)] if m.group(i) is not None else None))
+        pos = match.end()
+    out.append(sql[pos:])
+    return "".join(out)
+
+
+def _interval_call(group) -> str:
+    function = "DATE_SUB" if group(1).upper() in ("DATE_SUB", "SUBDATE") else "DATE_ADD"
+    return f"{function}({group(2).strip()}, {group(3)}, '{group(4).upper()}')"
+
+
+def _interval_arithmetic(group) -> str:
+    function = "DATE_SUB" if group(2) == "-" else "DATE_ADD"
+    return f"{function}({group(1)}, {group(3)}, '{group(4).upper()}')"
+
+
+def translate(sql: str, params: Any = None) -> Tuple[str, Any]:
+    """SQL de MariaDB con placeholders de pymysql -> SQL de SQLite con parámetros '?' o ':nombre'"""
+    previous = None
+    while previous != sql:
+        # Repetir hasta que no queden INTERVAL (DATE_SUB(DATE_ADD(...)) y aritmética encadenada)
+        previous = sql
+        sql = _substitute(sql, _INTERVAL_CALL_RE, _interval_call)
+        sql = _substitute(sql, _INTERVAL_ARITHMETIC_RE, _interval_arithmetic)
+    if re.search(r"\bINTERVAL\b", mask_literals(sql), re.IGNORECASE):
+        raise MirrorError("Expresión con INTERVAL no soportada en el espejo; usar DATE_ADD/DATE_SUB(fecha, INTERVAL n UNIDAD)")
+    sql = _substitute(sql, _TIMESTAMPDIFF_RE, lambda group: f"TIMESTAMPDIFF('{group(1).upper()}',")
+    sql = _substitute(sql, _CURRENT_DATE_RE, lambda group: "CURDATE()")
+    sql = _substitute(sql, _CURRENT_TIMESTAMP_RE, lambda group: "NOW()")
+    sql = _substitute(sql, _IF_RE, lambda group: "iif(")
+
+    if params is None:
+        return sql, ()
+    if isinstance(params, dict):
+        sql = _substitute(sql, _PLACEHOLDER_RE, lambda group: f":{group(1)}" if group(1) else
+                          ("%" if group(0) == "%%" else "?"))
+        # pymysql escapa % como %% también dentro de literales cuando hay parámetros
+        return sql.replace("%%", "%"), {key: _to_sqlite(value) for key, value in params.items()}
+    sql = _substitute(sql, _PLACEHOLDER_RE, lambda group: "%" if group(0) == "%%" else "?")
+    return sql.replace("%%", "%"), [_to_sqlite(value) for value in params]
+
+
+class MirrorCursor:
+    """Cursor con la interfaz de pymysql sobre el espejo SQLite"""
+
+    def __init__(self, connection: "MirrorConnection"):
+        self.connection = connection
+        self._cursor = connection.sqlite.cursor()
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    @property
+    def rowcount(self) -> int:
+        return self._cursor.rowcount
+
+    def execute(self, sql: str, params: Any = None) -> int:
+        try:
+            self._cursor.execute(*translate(sql, params))
+        except sqlite3.OperationalError as e:
+            raise MirrorError(f"Error en el espejo SQLite: {e}") from e
+        return self._cursor.rowcount
+
+    def fetchone(self):
+        return _convert_row(self._cursor.fetchone())
+
+    def fetchmany(self, size: int = None):
+        rows = self._cursor.fetchmany(size) if size else self._cursor.fetchmany()
+        return [_convert_row(row) for row in rows]
+
+    def fetchall(self):
+        return [_convert_row(row) for row in self._cursor.fetchall()]
+
+    def close(self):
+        self._cursor.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class MirrorConnection:
+    """Conexión de solo lectura al espejo de una base"""
+
+    def __init__(self, database: str, sqlite: sqlite3.Connection):
+        self.database = database
+        self.sqlite = sqlite
+
+    def cursor(self, cursor_class=None) -> MirrorCursor:
+        # El cursor de SQLite ya entrega las filas bajo demanda: SSCursor no hace falta
+        return MirrorCursor(self)
+
+    def execute_raw(self, sql: str, params: Any = ()) -> int:
+        """SQL de SQLite sin traducir (DDL y datos de prueba); devuelve las filas afectadas"""
+        return self.sqlite.execute(sql, params).rowcount
+
+    def executemany_raw(self, sql: str, rows: Sequence[Any]) -> int:
+        """execute_raw para una lista de filas"""
+        return self.sqlite.executemany(sql, rows).rowcount
+
+    def commit(self):
+        self.sqlite.commit()
+
+    def close(self):
+        self.sqlite.close()
+
+
+class SqliteMirror:
+    """Espejos SQLite por base de datos con marca de agua por id en cada tabla"""
+
+    def __init__(self, directory: str = "mirror", tables: Sequence[str] = ("core_registro", "core_usuario"),
+                 indexes: Dict[str, List[Tuple[str, ...]]] = None, batch_rows: int = 50_000,
+                 commit_rows: int = 500_000, sync_interval: float = 60.0):
+        self.directory = directory
+        self.tables = list(tables)
+        self.indexes = indexes or {}
+        self.batch_rows = batch_rows
+        self.commit_rows = commit_rows
+        self.sync_interval = sync_interval
+        self._lock = threading.Lock()
+        self._sync_locks: Dict[str, threading.Lock] = {}
+        self._last_sync: Dict[str, float] = {}
+        self._counts = {"syncs": 0, "rows_synced": 0, "rebuilds": 0, "queries": 0}
+
+    def path(self, database: str) -> str:
+        if not database or database in (".", "..") or os.path.basename(database) != database:
+            raise MirrorError(f"Nombre de base de datos no válido para el espejo: {database!r}")
+        return os.path.join(self.directory, f"{database}.sqlite3")
+
+    def _sync_lock(self, database: str) -> threading.Lock:
+        with self._lock:
+            return self._sync_locks.setdefault(database, threading.Lock())
+
+    # ===== Sincronización =====
+
+    @staticmethod
+    def _source_columns(cursor, table: str) -> List[Tuple[str, str]]:
+        cursor.execute("""
+            SELECT COLUMN_NAME, DATA_TYPE FROM INFORMATION_SCHEMA.COLUMNS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s
+            ORDER BY ORDINAL_POSITION
+        """, [table])
+        return [(name, data_type) for name, data_type in cursor.fetchall()]
+
+    def _create_table(self, db: sqlite3.Connection, table: str, columns: List[Tuple[str, str]]):
+        definitions = ", ".join(
+            f'"{name}" {_sqlite_type(data_type)}' + (" PRIMARY KEY" if name == "id" else "")
+            for name, data_type in columns)
+        db.execute(f'DROP TABLE IF EXISTS "{table}"')
+        db.execute(f'CREATE TABLE "{table}" ({definitions})')
+        names = {name for name, _ in columns}
+        for index in self.indexes.get(table, []):
+            if set(index) <= names:
+                db.execute(f'CREATE INDEX "{table}_{"_".join(index)}" ON "{table}" '
+                           f'({", ".join(f"{chr(34)}{c}{chr(34)}" for c in index)})')
+
+    def _sync_table(self, cursor, db: sqlite3.Connection, table: str, rebuild: bool) -> Dict[str, Any]:
+        started = time.perf_counter()
+        columns = self._source_columns(cursor, table)
+        names = [name for name, _ in columns]
+        if "id" not in names:
+            raise MirrorError(f"La tabla {table} no tiene columna id (o no existe): no se puede sincronizar")
+        signature = json.dumps(columns)
+        state = db.execute("SELECT watermark, row_count, columns FROM mirror_state WHERE table_name = ?",
+                           (table,)).fetchone()
+        rebuilt = rebuild or state is None or state[2] != signature
+        if rebuilt:
+            self._create_table(db, table, columns)
+            watermark, row_count = 0, 0
+        else:
+            watermark, row_count = state[0], state[1]
+
+        id_index = names.index("id")
+        select = (f"SELECT {', '.join(f'`{name}`' for name in names)} FROM `{table}` "
+                  f"WHERE id > %s ORDER BY id LIMIT %s")
+        insert = (f'INSERT OR REPLACE INTO "{table}" ({", ".join(chr(34) + n + chr(34) for n in names)}) '
+                  f'VALUES ({", ".join("?" * len(names))})')
+        added = uncommitted = 0
+        while True:
+            cursor.execute(select, [watermark, self.batch_rows])
+            rows = cursor.fetchall()
+            if not rows:
+                break
+            db.executemany(insert, ([_to_sqlite(value) for value in row] for row in rows))
+            watermark = rows[-1][id_index]
+            added += len(rows)
+            uncommitted += len(rows)
+            if uncommitted >= self.commit_rows:
+                # Transacciones grandes, pero la marca de agua se guarda con cada commit
+                self._save_state(db, table, watermark, row_count + added, signature)
+                db.commit()
+                uncommitted = 0
+            if len(rows) < self.batch_rows:
+                break
+        self._save_state(db, table, watermark, row_count + added, signature)
+        db.commit()
+        return {
+            "rows_added": added,
+            "watermark": watermark,
+            "rows": row_count + added,
+            "rebuilt": rebuilt,
+            "elapsed_seconds": round(time.perf_counter() - started, 3)
+        }
+
+    @staticmethod
+    def _save_state(db: sqlite3.Connection, table: str, watermark: int, row_count: int, signature: str):
+        db.execute("""
+            INSERT INTO mirror_state (table_name, watermark, row_count, columns, synced_at) VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(table_name) DO UPDATE SET watermark = excluded.watermark, row_count = excluded.row_count,
+                columns = excluded.columns, synced_at = excluded.synced_at
+        """, (table, watermark, row_count, signature, datetime.now().isoformat()))
+
+    def exists(self, database: str) -> bool:
+        return os.path.exists(self.path(database))
+
+    def is_stale(self, database: str) -> bool:
+        """True si no se ha intentado sincronizar en sync_interval segundos (0 desactiva)"""
+        if self.sync_interval <= 0:
+            return False
+        last = self._last_sync.get(database)
+        return last is None or time.monotonic() - last >= self.sync_interval
+
+    def sync(self, cursor, database: str, force: bool = False, rebuild: bool = False,
+             wait: bool = True) -> Dict[str, Any]:
+        """
+        Copiar al espejo las filas nuevas de cada tabla (cursor de MariaDB de `database`).
+        Sin force, se omite si el último intento fue hace menos de sync_interval segundos.
+        wait=False: si otra sincronización de la base está en curso, se omite en lugar de esperarla.
+        """
+        path = self.path(database)
+        lock = self._sync_lock(database)
+        if not lock.acquire(blocking=wait):
+            return {"skipped": True, "in_progress": True}
+        try:
+            last = self._last_sync.get(database)
+            if not (force or rebuild) and last is not None and time.monotonic() - last < self.sync_interval:
+                return {"skipped": True, "seconds_since_sync": round(time.monotonic() - last, 1)}
+            os.makedirs(self.directory, exist_ok=True)
+            db = sqlite3.connect(path)
+            try:
+                db.execute("PRAGMA journal_mode=WAL")
+                db.execute("PRAGMA synchronous=NORMAL")
+                db.executescript(_STATE_SCHEMA)
+                tables = {table: self._sync_table(cursor, db, table, rebuild) for table in self.tables}
+            finally:
+                db.close()
+                # También si falló: con MariaDB caída no se reintenta en cada lectura
+                self._last_sync[database] = time.monotonic()
+        finally:
+            lock.release()
+
+        added = sum(result["rows_added"] for result in tables.values())
+        with self._lock:
+            self._counts["syncs"] += 1
+            self._counts["rows_synced"] += added
+            self._counts["rebuilds"] += sum(result["rebuilt"] for result in tables.values())
+        if added:
+            logger.info(f"🪞 Espejo de '{database}' sincronizado: {added} filas nuevas")
+        return {"skipped": False, "path": path, "tables": tables}
+
+    # ===== Lectura =====
+
+    @contextmanager
+    def connect(self, database: str):
+        """Conexión de solo lectura con la interfaz de pymysql (ver MirrorCursor)"""
+        path = self.path(database)
+        if not os.path.exists(path):
+            raise MirrorError(f"No hay espejo de '{database}'; crearlo con sync_mirror")
+        sqlite = sqlite3.connect(f"file:{os.path.abspath(path)}?mode=ro", uri=True,
+                                 detect_types=sqlite3.PARSE_DECLTYPES, check_same_thread=False)
+        register_functions(sqlite)
+        with self._lock:
+            self._counts["queries"] += 1
+        connection = MirrorConnection(database, sqlite)
+        try:
+            yield connection
+        finally:
+            connection.close()
+
+    def status(self, database: str) -> Dict[str, Any]:
+        """Marca de agua, filas y última sincronización de cada tabla del espejo"""
+        path = self.path(database)
+        if not os.path.exists(path):
+            return {"exists": False, "path": path}
+        db = sqlite3.connect(f"file:{os.path.abspath(path)}?mode=ro", uri=True)
+        try:
+            rows = db.execute("SELECT table_name, watermark, row_count, synced_at FROM mirror_state").fetchall()
+        finally:
+            db.close()
+        return {
+            "exists": True,
+            "path": path,
+            "bytes": os.path.getsize(path),
+            "tables": {table: {"watermark": watermark, "rows": count, "synced_at": synced_at}
+                       for table, watermark, count, synced_at in rows}
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self._counts, databases=len(self._last_sync))
@@ -0,0 +1,215 @@
+# table_diff.py
+"""
+Diferencia de datos entre dos tablas por sumas de verificación por trozos.
+
+Ambas tablas se parten en rangos de la clave primaria (entera, misma columna
+en las dos). Por cada rango se calcula COUNT(*), BIT_XOR y SUM del CRC32 de
+la fila (valores prefijados por su longitud) con una sola sentencia agregada
+por tabla, y las dos tablas se leen en paralelo, cada una en su propia
+conexión. Solo los rangos cuya suma no coincide se subdividen, y al llegar a
+rangos pequeños se comparan (clave, hash) fila por fila. Verificar una copia
+de archivo de millones de filas cuesta así unos pocos recorridos agregados.
+"""
+import contextvars
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import AbstractContextManager
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from schema_cache import quote_identifier
+
+# Conexión para una de las dos tablas: () -> context manager que entrega una conexión
+ConnectionFactory = Callable[[], AbstractContextManager]
+
+
+def row_hash_sql(columns: Sequence[str]) -> str:
+    """
+    CRC32 de la fila con cada valor prefijado por su longitud ('3:abc') y NULL
+    como 'N': a diferencia de un separador, ningún contenido de las columnas
+    puede hacer que dos filas distintas den la misma cadena.
+    """
+    values = [f"COALESCE(CONCAT(CHAR_LENGTH({c}), ':', {c}), 'N')" for c in map(quote_identifier, columns)]
+    return f"CRC32(CONCAT({', '.join(values)}))"
+
+
+class TableSide:
+    """Una de las dos tablas comparadas y cómo obtener una conexión para ella"""
+
+    def __init__(self, label: str, table: str, connect: ConnectionFactory):
+        self.label = label
+        self.table = table
+        self.connect = connect
+
+    def query(self, sql: str, params: Sequence[Any] = ()) -> List[tuple]:
+        with self.connect() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(sql, tuple(params) or None)
+                return list(cursor.fetchall())
+
+
+def query_both(left: TableSide, right: TableSide, sql_for: Callable[[TableSide], Tuple[str, Sequence[Any]]],
+               pool: Optional[ThreadPoolExecutor] = None) -> Tuple[List[tuple], List[tuple]]:
+    """Ejecutar la sentencia en las dos tablas en paralelo (una conexión por tabla)"""
+    own_pool = pool is None
+    pool = pool or ThreadPoolExecutor(max_workers=2, thread_name_prefix="mcp-diff")
+    try:
+        futures = []
+        for side in (left, right):
+            sql, params = sql_for(side)
+            # Copiar el contexto: la ejecución en curso registra las sesiones para KILL QUERY
+            context = contextvars.copy_context()
+            futures.append(pool.submit(context.run, side.query, sql, params))
+        return futures[0].result(), futures[1].result()
+    finally:
+        if own_pool:
+            pool.shutdown(wait=False)
+
+
+class ChunkedTableDiff:
+    """Compara dos tablas por sumas de verificación por trozos de la clave primaria"""
+
+    def __init__(self, left: TableSide, right: TableSide, primary_key: str, columns: Sequence[str],
+                 chunk_size: int = 100_000, fanout: int = 16, leaf_rows: int = 512,
+                 max_differences: int = 100):
+        self.left = left
+        self.right = right
+        self.pk = quote_identifier(primary_key)
+        self.primary_key = primary_key
+        self.columns = list(columns)
+        self.hash_sql = row_hash_sql(self.columns)
+        self.chunk_size = max(1, chunk_size)
+        self.fanout = max(2, fanout)
+        self.leaf_rows = max(1, leaf_rows)
+        self.max_differences = max_differences
+        self.queries = 0
+        self._pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="mcp-diff")
+
+    def _both(self, sql_for: Callable[[TableSide], Tuple[str, Sequence[Any]]]) -> Tuple[List[tuple], List[tuple]]:
+        self.queries += 2
+        return query_both(self.left, self.right, sql_for, self._pool)
+
+    def _checksums(self, low: int, high: int, size: int) -> Tuple[Dict[int, tuple], Dict[int, tuple]]:
+        """{trozo: (filas, xor, suma)} por tabla para los trozos de `size` claves en [low, high]"""
+        def sql_for(side: TableSide):
+            return f"""
+                SELECT FLOOR(({self.pk} - %s) / %s) AS chunk, COUNT(*), BIT_XOR(h), SUM(h)
+                FROM (SELECT {self.pk}, {self.hash_sql} AS h FROM {quote_identifier(side.table)}
+                      WHERE {self.pk} BETWEEN %s AND %s) AS rows_hashed
+                GROUP BY chunk
+            """, (low, size, low, high)
+
+        left, right = self._both(sql_for)
+        to_map = lambda rows: {int(r[0]): (int(r[1]), int(r[2] or 0), int(r[3] or 0)) for r in rows}
+        return to_map(left), to_map(right)
+
+    def _row_hashes(self, low: int, high: int) -> Tuple[Dict[Any, int], Dict[Any, int]]:
+        def sql_for(side: TableSide):
+            return f"""
+                SELECT {self.pk}, {self.hash_sql} FROM {quote_identifier(side.table)}
+                WHERE {self.pk} BETWEEN %s AND %s
+            """, (low, high)
+
+        left, right = self._both(sql_for)
+        return dict(left), dict(right)
+
+    def _column_differences(self, keys: List[Any]) -> Dict[Any, List[str]]:
+        """Columnas que difieren en las filas presentes en ambas tablas con hash distinto"""
+        if not keys:
+            return {}
+        select = ", ".join([self.pk] + [quote_identifier(c) for c in self.columns])
+        placeholders = ", ".join(["%s"] * len(keys))
+
+        def sql_for(side: TableSide):
+            return f"SELECT {select} FROM {quote_identifier(side.table)} WHERE {self.pk} IN ({placeholders})", keys
+
+        left, right = self._both(sql_for)
+        right_rows = {row[0]: row for row in right}
+        differences = {}
+        for row in left:
+            other = right_rows.get(row[0])
+            if other is not None:
+                differences[row[0]] = [c for c, a, b in zip(self.columns, row[1:], other[1:]) if a != b]
+        return differences
+
+    def run(self) -> Dict[str, Any]:
+        started = time.perf_counter()
+        try:
+            return self._run(started)
+        finally:
+            self._pool.shutdown(wait=False)
+
+    def _run(self, started: float) -> Dict[str, Any]:
+        def sql_for(side: TableSide):
+            return f"SELECT MIN({self.pk}), MAX({self.pk}) FROM {quote_identifier(side.table)}", ()
+
+        (left_range,), (right_range,) = self._both(sql_for)
+        bounds = [v for v in (*left_range, *right_range) if v is not None]
+        summary: Dict[str, Any] = {
+            "primary_key": self.primary_key,
+            "columns_compared": self.columns,
+            "chunk_size": self.chunk_size,
+        }
+        if not bounds:
+            return dict(summary, identical=True, rows_table1=0, rows_table2=0, chunks=0,
+                        mismatched_chunks=0, differences=[], truncated=False, queries=self.queries,
+                        elapsed_seconds=round(time.perf_counter() - started, 3))
+        low, high = int(min(bounds)), int(max(bounds))
+
+        # Nivel superior: una sentencia agregada por tabla cubre todo el rango de claves
+        left, right = self._checksums(low, high, self.chunk_size)
+        rows_left = sum(v[0] for v in left.values())
+        rows_right = sum(v[0] for v in right.values())
+        mismatched = sorted(c for c in set(left) | set(right) if left.get(c) != right.get(c))
+
+        pending = [(low + c * self.chunk_size, min(high, low + (c + 1) * self.chunk_size - 1)) for c in mismatched]
+        differences: List[Dict[str, Any]] = []
+        truncated = False
+        while pending:
+            if len(differences) >= self.max_differences:
+                truncated = True
+                break
+            chunk_low, chunk_high = pending.pop(0)
+            span = chunk_high - chunk_low + 1
+            if span <= self.leaf_rows:
+                differences.extend(self._leaf(chunk_low, chunk_high))
+                continue
+            size = -(-span // self.fanout)
+            sub_left, sub_right = self._checksums(chunk_low, chunk_high, size)
+            children = sorted(c for c in set(sub_left) | set(sub_right) if sub_left.get(c) != sub_right.get(c))
+            # Primero en profundidad: las diferencias salen en orden de clave
+            pending[:0] = [(chunk_low + c * size, min(chunk_high, chunk_low + (c + 1) * size - 1)) for c in children]
+
+        if len(differences) > self.max_differences:
+            differences = differences[:self.max_differences]
+            truncated = True
+        changed = [d["key"] for d in differences if d["status"] == "different"]
+        for key, cols in self._column_differences(changed).items():
+            for d in differences:
+                if d["key"] == key:
+                    d["columns"] = cols
+
+        return dict(
+            summary,
+            identical=not mismatched,
+            rows_table1=rows_left,
+            rows_table2=rows_right,
+            key_range=[low, high],
+            chunks=-(-(high - low + 1) // self.chunk_size),
+            mismatched_chunks=len(mismatched),
+            differences=differences,
+            truncated=truncated,
+            queries=self.queries,
+            elapsed_seconds=round(time.perf_counter() - started, 3)
+        )
+
+    def _leaf(self, low: int, high: int) -> List[Dict[str, Any]]:
+        left, right = self._row_hashes(low, high)
+        found = []
+        for key in sorted(set(left) | set(right)):
+            if key not in right:
+                found.append({"key": key, "status": f"only_in_{self.left.label}"})
+            elif key not in left:
+                found.append({"key": key, "status": f"only_in_{self.right.label}"})
+            elif left[key] != right[key]:
+                found.append({"key": key, "status": "different"})
+        return found
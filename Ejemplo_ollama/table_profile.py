@@ -0,0 +1,180 @@
+# table_profile.py
+"""
+Perfil de columnas numéricas para get_table_metrics.
+
+- Modo exacto: COUNT(*) y MIN/MAX/AVG/COUNT(DISTINCT) de todas las columnas
+  numéricas en una sola sentencia agregada (un recorrido de la tabla en lugar
+  de uno por columna).
+- Modo muestreado: lee trozos contiguos de la clave primaria que empiezan en
+  puntos aleatorios de estratos del rango de la clave (una sentencia con UNION
+  ALL; cada trozo es un recorrido de rango acotado por LIMIT y por el inicio del
+  trozo siguiente, así dos trozos nunca leen las mismas filas). Conteo y
+  promedios se estiman con un estimador de razón por conglomerados (cada trozo
+  es un conglomerado), con su margen de error al nivel de confianza pedido.
+"""
+import math
+import random
+from statistics import NormalDist
+from typing import Any, Dict, List, Optional, Sequence
+
+from schema_cache import quote_identifier
+
+NUMERIC_DATA_TYPES = frozenset((
+    'tinyint', 'smallint', 'mediumint', 'int', 'integer', 'bigint',
+    'decimal', 'numeric', 'float', 'double', 'real'
+))
+INTEGER_DATA_TYPES = frozenset(('tinyint', 'smallint', 'mediumint', 'int', 'integer', 'bigint'))
+
+
+def numeric_columns(columns: List[Dict[str, Any]]) -> List[str]:
+    """Columnas numéricas según DATA_TYPE del cache del esquema"""
+    return [c["field"] for c in columns if c["data_type"] in NUMERIC_DATA_TYPES]
+
+
+def integer_primary_key(columns: List[Dict[str, Any]], indexes: List[Dict[str, Any]]) -> Optional[str]:
+    """Columna de la clave primaria si es una sola columna entera (requisito del muestreo)"""
+    primary = [idx["column_name"] for idx in indexes if idx["key_name"] == 'PRIMARY']
+    if len(primary) != 1:
+        return None
+    types = {c["field"]: c["data_type"] for c in columns}
+    return primary[0] if types.get(primary[0]) in INTEGER_DATA_TYPES else None
+
+
+def _float(value: Any) -> Optional[float]:
+    return float(value) if value is not None else None
+
+
+def profile_exact(cursor, table: str, columns: Sequence[str]) -> Dict[str, Any]:
+    """Conteo exacto y estadísticas de todas las columnas en una sola sentencia"""
+    select = ["COUNT(*)"]
+    for column in columns:
+        col = quote_identifier(column)
+        select.extend((f"MIN({col})", f"MAX({col})", f"AVG({col})", f"COUNT(DISTINCT {col})", f"COUNT({col})"))
+    cursor.execute(f"SELECT {', '.join(select)} FROM {quote_identifier(table)}")
+    row = cursor.fetchone()
+
+    stats = {}
+    for i, column in enumerate(columns):
+        min_val, max_val, avg_val, distinct, non_null = row[1 + i * 5: 6 + i * 5]
+        if not non_null:
+            # Igual que antes: columnas sin valores no se reportan
+            continue
+        stats[column] = {
+            "min": _float(min_val),
+            "max": _float(max_val),
+            "avg": _float(avg_val),
+            "distinct_count": distinct,
+            "non_null_count": non_null
+        }
+    return {"row_count": row[0], "numeric_statistics": stats}
+
+
+def _ratio_estimate(numerators: List[float], denominators: List[float], sampling_fraction: float):
+    """Razón Σy/Σx y su error estándar entre conglomerados (linealización de Taylor)"""
+    total_x = sum(denominators)
+    ratio = sum(numerators) / total_x
+    m = len(numerators)
+    if m < 2:
+        return ratio, None
+    mean_x = total_x / m
+    residuals = [(y - ratio * x) / mean_x for y, x in zip(numerators, denominators)]
+    variance = sum(r * r for r in residuals) / (m * (m - 1))
+    return ratio, math.sqrt(variance * max(0.0, 1.0 - sampling_fraction))
+
+
+def profile_sample(cursor, table: str, primary_key: str, columns: Sequence[str], sample_rows: int,
+                   chunks: int = 20, confidence: float = 0.95, rng: Optional[random.Random] = None) -> Dict[str, Any]:
+    """
+    Estadísticas estimadas a partir de `chunks` trozos de ~sample_rows/chunks filas
+    contiguas en la clave primaria, con márgenes de error al nivel `confidence`.
+    """
+    if not 0 < confidence < 1:
+        raise ValueError(f"confidence debe estar entre 0 y 1 (exclusivo), no {confidence}")
+    rng = rng or random.Random()
+    tbl = quote_identifier(table)
+    pk = quote_identifier(primary_key)
+
+    cursor.execute(f"SELECT MIN({pk}), MAX({pk}) FROM {tbl}")
+    key_min, key_max = cursor.fetchone()
+    if key_min is None:
+        return {"row_count": 0, "numeric_statistics": {}, "sampling": {"chunks": 0, "rows_read": 0}}
+    key_min, key_max = int(key_min), int(key_max)
+    key_span = key_max - key_min + 1
+
+    chunks = max(1, min(chunks, key_span))
+    per_chunk = max(1, sample_rows // chunks)
+    stratum = key_span / chunks
+    starts = [key_min + int(i * stratum) + rng.randrange(max(1, int(stratum))) for i in range(chunks)]
+    # Cada trozo termina donde empieza el siguiente (los inicios son crecientes); el último en MAX(pk)
+    ends = starts[1:] + [key_max + 1]
+
+    # La primera columna del select identifica el trozo; la segunda es la clave
+    select = ", ".join([pk] + [quote_identifier(c) for c in columns])
+    parts = [f"(SELECT {i} AS chunk_id, {select} FROM {tbl} WHERE {pk} >= %s AND {pk} < %s "
+             f"ORDER BY {pk} LIMIT {per_chunk})" for i in range(chunks)]
+    cursor.execute(" UNION ALL ".join(parts), [bound for pair in zip(starts, ends) for bound in pair])
+    rows = cursor.fetchall()
+
+    by_chunk: Dict[int, List[tuple]] = {i: [] for i in range(chunks)}
+    for row in rows:
+        by_chunk[row[0]].append(row)
+
+    # Densidad (filas por valor de clave) de cada trozo: filas leídas / tramo de clave cubierto
+    spans, counts = [], []
+    for i, chunk_rows in by_chunk.items():
+        if len(chunk_rows) < per_chunk:
+            # El trozo se agotó antes del LIMIT: cubre todo su tramo hasta el inicio del siguiente
+            span = ends[i] - starts[i]
+        else:
+            span = int(chunk_rows[-1][1]) - starts[i] + 1
+        spans.append(float(max(span, 1)))
+        counts.append(float(len(chunk_rows)))
+
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+    density, density_se = _ratio_estimate(counts, spans, sum(spans) / key_span)
+    row_estimate = density * key_span
+    sampling_fraction = min(1.0, len(rows) / row_estimate) if row_estimate else 1.0
+
+    stats = {}
+    for offset, column in enumerate(columns, start=2):
+        sums, non_null, values = [], [], []
+        for chunk_rows in by_chunk.values():
+            chunk_values = [float(r[offset]) for r in chunk_rows if r[offset] is not None]
+            sums.append(sum(chunk_values))
+            non_null.append(float(len(chunk_values)))
+            values.extend(chunk_values)
+        if not values:
+            continue
+        mean, mean_se = _ratio_estimate(sums, non_null, sampling_fraction) if sum(non_null) else (None, None)
+        stats[column] = {
+            "min": min(values),
+            "max": max(values),
+            "avg": mean,
+            "avg_margin_of_error": z * mean_se if mean_se is not None else None,
+            "distinct_count": None,
+            "distinct_in_sample": len(set(values)),
+            "non_null_ratio": len(values) / len(rows),
+            "sample_values": len(values)
+        }
+
+    return {
+        "row_count": int(round(row_estimate)),
+        "row_count_margin_of_error": int(round(z * density_se * key_span)) if density_se is not None else None,
+        "numeric_statistics": stats,
+        "sampling": {
+            "method": "pk_range_chunks",
+            "primary_key": primary_key,
+            "key_range": [key_min, key_max],
+            "chunks": chunks,
+            "rows_per_chunk": per_chunk,
+            "rows_read": len(rows),
+            "confidence": confidence,
+            "notes": [
+                "min/max son los de la muestra (cotas internas del valor real)",
+                "distinct_count no se estima; distinct_in_sample es una cota inferior",
+                "Los márgenes de error tratan cada trozo como un conglomerado; "
+                "los trozos son contiguos en la clave, así que valores correlacionados con el id "
+                "(p. ej. fechas) tienen más varianza entre trozos y el margen lo refleja"
+            ]
+        }
+    }
@@ -5,6 +5,7 @@ Script de prueba rápida para verificar conectividad
 """
 
 import sys
+import asyncio
 import requests
 import json
 
@@ -47,13 +48,14 @@ def test_mcp_tools():
     try:
         from server import test_connection, list_databases
         
+        # Las herramientas son corrutinas (se ejecutan en el pool de hilos del servidor)
         # Probar conexión
-        result = test_connection()
+        result = asyncio.run(test_connection())
         if not result.get("success"):
             return False, "Error en test_connection"
         
         # Probar listado de bases de datos
-        result = list_databases()
+        result = asyncio.run(list_databases())
         if not result.get("success"):
             return False, "Error en list_databases"
             
@@ -72,7 +74,7 @@ def test_smart_search():
         
         # Primero obtener una base de datos para probar
         from server import list_databases
-        dbs_result = list_databases()
+        dbs_result = asyncio.run(list_databases())
         
         if not dbs_result.get("success") or not dbs_result.get("databases"):
             return False, "Sin bases de datos para probar"
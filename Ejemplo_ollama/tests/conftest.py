@@ -0,0 +1,40 @@
+# conftest.py
+"""
+Pruebas sin servidor de base de datos: los módulos se importan desde Ejemplo_ollama y
+las consultas corren sobre SQLite en memoria con la interfaz de cursor de pymysql
+(sqlite_mirror.MirrorConnection), o sobre cursores falsos. Las pruebas de herramientas
+importan server.py con el fixture server_module, que no abre conexiones.
+
+    cd Ejemplo_ollama && python -m pytest -q tests
+"""
+import os
+import sqlite3
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlite_mirror import MirrorConnection, register_functions  # noqa: E402
+
+
+@pytest.fixture
+def sqlite_connection():
+    """Conexión tipo pymysql sobre SQLite en memoria (placeholders %s, funciones de MariaDB)"""
+    sqlite = sqlite3.connect(":memory:", detect_types=sqlite3.PARSE_DECLTYPES)
+    register_functions(sqlite)
+    connection = MirrorConnection("pruebas", sqlite)
+    yield connection
+    connection.close()
+
+
+@pytest.fixture(scope="session")
+def server_module(tmp_path_factory):
+    """server.py importado desde un directorio temporal: su mcp_server.log no cae en el repositorio"""
+    previous = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp("server"))
+    try:
+        import server
+    finally:
+        os.chdir(previous)
+    return server
@@ -0,0 +1,175 @@
+import random
+import threading
+from datetime import date, datetime, time, timedelta
+
+import pytest
+
+from attendance_engine import AttendanceEngine, RowLimitExceeded
+
+
+def make_records(seed=3, days=20, users=30):
+    """Registros de core_registro en el orden de LOAD_COLUMNS, con entradas sin salida y lugares NULL"""
+    rng = random.Random(seed)
+    records, next_id = [], 0
+    for offset in range(days):
+        day = date(2025, 3, 1) + timedelta(days=offset)
+        for user in range(1, users + 1):
+            if rng.random() < 0.15:
+                continue
+            moment = datetime.combine(day, time(7)) + timedelta(minutes=rng.randint(0, 120))
+            for k in range(rng.choice([1, 2, 2, 3])):
+                next_id += 1
+                state = 1 if k % 2 == 0 else 2
+                records.append((next_id, user, state, moment, f"Usuario {user}", f"C{user}",
+                                "Entrada" if state == 1 else "Salida", rng.choice(["Norte", None]),
+                                rng.choice(["D1", "D2"])))
+                moment += timedelta(minutes=rng.randint(5, 600))
+    rng.shuffle(records)
+    return records
+
+
+class FakeCursor:
+    """Cursor que entiende las consultas del motor (MAX(id), COUNT(*) y rangos) sobre una lista"""
+
+    def __init__(self, records):
+        self.records = records
+        self.queries = []
+        self.rows = []
+
+    def execute(self, sql, params=None):
+        self.queries.append(sql)
+        params = list(params or [])
+        rows = self.records
+        if "MAX(id)" in sql:
+            self.rows = [(max(row[0] for row in rows),)]
+            return
+        if "tiempo >= %s" in sql:
+            low = params.pop(0)
+            rows = [row for row in rows if row[3] >= low]
+        if "tiempo < %s" in sql:
+            high = params.pop(0)
+            rows = [row for row in rows if row[3] < high]
+        if "id > %s" in sql:
+            after = params.pop(0)
+            rows = [row for row in rows if row[0] > after]
+        if "id <= %s" in sql:
+            last = params.pop(0)
+            rows = [row for row in rows if row[0] <= last]
+        self.rows = [(len(rows),)] if "COUNT(*)" in sql else list(rows)
+
+    def fetchone(self):
+        return self.rows[0]
+
+    def fetchmany(self, size):
+        batch, self.rows = self.rows[:size], self.rows[size:]
+        return batch
+
+    def count(self, text):
+        return sum(text in sql for sql in self.queries)
+
+
+def in_range(records, date_from, date_to):
+    low = datetime.fromisoformat(date_from)
+    high = datetime.fromisoformat(date_to) + timedelta(days=1)
+    return [row for row in records if low <= row[3] < high]
+
+
+def test_daily_summary_matches_brute_force():
+    records = make_records()
+    engine = AttendanceEngine(refresh_interval=0, batch_rows=100)
+    result = engine.analyze(FakeCursor(records), "pruebas", "daily_summary", "2025-03-05", "2025-03-12")
+    days = {}
+    for row in in_range(records, "2025-03-05", "2025-03-12"):
+        days.setdefault(row[3].date(), []).append(row)
+    expected = [(day, len(rows), len({row[1] for row in rows}), sum(row[2] == 1 for row in rows),
+                 sum(row[2] == 2 for row in rows)) for day, rows in sorted(days.items(), reverse=True)]
+    assert [tuple(row) for row in result["rows"]] == expected
+    assert result["frame_source"] == "loaded"
+
+
+def test_late_arrivals_and_missing_exits_match_brute_force():
+    records = make_records()
+    engine = AttendanceEngine(refresh_interval=0)
+    cursor = FakeCursor(records)
+    selected = in_range(records, "2025-03-01", "2025-03-20")
+
+    late = engine.analyze(cursor, "pruebas", "late_arrivals", "2025-03-01", "2025-03-20")
+    expected = sorted((row for row in selected if row[2] == 1 and row[3].time() > time(8, 10)),
+                      key=lambda row: (row[3], row[0]), reverse=True)
+    assert [row[0] for row in late["rows"]] == [row[0] for row in expected]
+
+    missing = engine.analyze(cursor, "pruebas", "missing_exits", "2025-03-01", "2025-03-20")
+    expected = sorted((row for row in selected if row[2] == 1 and not any(
+        other[1] == row[1] and other[2] == 2 and other[3].date() == row[3].date() and other[3] > row[3]
+        for other in records)), key=lambda row: (row[3], row[0]), reverse=True)
+    assert [row[0] for row in missing["rows"]] == [row[0] for row in expected]
+    assert missing["frame_source"] == "memory"
+
+
+def test_new_records_are_loaded_incrementally():
+    records = make_records()
+    newest = max(row[0] for row in records)
+    cursor = FakeCursor([row for row in records if row[0] <= newest - 50])
+    engine = AttendanceEngine(refresh_interval=0)
+    engine.analyze(cursor, "pruebas", "daily_summary", "2025-03-01", "2025-03-20")
+
+    cursor.records = records
+    result = engine.analyze(cursor, "pruebas", "daily_summary", "2025-03-01", "2025-03-20")
+    assert result["frame_source"] == "incremental"
+    assert result["frame_rows"] == len(in_range(records, "2025-03-01", "2025-03-20"))
+
+
+def test_over_limit_range_is_counted_before_streaming_and_remembered():
+    records = make_records()
+    cursor = FakeCursor(records)
+    engine = AttendanceEngine(max_rows=100, refresh_interval=0)
+
+    with pytest.raises(RowLimitExceeded):
+        engine.analyze(cursor, "pruebas", "daily_summary", "2025-03-01", "2025-03-20")
+    # Se contó con COUNT(*) y no se pidió ninguna fila del rango
+    assert cursor.count("COUNT(*)") == 1
+    assert not any(sql.startswith("SELECT id,") for sql in cursor.queries)
+
+    # El mismo rango, o uno que lo contiene, se rechaza sin volver a MariaDB
+    queries = len(cursor.queries)
+    for date_from, date_to in (("2025-03-01", "2025-03-20"), ("2025-02-01", "2025-03-31")):
+        with pytest.raises(RowLimitExceeded):
+            engine.analyze(cursor, "pruebas", "daily_summary", date_from, date_to)
+    assert len(cursor.queries) == queries
+    assert engine.stats()["over_limit"] == 3
+    assert engine.stats()["over_limit_ranges"] == 1
+
+    # Un rango menor dentro del límite se sigue cargando
+    result = engine.analyze(cursor, "pruebas", "daily_summary", "2025-03-02", "2025-03-02")
+    assert result["frame_source"] == "loaded"
+    # Otra base no hereda el rechazo
+    with pytest.raises(RowLimitExceeded):
+        engine.analyze(cursor, "otra", "daily_summary", "2025-03-01", "2025-03-20")
+    assert cursor.count("COUNT(*)") == 3
+
+
+def test_loads_of_different_ranges_do_not_wait_for_each_other():
+    engine = AttendanceEngine()
+    holding, release = threading.Event(), threading.Event()
+
+    def hold():
+        with engine._range_lock(("pruebas", 0, 86400)):
+            holding.set()
+            release.wait(5)
+
+    thread = threading.Thread(target=hold)
+    thread.start()
+    try:
+        assert holding.wait(5)
+        acquired = threading.Event()
+
+        def other():
+            with engine._range_lock(("otra", 0, 86400)):
+                acquired.set()
+
+        threading.Thread(target=other).start()
+        assert acquired.wait(1)
+    finally:
+        release.set()
+        thread.join()
+    assert engine._load_locks == {}
@@ -0,0 +1,45 @@
+from datetime import date, timedelta
+
+from attendance_kpis import attendance_kpis
+from attendance_rollup import ENTRY_STATE, EXIT_STATE, AttendanceRollup
+
+
+def day(offset, clock):
+    return f"{(date.today() - timedelta(days=offset)).isoformat()} {clock}"
+
+
+# (usuario, días atrás, hora, estado)
+PUNCHES = [
+    # Dos entradas el mismo día: solo la primera cuenta para la puntualidad
+    (1, 1, "08:05:00", ENTRY_STATE), (1, 1, "12:00:00", EXIT_STATE),
+    (1, 1, "13:00:00", ENTRY_STATE), (1, 1, "17:30:00", EXIT_STATE),
+    # Exactamente en el umbral es puntual; 30 segundos después ya es retardo
+    (1, 2, "08:10:00", ENTRY_STATE), (1, 2, "16:10:00", EXIT_STATE),
+    (2, 1, "08:10:30", ENTRY_STATE), (2, 1, "15:00:00", EXIT_STATE),
+    # Entrada sin salida y salida sin entrada
+    (3, 2, "09:00:00", ENTRY_STATE),
+    (4, 3, "18:00:00", EXIT_STATE),
+    # Salida anterior a la entrada: no suma horas
+    (5, 3, "07:00:00", EXIT_STATE), (5, 3, "07:30:00", ENTRY_STATE),
+    # Fuera de la ventana de 30 días
+    (6, 40, "07:00:00", ENTRY_STATE), (6, 40, "15:00:00", EXIT_STATE),
+]
+
+
+def test_raw_and_rollup_kpis_agree(sqlite_connection, tmp_path):
+    cursor = sqlite_connection.cursor()
+    cursor.execute("CREATE TABLE core_registro (id INTEGER PRIMARY KEY, usuario_id INTEGER, nombre TEXT, "
+                   "estado_id INTEGER, tiempo TEXT)")
+    for i, (user, offset, clock, state) in enumerate(PUNCHES, start=1):
+        cursor.execute("INSERT INTO core_registro VALUES (%s, %s, %s, %s, %s)",
+                       (i, user, f"Empleado {user}", state, day(offset, clock)))
+
+    rollup = AttendanceRollup(str(tmp_path / "rollup.sqlite3"), late_threshold="08:10:00")
+    rollup.refresh(sqlite_connection.cursor(), "pruebas")
+    raw = attendance_kpis(sqlite_connection.cursor(), days=30, late_threshold="08:10:00")
+
+    assert raw == rollup.kpis("pruebas", days=30)
+    assert raw["punctuality_rate"] == {"percentage": 60.0, "punctual_arrivals": 3, "total_arrivals": 5}
+    # (9.4167 + 8 + 6.8333) / 3 usuario-días con salida posterior a la entrada
+    assert raw["average_work_hours"] == 8.08
+    assert (raw["active_days_last_30"], raw["active_users_last_30"]) == (3, 5)
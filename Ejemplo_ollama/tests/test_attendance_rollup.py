@@ -0,0 +1,57 @@
+import threading
+from datetime import datetime
+
+from attendance_rollup import AttendanceRollup
+
+
+class AggregateCursor:
+    """Cursor de MariaDB falso: MAX(id) y el agregado por usuario y día; puede quedarse esperando"""
+
+    def __init__(self, rows, gate=None):
+        self.rows = rows
+        self.gate = gate
+        self.result = []
+
+    def execute(self, sql, params=None):
+        if "MAX(id)" in sql:
+            self.result = [(len(self.rows),)]
+            return
+        if self.gate:
+            self.gate.wait(5)
+        self.result = self.rows
+
+    def fetchone(self):
+        return self.result[0]
+
+    def fetchall(self):
+        return self.result
+
+
+ROWS = [(1, "2025-03-03", "Ana", datetime(2025, 3, 3, 8, 20), datetime(2025, 3, 3, 17), 2),
+        (2, "2025-03-03", "Luis", datetime(2025, 3, 3, 8), None, 1)]
+
+
+def test_refresh_merges_user_days(tmp_path):
+    rollup = AttendanceRollup(str(tmp_path / "rollup.sqlite3"))
+    result = rollup.refresh(AggregateCursor(ROWS), "pruebas")
+    assert (result["raw_rows"], result["user_days_merged"], result["watermark"]) == (3, 2, 2)
+    assert not rollup.refresh(AggregateCursor(ROWS), "pruebas")["refreshed"]
+    assert rollup.stats()["raw_rows_aggregated"] == 3
+
+
+def test_slow_refresh_does_not_block_other_databases(tmp_path):
+    rollup = AttendanceRollup(str(tmp_path / "rollup.sqlite3"))
+    gate = threading.Event()
+    slow = threading.Thread(target=rollup.refresh, args=(AggregateCursor(ROWS, gate), "lenta"))
+    slow.start()
+    try:
+        done = threading.Event()
+        other = threading.Thread(target=lambda: (rollup.refresh(AggregateCursor(ROWS), "rapida"), done.set()))
+        other.start()
+        assert done.wait(2), "la agregación de otra base bloqueó el refresh"
+        # stats() tampoco espera a la agregación en curso
+        assert rollup.stats()["refreshes"] == 1
+    finally:
+        gate.set()
+        slow.join(5)
+    assert rollup.watermark("lenta") == rollup.watermark("rapida") == 2
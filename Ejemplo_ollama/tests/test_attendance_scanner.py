@@ -0,0 +1,72 @@
+from datetime import datetime
+
+from attendance_scanner import ISSUE_TYPES, collect, scan, stream_rows
+
+
+def checada(id, usuario_id, tiempo, estado_id):
+    evento = "Entrada" if estado_id == 1 else "Salida"
+    return (id, usuario_id, f"Usuario {usuario_id}", f"C{usuario_id}", datetime.fromisoformat(tiempo), evento,
+            estado_id, "Norte", "D1")
+
+
+ROWS = [
+    # Usuario 1: entrada duplicada, salida a los 10 minutos y otra salida 13 horas después
+    checada(1, 1, "2025-03-03 08:00:00", 1),
+    checada(2, 1, "2025-03-03 08:00:00", 1),
+    checada(3, 1, "2025-03-03 08:10:00", 2),
+    checada(4, 1, "2025-03-03 21:00:00", 2),
+    # Usuario 2: día normal
+    checada(5, 2, "2025-03-03 08:00:00", 1),
+    checada(6, 2, "2025-03-03 17:00:00", 2),
+    # Usuario 3: salida del día siguiente, no se compara contra la entrada anterior
+    checada(7, 3, "2025-03-03 22:00:00", 1),
+    checada(8, 3, "2025-03-04 11:00:00", 2),
+]
+
+
+def findings_by_type(rows):
+    found = {issue: [] for issue in ISSUE_TYPES}
+    for issue, finding in scan(rows):
+        found[issue].append(finding)
+    return found
+
+
+def test_single_pass_finds_each_issue_type():
+    found = findings_by_type(ROWS)
+    assert [f["ids"] for f in found["same_time_events"]] == [[1, 2]]
+    assert [(f["evento"], f["duplicados"]) for f in found["duplicates"]] == [("Entrada", 2)]
+    assert [(f["evento1_tiempo"].hour, f["evento2_tiempo"].hour) for f in found["invalid_sequences"]] == [(8, 21)]
+    gaps = [(f["salida"].strftime("%H:%M"), f["horas_diferencia"], f["minutos_diferencia"])
+            for f in found["time_gaps"]]
+    assert gaps == [("08:10", 0, 10), ("21:00", 13, 780)]
+    assert all(f["nombre"] == "Usuario 1" for issue in ISSUE_TYPES for f in found[issue])
+
+
+def test_sequences_do_not_cross_users():
+    # Entrada de un usuario seguida de la entrada de otro: no es secuencia inválida
+    rows = [checada(1, 1, "2025-03-03 08:00:00", 1), checada(2, 2, "2025-03-03 08:05:00", 1)]
+    assert list(scan(rows)) == []
+
+
+def test_collect_counts_everything_and_keeps_the_first():
+    result = collect(scan(ROWS), max_per_type=1)
+    assert result["issue_counts"]["time_gaps"] == 2
+    assert len(result["issues_found"]["time_gaps"]) == 1
+    assert result["truncated"] == {"duplicates": False, "same_time_events": False,
+                                   "invalid_sequences": False, "time_gaps": True}
+
+
+def test_stream_rows_reads_in_batches():
+    class BatchCursor:
+        def __init__(self, rows):
+            self.rows = list(rows)
+            self.calls = 0
+
+        def fetchmany(self, size):
+            self.calls += 1
+            batch, self.rows = self.rows[:size], self.rows[size:]
+            return batch
+
+    cursor = BatchCursor(ROWS)
+    assert list(stream_rows(cursor, batch_size=3)) == ROWS
+    assert cursor.calls == 4
@@ -0,0 +1,55 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+from columnar import decode_columnar, encode_columnar
+
+COLUMNS = ["id", "nombre", "lugar", "retardo"]
+ROWS = [{"id": i, "nombre": f"Empleado {i}", "lugar": ["Zapopan", "Tonalá", None][i % 3],
+         "retardo": None if i % 4 else i * 1.5} for i in range(12)]
+
+
+def test_roundtrip_with_dictionary_for_low_cardinality_text():
+    payload = encode_columnar(COLUMNS, ROWS)
+    assert list(payload["dictionaries"]) == ["lugar"]
+    assert payload["dictionaries"]["lugar"] == ["Zapopan", "Tonalá", None]
+    assert payload["data"][2][:4] == [0, 1, 2, 0]
+    assert decode_columnar(json.loads(json.dumps(payload))) == ROWS
+
+
+def test_roundtrip_without_dictionary_and_empty_result():
+    payload = encode_columnar(COLUMNS, ROWS, dictionary_encode=False)
+    assert payload["dictionaries"] == {}
+    assert decode_columnar(payload) == ROWS
+    assert decode_columnar(encode_columnar(COLUMNS, [])) == []
+    # Pocas filas: no vale la pena el diccionario
+    assert encode_columnar(COLUMNS, ROWS[:3])["dictionaries"] == {}
+
+
+class ToolSession:
+    """Sesión MCP falsa: devuelve como texto JSON la respuesta que arma el servidor"""
+
+    def __init__(self, respond):
+        self.respond = respond
+        self.calls = []
+
+    async def call_tool(self, name, arguments):
+        self.calls.append((name, dict(arguments)))
+        text = json.dumps(self.respond(arguments), ensure_ascii=False)
+        return SimpleNamespace(content=[SimpleNamespace(text=text)])
+
+
+def test_server_encoding_is_decoded_by_the_client(server_module):
+    from client import OllamaMCPClient
+
+    def respond(arguments):
+        return server_module.apply_result_format(
+            {"success": True, "columns": COLUMNS, "results": [dict(row) for row in ROWS]}, arguments["format"])
+
+    client = OllamaMCPClient()
+    client.mcp_session = ToolSession(respond)
+    result = asyncio.run(client.execute_mcp_tool("execute_query", database="pruebas", query="SELECT 1"))
+
+    assert client.mcp_session.calls[0][1]["format"] == "columnar"
+    assert result["format"] == "columnar" and "columnar" not in result
+    assert result["results"] == ROWS
@@ -0,0 +1,95 @@
+import json
+
+import pytest
+
+from cost_guard import CostGuard, CostRejected, explain_plan
+from pagination import fetch_page, parse_order_by
+
+TABLE_ROWS = 6_000_000
+
+
+def table_plan(access_type, key=None, condition=None, filesort=False):
+    table = {"table_name": "core_registro", "access_type": access_type, "rows": TABLE_ROWS, "filtered": 100}
+    if key:
+        table["key"] = key
+    if condition:
+        table["attached_condition"] = condition
+    block = {"select_id": 1, "table": table}
+    if filesort:
+        block = {"select_id": 1, "filesort": {"sort_key": "tiempo", "table": table}}
+    return {"query_block": block}
+
+
+class ExplainCursor:
+    """Cursor que responde a EXPLAIN FORMAT=JSON con un plan fijo y registra lo explicado"""
+
+    def __init__(self, plan):
+        self.plan = plan
+        self.explained = []
+
+    def execute(self, sql, params=None):
+        self.explained.append((sql, params))
+
+    def fetchone(self):
+        return (json.dumps(self.plan),)
+
+
+def guard():
+    return CostGuard(warn_rows=100_000, reject_rows=5_000_000, guarded_tables=["core_registro"],
+                     full_scan_action="reject")
+
+
+def test_order_by_index_key_with_limit_is_bounded():
+    cursor = ExplainCursor(table_plan("index", key="PRIMARY"))
+    plan = explain_plan(cursor, "SELECT * FROM core_registro ORDER BY id DESC LIMIT 100")
+    assert plan["limit_bounded"]
+    assert plan["estimated_rows"] == 100
+    assert guard().check(cursor, "pruebas", "SELECT * FROM core_registro ORDER BY id DESC LIMIT 100")["action"] == "allow"
+
+
+def test_order_by_with_filesort_or_filtered_index_scan_is_not_bounded():
+    sql = "SELECT * FROM core_registro WHERE nombre LIKE '%a%' ORDER BY tiempo LIMIT 100"
+    plan = explain_plan(ExplainCursor(table_plan("ALL", filesort=True)), sql)
+    assert not plan["limit_bounded"]
+    assert plan["estimated_rows"] == TABLE_ROWS
+
+    plan = explain_plan(ExplainCursor(table_plan("index", key="PRIMARY", condition="nombre like '%a%'")),
+                        "SELECT * FROM core_registro WHERE nombre LIKE '%a%' ORDER BY id LIMIT 100")
+    assert not plan["limit_bounded"]
+
+
+def test_grouped_query_is_not_bounded_by_limit():
+    plan = explain_plan(ExplainCursor(table_plan("index", key="usuario")),
+                        "SELECT usuario_id, COUNT(*) FROM core_registro GROUP BY usuario_id LIMIT 10")
+    assert not plan["limit_bounded"]
+
+
+def test_unordered_limit_without_filter_is_bounded():
+    plan = explain_plan(ExplainCursor(table_plan("ALL")), "SELECT * FROM core_registro LIMIT 50")
+    assert plan["limit_bounded"]
+    assert plan["estimated_rows"] == 50
+
+
+def test_keyset_page_is_guarded_instead_of_base_query():
+    cursor = ExplainCursor(table_plan("range", key="PRIMARY", condition="core_registro.id > 10"))
+    cost_guard = guard()
+    base = "SELECT id, tiempo FROM core_registro ORDER BY id"
+
+    def guard_page(sql, params):
+        verdict = cost_guard.check(cursor, "pruebas", sql, params)
+        if verdict["action"] == "reject":
+            raise CostRejected(verdict)
+        return verdict["query"]
+
+    def select(sql, params):
+        return ["id", "tiempo"], [(i, "2025-03-01") for i in range(11, 22)], False
+
+    _, rows, pagination, executed = fetch_page(select, "pruebas", base, parse_order_by(base), 10, guard=guard_page)
+    explained_sql, _ = cursor.explained[-1]
+    assert explained_sql == f"EXPLAIN FORMAT=JSON {executed}"
+    assert "_pagina" in executed and executed.endswith("LIMIT 11")
+    assert len(rows) == 10 and pagination["has_more"]
+
+    # La consulta base sin acotar sí se rechaza
+    with pytest.raises(CostRejected):
+        guard_page(base, [])
@@ -0,0 +1,127 @@
+import asyncio
+import threading
+
+import pytest
+
+from db_executor import DatabaseExecutor, ToolCancelledError, current_execution, database_tool
+
+
+def test_per_database_limit_does_not_block_other_databases():
+    executor = DatabaseExecutor(max_workers=4, per_database_limit=1)
+    gate = threading.Event()
+    started = []
+
+    def tool(database):
+        started.append(database)
+        if database == "lenta":
+            gate.wait(5)
+        return database
+
+    async def scenario():
+        first = asyncio.ensure_future(executor.run("lenta", tool, "lenta"))
+        second = asyncio.ensure_future(executor.run("lenta", tool, "lenta"))
+        # Con la primera ocupando el único lugar de "lenta", otra base corre igual
+        assert await asyncio.wait_for(executor.run("rapida", tool, "rapida"), 2) == "rapida"
+        assert started.count("lenta") == 1 and executor.stats()["running"] == {"lenta": 1}
+        gate.set()
+        return await asyncio.gather(first, second)
+
+    try:
+        assert asyncio.run(scenario()) == ["lenta", "lenta"]
+        stats = executor.stats()
+        assert (stats["completed"], stats["peak_running"], stats["running"]) == (3, 2, {})
+    finally:
+        executor.shutdown()
+
+
+def test_database_tool_runs_in_the_pool_and_keeps_the_function():
+    executor = DatabaseExecutor(max_workers=2)
+
+    @database_tool(executor)
+    def list_rows(database: str, limit: int = 10) -> dict:
+        return {"success": True, "database": database, "thread": threading.current_thread().name}
+
+    try:
+        result = asyncio.run(list_rows("pruebas", limit=5))
+        assert result["database"] == "pruebas" and result["thread"].startswith("mcp-db")
+        assert list_rows.__wrapped__("pruebas")["thread"] == threading.current_thread().name
+    finally:
+        executor.shutdown()
+
+
+class KillRecorder:
+    """on_cancel falso: guarda las sesiones a las que se envió KILL QUERY"""
+
+    def __init__(self):
+        self.killed = []
+        self.sent = threading.Event()
+
+    def __call__(self, sessions):
+        self.killed.extend(sorted(sessions))
+        self.sent.set()
+
+
+def test_timeout_kills_registered_sessions_and_frees_the_slot():
+    kills = KillRecorder()
+    executor = DatabaseExecutor(max_workers=2, per_database_limit=1, tool_timeouts={"slow_query": 0.1},
+                                timeout_grace=0.1, on_cancel=kills)
+    release = threading.Event()
+
+    @database_tool(executor)
+    def slow_query(database: str) -> dict:
+        execution = current_execution()
+        assert execution.statement_timeout == 0.1
+        execution.register(("primary", 41))
+        # La sentencia "corre" hasta que llega el KILL QUERY
+        release.wait(5)
+        # Ya cancelada: no se pueden registrar sesiones nuevas
+        with pytest.raises(ToolCancelledError):
+            execution.register(("primary", 42))
+        return {"success": True}
+
+    def quick_query(database: str):
+        return "libre"
+
+    async def scenario():
+        result = await slow_query("pruebas")
+        assert kills.sent.wait(2)
+        release.set()
+        # El lugar de la base quedó libre aunque el hilo de la consulta lenta no haya terminado
+        return result, await asyncio.wait_for(executor.run("pruebas", quick_query, "pruebas"), 2)
+
+    try:
+        result, after = asyncio.run(scenario())
+        assert not result["success"] and result["timeout_seconds"] == 0.1
+        assert kills.killed == [("primary", 41)]
+        assert after == "libre"
+        assert executor.stats()["timeouts"] == 1
+    finally:
+        release.set()
+        executor.shutdown()
+
+
+def test_cancelled_request_kills_its_sessions():
+    kills = KillRecorder()
+    executor = DatabaseExecutor(max_workers=2, on_cancel=kills)
+    release = threading.Event()
+    registered = threading.Event()
+
+    def long_query(database):
+        current_execution().register(("r1", 7))
+        registered.set()
+        release.wait(5)
+
+    async def scenario():
+        task = asyncio.ensure_future(executor.run("pruebas", long_query, "pruebas"))
+        await asyncio.get_running_loop().run_in_executor(None, registered.wait, 2)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    try:
+        asyncio.run(scenario())
+        assert kills.sent.wait(2) and kills.killed == [("r1", 7)]
+        assert executor.stats()["cancellations"] == 1
+    finally:
+        release.set()
+        executor.shutdown()
@@ -0,0 +1,157 @@
+import threading
+
+import pymysql
+import pytest
+
+import db_pool
+from db_pool import ConnectionPool, PoolManager, is_connection_lost
+
+
+class FakeConnection:
+    """Conexión pymysql falsa con estado de sesión: variables, charset y base por defecto"""
+
+    def __init__(self, **config):
+        self.closed = False
+        self.charset = self.server_charset = config.get("charset", "utf8mb4")
+        self.database = config.get("database")
+        self.session = {}
+        self.commands = []
+        self.ping_gate = None
+        self.pinging = threading.Event()
+
+    def ping(self, reconnect=False):
+        self.pinging.set()
+        if self.ping_gate:
+            self.ping_gate.wait(5)
+        if self.closed:
+            raise pymysql.err.InterfaceError("cerrada")
+
+    def _execute_command(self, command, sql):
+        self.commands.append(command)
+        if command == db_pool.COM_RESET_CONNECTION:
+            self.session.clear()
+            self.server_charset = "latin1"
+
+    def _read_ok_packet(self):
+        pass
+
+    def set_character_set(self, charset, collation=None):
+        self.server_charset = charset
+
+    def select_db(self, database):
+        self.database = database
+
+    def get_autocommit(self):
+        return False
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture(autouse=True)
+def fake_connect(monkeypatch):
+    monkeypatch.setattr(db_pool.pymysql, "connect", FakeConnection)
+
+
+@pytest.mark.parametrize("error, lost", [
+    (pymysql.err.OperationalError(2006, "MySQL server has gone away"), True),
+    (pymysql.err.OperationalError(2013, "Lost connection to MySQL server during query"), True),
+    (pymysql.err.OperationalError(2014, "Commands out of sync"), True),
+    (pymysql.err.OperationalError(2055, "Lost connection to MySQL server at 'reading'"), True),
+    (pymysql.err.InterfaceError(0, ""), True),
+    (pymysql.err.OperationalError(1054, "Unknown column 'x' in 'field list'"), False),
+    (pymysql.err.OperationalError(1055, "'t.c' isn't in GROUP BY"), False),
+    (pymysql.err.OperationalError(1317, "Query execution was interrupted"), False),
+    (pymysql.err.ProgrammingError(1146, "Table doesn't exist"), False),
+])
+def test_only_lost_connections_are_discarded(error, lost):
+    assert is_connection_lost(error) is lost
+    pool = ConnectionPool({"host": "db"}, "pruebas")
+    with pytest.raises(type(error)):
+        with pool.connection() as connection:
+            raise error
+    assert connection.closed is lost
+    assert pool.stats()["idle"] == (0 if lost else 1)
+
+
+def test_other_pools_are_pruned_on_a_timer(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(db_pool.time, "monotonic", lambda: now[0])
+    manager = PoolManager({"host": "db"}, prune_interval=60, idle_timeout=10)
+    idle = manager.get_pool("a")
+    idle.release(idle.acquire())
+    pruned = []
+    monkeypatch.setattr(idle, "prune_idle", lambda: pruned.append(now[0]))
+
+    for _ in range(5):
+        now[0] += 1
+        manager.get_pool("b")
+    assert pruned == []
+
+    now[0] += 60
+    manager.get_pool("b")
+    manager.get_pool("b")
+    assert pruned == [now[0]]
+
+
+def test_session_state_does_not_leak_to_the_next_borrower():
+    forgotten = []
+    pool = ConnectionPool({"host": "db", "charset": "utf8mb4"}, "pruebas", on_session_reset=forgotten.append)
+    with pool.connection() as connection:
+        connection.session["@usuario"] = 5
+        connection.session["sql_mode"] = "ANSI"
+        connection.select_db("otra")
+    with pool.connection() as again:
+        assert again is connection
+        assert again.session == {}
+        assert (again.server_charset, again.database) == ("utf8mb4", "pruebas")
+    assert forgotten == [connection, connection]
+
+
+def test_slow_ping_does_not_block_other_checkouts():
+    pool = ConnectionPool({"host": "db"}, "pruebas")
+    first, second = pool.acquire(), pool.acquire()
+    pool.release(first)
+    pool.release(second)
+    second.pinging.clear()
+    # pop() toma la última devuelta: second queda en el ping lento
+    second.ping_gate = threading.Event()
+    slow = threading.Thread(target=pool.acquire)
+    slow.start()
+    try:
+        assert second.pinging.wait(2)
+        done = threading.Event()
+        threading.Thread(target=lambda: (pool.acquire(), done.set())).start()
+        assert done.wait(2), "el ping de otra conexión bloqueó el préstamo"
+    finally:
+        second.ping_gate.set()
+        slow.join(5)
+
+
+class StatementCursor:
+    def __init__(self, executed):
+        self.executed = executed
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=None):
+        self.executed.append((sql, params))
+
+
+@pytest.mark.parametrize("variable, value", [("max_statement_time", 2.5), ("max_execution_time", 2500)])
+def test_statement_timeout_is_set_once_per_session(variable, value):
+    pool = ConnectionPool({"host": "db"}, "pruebas", statement_timeout_variable=variable)
+    executed = []
+    with pool.connection() as connection:
+        connection.cursor = lambda: StatementCursor(executed)
+        pool.set_statement_timeout(connection, 2.5)
+        pool.set_statement_timeout(connection, 2.5)
+    assert executed == [(f"SET SESSION {variable} = %s", (value,))]
+    # El reinicio de sesión al devolverla vuelve el límite al global: se fija de nuevo
+    with pool.connection() as again:
+        pool.set_statement_timeout(again, 2.5)
+    assert len(executed) == 2
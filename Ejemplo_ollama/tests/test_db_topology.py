@@ -0,0 +1,171 @@
+import threading
+from contextlib import contextmanager
+
+import pytest
+
+from db_pool import PoolTimeoutError
+from db_topology import PRIMARY, ReplicaRouter, replication_lag
+
+STATUS_COLUMNS = [("Slave_IO_Running",), ("Slave_SQL_Running",), ("Seconds_Behind_Master",)]
+
+
+class StatusCursor:
+    def __init__(self, node):
+        self.node = node
+        self.description = STATUS_COLUMNS
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=None):
+        if self.node.down:
+            raise ConnectionError(f"{self.node.name} no responde")
+        self.node.lag_checks += 1
+        if self.node.gate is not None:
+            self.node.checking.set()
+            self.node.gate.wait(2)
+
+    def fetchall(self):
+        if self.node.lag is None:
+            return [("Yes", "No", None)]
+        return [("Yes", "Yes", self.node.lag)]
+
+
+class FakeNode:
+    """PoolManager falso de un nodo: retraso, conexiones en uso, caídas y KILL QUERY"""
+
+    def __init__(self, name, lag=0, busy=0):
+        self.name = name
+        self.lag = lag
+        self.busy = busy
+        self.down = False
+        self.full = False
+        self.lag_checks = 0
+        self.killed = []
+        self.gate = None
+        self.checking = threading.Event()
+
+    @contextmanager
+    def connection(self, database=None):
+        yield self
+
+    def cursor(self):
+        return StatusCursor(self)
+
+    def get_pool(self, database=None):
+        return self
+
+    def acquire(self):
+        if self.full:
+            raise PoolTimeoutError(f"Pool de {self.name} lleno")
+        if self.down:
+            raise ConnectionError(f"No se pudo conectar a {self.name}")
+        return f"conexión a {self.name}"
+
+    def in_use(self):
+        return self.busy
+
+    def kill_queries(self, thread_ids):
+        self.killed.extend(thread_ids)
+
+
+@pytest.fixture
+def topology():
+    primary, r1, r2 = FakeNode(PRIMARY), FakeNode("r1", lag=2), FakeNode("r2", lag=10)
+    router = ReplicaRouter(primary, {"r1": r1, "r2": r2}, {"execute_query": 30, "create_attendance_kpis": 5},
+                           lag_check_interval=0, retry_interval=30)
+    return router, primary, r1, r2
+
+
+def test_tools_without_budget_go_to_primary(topology):
+    router, _, r1, r2 = topology
+    assert router.candidates("list_databases") == [PRIMARY]
+    assert router.candidates(None) == [PRIMARY]
+    assert r1.lag_checks == r2.lag_checks == 0
+
+
+def test_least_loaded_replica_within_budget_is_preferred(topology):
+    router, _, r1, r2 = topology
+    assert router.candidates("execute_query") == ["r1", "r2", PRIMARY]
+    r1.busy = 3
+    assert router.acquire("pruebas", "execute_query")[0] == "r2"
+
+
+def test_lag_budget_excludes_stale_replicas(topology):
+    router, _, r1, r2 = topology
+    assert router.candidates("create_attendance_kpis") == ["r1", PRIMARY]
+    r1.lag, r2.lag = 100, 50
+    assert router.candidates("execute_query") == [PRIMARY]
+    assert router.stats()["fallbacks_to_primary"] == 1
+
+
+def test_stopped_replication_marks_replica_unhealthy(topology):
+    router, _, _, r2 = topology
+    r2.lag = None
+    assert router.candidates("execute_query") == ["r1", PRIMARY]
+    stats = router.stats()["replicas"]["r2"]
+    assert not stats["healthy"] and stats["error"] == "Replicación detenida"
+
+
+def test_failed_connection_fails_over_and_backs_off(topology):
+    router, _, r1, r2 = topology
+    r1.down = True
+    node, _, connection = router.acquire("pruebas", "execute_query")
+    assert (node, connection) == ("r2", "conexión a r2")
+
+    # r1 queda fuera durante retry_interval aunque se recupere
+    r1.down = False
+    assert router.candidates("execute_query") == ["r2", PRIMARY]
+
+    r2.down = True
+    router.replicas["r2"].checked_at = float("inf")  # pasa la medición y falla al conectar
+    assert router.acquire("pruebas", "execute_query")[0] == PRIMARY
+    stats = router.stats()
+    assert stats["failovers"] == 1
+    assert stats["replicas"]["r2"]["retry_in_seconds"] is not None
+
+
+def test_full_replica_pool_tries_next_node_without_marking_it_down(topology):
+    router, _, r1, _ = topology
+    r1.full = True
+    assert router.acquire("pruebas", "execute_query")[0] == "r2"
+    assert router.stats()["replicas"]["r1"]["healthy"]
+
+
+def test_kill_queries_are_sent_to_the_owning_node(topology):
+    router, primary, r1, r2 = topology
+    router.kill_queries([("r1", 7), (PRIMARY, 3), ("r1", 8)])
+    assert r1.killed == [7, 8]
+    assert primary.killed == [3]
+    assert r2.killed == []
+
+
+def test_slow_lag_check_is_single_flight_and_does_not_block_routing(topology):
+    router, _, r1, r2 = topology
+    assert router.candidates("execute_query") == ["r1", "r2", PRIMARY]
+    r1.lag, r1.gate = 50, threading.Event()
+    slow = threading.Thread(target=router.candidates, args=("execute_query",))
+    slow.start()
+    try:
+        assert r1.checking.wait(2)
+        # Mientras la medición de r1 está colgada se enruta con el último retraso conocido
+        assert router.candidates("execute_query") == ["r1", "r2", PRIMARY]
+        assert router.stats()["replicas"]["r1"]["lag_seconds"] == 2
+        assert r1.lag_checks == 2
+    finally:
+        r1.gate.set()
+        slow.join(2)
+    assert router.candidates("execute_query") == ["r2", PRIMARY]
+
+
+def test_replication_lag_uses_the_most_delayed_channel():
+    node = FakeNode("r1")
+    cursor = StatusCursor(node)
+    cursor.fetchall = lambda: [("Yes", "Yes", 3), ("Yes", "Yes", 12)]
+    assert replication_lag(cursor) == 12.0
+    cursor.fetchall = lambda: []
+    with pytest.raises(RuntimeError):
+        replication_lag(cursor)
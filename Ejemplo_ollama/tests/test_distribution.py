@@ -0,0 +1,96 @@
+import math
+from collections import defaultdict
+from statistics import fmean, pstdev
+
+import pytest
+
+from distribution import _percentile, range_spec, summarize, time_of_day_spec
+
+
+def fine_rows(values, spec):
+    """Lo que devuelve distribution_sql: una fila por cubeta fina, calculada en Python"""
+    groups = defaultdict(list)
+    for value in values:
+        if value is None:
+            groups[None].append(value)
+            continue
+        bucket = math.floor((value - spec.origin) / spec.width)
+        if spec.fine_count and not spec.per_value:
+            bucket = min(bucket, spec.fine_count - 1)
+        groups[bucket].append(value)
+    rows = []
+    for bucket, members in groups.items():
+        present = [v for v in members if v is not None]
+        shifted = [v - spec.origin for v in present]
+        rows.append((bucket, len(members), len(present), sum(shifted) if present else None,
+                     sum(s * s for s in shifted) if present else None,
+                     min(present, default=None), max(present, default=None), len(set(present))))
+    return rows
+
+
+def test_percentile_interpolates_inside_and_between_fine_buckets():
+    # (índice, conteo, min, max) de dos cubetas finas con 5 valores cada una: 0..4 y 10..14
+    buckets = [(0, 5, 0.0, 4.0), (1, 5, 10.0, 14.0)]
+    assert _percentile(buckets, 10, 0) == 0.0
+    assert _percentile(buckets, 10, 40) == pytest.approx(3.6)   # posición 3.6 dentro de la primera
+    assert _percentile(buckets, 10, 50) == 7.0                  # posición 4.5: entre 4.0 y 10.0
+    assert _percentile(buckets, 10, 60) == pytest.approx(10.4)  # posición 5.4 dentro de la segunda
+    assert _percentile(buckets, 10, 100) == 14.0
+    assert _percentile([], 0, 50) is None
+
+
+def test_uniform_floats_have_exact_percentiles_and_histogram():
+    values = [i * 0.5 for i in range(201)] + [None] * 9  # 0.0 .. 100.0
+    spec = range_spec("numeric", "`v`", 0.0, 100.0, bins=4, fine_per_bin=5, integer=False)
+    result = summarize(fine_rows(values, spec), spec)
+
+    stats = result["basic_statistics"]
+    present = [v for v in values if v is not None]
+    assert (stats["total_rows"], stats["non_null_count"], stats["null_count"]) == (210, 201, 9)
+    assert (stats["min_value"], stats["max_value"]) == (0.0, 100.0)
+    assert stats["average"] == pytest.approx(fmean(present))
+    assert stats["std_deviation"] == pytest.approx(pstdev(present))
+    assert result["percentiles"] == {"p50": 50.0, "p90": 90.0, "p99": 99.0}
+    assert result["percentile_resolution"] == "interpolado en cubetas de ancho 5"
+
+    histogram = result["histogram"]
+    assert (histogram["bins"], histogram["bin_width"]) == (4, 25.0)
+    # MAX cae en el borde superior y va a la última cubeta
+    assert [b["count"] for b in histogram["buckets"]] == [50, 50, 50, 51]
+    assert "note" not in histogram
+
+
+def test_small_integer_range_uses_one_bucket_per_value():
+    values = [1, 1, 2, 3, 3, 3, 5, 5, 5, 5]
+    spec = range_spec("numeric", "`v`", 1.0, 5.0, bins=10, fine_per_bin=100, integer=True)
+    result = summarize(fine_rows(values, spec), spec)
+
+    # Mismos valores que numpy.percentile con interpolación lineal
+    assert result["percentiles"] == {"p50": 3.0, "p90": 5.0, "p99": 5.0}
+    assert result["percentile_resolution"] == "exacto"
+    assert result["top_values"][0] == {"value": 5.0, "frequency": 4, "percentage": 40.0}
+
+    histogram = result["histogram"]
+    assert [b["count"] for b in histogram["buckets"]] == [2, 1, 3, 0, 4]
+    assert (histogram["bins"], histogram["requested_bins"]) == (5, 10)
+    assert "5 valores" in histogram["note"]
+
+
+def test_integer_percentile_between_values_is_interpolated():
+    values = list(range(1, 11))
+    spec = range_spec("numeric", "`v`", 1.0, 10.0, bins=10, fine_per_bin=100, integer=True)
+    result = summarize(fine_rows(values, spec), spec, percentiles=(25, 50, 90))
+    assert result["percentiles"] == {"p25": 3.25, "p50": 5.5, "p90": pytest.approx(9.1)}
+    assert "note" not in result["histogram"]
+
+
+def test_time_of_day_histogram_notes_that_bins_do_not_apply():
+    spec = time_of_day_spec("`tiempo`", "datetime", "hour", bins=10)
+    seconds = [8 * 3600, 8 * 3600 + 600, 9 * 3600 + 30, 17 * 3600]
+    result = summarize(fine_rows(seconds, spec), spec)
+    # Posición 1.5: a medio camino entre 08:10:00 y 09:00:30
+    assert result["percentiles"]["p50"] == "08:35:15"
+    histogram = result["histogram"]
+    assert [(b["from"], b["count"]) for b in histogram["buckets"]] == [
+        ("08:00:00", 2), ("09:00:00", 1), ("17:00:00", 1)]
+    assert histogram["requested_bins"] == 10 and "bins no aplica" in histogram["note"]
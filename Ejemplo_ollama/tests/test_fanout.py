@@ -0,0 +1,80 @@
+import asyncio
+
+import pytest
+
+
+@pytest.fixture
+def fanout(server_module, monkeypatch):
+    """execute_attendance_analysis_multi con el análisis por base reemplazado por `sites`"""
+    sites = {}
+    cancelled = []
+
+    async def analysis(database, analysis_type, date_from, date_to, user_filter, engine=None, backend=None):
+        behaviour = sites[database]
+        if behaviour == "hang":
+            try:
+                await asyncio.Event().wait()
+            except asyncio.CancelledError:
+                cancelled.append(database)
+                raise
+        if isinstance(behaviour, Exception):
+            raise behaviour
+        return behaviour
+
+    monkeypatch.setattr(server_module, "execute_attendance_analysis", analysis)
+    monkeypatch.setitem(server_module.FANOUT_CONFIG, "deadline", 0.2)
+
+    def run(databases):
+        async def call():
+            # El semáforo se crea dentro del loop de esta prueba
+            monkeypatch.setattr(server_module, "fanout_semaphore", asyncio.Semaphore(2))
+            return await server_module.execute_attendance_analysis_multi(databases, "daily_summary")
+        return asyncio.run(call())
+    return sites, cancelled, run
+
+
+def site_result(rows):
+    return {"success": True, "columns": ["fecha", "total"], "results": rows, "row_count": len(rows),
+            "engine": "sql", "from_cache": False}
+
+
+def test_partial_results_keep_successful_sites(fanout):
+    sites, cancelled, run = fanout
+    sites.update({
+        "zapopan": site_result([{"fecha": "2025-03-03", "total": 10}]),
+        "tonala": {"success": False, "error": "Tabla core_registro no encontrada"},
+        "tlaquepaque": RuntimeError("Conexión rechazada"),
+        "centro": site_result([{"fecha": "2025-03-03", "total": 4}, {"fecha": "2025-03-04", "total": 6}]),
+    })
+    response = run("zapopan,tonala,tlaquepaque,centro")
+
+    assert response["success"] and response["partial"]
+    assert response["columns"] == ["database", "fecha", "total"]
+    assert [(row["database"], row["total"]) for row in response["results"]] == [
+        ("zapopan", 10), ("centro", 4), ("centro", 6)]
+    assert [site["database"] for site in response["sites"]] == ["zapopan", "centro"]
+    assert [(f["database"], f["error"]) for f in response["failed"]] == [
+        ("tonala", "Tabla core_registro no encontrada"), ("tlaquepaque", "Conexión rechazada")]
+    assert all(set(f) == {"database", "error", "elapsed_seconds"} for f in response["failed"])
+    assert response["timed_out"] == 0 and cancelled == []
+
+
+def test_sites_past_the_deadline_are_cancelled(fanout):
+    sites, cancelled, run = fanout
+    sites.update({"zapopan": site_result([{"fecha": "2025-03-03", "total": 10}]),
+                  "lenta": "hang", "colgada": "hang"})
+    response = run("zapopan,lenta,colgada")
+
+    assert response["success"] and response["partial"]
+    assert response["timed_out"] == 2
+    assert sorted(cancelled) == ["colgada", "lenta"]
+    assert [f["error"] for f in response["failed"]] == ["Sin terminar al vencer el plazo de 0.2s"] * 2
+    assert response["row_count"] == 1
+
+
+def test_all_sites_failing_is_an_error(fanout):
+    sites, _, run = fanout
+    sites.update({"a": RuntimeError("caída"), "b": "hang"})
+    response = run("a,b")
+    assert not response["success"] and not response["partial"]
+    assert response["error"] == "El análisis falló en todas las bases de datos (2)"
@@ -0,0 +1,20 @@
+import pytest
+
+from index_advisor import analyze_query
+
+COLUMNS = ["id", "usuario_id", "tiempo", "estado_id"]
+
+
+@pytest.mark.parametrize("predicate, is_range", [
+    ("DATE(tiempo) = CURDATE()", True),
+    ("YEAR(tiempo) = 2025", True),
+    # MONTH(tiempo) = 3 son los marzos de todos los años: no hay un rango contiguo
+    ("MONTH(tiempo) = 3", False),
+    ("HOUR(tiempo) > 8", False),
+])
+def test_only_rewritable_functions_count_as_range(predicate, is_range):
+    shape = analyze_query(f"SELECT id FROM core_registro WHERE usuario_id = 5 AND {predicate}",
+                          "core_registro", COLUMNS)
+    assert shape["equality"] == ["usuario_id"]
+    assert (shape["range"] == ["tiempo"]) is is_range
+    assert shape["non_sargable"] == [predicate.split(")")[0] + ")"]
@@ -0,0 +1,112 @@
+# test_pagination.py
+import random
+
+import pytest
+
+from pagination import PaginationError, fetch_page, keyset_predicate, parse_order_by, with_tiebreaker
+
+
+@pytest.fixture
+def registros(sqlite_connection):
+    """899 registros con muchos empates en tiempo y NULL en dispositivo"""
+    rng = random.Random(7)
+    rows = [(i, f"2025-03-01 08:{rng.randrange(10):02d}:00", rng.choice(["D1", "D2", None]))
+            for i in range(1, 900)]
+    sqlite_connection.execute_raw("CREATE TABLE core_registro (id INTEGER PRIMARY KEY, tiempo TEXT, dispositivo TEXT)")
+    sqlite_connection.executemany_raw("INSERT INTO core_registro VALUES (?, ?, ?)", rows)
+    return sqlite_connection, rows
+
+
+def select_with(connection):
+    def select(sql, params):
+        cursor = connection.cursor()
+        cursor.execute(sql, params)
+        return [desc[0] for desc in cursor.description], cursor.fetchall(), False
+    return select
+
+
+def page_through(connection, query, keyset, page_size, tiebreaker="id"):
+    select = select_with(connection)
+    rows, token = [], None
+    while True:
+        columns, page, pagination, _ = fetch_page(select, "pruebas", query, keyset, page_size, token,
+                                                  tiebreaker=tiebreaker)
+        rows.extend(page)
+        token = pagination["continuation_token"]
+        if not pagination["has_more"]:
+            return columns, rows
+
+
+def test_ties_are_not_lost_between_pages(registros):
+    connection, rows = registros
+    query = "SELECT id, tiempo FROM core_registro ORDER BY tiempo DESC"
+    _, paged = page_through(connection, query, parse_order_by(query), 7)
+    assert len(paged) == len(rows)
+    assert sorted(row[0] for row in paged) == [row[0] for row in rows]
+    # Orden del ORDER BY con id como desempate
+    expected = sorted(rows, key=lambda row: (row[1], -row[0]), reverse=True)
+    assert [row[0] for row in paged] == [row[0] for row in expected]
+
+
+def test_null_keys_are_not_skipped(registros):
+    connection, rows = registros
+    for direction in ("ASC", "DESC"):
+        query = f"SELECT id, dispositivo FROM core_registro ORDER BY dispositivo {direction}"
+        _, paged = page_through(connection, query, parse_order_by(query), 11)
+        assert sorted(row[0] for row in paged) == [row[0] for row in rows], direction
+
+
+def test_grouped_result_without_id_uses_remaining_columns(registros):
+    connection, _ = registros
+    query = ("SELECT dispositivo, tiempo, COUNT(*) AS total FROM core_registro "
+             "GROUP BY dispositivo, tiempo ORDER BY total DESC")
+    cursor = connection.cursor()
+    cursor.execute(query)
+    expected = sorted(cursor.fetchall(), key=repr)
+    columns, paged = page_through(connection, query, parse_order_by(query), 4)
+    assert sorted(paged, key=repr) == expected
+
+
+def test_analysis_keyset_with_nulls_and_no_tiebreaker(registros):
+    connection, _ = registros
+    query = ("SELECT dispositivo, COUNT(*) AS total_usos FROM core_registro "
+             "GROUP BY dispositivo ORDER BY total_usos DESC")
+    _, paged = page_through(connection, query, [("total_usos", "DESC"), ("dispositivo", "ASC")], 1,
+                            tiebreaker=None)
+    assert sorted(paged, key=repr) == sorted(select_with(connection)(query, [])[1], key=repr)
+
+
+def test_with_tiebreaker():
+    assert with_tiebreaker([("tiempo", "DESC")], ["ID", "tiempo"]) == [("tiempo", "DESC"), ("ID", "ASC")]
+    assert with_tiebreaker([("id", "DESC")], ["id"]) == [("id", "DESC")]
+    assert with_tiebreaker([("b", "ASC")], ["a", "b", "c"]) == [("b", "ASC"), ("a", "ASC"), ("c", "ASC")]
+
+
+def test_keyset_predicate_null_handling():
+    sql, params = keyset_predicate([("a", "ASC"), ("b", "DESC")], [None, 5])
+    assert sql == "((`a` IS NOT NULL) OR (`a` IS NULL AND (`b` < %s OR `b` IS NULL)))"
+    assert params == [5]
+    assert keyset_predicate([("a", "DESC")], [None]) == ("(1 = 0)", [])
+
+
+def test_token_from_other_query_is_rejected(registros):
+    connection, _ = registros
+    select = select_with(connection)
+    query = "SELECT id, tiempo FROM core_registro ORDER BY tiempo"
+    _, _, pagination, _ = fetch_page(select, "pruebas", query, parse_order_by(query), 5, tiebreaker="id")
+    with pytest.raises(PaginationError):
+        fetch_page(select, "pruebas", query + " DESC", parse_order_by(query + " DESC"), 5,
+                   pagination["continuation_token"], tiebreaker="id")
+
+
+def test_query_without_order_by_pages_by_id(registros):
+    connection, rows = registros
+    _, paged = page_through(connection, "SELECT id, dispositivo FROM core_registro", [], 50)
+    assert [row[0] for row in paged] == [row[0] for row in rows]
+
+
+def test_query_without_order_by_nor_id_is_rejected(registros):
+    connection, _ = registros
+    query = "SELECT dispositivo, COUNT(*) AS total FROM core_registro GROUP BY dispositivo"
+    with pytest.raises(PaginationError, match="ORDER BY"):
+        fetch_page(select_with(connection), "pruebas", query, parse_order_by(query), 2, tiebreaker="id")
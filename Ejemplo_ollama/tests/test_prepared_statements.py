@@ -0,0 +1,74 @@
+import pymysql
+import pytest
+
+from prepared_statements import UNKNOWN_STMT_HANDLER, PreparedStatementCache, to_qmark
+
+
+@pytest.mark.parametrize("sql, expected", [
+    ("SELECT id FROM t WHERE a = %s AND b LIKE %s;", "SELECT id FROM t WHERE a = ? AND b LIKE ?"),
+    ("SELECT DATE_FORMAT(tiempo, '%%Y-%%m') FROM t WHERE id = %s",
+     "SELECT DATE_FORMAT(tiempo, '%Y-%m') FROM t WHERE id = ?"),
+    # Un %s dentro de un literal o comentario es texto, no un placeholder
+    ("SELECT '%s' AS texto, %s FROM t", "SELECT '%s' AS texto, ? FROM t"),
+    ("SELECT \"a %s\" FROM t /* %s */ WHERE a = %s", "SELECT \"a %s\" FROM t /* %s */ WHERE a = ?"),
+    ("SELECT '%%s' FROM t WHERE a = %s", "SELECT '%s' FROM t WHERE a = ?"),
+    ("SELECT 'it''s %s' FROM t WHERE a = %s", "SELECT 'it''s %s' FROM t WHERE a = ?"),
+])
+def test_to_qmark_converts_only_placeholders_outside_literals(sql, expected):
+    assert to_qmark(sql) == expected
+
+
+class Connection:
+    pass
+
+
+class StatementCursor:
+    """Cursor falso: registra las sentencias y simula la pérdida de una sentencia preparada"""
+
+    def __init__(self):
+        self.connection = Connection()
+        self.executed = []
+        self.lost = set()
+
+    def execute(self, sql, params=None):
+        self.executed.append((sql, params))
+        name = sql.split()[1] if sql.startswith("EXECUTE") else None
+        if name in self.lost:
+            self.lost.discard(name)
+            raise pymysql.err.DatabaseError(UNKNOWN_STMT_HANDLER, f"Unknown prepared statement handler ({name})")
+        return 1
+
+
+def test_lru_deallocates_least_recently_used_statement():
+    cache = PreparedStatementCache(max_per_connection=2)
+    cursor = StatementCursor()
+    cache.execute(cursor, "SELECT 1 FROM t WHERE a = %s", [1])
+    cache.execute(cursor, "SELECT 2 FROM t")
+    cache.execute(cursor, "SELECT 1 FROM t WHERE a = %s", [2])
+    cache.execute(cursor, "SELECT 3 FROM t")
+
+    assert ("DEALLOCATE PREPARE mcp_stmt_2", None) in cursor.executed
+    assert ("EXECUTE mcp_stmt_1 USING %s", [2]) in cursor.executed
+    assert cache.stats() == {"connections": 1, "statements": 2, "prepares": 3, "reuses": 1, "deallocations": 1}
+    assert cursor.executed[0] == ("PREPARE mcp_stmt_1 FROM %s", ("SELECT 1 FROM t WHERE a = ?",))
+
+
+def test_lost_statement_is_prepared_again():
+    cache = PreparedStatementCache()
+    cursor = StatementCursor()
+    cache.execute(cursor, "SELECT 1 FROM t")
+    cursor.lost.add("mcp_stmt_1")
+    cache.execute(cursor, "SELECT 1 FROM t")
+    assert cursor.executed[-2:] == [("PREPARE mcp_stmt_2 FROM %s", ("SELECT 1 FROM t",)),
+                                    ("EXECUTE mcp_stmt_2", None)]
+    assert cache.stats()["statements"] == 1
+
+
+def test_forget_drops_statements_of_a_reset_session():
+    cache = PreparedStatementCache()
+    cursor = StatementCursor()
+    cache.execute(cursor, "SELECT 1 FROM t")
+    cache.forget(cursor.connection)
+    cache.execute(cursor, "SELECT 1 FROM t")
+    assert [sql for sql, _ in cursor.executed if sql.startswith("PREPARE")] == \
+        ["PREPARE mcp_stmt_1 FROM %s", "PREPARE mcp_stmt_2 FROM %s"]
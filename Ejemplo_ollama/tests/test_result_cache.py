@@ -0,0 +1,84 @@
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+
+import result_cache
+from result_cache import ResultCache, estimate_size, normalize_sql, ttl_for_query
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(result_cache.time, "monotonic", clock)
+    return clock
+
+
+def test_key_distinguishes_parameter_types():
+    sql = "SELECT * FROM core_registro WHERE usuario_id = %s"
+    values = (1, "1", 1.0, Decimal("1"), True, None, "None")
+    assert len({ResultCache.make_key("pruebas", sql, [value]) for value in values}) == len(values)
+    # Mismo SQL con otro espaciado y ';' final: misma entrada
+    spaced = sql.replace(" ", "  ") + ";"
+    assert ResultCache.make_key("pruebas", spaced, [1]) == ResultCache.make_key("pruebas", sql, [1])
+
+
+def test_normalize_sql_keeps_literals():
+    assert normalize_sql("SELECT  a ,b FROM t WHERE x = 'a  b' ;") == "SELECT a,b FROM t WHERE x = 'a  b'"
+
+
+def test_entry_expires_after_ttl(clock):
+    cache = ResultCache()
+    key = cache.make_key("pruebas", "SELECT 1")
+    cache.put(key, [[1]], ttl=10)
+    clock.now += 9.9
+    assert cache.get(key) == [[1]]
+    clock.now += 0.1
+    assert cache.get(key) is None
+    assert cache.stats()["expired"] == 1
+
+
+def test_byte_bound_evicts_least_recently_used(clock):
+    value = ["x" * 84]
+    size = estimate_size(value)
+    cache = ResultCache(max_bytes=4 * size + 10)  # caben 4 entradas
+    keys = [cache.make_key("pruebas", f"SELECT {i}") for i in range(5)]
+    for key in keys[:4]:
+        assert cache.put(key, value, ttl=60)
+    cache.get(keys[0])  # keys[1] queda como la menos usada
+    cache.put(keys[4], value, ttl=60)
+    assert cache.get(keys[1]) is None
+    assert all(cache.get(key) == value for key in (keys[0], keys[2], keys[3], keys[4]))
+    stats = cache.stats()
+    assert (stats["entries"], stats["evicted"], stats["bytes"]) == (4, 1, 4 * size)
+
+
+def test_too_large_results_are_not_cached():
+    cache = ResultCache(max_bytes=400)
+    assert not cache.put(("pruebas", "SELECT 1", ()), ["x" * 200], ttl=60)
+    assert cache.stats()["too_large"] == 1
+
+
+def test_watermark_change_invalidates_entry(clock):
+    cache = ResultCache()
+    key = cache.make_key("pruebas", "SELECT COUNT(*) FROM core_registro")
+    cache.put(key, [[10]], ttl=60, watermark=(("core_registro", 100),))
+    assert cache.get(key, watermark=(("core_registro", 100),)) == [[10]]
+    assert cache.get(key, watermark=(("core_registro", 101),)) is None
+    assert cache.get(key, watermark=(("core_registro", 100),)) is None
+    assert cache.stats()["invalidated_by_watermark"] == 1
+
+
+def test_ttl_for_query():
+    evening = datetime(2025, 3, 3, 23, 59, 0)
+    assert ttl_for_query("SELECT NOW()", 300) is None
+    assert ttl_for_query("SELECT * FROM t WHERE DATE(tiempo) = CURDATE()", 300, evening) == 60
+    assert ttl_for_query("SELECT * FROM t", 300, evening) == 300
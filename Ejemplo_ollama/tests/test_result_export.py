@@ -0,0 +1,102 @@
+import csv
+import gzip
+import io
+import json
+import os
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+import pytest
+
+from result_export import ExportError, ExportStore, stream_to_file
+
+COLUMNS = ["id", "tiempo", "monto", "retardo", "nota"]
+ROWS = [
+    (1, datetime(2025, 3, 3, 8, 5), Decimal("10.50"), timedelta(minutes=5), "ñandú, \"comillas\""),
+    (2, date(2025, 3, 4), Decimal("-0.01"), timedelta(hours=-1, minutes=30), None),
+    (3, None, None, timedelta(hours=30, seconds=7), "línea\nnueva"),
+]
+
+
+class BatchCursor:
+    """Cursor sin búfer falso: entrega las filas con fetchmany y puede fallar a mitad"""
+
+    def __init__(self, rows, fail_after=None):
+        self.description = [(name,) for name in COLUMNS]
+        self.rows = list(rows)
+        self.fail_after = fail_after
+        self.batches = 0
+
+    def fetchmany(self, size):
+        if self.fail_after is not None and self.batches == self.fail_after:
+            raise ConnectionError("Conexión perdida durante el volcado")
+        self.batches += 1
+        batch, self.rows = self.rows[:size], self.rows[size:]
+        return batch
+
+
+def test_csv_roundtrip(tmp_path):
+    path = str(tmp_path / "datos.csv.gz")
+    result = stream_to_file(BatchCursor(ROWS), path, "csv", batch_rows=2)
+    assert (result["columns"], result["rows"]) == (COLUMNS, 3)
+    assert result["bytes"] == os.path.getsize(path)
+
+    with gzip.open(path, "rt", encoding="utf-8", newline="") as handle:
+        rows = list(csv.reader(handle))
+    assert rows == [
+        COLUMNS,
+        ["1", "2025-03-03T08:05:00", "10.50", "00:05:00", "ñandú, \"comillas\""],
+        ["2", "2025-03-04", "-0.01", "-00:30:00", ""],
+        ["3", "", "", "30:00:07", "línea\nnueva"],
+    ]
+    assert result["uncompressed_bytes"] == len(gzip.open(path).read())
+
+
+def test_ndjson_roundtrip(tmp_path):
+    path = str(tmp_path / "datos.ndjson.gz")
+    stream_to_file(BatchCursor(ROWS), path, "ndjson", batch_rows=1)
+    with gzip.open(path, "rt", encoding="utf-8") as handle:
+        records = [json.loads(line) for line in handle]
+    assert records == [
+        {"id": 1, "tiempo": "2025-03-03T08:05:00", "monto": "10.50", "retardo": "00:05:00",
+         "nota": "ñandú, \"comillas\""},
+        {"id": 2, "tiempo": "2025-03-04", "monto": "-0.01", "retardo": "-00:30:00", "nota": None},
+        {"id": 3, "tiempo": None, "monto": None, "retardo": "30:00:07", "nota": "línea\nnueva"},
+    ]
+
+
+def test_store_writes_metadata_and_serves_it(tmp_path):
+    store = ExportStore(str(tmp_path / "exports"))
+    info = store.export(BatchCursor(ROWS), "ndjson", 2, database="pruebas", query="SELECT ...", params=[1])
+    assert store.get(info["export_id"]) == info
+    assert info["path"].endswith(".ndjson.gz") and os.path.exists(info["path"])
+    assert (info["rows"], info["params"]) == (3, [1])
+    assert sorted(os.listdir(store.directory)) == sorted([f"{info['export_id']}.json",
+                                                         f"{info['export_id']}.ndjson.gz"])
+    assert store.stats()["rows_written"] == 3
+
+
+def test_failed_export_removes_part_file_and_is_not_reported(tmp_path):
+    store = ExportStore(str(tmp_path / "exports"))
+    with pytest.raises(ConnectionError):
+        store.export(BatchCursor(ROWS, fail_after=1), "csv", 1)
+    assert os.listdir(store.directory) == []
+    assert store.stats()["failures"] == 1
+
+
+def test_invalid_format_and_unknown_export(tmp_path):
+    store = ExportStore(str(tmp_path / "exports"))
+    with pytest.raises(ExportError):
+        store.export(BatchCursor(ROWS), "xlsx", 10)
+    with pytest.raises(ExportError, match="no existe"):
+        store.get("0" * 32)
+    with pytest.raises(ExportError, match="no válido"):
+        store.get("../secreto")
+
+
+def test_cleanup_removes_old_exports(tmp_path):
+    store = ExportStore(str(tmp_path / "exports"), retention_hours=1)
+    info = store.export(BatchCursor(ROWS), "csv", 10)
+    assert store.cleanup() == 0
+    assert store.cleanup(now=os.path.getmtime(info["path"]) + 3601) == 1
+    assert os.listdir(store.directory) == []
@@ -0,0 +1,112 @@
+import pytest
+
+import result_handles
+from result_cache import estimate_size
+from result_handles import HandleError, ResultHandleStore
+
+COLUMNS = ["nombre", "retardo"]
+ROWS = [{"nombre": "Ana", "retardo": 5}, {"nombre": "Luis", "retardo": None}, {"nombre": "Eva", "retardo": 12},
+        {"nombre": "Beto", "retardo": 5}, {"nombre": None, "retardo": 0}]
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(result_handles.time, "monotonic", clock)
+    return clock
+
+
+def result_size():
+    return estimate_size(COLUMNS) + estimate_size(ROWS)
+
+
+def test_slices_follow_next_uri():
+    store = ResultHandleStore(max_slice_rows=2)
+    handle = store.put(COLUMNS, ROWS, analysis_type="late_arrivals")["handle"]
+    assert store.info(handle)["row_count"] == 5
+    assert store.info(handle)["analysis_type"] == "late_arrivals"
+
+    page = store.slice(handle, 0, 10)  # size se acota a max_slice_rows
+    assert page["results"] == ROWS[:2]
+    assert page["next_uri"] == f"result://{handle}/2/2"
+    page = store.slice(handle, 4, 2)
+    assert (page["results"], page["next_uri"]) == (ROWS[4:], None)
+    assert store.slice(handle, 10, 2)["results"] == []
+    with pytest.raises(HandleError):
+        store.slice(handle, -1, 2)
+
+
+def test_sort_permutation_puts_nulls_last_in_both_directions():
+    store = ResultHandleStore()
+    handle = store.put(COLUMNS, ROWS)["handle"]
+    ascending = store.slice(handle, 0, 5, "retardo,nombre")["results"]
+    assert [r["nombre"] for r in ascending] == [None, "Ana", "Beto", "Eva", "Luis"]
+    page = store.slice(handle, 0, 5, "-retardo, -nombre")
+    assert [r["nombre"] for r in page["results"]] == ["Eva", "Beto", "Ana", None, "Luis"]
+    assert page["order_by"] == "-retardo,-nombre"
+
+    page = store.slice(handle, 0, 2, "-retardo,-nombre")
+    assert page["next_uri"] == f"result://{handle}/2/2/-retardo,-nombre"
+    stats = store.stats()
+    assert (stats["sorts_computed"], stats["sorts_reused"]) == (2, 1)
+    with pytest.raises(HandleError, match="desconocida"):
+        store.slice(handle, 0, 5, "sueldo")
+
+
+def test_handle_expires(clock):
+    store = ResultHandleStore(ttl=60)
+    handle = store.put(COLUMNS, ROWS)["handle"]
+    clock.now += 59
+    assert store.slice(handle, 0, 1)["row_count"] == 1
+    clock.now += 1
+    with pytest.raises(HandleError, match="expiró"):
+        store.slice(handle, 0, 1)
+    assert store.stats()["expired"] == 1
+
+
+def test_byte_budget_evicts_least_recently_used():
+    size = result_size()
+    store = ResultHandleStore(max_bytes=3 * size)
+    first, second, third = (store.put(COLUMNS, ROWS)["handle"] for _ in range(3))
+    store.info(first)
+    store.put(COLUMNS, ROWS)
+    with pytest.raises(HandleError):
+        store.info(second)
+    assert store.info(first)["handle"] == first and store.info(third)["handle"] == third
+    assert store.stats()["evicted"] == 1
+    with pytest.raises(HandleError, match="excede"):
+        ResultHandleStore(max_bytes=size - 1).put(COLUMNS, ROWS)
+
+
+def test_sort_permutations_count_toward_byte_budget():
+    size = result_size()
+    permutation = len(ROWS) * result_handles._PERMUTATION_ENTRY_BYTES
+    store = ResultHandleStore(max_bytes=2 * size + permutation - 1)
+    older = store.put(COLUMNS, ROWS)["handle"]
+    newer = store.put(COLUMNS, ROWS)["handle"]
+    assert store.stats()["bytes"] == 2 * size
+
+    # La permutación del orden nuevo no cabe junto a los dos resultados: sale el menos usado
+    store.slice(newer, 0, 1, "nombre")
+    assert store.info(newer)["bytes"] == size + permutation
+    assert store.stats()["bytes"] == size + permutation
+    with pytest.raises(HandleError):
+        store.info(older)
+
+
+def test_old_orders_are_dropped_and_their_bytes_released():
+    store = ResultHandleStore()
+    handle = store.put(COLUMNS, ROWS)["handle"]
+    permutation = len(ROWS) * result_handles._PERMUTATION_ENTRY_BYTES
+    for order in ("nombre", "-nombre", "retardo", "-retardo", "retardo,nombre"):
+        store.slice(handle, 0, 1, order)
+    assert store.info(handle)["bytes"] == result_size() + result_handles._MAX_ORDERS * permutation
+    assert store.stats()["bytes"] == store.info(handle)["bytes"]
@@ -0,0 +1,122 @@
+import threading
+from datetime import datetime
+
+import pytest
+
+import schema_cache
+from schema_cache import SchemaCache, column_leads_index, quote_identifier
+
+TABLES = [("core_registro", "BASE TABLE", "InnoDB", 1200, 16384, 8192, 1201, "utf8mb4_general_ci",
+           datetime(2025, 1, 1), None, "")]
+COLUMNS = [("core_registro", "id", "bigint(20)", "BIGINT", "NO", "PRI", None, "auto_increment"),
+           ("core_registro", "nombre", "varchar(255)", "varchar", "YES", "", "NULL", ""),
+           ("core_registro", "lugar", "varchar(100)", "varchar", "NO", "", "'Planta ''A'''", "")]
+STATISTICS = [("core_registro", "PRIMARY", 1, "id", 0, 1200),
+              ("core_registro", "registro_tiempo_nombre", 1, "tiempo", 1, 600),
+              ("core_registro", "registro_tiempo_nombre", 2, "nombre", 1, 1100)]
+
+
+class SchemaCursor:
+    """Cursor falso de information_schema; cuenta las consultas y puede quedarse esperando"""
+
+    def __init__(self, gate=None):
+        self.queries = 0
+        self.gate = gate
+        self.result = []
+
+    def execute(self, sql, params=None):
+        self.queries += 1
+        if self.gate is not None:
+            self.gate.wait(2)
+        self.result = (TABLES if "information_schema.TABLES" in sql else
+                       COLUMNS if "information_schema.COLUMNS" in sql else STATISTICS)
+
+    def fetchall(self):
+        return self.result
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(schema_cache.time, "monotonic", clock)
+    return clock
+
+
+def test_snapshot_is_loaded_with_three_queries_and_served_from_memory(clock):
+    cache = SchemaCache(ttl=60)
+    cursor = SchemaCursor()
+    snapshot = cache.get(cursor, "pruebas")
+    assert cursor.queries == 3
+    assert snapshot.resolve("CORE_REGISTRO") == "core_registro" and snapshot.resolve("otra") is None
+    assert snapshot.tables["core_registro"]["rows_estimate"] == 1200
+    assert snapshot.tables["core_registro"]["create_time"] == "2025-01-01T00:00:00"
+    columns = {c["field"]: c for c in snapshot.columns["core_registro"]}
+    assert columns["id"]["data_type"] == "bigint"
+    # DEFAULT como lo muestra DESCRIBE: 'NULL' explícito y literales entrecomillados
+    assert columns["nombre"]["default"] is None
+    assert columns["lugar"]["default"] == "Planta 'A'"
+    assert column_leads_index(snapshot.indexes["core_registro"], "TIEMPO")
+    assert not column_leads_index(snapshot.indexes["core_registro"], "nombre")
+
+    assert cache.get(cursor, "pruebas") is snapshot
+    assert cursor.queries == 3
+    assert (cache.stats()["hits"], cache.stats()["loads"]) == (1, 1)
+
+
+def test_ttl_and_invalidation_force_a_reload(clock):
+    cache = SchemaCache(ttl=60, miss_refresh_after=5)
+    cursor = SchemaCursor()
+    first = cache.get(cursor, "pruebas")
+    assert not cache.reload_on_miss(first)
+    clock.now += 5
+    assert cache.reload_on_miss(first)
+
+    clock.now += 55
+    assert cache.cached("pruebas") is None
+    second = cache.get(cursor, "pruebas")
+    assert second is not first and cursor.queries == 6
+
+    cache.invalidate("pruebas")
+    assert cache.get(cursor, "pruebas") is not second
+    cache.get(cursor, "otra")
+    cache.invalidate()
+    assert cache.stats()["databases"] == 0
+    assert cache.get(cursor, "pruebas", refresh=False) is not None and cursor.queries == 15
+    assert cache.get(cursor, "pruebas", refresh=True) is not None and cursor.queries == 18
+
+
+def test_least_recently_used_database_is_dropped():
+    cache = SchemaCache(max_databases=2)
+    cursor = SchemaCursor()
+    for database in ("a", "b"):
+        cache.get(cursor, database)
+    cache.cached("a")
+    cache.get(cursor, "c")
+    assert sorted(cache.stats()["snapshots"]) == ["a", "c"]
+
+
+def test_concurrent_misses_load_once():
+    cache = SchemaCache()
+    gate = threading.Event()
+    cursor = SchemaCursor(gate)
+    threads = [threading.Thread(target=cache.get, args=(cursor, "pruebas")) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    gate.set()
+    for thread in threads:
+        thread.join(2)
+    assert cursor.queries == 3
+    assert cache.stats()["loads"] == 1
+
+
+def test_quote_identifier():
+    assert quote_identifier("core_registro") == "`core_registro`"
+    assert quote_identifier("a`b") == "`a``b`"
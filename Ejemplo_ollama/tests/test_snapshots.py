@@ -0,0 +1,88 @@
+import pytest
+
+from attendance_engine import AttendanceEngine
+from snapshots import SnapshotError, export_snapshot, open_snapshot, snapshot_directory
+from test_attendance_engine import FakeCursor, in_range, make_records
+
+
+class ExportCursor(FakeCursor):
+    """FakeCursor que además responde el MIN/MAX de tiempo e id con que empieza la exportación"""
+
+    def execute(self, sql, params=None):
+        if "MIN(tiempo)" in sql:
+            self.queries.append(sql)
+            self.rows = [(min(row[3] for row in self.records), max(row[3] for row in self.records),
+                          max(row[0] for row in self.records))]
+            return
+        super().execute(sql, params)
+
+
+def as_tuples(rows):
+    return [tuple(row) for row in rows]
+
+
+def test_export_open_analyze_roundtrip(tmp_path):
+    # 45 días desde el 1 de marzo: dos meses, dos particiones
+    records = make_records(days=45)
+    directory = str(tmp_path / "pruebas")
+    exported = export_snapshot(ExportCursor(records), directory, "pruebas", batch_rows=100)
+    assert exported["partitions_written"] == ["2025-03", "2025-04"]
+    assert exported["rows_written"] == len(records)
+
+    snapshot = open_snapshot(directory)
+    info = snapshot.info()
+    assert info["database"] == "pruebas"
+    assert info["rows"] == len(records)
+    assert info["max_id"] == max(row[0] for row in records)
+    assert info["partitions"]["2025-03"]["rows"] == len(in_range(records, "2025-03-01", "2025-03-31"))
+
+    engine = AttendanceEngine(refresh_interval=0)
+    for analysis, date_from, date_to in (("daily_summary", "2025-03-05", "2025-03-12"),
+                                         ("daily_summary", "2025-03-25", "2025-04-08"),
+                                         ("late_arrivals", "2025-03-01", "2025-04-14"),
+                                         ("missing_exits", "2025-04-01", "2025-04-10")):
+        result = snapshot.analyze(analysis, date_from, date_to)
+        expected = engine.analyze(FakeCursor(records), "pruebas", analysis, date_from, date_to)
+        assert result["columns"] == expected["columns"]
+        assert as_tuples(result["rows"]) == as_tuples(expected["rows"])
+        assert result["rows_analyzed"] == len(in_range(records, date_from, date_to))
+
+    # Solo se mapean los meses que se cruzan con el rango
+    assert snapshot.analyze("daily_summary", "2025-03-05", "2025-03-12")["partitions_read"] == ["2025-03"]
+    assert snapshot.analyze("daily_summary", "2025-03-30", "2025-04-02")["partitions_read"] == ["2025-03", "2025-04"]
+
+
+def test_reexport_keeps_codes_and_reopens(tmp_path):
+    records = make_records(days=45)
+    march = [row for row in records if row[3].month == 3]
+    directory = str(tmp_path / "pruebas")
+    export_snapshot(ExportCursor(march), directory, "pruebas")
+    first = open_snapshot(directory)
+    assert list(first.info()["partitions"]) == ["2025-03"]
+    assert open_snapshot(directory) is first
+
+    # Re-exportar solo abril: marzo se conserva y el manifiesto nuevo se vuelve a abrir
+    exported = export_snapshot(ExportCursor(records), directory, "pruebas", date_from="2025-04-01")
+    assert exported["partitions_written"] == ["2025-04"]
+    second = open_snapshot(directory)
+    assert second is not first
+    assert second.info()["rows"] == len(records)
+    for column, dictionary in first.dictionaries.items():
+        assert second.dictionaries[column].values[:len(dictionary.values)] == dictionary.values
+
+    result = second.analyze("daily_summary", "2025-03-01", "2025-04-14")
+    expected = AttendanceEngine(refresh_interval=0).analyze(FakeCursor(records), "pruebas", "daily_summary",
+                                                            "2025-03-01", "2025-04-14")
+    assert as_tuples(result["rows"]) == as_tuples(expected["rows"])
+
+
+def test_other_database_and_bad_names_are_rejected(tmp_path):
+    directory = str(tmp_path / "pruebas")
+    export_snapshot(ExportCursor(make_records(days=5)), directory, "pruebas")
+    with pytest.raises(SnapshotError):
+        export_snapshot(ExportCursor(make_records(days=5)), directory, "otra")
+    with pytest.raises(SnapshotError):
+        open_snapshot(str(tmp_path / "vacia"))
+    for name in ("", ".", "..", "../pruebas", "a/b"):
+        with pytest.raises(SnapshotError):
+            snapshot_directory(name)
@@ -0,0 +1,51 @@
+import sqlite3
+
+import pytest
+
+from sql_rewriter import rewrite_sargable
+
+
+@pytest.mark.parametrize("predicate, expected", [
+    ("DATE(tiempo) = CURDATE()", "(tiempo >= CURDATE() AND tiempo < CURDATE() + INTERVAL 1 DAY)"),
+    ("DATE(tiempo) BETWEEN '2025-03-01' AND '2025-03-31'", "(tiempo >= '2025-03-01' AND tiempo < '2025-04-01')"),
+    ("DATE(tiempo) > DATE_SUB(CURDATE(), INTERVAL 7 DAY)",
+     "tiempo >= DATE_SUB(CURDATE(), INTERVAL 7 DAY) + INTERVAL 1 DAY"),
+    ("DATE(tiempo) <= '2025-03-31'", "tiempo < '2025-04-01'"),
+    ("'2025-03-01' <= DATE(r.tiempo)", "r.tiempo >= '2025-03-01'"),
+    ("YEAR(tiempo) = 2025", "(tiempo >= '2025-01-01' AND tiempo < '2026-01-01')"),
+    ("YEAR(tiempo) BETWEEN 2024 AND 2025", "(tiempo >= '2024-01-01' AND tiempo < '2026-01-01')"),
+    ("tiempo > CONCAT(DATE(tiempo), ' 08:10:00')", "TIME(tiempo) > '08:10:00'"),
+])
+def test_function_wrapped_predicates_become_ranges(predicate, expected):
+    sql, rewrites = rewrite_sargable(f"SELECT * FROM core_registro r WHERE {predicate}")
+    assert sql == f"SELECT * FROM core_registro r WHERE {expected}"
+    assert len(rewrites) == 1
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT 'DATE(tiempo) = CURDATE()' FROM core_registro",
+    "SELECT * FROM core_registro WHERE DATE(tiempo) = CURDATE() + 1",
+    "SELECT * FROM core_registro WHERE 1 + DATE(tiempo) = CURDATE()",
+    "SELECT * FROM core_registro WHERE DATE(tiempo) = '2025-02-30'",
+    "SELECT * FROM core_registro WHERE DATE(tiempo) = '2025-03-01 08:00'",
+    "SELECT * FROM core_registro WHERE tiempo > CONCAT(DATE(otro), ' 08:10:00')",
+])
+def test_unsafe_or_quoted_predicates_are_left_alone(sql):
+    assert rewrite_sargable(sql) == (sql, [])
+
+
+def test_rewritten_ranges_select_the_same_rows():
+    # DATE() de SQLite basta para comparar las dos formas del predicado
+    sqlite = sqlite3.connect(":memory:")
+    sqlite.execute("CREATE TABLE core_registro (id INTEGER PRIMARY KEY, tiempo TEXT)")
+    sqlite.executemany("INSERT INTO core_registro VALUES (?, ?)", [
+        (1, "2025-02-28 23:59:59"), (2, "2025-03-01 00:00:00"), (3, "2025-03-15 12:00:00"),
+        (4, "2025-03-31 23:59:59"), (5, "2025-04-01 00:00:00"), (6, "2024-12-31 23:59:59"),
+    ])
+    for predicate in ("DATE(tiempo) BETWEEN '2025-03-01' AND '2025-03-31'", "DATE(tiempo) > '2025-03-15'",
+                      "DATE(tiempo) < '2025-03-01'", "DATE(tiempo) = '2025-03-01'"):
+        original = f"SELECT id FROM core_registro WHERE {predicate} ORDER BY id"
+        rewritten, rewrites = rewrite_sargable(original)
+        assert rewrites
+        assert sqlite.execute(original).fetchall() == sqlite.execute(rewritten).fetchall(), predicate
+    sqlite.close()
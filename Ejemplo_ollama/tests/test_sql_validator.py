@@ -0,0 +1,87 @@
+import pytest
+
+import sql_validator
+from sql_validator import SQLValidator, parentheses_balanced, validate_sql_query
+
+
+@pytest.fixture(params=["fast", "lexer"])
+def scan(request, monkeypatch):
+    """_scan por el camino rápido (si la consulta lo admite) o forzando el analizador completo"""
+    if request.param == "lexer":
+        # '' está contenido en cualquier consulta: nunca se toma el camino rápido
+        monkeypatch.setattr(sql_validator, "_FAST_PATH_BLOCKERS", ("",))
+    return sql_validator._scan
+
+
+@pytest.mark.parametrize("query", [
+    "SELECT created_at, updated_at FROM core_registro",
+    "SELECT id FROM core_registro WHERE nota = 'DROP TABLE core_registro'",
+    "SELECT id FROM core_registro WHERE nota = 'a; DELETE FROM b'",
+    "SELECT id FROM core_registro /* DROP */ WHERE id = 1",
+    "SELECT `drop` FROM core_registro",
+    "SELECT COUNT(*) FROM core_registro;",
+    "(SELECT id FROM core_registro)",
+])
+def test_valid_queries(scan, query):
+    assert scan(query) == (True, "Consulta válida")
+
+
+@pytest.mark.parametrize("query, message", [
+    ("DROP TABLE core_registro", "Comando prohibido detectado: DROP"),
+    ("SELECT id FROM core_registro WHERE id IN (SELECT 1) DROP", "Comando prohibido detectado: DROP"),
+    ("SELECT 1; SELECT 2", "Caracter o patrón peligroso detectado: ;"),
+    ("SELECT 1 /*!50000 , SLEEP(10) */", "Comentarios ejecutables (/*! ... */) no permitidos"),
+    ("SELECT 1 /*M!100000 , SLEEP(10) */", "Comentarios ejecutables (/*! ... */) no permitidos"),
+    ("SELECT id FROM core_registro WHERE nota = 'abc", "Literal o identificador sin cerrar"),
+    ("SELECT id FROM t UNION SELECT password FROM u", "Patrón peligroso detectado: UNION"),
+    ("SELECT id INTO OUTFILE '/tmp/x' FROM t", "Comando prohibido detectado: INTO OUTFILE"),
+    ("SHOW TABLES", "Solo se permiten consultas SELECT"),
+])
+def test_rejected_queries(scan, query, message):
+    assert scan(query) == (False, message)
+
+
+@pytest.mark.parametrize("query", [
+    "SELECT id, 'it''s' FROM t WHERE a = 'x' AND b = 'DROP'",
+    "SELECT 1; DROP TABLE t",
+    "SELECT 'a;b';",
+    "SELECT 'sin cerrar",
+])
+def test_fast_path_agrees_with_lexer(query, monkeypatch):
+    fast_code, fast_violation = sql_validator._lex(query.upper())
+    monkeypatch.setattr(sql_validator, "_FAST_PATH_BLOCKERS", ("",))
+    lexer_code, lexer_violation = sql_validator._lex(query.upper())
+    assert fast_violation == lexer_violation
+    assert fast_code.replace(';', ' ').split() == lexer_code.replace(';', ' ').split()
+
+
+def test_validator_lru_counts_hits_and_evicts_oldest():
+    validator = SQLValidator(max_entries=2)
+    validator.validate("SELECT 1")
+    validator.validate("  SELECT 1  ")  # se normaliza con strip: mismo veredicto
+    validator.validate("SELECT 2")
+    validator.validate("SELECT 3")  # expulsa SELECT 1
+    assert validator.stats() == {"entries": 2, "max_entries": 2, "hits": 1, "misses": 3}
+    validator.validate("SELECT 3")
+    validator.validate("SELECT 1")
+    assert validator.stats() == {"entries": 2, "max_entries": 2, "hits": 2, "misses": 4}
+
+
+@pytest.mark.parametrize("fragment, balanced", [
+    ("estado_id = 1", True),
+    ("(estado_id = 1 OR estado_id = 2) AND usuario_id IN (1, 2)", True),
+    ("nombre = 'x)' AND nota = \"(\"", True),
+    ("estado_id = 1 /* ) */", True),
+    ("estado_id = 1) OR (1 = 1", False),
+    ("(estado_id = 1", False),
+    ("estado_id = 1)", False),
+])
+def test_parentheses_balanced(fragment, balanced):
+    assert parentheses_balanced(fragment) is balanced
+
+
+def test_filter_is_validated_in_the_statement_that_runs():
+    # Válido como SELECT 1 ... WHERE {filtro}, pero dentro de otra sentencia cierra su paréntesis
+    where = "1 = 1) OR (estado_id = 2"
+    assert validate_sql_query(f"SELECT 1 FROM t WHERE {where}")[0]
+    assert not parentheses_balanced(where)
@@ -0,0 +1,114 @@
+import threading
+from datetime import date, datetime
+
+import pytest
+
+from sqlite_mirror import MirrorError, SqliteMirror, translate
+
+COLUMNS = [("id", "int"), ("usuario_id", "int"), ("tiempo", "datetime"), ("nombre", "varchar")]
+
+
+@pytest.mark.parametrize("sql, expected", [
+    ("SELECT * FROM t WHERE tiempo >= DATE_SUB(CURDATE(), INTERVAL 7 DAY)",
+     "SELECT * FROM t WHERE tiempo >= DATE_SUB(CURDATE(), 7, 'DAY')"),
+    ("SELECT * FROM t WHERE tiempo < '2025-03-01' + INTERVAL 1 MONTH",
+     "SELECT * FROM t WHERE tiempo < DATE_ADD('2025-03-01', 1, 'MONTH')"),
+    ("SELECT TIMESTAMPDIFF(MINUTE, a, b) FROM t", "SELECT TIMESTAMPDIFF('MINUTE', a, b) FROM t"),
+    ("SELECT IF(estado_id = 1, 'E', 'S'), CURRENT_DATE FROM t", "SELECT iif(estado_id = 1, 'E', 'S'), CURDATE() FROM t"),
+    ("SELECT 'INTERVAL 1 DAY' FROM t", "SELECT 'INTERVAL 1 DAY' FROM t"),
+])
+def test_translate_mariadb_dialect(sql, expected):
+    assert translate(sql) == (expected, ())
+
+
+def test_translate_placeholders():
+    assert translate("SELECT * FROM t WHERE a = %s AND b LIKE %s AND c LIKE '50%%'", [1, "%x%"]) == \
+        ("SELECT * FROM t WHERE a = ? AND b LIKE ? AND c LIKE '50%'", [1, "%x%"])
+    assert translate("SELECT * FROM t WHERE tiempo >= %(desde)s", {"desde": datetime(2025, 3, 1, 8)}) == \
+        ("SELECT * FROM t WHERE tiempo >= :desde", {"desde": "2025-03-01 08:00:00"})
+    with pytest.raises(MirrorError):
+        translate("SELECT * FROM t WHERE tiempo > NOW() - INTERVAL (1 + 1) DAY")
+
+
+def test_expression_dates_come_back_as_datetime(sqlite_connection):
+    cursor = sqlite_connection.cursor()
+    sqlite_connection.execute_raw("CREATE TABLE core_registro (id INTEGER PRIMARY KEY, tiempo DATETIME, nombre TEXT)")
+    sqlite_connection.executemany_raw("INSERT INTO core_registro VALUES (?, ?, ?)", [
+        (1, "2025-03-01 08:00:00", "Ana"), (2, "2025-03-02 17:30:15.250000", "2025-03-02 no es fecha")])
+    cursor.execute("SELECT MIN(tiempo), MAX(tiempo), DATE(MIN(tiempo)), "
+                   "DATE_ADD(MIN(tiempo), INTERVAL 1 DAY), MIN(nombre), COUNT(*) FROM core_registro")
+    assert cursor.fetchone() == (datetime(2025, 3, 1, 8), datetime(2025, 3, 2, 17, 30, 15, 250000),
+                                 date(2025, 3, 1), datetime(2025, 3, 2, 8), "2025-03-02 no es fecha", 2)
+    cursor.execute("SELECT tiempo FROM core_registro ORDER BY id")
+    assert cursor.fetchall() == [(datetime(2025, 3, 1, 8),), (datetime(2025, 3, 2, 17, 30, 15, 250000),)]
+
+
+class SourceCursor:
+    """Cursor de MariaDB falso para sync(): columnas de INFORMATION_SCHEMA y lotes por id"""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.result = []
+
+    def execute(self, sql, params=None):
+        if "INFORMATION_SCHEMA" in sql:
+            self.result = COLUMNS if params == ["core_registro"] else []
+        else:
+            after, limit = params
+            self.result = [row for row in self.rows if row[0] > after][:limit]
+
+    def fetchall(self):
+        return self.result
+
+
+@pytest.fixture
+def mirror(tmp_path):
+    return SqliteMirror(str(tmp_path), ["core_registro"], {"core_registro": [("tiempo",)]},
+                        batch_rows=3, commit_rows=5, sync_interval=60)
+
+
+def test_incremental_sync_and_staleness(mirror):
+    rows = [(i, i % 3, datetime(2025, 3, 1, 8, i), f"Usuario {i}") for i in range(1, 8)]
+    source = SourceCursor(rows)
+    assert mirror.is_stale("pruebas") and not mirror.exists("pruebas")
+
+    result = mirror.sync(source, "pruebas")
+    assert result["tables"]["core_registro"]["rows_added"] == 7
+    assert mirror.exists("pruebas") and not mirror.is_stale("pruebas")
+    # Sin force se omite dentro de sync_interval
+    assert mirror.sync(source, "pruebas")["skipped"]
+
+    source.rows = rows + [(8, 1, datetime(2025, 3, 2, 9), "Usuario 8")]
+    result = mirror.sync(source, "pruebas", force=True)
+    assert result["tables"]["core_registro"] == dict(result["tables"]["core_registro"], rows_added=1, watermark=8,
+                                                      rows=8, rebuilt=False)
+    with mirror.connect("pruebas") as connection:
+        cursor = connection.cursor()
+        cursor.execute("SELECT COUNT(*), MAX(tiempo) FROM core_registro WHERE tiempo >= %s",
+                       [datetime(2025, 3, 1, 8, 5)])
+        assert cursor.fetchone() == (4, datetime(2025, 3, 2, 9))
+
+
+def test_sync_without_wait_skips_when_another_is_running(mirror):
+    lock = mirror._sync_lock("pruebas")
+    lock.acquire()
+    try:
+        result = {}
+        thread = threading.Thread(target=lambda: result.update(mirror.sync(SourceCursor([]), "pruebas", wait=False)))
+        thread.start()
+        thread.join(5)
+        assert result == {"skipped": True, "in_progress": True}
+    finally:
+        lock.release()
+
+
+def test_failed_sync_is_not_retried_on_every_read(mirror):
+    class BrokenCursor:
+        def execute(self, sql, params=None):
+            raise ConnectionError("MariaDB no responde")
+
+    with pytest.raises(ConnectionError):
+        mirror.sync(BrokenCursor(), "pruebas")
+    assert not mirror.is_stale("pruebas")
+    mirror.sync_interval = 0
+    assert not mirror.is_stale("pruebas")
@@ -0,0 +1,104 @@
+import sqlite3
+import zlib
+from contextlib import contextmanager
+
+import pytest
+
+from sqlite_mirror import MirrorConnection, register_functions
+from table_diff import ChunkedTableDiff, TableSide, row_hash_sql
+
+
+class BitXor:
+    def __init__(self):
+        self.value = 0
+
+    def step(self, value):
+        if value is not None:
+            self.value ^= int(value)
+
+    def finalize(self):
+        return self.value
+
+
+def connect(path):
+    """Conexión tipo pymysql sobre SQLite con CRC32, CHAR_LENGTH y BIT_XOR de MariaDB"""
+    sqlite = sqlite3.connect(path)
+    register_functions(sqlite)
+    sqlite.create_function("CRC32", 1, lambda v: None if v is None else zlib.crc32(str(v).encode()))
+    sqlite.create_function("CHAR_LENGTH", 1, lambda v: None if v is None else len(str(v)))
+    sqlite.create_aggregate("BIT_XOR", 1, BitXor)
+    return MirrorConnection("pruebas", sqlite)
+
+
+@pytest.fixture
+def database(tmp_path):
+    path = str(tmp_path / "diff.sqlite3")
+
+    @contextmanager
+    def factory():
+        # Una conexión por consulta: query_both lee las dos tablas desde hilos distintos
+        connection = connect(path)
+        try:
+            yield connection
+        finally:
+            connection.close()
+
+    with factory() as conn:
+        for table in ("original", "copia"):
+            conn.execute_raw(f"CREATE TABLE {table} (id INTEGER PRIMARY KEY, a TEXT, b TEXT)")
+        conn.commit()
+    return path, factory
+
+
+def hashes(path, rows):
+    connection = connect(path)
+    connection.execute_raw("CREATE TABLE valores (a TEXT, b TEXT)")
+    connection.executemany_raw("INSERT INTO valores VALUES (?, ?)", rows)
+    cursor = connection.cursor()
+    cursor.execute(f"SELECT {row_hash_sql(['a', 'b'])} FROM valores")
+    return [row[0] for row in cursor.fetchall()]
+
+
+def test_row_hash_has_no_separator_collisions(tmp_path):
+    # Con CONCAT_WS('#', ...) los dos primeros pares daban la misma cadena 'a#b#c'
+    rows = [("a#b", "c"), ("a", "b#c"), ("", None), (None, ""), ("N", None), (None, "N"), ("1:", "x"), ("", "1:x")]
+    values = hashes(str(tmp_path / "h.sqlite3"), rows)
+    assert len(set(values)) == len(rows)
+
+
+def test_chunked_diff_finds_changed_missing_and_extra_rows(database):
+    path, factory = database
+    rows = [(i, f"valor {i}", None if i % 7 == 0 else "x") for i in range(1, 2001)]
+    with factory() as conn:
+        conn.executemany_raw("INSERT INTO original VALUES (?, ?, ?)", rows)
+        conn.executemany_raw("INSERT INTO copia VALUES (?, ?, ?)", rows)
+        conn.execute_raw("UPDATE copia SET a = 'valor#15', b = NULL WHERE id = 150")
+        # Misma cadena con CONCAT_WS('#', ...): 'valor#15#x'
+        conn.execute_raw("UPDATE original SET a = 'valor', b = '15#x' WHERE id = 151")
+        conn.execute_raw("UPDATE copia SET a = 'valor#15', b = 'x' WHERE id = 151")
+        conn.execute_raw("DELETE FROM copia WHERE id = 1200")
+        conn.execute_raw("INSERT INTO copia VALUES (2500, 'nuevo', NULL)")
+        conn.commit()
+
+    diff = ChunkedTableDiff(TableSide("table1", "original", factory), TableSide("table2", "copia", factory),
+                            "id", ["a", "b"], chunk_size=500, fanout=4, leaf_rows=16).run()
+    assert not diff["identical"]
+    assert (diff["rows_table1"], diff["rows_table2"]) == (2000, 2000)
+    assert diff["differences"] == [
+        {"key": 150, "status": "different", "columns": ["a", "b"]},
+        {"key": 151, "status": "different", "columns": ["a", "b"]},
+        {"key": 1200, "status": "only_in_table1"},
+        {"key": 2500, "status": "only_in_table2"},
+    ]
+    assert diff["mismatched_chunks"] == 3 and not diff["truncated"]
+
+
+def test_identical_tables(database):
+    _, factory = database
+    with factory() as conn:
+        for table in ("original", "copia"):
+            conn.executemany_raw(f"INSERT INTO {table} VALUES (?, ?, ?)", [(1, "a", None), (2, "", "b")])
+        conn.commit()
+    diff = ChunkedTableDiff(TableSide("table1", "original", factory), TableSide("table2", "copia", factory),
+                            "id", ["a", "b"]).run()
+    assert diff["identical"] and diff["differences"] == [] and diff["queries"] == 4
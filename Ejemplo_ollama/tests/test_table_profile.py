@@ -0,0 +1,67 @@
+import random
+import re
+from statistics import fmean
+
+import pytest
+
+from table_profile import profile_sample
+
+
+class TableCursor:
+    """Cursor falso sobre una tabla en memoria (id, valor) para MIN/MAX y los trozos UNION ALL"""
+
+    def __init__(self, rows):
+        self.rows = sorted(rows)
+        self.result = []
+
+    def execute(self, sql, params=None):
+        if sql.startswith("SELECT MIN("):
+            self.result = [(self.rows[0][0], self.rows[-1][0])] if self.rows else [(None, None)]
+            return
+        limits = [int(n) for n in re.findall(r"LIMIT (\d+)", sql)]
+        self.result = []
+        for chunk_id, limit in enumerate(limits):
+            start, end = params[2 * chunk_id], params[2 * chunk_id + 1]
+            chunk = [row for row in self.rows if start <= row[0] < end][:limit]
+            self.result.extend((chunk_id,) + row for row in chunk)
+
+    def fetchone(self):
+        return self.result[0]
+
+    def fetchall(self):
+        return self.result
+
+
+@pytest.fixture
+def table():
+    # Ids pares (densidad 0.5) con valores normales de media 50
+    rng = random.Random(3)
+    return [(key, rng.gauss(50, 10)) for key in range(2, 20_002, 2)]
+
+
+def test_sample_estimates_known_distribution(table):
+    profile = profile_sample(TableCursor(table), "t", "id", ["valor"], sample_rows=2_000, chunks=20,
+                             rng=random.Random(1))
+    stats = profile["numeric_statistics"]["valor"]
+    true_mean = fmean(value for _, value in table)
+    assert abs(profile["row_count"] - len(table)) / len(table) < 0.01
+    assert abs(stats["avg"] - true_mean) <= stats["avg_margin_of_error"]
+    assert stats["avg_margin_of_error"] < 1.5
+    assert profile["sampling"]["rows_read"] <= 2_000
+
+
+def test_chunks_do_not_overlap_and_full_sample_is_exact(table):
+    cursor = TableCursor(table)
+    # Más filas por trozo que filas por estrato: sin cota superior los trozos se solaparían
+    profile = profile_sample(cursor, "t", "id", ["valor"], sample_rows=len(table) * 4, chunks=10,
+                             rng=random.Random(5))
+    keys = [row[1] for row in cursor.result]
+    assert len(keys) == len(set(keys))
+    # Densidad exacta (0.5) en todos los trozos: el conteo estimado es el real
+    assert profile["row_count"] == len(table)
+
+
+@pytest.mark.parametrize("confidence", [0, 1, 95, -0.5])
+def test_confidence_is_validated(table, confidence):
+    with pytest.raises(ValueError, match="confidence"):
+        profile_sample(TableCursor(table), "t", "id", ["valor"], sample_rows=100, confidence=confidence)
@@ -2,6 +2,12 @@
 from mcp.server.fastmcp import FastMCP
 from datetime import datetime, timedelta
 import json
+import os
+import sys
+
+# Los filtros se comparten con el servidor de Ejemplo_ollama
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "Ejemplo_ollama"))
+from attendance_filters import build_attendance_filters
 
 # Crear servidor MCP especializado en registros de asistencia
 mcp = FastMCP("Attendance Analysis Server")
@@ -32,17 +38,13 @@ def generate_attendance_query(analysis_type: str, date_from: str = None, date_to
     date_from: Fecha inicio en formato YYYY-MM-DD
     date_to: Fecha fin en formato YYYY-MM-DD  
     user_filter: Filtro por nombre o código de usuario
-    """
     
-    base_conditions = []
-    if date_from:
-        base_conditions.append(f"tiempo >= '{date_from} 00:00:00'")
-    if date_to:
-        base_conditions.append(f"tiempo <= '{date_to} 23:59:59'")
-    if user_filter:
-        base_conditions.append(f"(nombre LIKE '%{user_filter}%' OR codigo_usuario LIKE '%{user_filter}%')")
+    La consulta usa placeholders %s; los valores de los filtros se devuelven en "params"
+    para ejecutarla como sentencia parametrizada.
+    """
     
-    where_clause = " AND ".join(base_conditions) if base_conditions else "1=1"
+    where_clause, params = build_attendance_filters(date_from, date_to, user_filter)
+    r1_where_clause, _ = build_attendance_filters(date_from, date_to, user_filter, alias="r1")
     
     queries = {
         "daily_summary": f"""
@@ -78,7 +80,7 @@ def generate_attendance_query(analysis_type: str, date_from: str = None, date_to
                 TIME(r1.tiempo) as hora_entrada
             FROM core_registro r1
             WHERE r1.evento = 'entrada' 
-                AND {where_clause.replace('tiempo', 'r1.tiempo')}
+                AND {r1_where_clause}
                 AND NOT EXISTS (
                     SELECT 1 FROM core_registro r2 
                     WHERE r2.usuario_id = r1.usuario_id 
@@ -137,7 +139,8 @@ def generate_attendance_query(analysis_type: str, date_from: str = None, date_to
     
     return {
         "query": queries[analysis_type].strip(),
-        "description": f"Consulta para {analysis_type}",
+        "params": params,
+        "description": f"Consulta parametrizada para {analysis_type}",
         "filters_applied": {
             "date_from": date_from,
             "date_to": date_to, 